@@ -0,0 +1,216 @@
+import asyncio
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+
+from app.services.nl2sql_service import get_nl2sql_service
+from app.services.cost_guard import get_cost_guard
+from app.services.rollup import get_rollup_manager
+from app.services.replica import get_replica
+from app.services.query_log import get_query_log
+from app.services.index_advisor import recommend
+from app.services.schema_catalog import get_schema_catalog
+from app.utils.database import get_db
+from config import INDEX_ADVISOR_DATABASE
+
+# 创建管理接口路由
+router = APIRouter()
+
+# 请求模型
+class BumpTablesRequest(BaseModel):
+    tables: List[str]
+
+class RefreshRollupsRequest(BaseModel):
+    rollups: Optional[List[str]] = None  # 为空时刷新全部汇总表
+    full: bool = False  # 全量重建（历史订单被修改后使用）
+
+class RefreshReplicaRequest(BaseModel):
+    tables: Optional[List[str]] = None  # 为空时刷新全部表
+    full: bool = False  # 全量重新加载（同步已有行的更新和删除）
+
+class RefreshSchemaRequest(BaseModel):
+    full: bool = True  # 不比较结构指纹，直接重新读取（同时更新估算行数）
+
+@router.get("/cache")
+async def get_sql_cache_info(limit: int = 20):
+    """
+    查看自然语言转SQL缓存状态
+    """
+    try:
+        nl2sql = get_nl2sql_service()
+        return {
+            "stats": nl2sql.cache_stats(),
+            "fast_path": nl2sql.fast_path.stats() if nl2sql.fast_path else None,
+            "speculation": nl2sql.speculation_stats(),
+            "llm": nl2sql.llm.stats(),
+            "recent_keys": nl2sql.sql_cache.keys(limit=limit)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取缓存信息失败: {str(e)}")
+
+@router.delete("/cache")
+async def clear_sql_cache():
+    """
+    清空自然语言转SQL缓存
+    """
+    try:
+        nl2sql = get_nl2sql_service()
+        cleared = nl2sql.clear_cache()
+        nl2sql.sql_cache.reset_stats()
+        return {"success": True, "cleared": cleared}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"清空缓存失败: {str(e)}")
+
+@router.get("/result-cache")
+async def get_result_cache_info():
+    """
+    查看查询结果缓存状态
+    """
+    db = get_db()
+    if db.result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "stats": db.result_cache.stats()}
+
+@router.delete("/result-cache")
+async def clear_result_cache():
+    """
+    清空查询结果缓存
+    """
+    db = get_db()
+    if db.result_cache is None:
+        return {"success": True, "cleared": 0}
+    return {"success": True, "cleared": db.result_cache.clear()}
+
+@router.post("/result-cache/bump")
+async def bump_table_versions(request: BumpTablesRequest):
+    """
+    外部写入数据后，显式使相关表的查询结果缓存失效
+    """
+    db = get_db()
+    unknown = [t for t in request.tables if t not in db.known_tables]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的表: {', '.join(unknown)}")
+    db.bump_tables(request.tables)
+    return {"success": True, "tables": request.tables}
+
+@router.get("/pool")
+async def get_pool_info():
+    """
+    查看数据库连接池状态（使用中、空闲、等待者、等待时间）
+    """
+    return get_db().pool_stats()
+
+@router.get("/coalescing")
+async def get_coalescing_info():
+    """
+    查看并发请求合并统计（相同问题的Groq调用、相同SQL的数据库查询）
+    """
+    return {
+        "llm": get_nl2sql_service().inflight.stats(),
+        "db": get_db().inflight.stats()
+    }
+
+@router.get("/cost-guard")
+async def get_cost_guard_info():
+    """
+    查看执行前代价检查的预算和统计
+    """
+    return get_cost_guard().stats()
+
+@router.delete("/cost-guard/explain-cache")
+async def clear_explain_cache():
+    """
+    清空EXPLAIN缓存（表数据量或索引变化后使用）
+    """
+    return {"success": True, "cleared": get_cost_guard().explain_cache.clear()}
+
+@router.get("/rollups")
+async def get_rollup_info():
+    """
+    查看预聚合汇总表的刷新状态和查询改写统计
+    """
+    return get_rollup_manager().stats()
+
+@router.post("/rollups/refresh")
+async def refresh_rollups(request: RefreshRollupsRequest):
+    """
+    立即刷新汇总表（默认增量刷新）
+    """
+    manager = get_rollup_manager()
+    unknown = [name for name in request.rollups or [] if name not in manager.rollups]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的汇总表: {', '.join(unknown)}")
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, manager.refresh, request.rollups, request.full)
+    return {"success": all(result["success"] for result in results.values()), "results": results}
+
+@router.get("/replica")
+async def get_replica_info():
+    """
+    查看进程内列式副本的加载状态和查询统计
+    """
+    return get_replica().stats()
+
+@router.post("/replica/refresh")
+async def refresh_replica(request: RefreshReplicaRequest):
+    """
+    立即刷新列式副本（默认按主键增量追加）
+    """
+    replica = get_replica()
+    if not replica.enabled:
+        raise HTTPException(status_code=400, detail="列式副本未启用（REPLICA_ENABLED=true 且需要安装numpy）")
+    unknown = [name for name in request.tables or [] if name not in replica.schema]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的表: {', '.join(unknown)}")
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, replica.refresh, request.tables, request.full)
+    return {"success": all(result["success"] for result in results.values()), "results": results}
+
+@router.get("/query-log")
+async def get_query_log_info(limit: int = 20):
+    """
+    查看查询日志：按总耗时排列的SQL模板及其谓词、连接、分组列
+    """
+    log = get_query_log()
+    return {"stats": log.stats(), "entries": [entry.to_dict() for entry in log.entries(limit)]}
+
+@router.delete("/query-log")
+async def clear_query_log():
+    """
+    清空内存中的查询日志（已写入的JSONL文件保留）
+    """
+    return {"success": True, "cleared": get_query_log().clear()}
+
+@router.get("/index-advice")
+async def get_index_advice(limit: int = 10, validate: bool = False):
+    """
+    根据查询日志给出索引建议（按估算收益排序）及建索引的DDL
+
+    validate=true 时在 INDEX_ADVISOR_DATABASE 副本上临时创建索引，用EXPLAIN验证收益
+    """
+    if validate and not INDEX_ADVISOR_DATABASE:
+        raise HTTPException(status_code=400, detail="未配置用于验证的数据库副本（INDEX_ADVISOR_DATABASE）")
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, recommend, None, limit, validate)
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    return result
+
+@router.get("/schema")
+async def get_schema_catalog_info():
+    """
+    查看数据库结构目录：当前快照的来源、版本、各表的列类型、索引、外键和估算行数
+    """
+    return get_schema_catalog().stats()
+
+@router.post("/schema/refresh")
+async def refresh_schema_catalog(request: RefreshSchemaRequest):
+    """
+    立即从 information_schema 重新读取数据库结构（执行DDL后使用）
+    """
+    catalog = get_schema_catalog()
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, catalog.refresh, request.full)
+    if not result["success"]:
+        raise HTTPException(status_code=503, detail=f"读取数据库结构失败: {result['error']}")
+    return result
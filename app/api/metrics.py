@@ -0,0 +1,94 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.services.nl2sql_service import get_nl2sql_service
+from app.services.cost_guard import get_cost_guard
+from app.services.rollup import get_rollup_manager
+from app.services.replica import get_replica
+from app.services.schema_catalog import get_schema_catalog
+from app.utils.database import get_db
+from app.utils.metrics import get_registry, CONTENT_TYPE
+
+# 创建指标接口路由
+router = APIRouter()
+
+
+def _cache_stats():
+    """各缓存的统计：缓存名 -> stats()"""
+    nl2sql = get_nl2sql_service()
+    db = get_db()
+    caches = {
+        "sql": nl2sql.sql_cache.stats(),
+        "explain": get_cost_guard().explain_cache.stats(),
+    }
+    if db.result_cache is not None:
+        caches["result"] = db.result_cache.stats()
+    if nl2sql.fast_path is not None:
+        caches["fast_path"] = nl2sql.fast_path.stats()
+    return caches
+
+def _cache_values(field):
+    def collect():
+        values = {}
+        for name, stats in _cache_stats().items():
+            if field == "hit_ratio":
+                total = stats["hits"] + stats["misses"]
+                values[(name,)] = stats["hits"] / total if total else 0.0
+            else:
+                values[(name,)] = stats[field]
+        return values
+    return collect
+
+def _pool_connections():
+    stats = get_db().pool_stats()
+    return {("in_use",): stats["in_use"], ("idle",): stats["idle"]}
+
+def _coalesced():
+    return {
+        ("llm",): get_nl2sql_service().inflight.stats()["coalesced"],
+        ("db",): get_db().inflight.stats()["coalesced"]
+    }
+
+def _cost_guard_decisions():
+    stats = get_cost_guard().stats()
+    return {
+        ("rejected",): stats["rejected"],
+        ("downgraded",): stats["downgraded"],
+        ("explain_failed",): stats["explain_failures"]
+    }
+
+
+def _register_collectors(registry):
+    """注册抓取时读取已有统计的指标（缓存、连接池、请求合并、代价检查）"""
+    registry.callback("chat2bi_cache_hit_ratio", "Cache hit ratio since start",
+                      _cache_values("hit_ratio"), ["cache"])
+    registry.callback("chat2bi_cache_hits_total", "Cache hits",
+                      _cache_values("hits"), ["cache"], kind="counter")
+    registry.callback("chat2bi_cache_misses_total", "Cache misses",
+                      _cache_values("misses"), ["cache"], kind="counter")
+    registry.callback("chat2bi_db_pool_connections", "Database pool connections by state",
+                      _pool_connections, ["state"])
+    registry.callback("chat2bi_db_pool_waiters", "Threads waiting for a database connection",
+                      lambda: get_db().pool_stats()["waiters"])
+    registry.callback("chat2bi_db_pool_timeouts_total", "Connection checkouts that timed out",
+                      lambda: get_db().pool_stats()["timeouts"], kind="counter")
+    registry.callback("chat2bi_coalesced_total", "Concurrent duplicate calls served by single-flight",
+                      _coalesced, ["layer"], kind="counter")
+    registry.callback("chat2bi_cost_guard_total", "Cost guard decisions",
+                      _cost_guard_decisions, ["decision"], kind="counter")
+    registry.callback("chat2bi_rollup_age_seconds", "Seconds since each rollup table was last refreshed",
+                      lambda: {(name,): age for name, age in get_rollup_manager().ages().items()}, ["rollup"])
+    registry.callback("chat2bi_replica_age_seconds", "Seconds since each replica table was last fully loaded",
+                      lambda: {(name,): age for name, age in get_replica().ages().items()}, ["table"])
+    registry.callback("chat2bi_schema_snapshot_age_seconds", "Seconds since the schema snapshot was loaded",
+                      lambda: get_schema_catalog().age())
+
+_register_collectors(get_registry())
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus 指标（文本格式）
+    """
+    return Response(content=get_registry().render(), media_type=CONTENT_TYPE)
@@ -1,123 +1,355 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 import json
+import time
+import asyncio
+from dataclasses import replace
 
 # 导入服务
 from app.services.nl2sql_service import get_nl2sql_service
-from app.utils.database import get_db
+from app.utils.database import get_db, QueryTimeoutError
+from app.utils.pool import PoolTimeoutError
+from app.utils.async_utils import run_until_disconnected, ClientDisconnected
+from app.utils.serializer import (
+    RESULT_SHAPES, column_converters, dumps, encode_csv_chunk, encode_csv_error, encode_ndjson_chunk,
+    encode_ndjson_error, result_data
+)
+from app.utils.text import normalize_question
+from app.services.cost_guard import get_cost_guard, with_max_execution_time
+from app.services.rollup import get_rollup_manager
+from app.services.replica import get_replica
+from app.services.query_log import get_query_log
+from app.services.schema_catalog import get_schema_catalog
+from app.services.pagination import plan_page, apply_page, cap_sql, decode_cursor, InvalidCursor
+from app.utils.arrow_format import ARROW_AVAILABLE, ARROW_FORMATS, ArrowEncoder, negotiate_format
+from app.utils.timing import start_timer, current_timer, stage
+from app.utils.metrics import STAGE_SECONDS, QUERY_SECONDS, QUERIES_TOTAL, ROWS_RETURNED, RESPONSE_BYTES
+from config import (
+    STREAM_CHUNK_SIZE, STREAM_EXECUTION_TIMEOUT_MS, BATCH_MAX_QUESTIONS, BATCH_MAX_CONCURRENCY,
+    QUERY_ROW_LIMIT, STREAM_ROW_LIMIT, PAGINATION_SECRET
+)
+from mysql.connector import Error
 
 # 创建API路由
 router = APIRouter()
 
+# 流式结果格式 -> 响应类型
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet"
+}
+
+# 下载文件名的扩展名
+STREAM_FILE_EXTENSIONS = {"csv": "csv", "parquet": "parquet"}
+
 # 请求模型
 class QueryRequest(BaseModel):
     question: str
+    cursor: Optional[str] = None  # 上一页返回的 next_cursor，用于读取下一页
     
 class QueryResponse(BaseModel):
     success: bool
     question: str
     sql: Optional[str] = None
-    data: Optional[List[Dict[str, Any]]] = None
+    data: Optional[Union[List[Dict[str, Any]], Dict[str, Any]]] = None  # shape=columns 时为 {columns, rows}
     count: Optional[int] = None
     error: Optional[str] = None
     execution_time: Optional[float] = None
+    source: Optional[str] = None  # SQL来源: template（模板）、cache（缓存）、llm（模型生成）、cursor（分页续读）
+    truncated: Optional[bool] = None  # 结果是否超过单次返回的行数上限
+    next_cursor: Optional[str] = None  # 下一页游标，没有下一页或查询不支持续读时为空
+    error_detail: Optional[Dict[str, Any]] = None  # 结构化的错误原因（代价检查拒绝、执行超时）
+    timings: Optional[Dict[str, float]] = None  # timing=true 时返回各阶段耗时（毫秒）
+    rollup: Optional[str] = None  # 查询改写为读取的汇总表（sql 仍为生成的SQL）
+    rollup_age: Optional[float] = None  # 汇总表距上次刷新的秒数（结果可能缺少这段时间内的数据）
+    replica: Optional[bool] = None  # 是否由进程内列式副本回答（未访问数据库）
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    max_concurrency: Optional[int] = None
+
+class BatchQueryResponse(BaseModel):
+    success: bool
+    results: List[QueryResponse]
+    count: int
+    unique_count: int
+    execution_time: float
 
 @router.post("/query", response_model=QueryResponse)
-async def natural_language_query(request: QueryRequest):
+async def natural_language_query(request: QueryRequest, http_request: Request,
+                                 stream: Optional[str] = None, shape: str = "records",
+                                 result_format: Optional[str] = Query(None, alias="format"),
+                                 timing: bool = False):
     """
     自然语言查询接口
     
-    接收自然语言问题，转换为SQL查询，执行并返回JSON结果
+    接收自然语言问题，转换为SQL查询，执行并返回JSON结果。
+    Groq调用和数据库查询都不阻塞事件循环，客户端断开时取消处理。
+    stream=ndjson|csv 时以流式方式边读边返回结果，适合大结果集；
+    format=arrow|parquet（或对应的Accept头）时返回带类型的二进制列式结果；
+    shape=columns 时 data 为 {columns, rows}，列名只出现一次；
+    timing=true 时响应中带各阶段耗时（timings 字段和 Server-Timing 头）
     """
-    import time
+    stream = _resolve_format(stream, result_format, http_request.headers.get("accept"))
+    _check_shape(shape)
     
     start_time = time.time()
+    timer = start_timer()
     
+    try:
+        response = await run_until_disconnected(http_request, _process_query(request, start_time, stream, shape=shape))
+    except ClientDisconnected:
+        response = QueryResponse(
+            success=False,
+            question=request.question,
+            error="客户端已断开连接",
+            execution_time=time.time() - start_time
+        )
+    
+    if isinstance(response, dict):
+        if timing:
+            response["timings"] = timer.breakdown()
+        with timer.stage("encode"):
+            content = dumps(response)
+        _observe_query(timer, response, len(content))
+        headers = {"Server-Timing": _server_timing(timer)} if timing else None
+        return Response(content=content, media_type="application/json", headers=headers)
+    
+    if isinstance(response, QueryResponse) and timing:
+        response.timings = timer.breakdown()
+    _observe_query(timer, response)
+    return response
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def batch_query(request: BatchQueryRequest, http_request: Request, shape: str = "records"):
+    """
+    批量自然语言查询接口
+    
+    相同的问题只处理一次；SQL生成并发执行（受并发上限控制），
+    生成的SQL通过连接池并行执行。每个问题单独返回结果或错误
+    """
+    _check_shape(shape)
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions不能为空")
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"一次最多查询{BATCH_MAX_QUESTIONS}个问题")
+    
+    start_time = time.time()
+    concurrency = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    generation_limiter = asyncio.Semaphore(max(concurrency, 1))
+    
+    # 按归一化后的问题去重
+    unique_questions = {}
+    for question in request.questions:
+        unique_questions.setdefault(normalize_question(question), question)
+    
+    async def run_one(question):
+        # 每个问题在自己的任务中计时；单个问题的异常只影响该问题的结果
+        timer = start_timer()
+        try:
+            response = await _process_query(QueryRequest(question=question), time.time(),
+                                            generation_limiter=generation_limiter, shape=shape)
+        except Exception as e:
+            response = QueryResponse(success=False, question=question, error=f"系统错误: {str(e)}")
+        _observe_query(timer, response)
+        return response
+    
+    async def run_all():
+        return await asyncio.gather(*[run_one(question) for question in unique_questions.values()])
+    
+    try:
+        responses = await run_until_disconnected(http_request, run_all())
+    except ClientDisconnected:
+        responses = [
+            QueryResponse(success=False, question=question, error="客户端已断开连接")
+            for question in unique_questions.values()
+        ]
+    
+    # 成功的结果已是可直接编码的字典，错误结果转换为字典后一起编码
+    by_key = {
+        key: response if isinstance(response, dict) else response.model_dump()
+        for key, response in zip(unique_questions.keys(), responses)
+    }
+    results = []
+    for question in request.questions:
+        response = by_key[normalize_question(question)]
+        if response["question"] != question:
+            response = {**response, "question": question}
+        results.append(response)
+    
+    return Response(content=dumps({
+        "success": all(r["success"] for r in results),
+        "results": results,
+        "count": len(results),
+        "unique_count": len(unique_questions),
+        "execution_time": time.time() - start_time
+    }), media_type="application/json")
+
+def _resolve_format(stream, result_format, accept):
+    """确定结果格式：stream/format 参数优先，其次是Accept头；返回None表示普通JSON"""
+    fmt = stream or result_format
+    if fmt is None:
+        return negotiate_format(accept)
+    if fmt == "json":
+        return None
+    if fmt not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的结果格式: {fmt}，可选: json, {', '.join(STREAM_MEDIA_TYPES)}")
+    if fmt in ARROW_FORMATS and not ARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail=f"服务端未安装pyarrow，不支持{fmt}格式")
+    return fmt
+
+def _check_shape(shape):
+    if shape not in RESULT_SHAPES:
+        raise HTTPException(status_code=400, detail=f"不支持的结果形状: {shape}，可选: {', '.join(RESULT_SHAPES)}")
+
+async def _process_query(request, start_time, stream=None, generation_limiter=None, shape="records"):
+    """执行自然语言查询流水线：生成SQL -> 验证 -> 执行 -> 处理结果
+
+    成功时返回可直接编码为JSON的字典（绕过pydantic对大结果集的逐行校验），
+    失败时返回 QueryResponse。
+    generation_limiter 为信号量时，SQL生成阶段受其并发上限控制（批量查询使用）
+    """
     try:
         # 1. 获取服务实例
         nl2sql = get_nl2sql_service()
         db = get_db()
         
-        # 2. 生成SQL查询
-        sql_result = nl2sql.generate_sql(request.question)
+        # 2. 生成SQL查询（带分页游标时直接使用游标中的SQL）
+        after = None
+        if request.cursor:
+            if stream is not None:
+                return QueryResponse(
+                    success=False,
+                    question=request.question,
+                    error="流式导出不支持分页游标",
+                    execution_time=time.time() - start_time
+                )
+            try:
+                with stage("generate"):
+                    sql_query, after = decode_cursor(request.cursor, PAGINATION_SECRET)
+            except InvalidCursor as e:
+                return QueryResponse(
+                    success=False,
+                    question=request.question,
+                    error=f"分页游标无效: {str(e)}",
+                    execution_time=time.time() - start_time
+                )
+            source = "cursor"
+        else:
+            with stage("generate"):
+                if generation_limiter is not None:
+                    async with generation_limiter:
+                        sql_result = await nl2sql.agenerate_sql(request.question)
+                else:
+                    sql_result = await nl2sql.agenerate_sql(request.question)
+            
+            if not sql_result["success"]:
+                return QueryResponse(
+                    success=False,
+                    question=request.question,
+                    error=f"SQL生成失败: {sql_result['error']}",
+                    execution_time=time.time() - start_time
+                )
+            
+            sql_query = sql_result["sql"]
+            source = sql_result.get("source")
         
-        if not sql_result["success"]:
+        # 3. 验证SQL查询
+        with stage("validate"):
+            is_valid, validation_message = nl2sql.validate_sql(sql_query)
+        if not is_valid:
             return QueryResponse(
                 success=False,
                 question=request.question,
-                error=f"SQL生成失败: {sql_result['error']}",
+                sql=sql_query,
+                source=source,
+                error=f"SQL验证失败: {validation_message}",
                 execution_time=time.time() - start_time
             )
         
-        sql_query = sql_result["sql"]
+        # 匹配预聚合汇总表的聚合查询改为读取汇总表，结果与原查询一致
+        with stage("rewrite"):
+            rewrite = get_rollup_manager().rewrite(sql_query)
+        exec_sql = rewrite.sql if rewrite is not None else sql_query
         
-        # 3. 验证SQL查询
-        is_valid, validation_message = nl2sql.validate_sql(sql_query)
-        if not is_valid:
+        guard = get_cost_guard()
+        
+        if stream is not None:
+            stream_sql = cap_sql(exec_sql, STREAM_ROW_LIMIT)
+            with stage("cost_guard"):
+                # EXPLAIN缓存按改写后、加行数上限之前的SQL区分，与分页查询共用且不与改写前的SQL混用
+                verdict = await guard.check(stream_sql, db.explain_async, cache_key=exec_sql)
+            if not verdict.allowed:
+                return _cost_rejection(request, sql_query, source, verdict, start_time)
+            return await _stream_query_result(request, sql_query, stream_sql, source, stream, start_time,
+                                              verdict, rewrite)
+        
+        # 4. 服务端限制返回行数：可以按主键续读的查询使用keyset分页，其余查询加LIMIT
+        try:
+            with stage("plan"):
+                plan = plan_page(exec_sql, nl2sql.table_schema, QUERY_ROW_LIMIT, after)
+        except InvalidCursor as e:
             return QueryResponse(
                 success=False,
                 question=request.question,
                 sql=sql_query,
-                error=f"SQL验证失败: {validation_message}",
+                source=source,
+                error=f"分页游标无效: {str(e)}",
                 execution_time=time.time() - start_time
             )
         
-        # 4. 执行SQL查询
-        if not db.connect():
+        # 进程内列式副本能回答的聚合查询直接在本地执行（使用原始SQL，不经过汇总表改写）
+        replica = get_replica()
+        if replica.enabled:
+            replica_plan = plan if rewrite is None else plan_page(sql_query, nl2sql.table_schema, QUERY_ROW_LIMIT, after)
+            with stage("replica"):
+                query_result = await replica.aexecute(replica_plan.sql)
+            if query_result is not None:
+                return _page_response(request, sql_query, source, replica_plan, query_result, shape, start_time,
+                                      replica=True)
+        
+        # 5. 执行前代价检查：EXPLAIN估算超过预算的查询直接拒绝，不占用数据库
+        with stage("cost_guard"):
+            verdict = await guard.check(plan.sql, db.explain_async, cache_key=plan.source_sql)
+        if not verdict.allowed:
+            return _cost_rejection(request, sql_query, source, verdict, start_time)
+        
+        # 执行SQL查询（在数据库线程池中执行，从连接池借出连接，结束后自动归还），
+        # MySQL和客户端两侧都有超时，超时后中止语句
+        try:
+            with stage("execute"):
+                query_result = await asyncio.wait_for(
+                    db.fetch_result_async(with_max_execution_time(plan.sql, verdict.timeout_ms)),
+                    timeout=verdict.client_timeout
+                )
+        except (QueryTimeoutError, asyncio.TimeoutError):
+            return _timeout_response(request, sql_query, plan.sql, source, verdict, start_time)
+        except (Error, PoolTimeoutError) as e:
             return QueryResponse(
                 success=False,
                 question=request.question,
                 sql=sql_query,
-                error="数据库连接失败",
+                source=source,
+                error=f"数据库连接失败: {str(e)}",
                 execution_time=time.time() - start_time
             )
         
-        try:
-            query_result = db.execute_query(sql_query)
-            
-            if query_result is None:
-                return QueryResponse(
-                    success=False,
-                    question=request.question,
-                    sql=sql_query,
-                    error="查询执行失败",
-                    execution_time=time.time() - start_time
-                )
-            
-            # 5. 处理查询结果
-            result_data = []
-            if isinstance(query_result, list):
-                # 处理字典列表结果
-                for row in query_result:
-                    if isinstance(row, dict):
-                        # 转换Decimal类型为float，处理日期时间格式
-                        processed_row = {}
-                        for key, value in row.items():
-                            if hasattr(value, 'isoformat'):  # 日期时间对象
-                                processed_row[key] = value.isoformat()
-                            elif hasattr(value, '__float__'):  # Decimal对象
-                                processed_row[key] = float(value)
-                            else:
-                                processed_row[key] = value
-                        result_data.append(processed_row)
-                    else:
-                        result_data.append(row)
-            else:
-                # 单个值结果
-                result_data = [{"result": query_result}]
-            
+        if query_result is None:
             return QueryResponse(
-                success=True,
+                success=False,
                 question=request.question,
                 sql=sql_query,
-                data=result_data,
-                count=len(result_data),
+                source=source,
+                error="查询执行失败",
                 execution_time=time.time() - start_time
             )
-            
-        finally:
-            db.disconnect()
+        
+        _log_execution(plan.sql, query_result)
+        return _page_response(request, sql_query, source, plan, query_result, shape, start_time, rewrite=rewrite)
             
     except Exception as e:
         return QueryResponse(
@@ -127,6 +359,169 @@ async def natural_language_query(request: QueryRequest):
             execution_time=time.time() - start_time
         )
 
+def _page_response(request, sql_query, source, plan, query_result, shape, start_time, rewrite=None, replica=None):
+    """截取一页结果并转换为响应字典；rewrite 为汇总表改写结果（读取汇总表时返回汇总表及其数据滞后时间）"""
+    query_result, truncated, next_cursor = apply_page(plan, query_result, PAGINATION_SECRET)
+    
+    # 6. 按列类型转换查询结果（每列只选择一次转换函数）
+    with stage("serialize"):
+        data = result_data(query_result, shape)
+    return {
+        "success": True,
+        "question": request.question,
+        "sql": sql_query,
+        "data": data,
+        "count": len(query_result),
+        "error": None,
+        "execution_time": time.time() - start_time,
+        "source": source,
+        "truncated": truncated,
+        "next_cursor": next_cursor,
+        "rollup": rewrite.rollup if rewrite is not None else None,
+        "rollup_age": rewrite.age if rewrite is not None else None,
+        "replica": replica
+    }
+
+def _log_execution(sql, query_result):
+    """把实际在数据库执行的SQL计入查询日志（结果缓存命中、与其他请求合并的查询没有数据库耗时，不计入）"""
+    timer = current_timer()
+    seconds = timer.seconds().get("db_query") if timer is not None else None
+    if seconds is not None:
+        get_query_log().record(sql, seconds, len(query_result))
+
+def _outcome(response):
+    """查询结果分类：success、stream、rejected（代价检查拒绝）、timeout、error"""
+    if isinstance(response, dict):
+        return "success"
+    if not isinstance(response, QueryResponse):
+        return "stream"
+    if response.success:
+        return "success"
+    code = (response.error_detail or {}).get("code")
+    if code == "timeout":
+        return "timeout"
+    return "rejected" if code else "error"
+
+def _observe_query(timer, response, response_bytes=None):
+    """把一次查询的各阶段耗时、行数和响应大小计入指标"""
+    for name, seconds in timer.seconds().items():
+        STAGE_SECONDS.observe(seconds, stage=name)
+    outcome = _outcome(response)
+    QUERY_SECONDS.observe(timer.elapsed(), outcome=outcome)
+    source = response.get("source") if isinstance(response, dict) else getattr(response, "source", None)
+    QUERIES_TOTAL.inc(source=source or "none", outcome=outcome)
+    if isinstance(response, dict):
+        ROWS_RETURNED.observe(response["count"])
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(response_bytes)
+
+def _server_timing(timer):
+    """Server-Timing 响应头（包含编码阶段）"""
+    parts = [f"{name};dur={elapsed}" for name, elapsed in timer.breakdown().items()]
+    return ", ".join(parts)
+
+def _cost_rejection(request, sql_query, source, verdict, start_time):
+    """代价检查拒绝时的响应"""
+    return QueryResponse(
+        success=False,
+        question=request.question,
+        sql=sql_query,
+        source=source,
+        error=f"查询代价超出限制: {verdict.reason['message']}",
+        error_detail=verdict.reason,
+        execution_time=time.time() - start_time
+    )
+
+def _timeout_response(request, sql_query, exec_sql, source, verdict, start_time):
+    """查询超过执行超时被中止时的响应"""
+    get_query_log().record(exec_sql, verdict.timeout_ms / 1000, timed_out=True)
+    return QueryResponse(
+        success=False,
+        question=request.question,
+        sql=sql_query,
+        source=source,
+        error=f"查询执行超时（{verdict.timeout_ms}毫秒）",
+        error_detail={
+            "code": "timeout",
+            "message": f"查询执行超过{verdict.timeout_ms}毫秒被中止",
+            "timeout_ms": verdict.timeout_ms,
+            "estimated_rows": verdict.estimated_rows,
+            "downgraded": verdict.downgraded
+        },
+        execution_time=time.time() - start_time
+    )
+
+async def _stream_query_result(request, sql_query, stream_sql, source, stream, start_time, verdict, rewrite=None):
+    """以NDJSON、CSV、Arrow IPC或Parquet流式返回查询结果
+
+    先读取列信息，执行出错或超时时仍可返回普通JSON错误；之后每读取一块就写出一块。
+    非缓冲游标的执行时间包含发送结果的时间，因此使用单独的 STREAM_EXECUTION_TIMEOUT_MS
+    作为 MAX_EXECUTION_TIME 提示和等待列信息的客户端超时。已经开始的响应中途出错时，
+    NDJSON/CSV 以一行错误信息结束（Arrow/Parquet 无法追加，直接中断响应）
+    """
+    verdict = replace(verdict, timeout_ms=STREAM_EXECUTION_TIMEOUT_MS)
+    db = get_db()
+    chunks = db.astream_query(with_max_execution_time(stream_sql, verdict.timeout_ms), chunk_size=STREAM_CHUNK_SIZE)
+    try:
+        description = await asyncio.wait_for(chunks.__anext__(), timeout=verdict.client_timeout)
+    except (QueryTimeoutError, asyncio.TimeoutError):
+        await chunks.aclose()
+        return _timeout_response(request, sql_query, stream_sql, source, verdict, start_time)
+    except (Error, PoolTimeoutError) as e:
+        await chunks.aclose()
+        return QueryResponse(
+            success=False,
+            question=request.question,
+            sql=sql_query,
+            source=source,
+            error=f"查询执行失败: {str(e)}",
+            execution_time=time.time() - start_time
+        )
+    
+    columns = [column[0] for column in description]
+    converters = column_converters(description)
+    
+    async def body():
+        try:
+            if stream in ARROW_FORMATS:
+                encoder = ArrowEncoder(description, stream)
+                async for rows in chunks:
+                    data = encoder.encode(rows)
+                    if data:
+                        yield data
+                yield encoder.finish()
+                return
+            if stream == "csv":
+                yield encode_csv_chunk([], header=columns)
+            async for rows in chunks:
+                if stream == "csv":
+                    yield encode_csv_chunk(rows, converters=converters)
+                else:
+                    yield encode_ndjson_chunk(columns, rows, converters)
+        except (QueryTimeoutError, Error) as e:
+            if isinstance(e, QueryTimeoutError):
+                get_query_log().record(stream_sql, verdict.timeout_ms / 1000, timed_out=True)
+                message = f"查询执行超过{verdict.timeout_ms}毫秒被中止，结果不完整"
+                detail = {"code": "timeout", "message": message, "timeout_ms": verdict.timeout_ms}
+            else:
+                message = f"查询执行失败，结果不完整: {str(e)}"
+                detail = {"code": "execution_error", "message": message}
+            print(f"[ERROR] 流式{message}")
+            if stream in ARROW_FORMATS:
+                raise
+            yield encode_csv_error(message) if stream == "csv" else encode_ndjson_error(message, detail)
+        finally:
+            await chunks.aclose()
+    
+    headers = {"X-Execution-Time": f"{time.time() - start_time:.6f}", "X-Query-Source": source or ""}
+    if rewrite is not None:
+        headers["X-Query-Rollup"] = rewrite.rollup
+        if rewrite.age is not None:
+            headers["X-Query-Rollup-Age"] = f"{rewrite.age:.3f}"
+    if stream in STREAM_FILE_EXTENSIONS:
+        headers["Content-Disposition"] = f'attachment; filename="query_result.{STREAM_FILE_EXTENSIONS[stream]}"'
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[stream], headers=headers)
+
 @router.get("/sample-queries")
 async def get_sample_queries():
     """
@@ -161,20 +556,36 @@ async def get_sample_queries():
         ]
     }
 
+async def warm_queries(questions):
+    """启动预热：并发执行模板快速通道能回答的问题（不调用模型），填充汇总表改写、EXPLAIN和查询结果缓存"""
+    nl2sql = get_nl2sql_service()
+    if nl2sql.fast_path is None:
+        return {"queries": 0, "failed": 0}
+    questions = [question for question in questions if nl2sql.fast_path.match(question) is not None]
+    responses = await asyncio.gather(*[
+        _process_query(QueryRequest(question=question), time.time()) for question in questions
+    ])
+    # 成功时返回字典，失败时返回 QueryResponse
+    return {"queries": len(questions), "failed": sum(1 for response in responses if not isinstance(response, dict))}
+
+# /database-info 的响应体，按 (结构快照, 提示词版本) 缓存，快照替换后第一次请求时重新编码
+_database_info_body = (None, None, b"")
+
 @router.get("/database-info")
 async def get_database_info():
     """
-    获取数据库结构信息
+    获取数据库结构信息（来自数据库结构目录的当前快照）
     """
+    global _database_info_body
     try:
-        from app.services.nl2sql_service import get_nl2sql_service
         nl2sql = get_nl2sql_service()
-        
-        return {
-            "tables": nl2sql.table_schema,
-            "field_mapping": nl2sql.field_mapping,
-            "relationships": nl2sql.table_relationships,
-            "enum_values": nl2sql.enum_values
-        }
+        snapshot = get_schema_catalog().snapshot
+        cached_snapshot, cached_version, body = _database_info_body
+        if cached_snapshot is not snapshot or cached_version != nl2sql.prompt_version:
+            info = snapshot.database_info()
+            info["prompt_version"] = nl2sql.prompt_version
+            body = dumps(info)
+            _database_info_body = (snapshot, nl2sql.prompt_version, body)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取数据库信息失败: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"获取数据库信息失败: {str(e)}") 
@@ -0,0 +1,179 @@
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.cache import TTLCache
+from app.utils.result_cache import normalize_sql
+from app.utils.sql_parser import parse_sql
+from config import (
+    COST_GUARD_ENABLED, COST_MAX_ESTIMATED_ROWS, COST_DOWNGRADE_ROWS, COST_MAX_FULL_SCAN_JOINS,
+    COST_FULL_SCAN_MIN_ROWS, QUERY_TIMEOUT_MS, DOWNGRADED_QUERY_TIMEOUT_MS,
+    EXPLAIN_CACHE_MAX_SIZE, EXPLAIN_CACHE_TTL
+)
+
+# 客户端超时比MySQL的执行超时多等一段时间，正常情况下由MySQL先中止语句
+CLIENT_TIMEOUT_GRACE_SECONDS = 1.0
+
+# 顶层（括号之外）的第一个SELECT：普通查询的开头，或 WITH ... 之后的主查询
+_TOP_LEVEL_SELECT = re.compile(r"\bSELECT\b")
+
+
+@dataclass(frozen=True)
+class CostVerdict:
+    """代价检查结果
+
+    allowed 为False时 reason 为结构化的拒绝原因；
+    downgraded 表示估算代价较高，使用更短的执行超时
+    """
+    allowed: bool
+    timeout_ms: int
+    estimated_rows: int = 0
+    full_scan_tables: Tuple[str, ...] = ()
+    downgraded: bool = False
+    reason: Optional[Dict[str, Any]] = field(default=None)
+
+    @property
+    def client_timeout(self):
+        """客户端等待查询结果的最长时间（秒）"""
+        return self.timeout_ms / 1000 + CLIENT_TIMEOUT_GRACE_SECONDS
+
+
+def estimate_cost(explain_rows, full_scan_min_rows=COST_FULL_SCAN_MIN_ROWS):
+    """根据 EXPLAIN 输出估算扫描行数和全表扫描的JOIN
+
+    同一 id 的各表是嵌套循环JOIN，每张表的扫描行数为前面各表输出行数（rows × filtered）的乘积 × 本表 rows；
+    不同 id（子查询、UNION）的估算相加。
+    JOIN中 type=ALL 且行数较多的表（包括hash join）计为全表扫描JOIN
+    """
+    groups = OrderedDict()
+    for row in explain_rows:
+        groups.setdefault(row.get('id'), []).append(row)
+
+    estimated_rows = 0
+    full_scan_tables = []
+    for rows in groups.values():
+        examined, fan_out = 0.0, 1.0
+        for index, row in enumerate(rows):
+            table_rows = max(int(row.get('rows') or 1), 1)
+            examined += fan_out * table_rows
+            fan_out *= table_rows * float(row.get('filtered') or 100) / 100
+            if index > 0 and row.get('type') == 'ALL' and table_rows >= full_scan_min_rows:
+                full_scan_tables.append(row.get('table'))
+        estimated_rows += int(examined)
+    return estimated_rows, tuple(full_scan_tables)
+
+def with_max_execution_time(sql, timeout_ms):
+    """给主查询的SELECT加上 MAX_EXECUTION_TIME 优化器提示，超时后由MySQL中止语句
+
+    MySQL只接受顶层SELECT上的该提示：WITH ... SELECT 加在WITH子句之后的主查询上，
+    CTE和子查询内部的SELECT不加；没有顶层SELECT（如括号包围的UNION）时原样返回
+    """
+    match = _TOP_LEVEL_SELECT.search(parse_sql(sql).masked)
+    if match is None:
+        return sql
+    return f"{sql[:match.start()]}SELECT /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{sql[match.end():]}"
+
+
+class CostGuard:
+    """执行前的代价检查：EXPLAIN 估算超过预算的查询被拒绝或降级"""
+
+    def __init__(self, enabled=COST_GUARD_ENABLED, max_rows=COST_MAX_ESTIMATED_ROWS,
+                 downgrade_rows=COST_DOWNGRADE_ROWS, max_full_scan_joins=COST_MAX_FULL_SCAN_JOINS,
+                 full_scan_min_rows=COST_FULL_SCAN_MIN_ROWS, timeout_ms=QUERY_TIMEOUT_MS,
+                 downgraded_timeout_ms=DOWNGRADED_QUERY_TIMEOUT_MS):
+        self.enabled = enabled
+        self.max_rows = max_rows
+        self.downgrade_rows = downgrade_rows
+        self.max_full_scan_joins = max_full_scan_joins
+        self.full_scan_min_rows = full_scan_min_rows
+        self.timeout_ms = timeout_ms
+        self.downgraded_timeout_ms = downgraded_timeout_ms
+        # 相同的SQL（归一化后）只EXPLAIN一次
+        self.explain_cache = TTLCache(max_size=EXPLAIN_CACHE_MAX_SIZE, ttl=EXPLAIN_CACHE_TTL)
+        self.checked = 0
+        self.rejected = 0
+        self.downgraded = 0
+        self.explain_failures = 0
+
+    def judge(self, explain_rows):
+        """根据 EXPLAIN 输出给出检查结果"""
+        estimated_rows, full_scan_tables = estimate_cost(explain_rows, self.full_scan_min_rows)
+        if estimated_rows > self.max_rows:
+            return CostVerdict(False, self.timeout_ms, estimated_rows, full_scan_tables, reason={
+                "code": "estimated_rows_exceeded",
+                "message": f"预计扫描{estimated_rows}行，超过上限{self.max_rows}行",
+                "estimated_rows": estimated_rows,
+                "limit": self.max_rows,
+                "full_scan_tables": list(full_scan_tables)
+            })
+        if len(full_scan_tables) > self.max_full_scan_joins:
+            return CostVerdict(False, self.timeout_ms, estimated_rows, full_scan_tables, reason={
+                "code": "full_scan_joins_exceeded",
+                "message": f"{len(full_scan_tables)}个表以全表扫描方式JOIN，超过上限{self.max_full_scan_joins}个",
+                "estimated_rows": estimated_rows,
+                "limit": self.max_full_scan_joins,
+                "full_scan_tables": list(full_scan_tables)
+            })
+        if estimated_rows > self.downgrade_rows:
+            return CostVerdict(True, self.downgraded_timeout_ms, estimated_rows, full_scan_tables, downgraded=True)
+        return CostVerdict(True, self.timeout_ms, estimated_rows, full_scan_tables)
+
+    async def check(self, sql, explain, cache_key=None):
+        """检查SQL的执行代价
+
+        explain 为异步函数，返回 EXPLAIN 的字典行；缓存按归一化后的 cache_key 区分，默认为 sql。
+        cache_key 只能是去掉行数上限、分页条件后的同一条SQL（汇总表改写之后的），不能是改写前的SQL
+        EXPLAIN 失败时放行（执行本身仍受超时保护）
+        """
+        if not self.enabled:
+            return CostVerdict(True, self.timeout_ms)
+        self.checked += 1
+
+        key = normalize_sql(cache_key or sql)
+        explain_rows = self.explain_cache.get(key)
+        if explain_rows is None:
+            try:
+                explain_rows = await explain(sql)
+            except Exception as e:
+                explain_rows = None
+                print(f"[ERROR] EXPLAIN失败: {e}")
+            if explain_rows is None:
+                self.explain_failures += 1
+                return CostVerdict(True, self.timeout_ms)
+            self.explain_cache.set(key, explain_rows)
+
+        verdict = self.judge(explain_rows)
+        if not verdict.allowed:
+            self.rejected += 1
+            print(f"[INFO] 查询被代价检查拒绝: {verdict.reason['message']}")
+        elif verdict.downgraded:
+            self.downgraded += 1
+        return verdict
+
+    def stats(self):
+        """获取代价检查统计"""
+        return {
+            "enabled": self.enabled,
+            "checked": self.checked,
+            "rejected": self.rejected,
+            "downgraded": self.downgraded,
+            "explain_failures": self.explain_failures,
+            "explain_cache": self.explain_cache.stats(),
+            "budgets": {
+                "max_estimated_rows": self.max_rows,
+                "downgrade_rows": self.downgrade_rows,
+                "max_full_scan_joins": self.max_full_scan_joins,
+                "full_scan_min_rows": self.full_scan_min_rows,
+                "timeout_ms": self.timeout_ms,
+                "downgraded_timeout_ms": self.downgraded_timeout_ms
+            }
+        }
+
+
+# 创建全局代价检查实例
+cost_guard = CostGuard()
+
+def get_cost_guard():
+    """获取代价检查实例"""
+    return cost_guard
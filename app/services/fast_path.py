@@ -0,0 +1,224 @@
+import re
+
+from app.utils.text import normalize_question
+
+# 默认的库存不足阈值（与示例查询“查询库存量低于50的商品”一致）
+DEFAULT_LOW_STOCK_THRESHOLD = 50
+
+# 已完成订单才计入销售额
+DELIVERED = "o.order_status = 'Delivered'"
+
+_CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4,
+              '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_CN_UNITS = {'十': 10, '百': 100, '千': 1000, '万': 10000}
+
+# 只匹配非负整数：归一化保留了数字中的小数点和正负号，“低于2.5”、“低于-5”不能完整匹配模板，交给模型处理
+NUMBER = r"[0-9]+|[零〇一二两三四五六七八九十百千万]+"
+
+def parse_number(text):
+    """解析阿拉伯数字或简单的中文数字（如“五十”、“一百二十”）"""
+    if text.isdigit():
+        return int(text)
+    total, section, digit = 0, 0, 0
+    for ch in text:
+        if ch in _CN_DIGITS:
+            digit = _CN_DIGITS[ch]
+        elif ch in _CN_UNITS:
+            unit = _CN_UNITS[ch]
+            if unit == 10000:
+                total += (section + digit) * unit
+                section = 0
+            else:
+                section += (digit or 1) * unit
+            digit = 0
+        else:
+            return None
+    return total + section + digit
+
+
+# 分组维度：key -> (中文说法, 所需表别名, SQL表达式, 结果列名)
+DIMENSIONS = {
+    'province': (('省份', '省'), 'u', 'u.province', 'province'),
+    'city': (('城市',), 'u', 'u.city', 'city'),
+    'user_level': (('用户等级', '会员等级', '等级'), 'u', 'u.user_level', 'user_level'),
+    'gender': (('性别',), 'u', 'u.gender', 'gender'),
+    'payment_method': (('支付方式', '付款方式'), 'o', 'o.payment_method', 'payment_method'),
+    'order_status': (('订单状态', '状态'), 'o', 'o.order_status', 'order_status'),
+    'month': (('月份', '每月', '月'), 'o', "DATE_FORMAT(o.order_date, '%Y-%m')", 'month'),
+    'day': (('日期', '每天', '天', '日'), 'o', 'DATE(o.order_date)', 'order_day'),
+    'brand': (('品牌',), 'p', 'p.brand', 'brand'),
+    'category': (('商品分类', '分类', '类别', '品类'), 'c', 'c.category_name', 'category_name'),
+}
+
+# 时间维度按时间排序，其余按指标降序
+TIME_DIMENSIONS = ('month', 'day')
+
+_ORDERS_USERS = "orders o JOIN users u ON o.user_id = u.user_id"
+_ITEMS_PRODUCTS = "order_items oi JOIN products p ON oi.product_id = p.product_id"
+_ITEMS_CATEGORIES = _ITEMS_PRODUCTS + " JOIN categories c ON p.category_id = c.category_id"
+_ITEMS_ORDERS = "order_items oi JOIN orders o ON oi.order_id = o.order_id"
+
+# 统计指标：key -> (中文说法, 结果列名, {维度所需表别名: (FROM子句, 聚合表达式, WHERE条件)})
+MEASURES = {
+    'user_count': (('用户数量', '用户数', '人数', '用户'), 'user_count', {
+        'u': ("users u", "COUNT(*)", None),
+    }),
+    'order_count': (('订单数量', '订单数', '订单量', '订单'), 'order_count', {
+        'o': ("orders o", "COUNT(*)", None),
+        'u': (_ORDERS_USERS, "COUNT(*)", None),
+    }),
+    'sales': (('销售金额', '销售总额', '销售额', '营收', '收入', '销售'), 'total_sales', {
+        'o': ("orders o", "SUM(o.final_amount)", DELIVERED),
+        'u': (_ORDERS_USERS, "SUM(o.final_amount)", DELIVERED),
+        'p': (_ITEMS_PRODUCTS + " JOIN orders o ON oi.order_id = o.order_id", "SUM(oi.total_price)", DELIVERED),
+        'c': (_ITEMS_CATEGORIES + " JOIN orders o ON oi.order_id = o.order_id", "SUM(oi.total_price)", DELIVERED),
+    }),
+    'avg_order_amount': (('平均订单金额', '客单价'), 'avg_order_amount', {
+        'o': ("orders o", "AVG(o.final_amount)", None),
+        'u': (_ORDERS_USERS, "AVG(o.final_amount)", None),
+    }),
+    'product_count': (('商品数量', '商品数', '商品'), 'product_count', {
+        'p': ("products p", "COUNT(*)", None),
+        'c': ("products p JOIN categories c ON p.category_id = c.category_id", "COUNT(*)", None),
+    }),
+    'quantity': (('销量', '销售数量'), 'total_quantity', {
+        'p': (_ITEMS_PRODUCTS, "SUM(oi.quantity)", None),
+        'c': (_ITEMS_CATEGORIES, "SUM(oi.quantity)", None),
+        'o': (_ITEMS_ORDERS, "SUM(oi.quantity)", None),
+    }),
+}
+
+def _alternation(synonyms):
+    """按长度降序拼接正则分支，保证优先匹配最长的说法"""
+    words = sorted({w for names in synonyms for w in names}, key=len, reverse=True)
+    return "|".join(re.escape(w) for w in words)
+
+_DIMENSION_WORDS = {w: key for key, (names, *_rest) in DIMENSIONS.items() for w in names}
+_MEASURE_WORDS = {w: key for key, (names, *_rest) in MEASURES.items() for w in names}
+_DIM = _alternation([names for names, *_rest in DIMENSIONS.values()])
+_MEASURE = _alternation([names for names, *_rest in MEASURES.values()])
+
+
+def _total_sales(match):
+    return "SELECT SUM(final_amount) AS total_sales FROM orders WHERE order_status = 'Delivered';"
+
+def _all_users(match):
+    return "SELECT * FROM users;"
+
+def _most_popular_products(match):
+    return (
+        "SELECT p.product_id, p.product_name, p.brand, SUM(oi.quantity) AS total_quantity "
+        "FROM order_items oi JOIN products p ON oi.product_id = p.product_id "
+        "GROUP BY p.product_id, p.product_name, p.brand "
+        "ORDER BY total_quantity DESC LIMIT 10;"
+    )
+
+def _low_stock(match):
+    threshold = DEFAULT_LOW_STOCK_THRESHOLD
+    if match.groupdict().get('n'):
+        threshold = parse_number(match.group('n'))
+        if threshold is None:
+            return None
+    return (
+        "SELECT product_id, product_name, brand, stock_quantity FROM products "
+        f"WHERE stock_quantity < {threshold} ORDER BY stock_quantity;"
+    )
+
+def _monthly_sales(match):
+    return (
+        "SELECT DATE_FORMAT(o.order_date, '%Y-%m') AS month, SUM(o.final_amount) AS total_sales, "
+        "COUNT(*) AS order_count FROM orders o WHERE o.order_status = 'Delivered' "
+        "GROUP BY month ORDER BY month;"
+    )
+
+def _group_by(match):
+    """按X统计Y"""
+    dim_key = _DIMENSION_WORDS[match.group('dim')]
+    _names, table, dim_expr, dim_alias = DIMENSIONS[dim_key]
+    _names, measure_alias, sources = MEASURES[_MEASURE_WORDS[match.group('measure')]]
+    if table not in sources:
+        # 维度和指标组合不明确（如按品牌统计用户数），交给模型处理
+        return None
+    from_clause, measure_expr, where = sources[table]
+    sql = f"SELECT {dim_expr} AS {dim_alias}, {measure_expr} AS {measure_alias} FROM {from_clause}"
+    if where:
+        sql += f" WHERE {where}"
+    sql += f" GROUP BY {dim_alias}"
+    if dim_key in TIME_DIMENSIONS:
+        sql += f" ORDER BY {dim_alias};"
+    else:
+        sql += f" ORDER BY {measure_alias} DESC;"
+    return sql
+
+
+class QueryTemplate:
+    """问题模板：正则完整匹配归一化后的问题，生成参数化SQL"""
+
+    def __init__(self, name, patterns, builder):
+        self.name = name
+        self.patterns = [re.compile(p) for p in patterns]
+        self.builder = builder
+
+    def match(self, text):
+        for pattern in self.patterns:
+            match = pattern.fullmatch(text)
+            if match:
+                sql = self.builder(match)
+                if sql:
+                    return sql
+        return None
+
+
+TEMPLATES = [
+    QueryTemplate('total_sales', [
+        r"(总|全部|所有)?的?销售(总)?(额|金额)(总计|合计)?(是多少|有多少|多少)?",
+        r"(一共|总共)?卖了多少钱",
+    ], _total_sales),
+    QueryTemplate('all_users', [
+        r"(查询|列出|显示|查看)?(所有|全部)的?用户的?(信息|列表|资料|数据)?",
+    ], _all_users),
+    QueryTemplate('most_popular_products', [
+        r"(哪个|哪些|什么)(商品|产品)最(受欢迎|畅销|好卖)",
+        r"最(受欢迎|畅销|好卖)的(商品|产品)(是什么|是哪个|有哪些|是哪些)?",
+        r"(商品|产品)销量(排行|排名)(榜)?",
+    ], _most_popular_products),
+    QueryTemplate('low_stock_products', [
+        r"库存(不足|紧张|较少|很少)的?(商品|产品)(有哪些)?",
+        rf"库存(低于|少于|小于|不足)(?P<n>{NUMBER})(件|个)?的?(商品|产品)(有哪些)?",
+    ], _low_stock),
+    QueryTemplate('monthly_sales_trend', [
+        r"(月度|每月|按月|各月|每个月)的?销售(额|金额)?(趋势|统计|情况|变化)?",
+    ], _monthly_sales),
+    QueryTemplate('group_by', [
+        rf"按(?P<dim>{_DIM})(分组)?统计的?(?P<measure>{_MEASURE})(分布)?",
+        rf"(各个|各|每个|每|不同)(?P<dim>{_DIM})的?(?P<measure>{_MEASURE})(分布|统计|是多少|有多少)?",
+        rf"(?P<measure>{_MEASURE})按(?P<dim>{_DIM})(分布|统计)",
+    ], _group_by),
+]
+
+
+class FastPathMatcher:
+    """确定性的意图匹配器：常见问题直接生成SQL，不调用模型
+
+    只有整个问题与模板完整匹配、且参数都能准确表达时才命中，其余情况一律交给模型
+    """
+
+    def __init__(self, templates=None):
+        self.templates = templates if templates is not None else TEMPLATES
+        self.hits = 0
+        self.misses = 0
+
+    def match(self, question):
+        """匹配问题，返回 {"template", "sql"}，没有把握时返回None"""
+        text = normalize_question(question)
+        for template in self.templates:
+            sql = template.match(text)
+            if sql:
+                self.hits += 1
+                return {"template": template.name, "sql": sql}
+        self.misses += 1
+        return None
+
+    def stats(self):
+        """获取匹配统计"""
+        return {"hits": self.hits, "misses": self.misses, "templates": [t.name for t in self.templates]}
@@ -0,0 +1,322 @@
+import sys
+import argparse
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import mysql.connector
+from mysql.connector import Error
+
+from config import DATABASE_CONFIG, INDEX_ADVISOR_DATABASE, QUERY_LOG_PATH
+from database.config import get_table_schema
+from app.services.cost_guard import estimate_cost
+from app.services.query_log import QueryLog, get_query_log
+from app.utils.database import get_db
+from app.utils.pool import PoolTimeoutError
+
+# 复合索引最多的列数
+MAX_INDEX_COLUMNS = 3
+# MySQL标识符的最大长度
+MAX_NAME_LENGTH = 64
+# 验证时在数据库副本上临时创建的索引名前缀
+TEMP_INDEX_PREFIX = "chat2bi_advisor_"
+
+EXISTING_INDEXES_SQL = (
+    "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+    "WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+)
+
+
+@dataclass(frozen=True)
+class IndexCandidate:
+    """候选索引：表和有序的列"""
+    table: str
+    columns: Tuple[str, ...]
+
+    @property
+    def name(self):
+        return f"idx_{self.table}_{'_'.join(self.columns)}"[:MAX_NAME_LENGTH]
+
+    @property
+    def ddl(self):
+        return f"CREATE INDEX {self.name} ON {self.table}({', '.join(self.columns)});"
+
+
+@dataclass
+class IndexSuggestion:
+    """一条索引建议
+
+    estimated_benefit 为日志中可能受益的执行耗时（秒，按索引能用上的条件比例折算）；
+    验证后 validated_benefit 为按EXPLAIN估算扫描行数减少的比例折算的耗时，used 表示优化器是否选用了该索引
+    """
+    candidate: IndexCandidate
+    estimated_benefit: float
+    entries: list = field(default_factory=list)
+    rows_before: Optional[int] = None
+    rows_after: Optional[int] = None
+    used: Optional[bool] = None
+    validated_benefit: Optional[float] = None
+
+    @property
+    def benefit(self):
+        return self.estimated_benefit if self.validated_benefit is None else self.validated_benefit
+
+    def to_dict(self):
+        return {
+            "table": self.candidate.table,
+            "columns": list(self.candidate.columns),
+            "ddl": self.candidate.ddl,
+            "estimated_benefit_ms": round(self.estimated_benefit * 1000, 3),
+            "queries": len(self.entries),
+            "executions": sum(entry.count for entry in self.entries),
+            "examples": [entry.template for entry in self.entries[:3]],
+            "validation": None if self.validated_benefit is None else {
+                "used": self.used,
+                "estimated_rows_before": self.rows_before,
+                "estimated_rows_after": self.rows_after,
+                "benefit_ms": round(self.validated_benefit * 1000, 3)
+            }
+        }
+
+
+def _table_columns(shape, table, primary_key=None):
+    """该表的等值列（含连接列，按名称排序）、范围列、分组列、排序列
+
+    主键上的等值和连接条件已经可以走主键，不计入
+    """
+    equality = {column for t, column in shape.equality if t == table}
+    equality.update(column for pair in shape.joins for t, column in pair if t == table)
+    equality.discard(primary_key)
+    ranges = [column for t, column in shape.ranges if t == table and column not in equality]
+    group = [column for t, column in shape.group_by if t == table]
+    order = [column for t, column in shape.order_by if t == table]
+    return sorted(equality), ranges, group, order
+
+def coverage(candidate, shape, primary_key=None):
+    """按最左前缀规则，索引能用上的条件占查询在该表上可走索引条件的比例
+
+    等值列可以连续使用；第一个范围列之后的列不再用于过滤；
+    等值列之后紧接完整的分组列（或排序列）时，分组（排序）也能利用索引的顺序
+    """
+    equality, ranges, group, order = _table_columns(shape, candidate.table, primary_key)
+    total = len(equality) + len(ranges) + bool(group) + bool(order)
+    if not total:
+        return 0.0
+    covered = 0
+    columns = list(candidate.columns)
+    for index, column in enumerate(columns):
+        if column in equality:
+            covered += 1
+            continue
+        if column in ranges:
+            covered += 1
+            break
+        rest = columns[index:]
+        covered += bool(group) and rest[:len(group)] == group
+        covered += bool(order) and rest[:len(order)] == order
+        break
+    return covered / total
+
+
+class IndexAdvisor:
+    """根据查询日志生成候选索引，按估算收益排序，可在数据库副本上用EXPLAIN验证"""
+
+    def __init__(self, schema=None, max_columns=MAX_INDEX_COLUMNS):
+        self.schema = schema or get_table_schema()
+        self.max_columns = max_columns
+
+    def candidates(self, shape):
+        """一条查询的候选索引：单列索引，以及 等值列 + 范围列/连接列/分组列/排序列 的复合索引"""
+        result = set()
+        for table in shape.tables:
+            primary_key = self.schema[table]["primary_key"]
+            equality, ranges, group, order = _table_columns(shape, table, primary_key)
+            options = [[column] for column in equality + ranges]
+            options += [equality + [column] for column in ranges]
+            options += [columns for columns in (group, order, equality + group, equality + order) if columns]
+            for option in options:
+                columns = tuple(dict.fromkeys(option))[:self.max_columns]
+                if columns and columns[0] != primary_key:
+                    result.add(IndexCandidate(table, columns))
+        return result
+
+    @staticmethod
+    def covered_by(candidate, existing):
+        """已有索引以候选索引的列为前缀时，候选索引没有意义"""
+        width = len(candidate.columns)
+        return any(tuple(columns[:width]) == candidate.columns for columns in existing.get(candidate.table, ()))
+
+    def advise(self, entries, existing=None, limit=10):
+        """为查询日志条目生成索引建议
+
+        existing 为 表 -> [已有索引的列]；一个候选索引是已选的更长索引的前缀时不再单独建议
+        """
+        existing = existing or {}
+        scored = {}
+        for entry in entries:
+            if entry.shape is None:
+                continue
+            for candidate in self.candidates(entry.shape):
+                if self.covered_by(candidate, existing):
+                    continue
+                fraction = coverage(candidate, entry.shape, self.schema[candidate.table]["primary_key"])
+                if fraction <= 0:
+                    continue
+                suggestion = scored.setdefault(candidate, IndexSuggestion(candidate, 0.0))
+                suggestion.estimated_benefit += entry.total_seconds * fraction
+                suggestion.entries.append(entry)
+
+        ranked = sorted(scored.values(), key=lambda s: (-s.estimated_benefit, len(s.candidate.columns),
+                                                        s.candidate.name))
+        chosen = []
+        for suggestion in ranked:
+            candidate = suggestion.candidate
+            if any(other.candidate.table == candidate.table and
+                   other.candidate.columns[:len(candidate.columns)] == candidate.columns for other in chosen):
+                continue
+            suggestion.entries.sort(key=lambda entry: entry.total_seconds, reverse=True)
+            chosen.append(suggestion)
+            if len(chosen) >= limit:
+                break
+        return chosen
+
+    def validate(self, suggestions, cursor):
+        """在数据库副本上逐个临时创建候选索引，比较创建前后EXPLAIN估算的扫描行数
+
+        cursor 为副本上的字典游标。验证后的收益 = Σ 日志中的耗时 × 估算扫描行数减少的比例，
+        优化器没有选用的索引收益为0；返回按验证后收益重新排序的建议
+        """
+        before = {}
+        for suggestion in suggestions:
+            for entry in suggestion.entries:
+                if entry.sql not in before:
+                    before[entry.sql] = _explain(cursor, entry.sql)
+
+        for index, suggestion in enumerate(suggestions):
+            candidate = suggestion.candidate
+            temp_name = f"{TEMP_INDEX_PREFIX}{index}"
+            cursor.execute(f"CREATE INDEX {temp_name} ON {candidate.table}({', '.join(candidate.columns)})")
+            try:
+                rows_before = rows_after = 0
+                benefit = 0.0
+                used = False
+                for entry in suggestion.entries:
+                    old, new = before[entry.sql], _explain(cursor, entry.sql)
+                    if old is None or new is None:
+                        continue
+                    rows_before += old[0]
+                    rows_after += new[0]
+                    if temp_name in new[1]:
+                        used = True
+                        benefit += entry.total_seconds * max(0.0, 1 - new[0] / max(old[0], 1))
+            finally:
+                cursor.execute(f"DROP INDEX {temp_name} ON {candidate.table}")
+            suggestion.rows_before = rows_before
+            suggestion.rows_after = rows_after
+            suggestion.used = used
+            suggestion.validated_benefit = benefit
+        return sorted(suggestions, key=lambda s: s.benefit, reverse=True)
+
+
+def _explain(cursor, sql):
+    """(估算扫描行数, 使用的索引名集合)；EXPLAIN失败（如副本中没有汇总表）时返回None"""
+    try:
+        cursor.execute(f"EXPLAIN {sql}")
+        rows = cursor.fetchall()
+    except Error as e:
+        print(f"[ERROR] EXPLAIN失败: {e}")
+        return None
+    return estimate_cost(rows)[0], {row.get("key") for row in rows}
+
+def fetch_existing_indexes(cursor):
+    """当前库的索引：表 -> [列元组]（包括主键和外键自动创建的索引）"""
+    cursor.execute(EXISTING_INDEXES_SQL)
+    indexes = {}
+    for table, name, column in cursor.fetchall():
+        indexes.setdefault(table.lower(), {}).setdefault(name, []).append(column.lower())
+    return {table: [tuple(columns) for columns in by_name.values()] for table, by_name in indexes.items()}
+
+def recommend(log=None, limit=10, validate=False, advisor_database=INDEX_ADVISOR_DATABASE):
+    """根据查询日志给出索引建议
+
+    已有索引从业务库读取；validate 为True时在 advisor_database（业务库的副本）上创建临时索引做EXPLAIN验证，
+    不会在业务库上执行任何DDL。返回 {"success", "error", "suggestions", "ddl"}
+    """
+    log = log or get_query_log()
+    if validate and not advisor_database:
+        return {"success": False, "error": "未配置用于验证的数据库副本（INDEX_ADVISOR_DATABASE）"}
+    if validate and advisor_database == DATABASE_CONFIG["database"]:
+        return {"success": False, "error": "INDEX_ADVISOR_DATABASE 不能是业务库本身"}
+
+    try:
+        with get_db().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                existing = fetch_existing_indexes(cursor)
+            finally:
+                cursor.close()
+    except (Error, PoolTimeoutError) as e:
+        print(f"[ERROR] 读取已有索引失败: {e}")
+        return {"success": False, "error": f"读取已有索引失败: {str(e)}"}
+
+    advisor = IndexAdvisor()
+    suggestions = advisor.advise(log.entries(), existing, limit)
+
+    if validate and suggestions:
+        try:
+            conn = mysql.connector.connect(**{**DATABASE_CONFIG, "database": advisor_database})
+            try:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    suggestions = advisor.validate(suggestions, cursor)
+                finally:
+                    cursor.close()
+            finally:
+                conn.close()
+        except Error as e:
+            print(f"[ERROR] 在数据库副本上验证索引失败: {e}")
+            return {"success": False, "error": f"在数据库副本上验证索引失败: {str(e)}"}
+
+    return {
+        "success": True,
+        "error": None,
+        "validated": bool(validate),
+        "suggestions": [suggestion.to_dict() for suggestion in suggestions],
+        "ddl": "\n".join(suggestion.candidate.ddl for suggestion in suggestions
+                         if suggestion.used is not False)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="根据查询日志给出索引建议")
+    parser.add_argument("--log", default=QUERY_LOG_PATH, help="查询日志JSONL文件（默认 QUERY_LOG_PATH）")
+    parser.add_argument("--limit", type=int, default=10, help="最多给出的建议数")
+    parser.add_argument("--validate", action="store_true",
+                        help="在 INDEX_ADVISOR_DATABASE 副本上创建临时索引，用EXPLAIN验证收益")
+    args = parser.parse_args(argv)
+    if not args.log:
+        print("[ERROR] 请通过 --log 或 QUERY_LOG_PATH 指定查询日志文件")
+        return 1
+
+    log = QueryLog.load(args.log)
+    print(f"[INFO] 读取查询日志: {log.stats()['recorded']} 次执行，{log.stats()['entries']} 个SQL模板")
+    result = recommend(log, args.limit, args.validate)
+    if not result["success"]:
+        print(f"[ERROR] {result['error']}")
+        return 1
+    for rank, suggestion in enumerate(result["suggestions"], 1):
+        validation = suggestion["validation"]
+        detail = "" if validation is None else (
+            f"，验证收益 {validation['benefit_ms']}ms，估算扫描行数 "
+            f"{validation['estimated_rows_before']} -> {validation['estimated_rows_after']}"
+            f"{'' if validation['used'] else '（优化器未使用）'}"
+        )
+        print(f"{rank}. {suggestion['ddl']}  估算收益 {suggestion['estimated_benefit_ms']}ms，"
+              f"{suggestion['queries']} 个SQL模板 / {suggestion['executions']} 次执行{detail}")
+    if result["ddl"]:
+        print("\n" + result["ddl"])
+    else:
+        print("[INFO] 没有需要新增的索引")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
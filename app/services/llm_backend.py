@@ -0,0 +1,206 @@
+import json
+import time
+import random
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from groq import Groq, AsyncGroq
+
+from config import (
+    LLM_BACKEND, GROQ_API_KEY, GROQ_MODEL, LLM_MAX_TOKENS, LLM_TOP_P,
+    LLM_STUB_FIXTURES, LLM_STUB_LATENCY_MS, LLM_STUB_LATENCY_JITTER_MS, LLM_STUB_ERROR_RATE, LLM_STUB_SEED
+)
+from app.utils.text import normalize_question
+from app.services.prompt_template import extract_question
+from app.utils.metrics import LLM_PROMPT_TOKENS
+
+# 本地桩后端的内置问题 -> SQL（未配置 LLM_STUB_FIXTURES 时使用）
+DEFAULT_STUB_FIXTURES = {
+    "有多少用户？": "SELECT COUNT(*) AS user_count FROM users;",
+    "今年的销售情况如何？": "SELECT SUM(final_amount) AS total_sales, COUNT(*) AS order_count FROM orders "
+                        "WHERE YEAR(order_date) = YEAR(CURDATE());",
+    "用户等级分布情况？": "SELECT user_level, COUNT(*) AS user_count FROM users GROUP BY user_level;",
+    "最受欢迎的产品是什么？": "SELECT p.product_name, SUM(oi.quantity) AS total_quantity FROM order_items oi "
+                          "JOIN products p ON oi.product_id = p.product_id GROUP BY p.product_id, p.product_name "
+                          "ORDER BY total_quantity DESC LIMIT 10;",
+    "各城市的用户数量": "SELECT city, COUNT(*) AS user_count FROM users GROUP BY city ORDER BY user_count DESC;",
+    "每个支付方式的订单金额": "SELECT payment_method, SUM(final_amount) AS total_amount FROM orders "
+                          "GROUP BY payment_method;",
+}
+# 没有匹配的问题时返回的SQL
+DEFAULT_STUB_SQL = "SELECT * FROM orders LIMIT 10;"
+
+
+class LLMBackendError(Exception):
+    """模型后端调用失败"""
+    pass
+
+
+class LLMBackend(ABC):
+    """模型后端接口：输入完整提示词，返回模型输出的文本
+
+    子类必须实现 complete / acomplete（同步和异步调用）；astream 逐段返回输出，默认一次返回全部
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def complete(self, prompt, temperature=0.1):
+        """同步调用，返回模型输出的文本"""
+
+    @abstractmethod
+    async def acomplete(self, prompt, temperature=0.1):
+        """异步调用，返回模型输出的文本"""
+
+    async def astream(self, prompt, temperature=0.1):
+        yield await self.acomplete(prompt, temperature)
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class GroqBackend(LLMBackend):
+    """Groq API（同步客户端供脚本使用，异步客户端供API使用）"""
+
+    name = "groq"
+
+    def __init__(self, api_key=GROQ_API_KEY, model=GROQ_MODEL, max_tokens=LLM_MAX_TOKENS, top_p=LLM_TOP_P):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.top_p = top_p
+        self.client = Groq(api_key=api_key)
+        self.async_client = AsyncGroq(api_key=api_key)
+
+    def _params(self, prompt, temperature):
+        """构建Groq API调用参数"""
+        return {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt,
+                }
+            ],
+            "model": self.model,
+            "temperature": temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+        }
+
+    def _content(self, chat_completion):
+        usage = getattr(chat_completion, "usage", None)
+        if usage is not None and usage.prompt_tokens is not None:
+            LLM_PROMPT_TOKENS.observe(usage.prompt_tokens, backend=self.name)
+        return chat_completion.choices[0].message.content
+
+    def complete(self, prompt, temperature=0.1):
+        chat_completion = self.client.chat.completions.create(**self._params(prompt, temperature))
+        return self._content(chat_completion)
+
+    async def acomplete(self, prompt, temperature=0.1):
+        chat_completion = await self.async_client.chat.completions.create(**self._params(prompt, temperature))
+        return self._content(chat_completion)
+
+    async def astream(self, prompt, temperature=0.1):
+        stream = await self.async_client.chat.completions.create(**self._params(prompt, temperature), stream=True)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def stats(self):
+        return {"backend": self.name, "model": self.model}
+
+
+class StubBackend(LLMBackend):
+    """不访问网络的本地桩后端，用于离线压测
+
+    按用户问题（归一化后）从 fixtures 中取SQL，没有匹配时返回 default_sql；
+    每次调用按 latency_ms ± jitter_ms 等待，并按 error_rate 的概率抛出 LLMBackendError
+    """
+
+    name = "stub"
+
+    def __init__(self, fixtures=None, default_sql=DEFAULT_STUB_SQL, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, seed=None):
+        fixtures = DEFAULT_STUB_FIXTURES if fixtures is None else fixtures
+        self.fixtures = {normalize_question(question): sql for question, sql in fixtures.items()}
+        self.default_sql = default_sql
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.misses = 0
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """从JSON文件 {"问题": "SQL", ...} 加载"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def _plan(self, prompt):
+        """决定本次调用的延迟（秒）、是否失败和返回的SQL"""
+        # 没有真实的分词器，按约4个字符1个token估算提示词长度
+        LLM_PROMPT_TOKENS.observe(len(prompt) // 4, backend=self.name)
+        with self.lock:
+            self.calls += 1
+            delay = max(self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            sql = self.fixtures.get(normalize_question(extract_question(prompt)))
+            if sql is None:
+                self.misses += 1
+                sql = self.default_sql
+        return delay, failed, sql
+
+    def complete(self, prompt, temperature=0.1):
+        delay, failed, sql = self._plan(prompt)
+        time.sleep(delay)
+        if failed:
+            raise LLMBackendError("模拟的模型调用失败")
+        return sql
+
+    async def acomplete(self, prompt, temperature=0.1):
+        delay, failed, sql = self._plan(prompt)
+        await asyncio.sleep(delay)
+        if failed:
+            raise LLMBackendError("模拟的模型调用失败")
+        return sql
+
+    async def astream(self, prompt, temperature=0.1):
+        delay, failed, sql = self._plan(prompt)
+        words = sql.split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(delay / len(words))
+            if failed and index == len(words) // 2:
+                raise LLMBackendError("模拟的模型调用失败")
+            yield word if index == 0 else " " + word
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": self.name,
+                "fixtures": len(self.fixtures),
+                "calls": self.calls,
+                "errors": self.errors,
+                "misses": self.misses,
+                "latency_ms": self.latency_ms,
+                "jitter_ms": self.jitter_ms,
+                "error_rate": self.error_rate
+            }
+
+
+def create_backend(name=LLM_BACKEND):
+    """按配置创建模型后端（groq 或 stub）"""
+    if name == "groq":
+        return GroqBackend()
+    if name == "stub":
+        options = dict(latency_ms=LLM_STUB_LATENCY_MS, jitter_ms=LLM_STUB_LATENCY_JITTER_MS,
+                       error_rate=LLM_STUB_ERROR_RATE, seed=LLM_STUB_SEED)
+        if LLM_STUB_FIXTURES:
+            return StubBackend.from_file(LLM_STUB_FIXTURES, **options)
+        return StubBackend(**options)
+    raise ValueError(f"未知的模型后端: {name}")
@@ -1,134 +1,261 @@
-import os
-from groq import Groq
-import json
-import sys
-from dotenv import load_dotenv
+import time
+from database.config import get_table_aliases
+from config import (
+    NL2SQL_CACHE_MAX_SIZE, NL2SQL_CACHE_TTL, SCHEMA_PRUNING_ENABLED, FAST_PATH_ENABLED,
+    SPECULATIVE_CANDIDATES, SPECULATIVE_TEMPERATURES
+)
+from app.utils.cache import TTLCache
+from app.utils.text import normalize_question
+from app.utils.singleflight import SingleFlight
+from app.utils.sql_parser import parse_sql
+from app.services.prompt_template import compile_prompt_template, build_database_context
+from app.services.schema_catalog import get_schema_catalog
+from app.services.schema_index import SchemaIndex
+from app.services.fast_path import FastPathMatcher
+from app.services.speculative import first_accepted, SpeculationStats
+from app.services.llm_backend import create_backend
+from app.utils.metrics import LLM_SECONDS, LLM_ERRORS
+from app.utils.lazy import Lazy
 
-# 加载.env文件
-load_dotenv()
-
-# 添加database目录到Python路径
-sys.path.append(os.path.join(os.path.dirname(__file__), '../../database'))
-
-# 导入database配置
-import importlib.util
-spec = importlib.util.spec_from_file_location("db_config", os.path.join(os.path.dirname(__file__), '../../database/config.py'))
-db_config = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(db_config)
-
-get_table_schema = db_config.get_table_schema
-get_field_mapping = db_config.get_field_mapping
-get_table_relationships = db_config.get_table_relationships
-get_enum_values = db_config.get_enum_values
+# 生成的SQL中不允许出现的操作（按关键字判断，不会误伤 created_at 这类列名或字符串内容）
+DANGEROUS_KEYWORDS = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE', 'REPLACE',
+                      'RENAME', 'GRANT', 'REVOKE', 'LOAD', 'INTO', 'CALL', 'LOCK', 'HANDLER']
 
 class NL2SQLService:
     def __init__(self):
-        # 初始化Groq客户端
-        self.client = Groq(
-            api_key=os.environ.get("GROQ_API_KEY", "")
-        )
+        # 模型后端（由 LLM_BACKEND 配置选择Groq或本地桩）
+        self.llm = create_backend()
+        
+        # 从数据库结构目录取当前快照并编译提示词模板，结构变化时在后台重新编译
+        self.prompt_template = None
+        self.schema_version = None
+        self.refresh_schema()
+        get_schema_catalog().subscribe(self.refresh_schema)
         
-        # 获取数据库元数据
-        self.table_schema = get_table_schema()
-        self.field_mapping = get_field_mapping()
-        self.table_relationships = get_table_relationships()
-        self.enum_values = get_enum_values()
+        # 问题 -> SQL 缓存，键包含提示词版本，schema或提示词变化后旧条目自然失效
+        self.sql_cache = TTLCache(max_size=NL2SQL_CACHE_MAX_SIZE, ttl=NL2SQL_CACHE_TTL)
+        
+        # 合并相同问题的并发模型调用
+        self.inflight = SingleFlight()
+        
+        # 常见问题的模板快速通道，命中时不调用模型
+        self.fast_path = FastPathMatcher() if FAST_PATH_ENABLED else None
+        
+        # 推测执行：并发生成多个候选SQL，取第一个通过验证的
+        self.speculative_candidates = SPECULATIVE_CANDIDATES
+        self.speculation = SpeculationStats()
+        
+    def refresh_schema(self, snapshot=None):
+        """使用数据库结构快照（默认为结构目录的当前快照），版本有变化时才重新编译提示词模板
+
+        返回模板是否被重新编译
+        """
+        snapshot = snapshot or get_schema_catalog().snapshot
+        if self.prompt_template is not None and self.schema_version == snapshot.version:
+            return False
         
+        # 先编译好新的模板和索引再替换，请求线程不会读到编译了一半的状态
+        prompt_template = compile_prompt_template(
+            snapshot.table_schema, snapshot.field_mapping, snapshot.table_relationships, snapshot.enum_values
+        )
+        # 按问题筛选相关表的索引，以及按表集合缓存的裁剪后模板
+        schema_index = SchemaIndex(
+            snapshot.table_schema, snapshot.field_mapping, snapshot.table_relationships, snapshot.enum_values,
+            get_table_aliases()
+        )
+        
+        self.table_schema = snapshot.table_schema
+        self.field_mapping = snapshot.field_mapping
+        self.table_relationships = snapshot.table_relationships
+        self.enum_values = snapshot.enum_values
+        self.schema_index = schema_index
+        self._pruned_templates = {}
+        self.prompt_template = prompt_template
+        self.schema_snapshot = snapshot
+        self.schema_version = snapshot.version
+        return True
+    
+    @property
+    def prompt_version(self):
+        """当前提示词模板的内容哈希"""
+        return self.prompt_template.version
+    
+    def _cache_key(self, user_question):
+        """生成SQL缓存键"""
+        return f"{self.prompt_version}:{normalize_question(user_question)}"
+    
     def _build_database_context(self):
         """构建数据库上下文信息"""
-        context = """
-### Database Schema Information
-
-This is the complete structure of the e-commerce sales database:
-
-**Table Structures:**
-"""
-        
-        # 添加表结构信息
-        for table_name, table_info in self.table_schema.items():
-            context += f"\n**{table_name} table** ({table_info['description']}):\n"
-            context += f"- Primary key: {table_info['primary_key']}\n"
-            context += "- Columns:\n"
-            for column in table_info['columns']:
-                chinese_name = self.field_mapping.get(column, column)
-                context += f"  - {column} ({chinese_name})\n"
-        
-        # 添加表关系信息
-        context += "\n**Table Relationships:**\n"
-        for table, relations in self.table_relationships.items():
-            for related_table, join_condition in relations.items():
-                context += f"- {table} -> {related_table}: {join_condition}\n"
-        
-        # 添加枚举值信息
-        context += "\n**Enum Values:**\n"
-        for field, values in self.enum_values.items():
-            context += f"- {field}: {', '.join(values)}\n"
-        
-        return context
+        return build_database_context(
+            self.table_schema, self.field_mapping, self.table_relationships, self.enum_values
+        )
     
+    def _select_template(self, user_question):
+        """选择提示词模板：只包含与问题相关的表，识别不出时使用完整schema"""
+        if not SCHEMA_PRUNING_ENABLED:
+            return self.prompt_template
+        
+        tables = self.schema_index.select_tables(user_question)
+        if tables is None or len(tables) == len(self.table_schema):
+            return self.prompt_template
+        
+        # 键包含结构版本：后台替换快照期间编译的旧模板不会被新版本用到
+        snapshot = self.schema_snapshot
+        key = (snapshot.version, tables)
+        template = self._pruned_templates.get(key)
+        if template is None:
+            template = compile_prompt_template(
+                snapshot.table_schema, snapshot.field_mapping, snapshot.table_relationships, snapshot.enum_values,
+                tables
+            )
+            self._pruned_templates[key] = template
+        return template
+    
+    def warm_templates(self, questions):
+        """预先编译这些问题用到的裁剪后模板，返回涉及的模板数"""
+        return len({self._select_template(question).version for question in questions})
+
     def _build_prompt(self, user_question):
         """构建完整的提示词"""
-        database_context = self._build_database_context()
+        return self._select_template(user_question).render(user_question)
+    
+    def cache_stats(self):
+        """获取SQL缓存统计"""
+        stats = self.sql_cache.stats()
+        stats["prompt_version"] = self.prompt_version
+        return stats
+    
+    def clear_cache(self):
+        """清空SQL缓存"""
+        return self.sql_cache.clear()
+    
+    def _complete(self, prompt, temperature=0.1):
+        """调用模型后端，记录延迟和失败次数"""
+        start = time.perf_counter()
+        try:
+            return self.llm.complete(prompt, temperature)
+        except Exception:
+            LLM_ERRORS.inc(backend=self.llm.name)
+            raise
+        finally:
+            LLM_SECONDS.observe(time.perf_counter() - start, backend=self.llm.name)
+    
+    async def _acomplete(self, prompt, temperature=0.1):
+        """_complete 的异步版本（被取消的调用不计入延迟）"""
+        start = time.perf_counter()
+        try:
+            content = await self.llm.acomplete(prompt, temperature)
+        except Exception:
+            LLM_ERRORS.inc(backend=self.llm.name)
+            LLM_SECONDS.observe(time.perf_counter() - start, backend=self.llm.name)
+            raise
+        LLM_SECONDS.observe(time.perf_counter() - start, backend=self.llm.name)
+        return content
+    
+    def _lookup_fast_path(self, user_question):
+        """匹配问题模板，命中时直接返回SQL"""
+        if self.fast_path is None:
+            return None
+        matched = self.fast_path.match(user_question)
+        if matched is None:
+            return None
+        return {
+            "success": True,
+            "sql": matched["sql"],
+            "user_question": user_question,
+            "cached": False,
+            "source": "template",
+            "template": matched["template"]
+        }
+    
+    def _lookup_cache(self, user_question, cache_key):
+        """查询SQL缓存，命中时返回结果字典"""
+        cached_sql = self.sql_cache.get(cache_key)
+        if cached_sql is None:
+            return None
+        return {
+            "success": True,
+            "sql": cached_sql,
+            "user_question": user_question,
+            "cached": True,
+            "source": "cache"
+        }
+    
+    def _extract_sql(self, content):
+        """从模型输出中提取SQL"""
+        # 清理SQL查询（移除代码块标记等）
+        return self._clean_sql(content.strip())
+    
+    def _handle_completion(self, user_question, cache_key, content):
+        """从模型输出中提取SQL并写入缓存"""
+        sql_query = self._extract_sql(content)
         
-        prompt = f"""
-You are a professional SQL query generation expert. Please generate accurate MySQL queries based on user's natural language questions.
-
-{database_context}
-
-### Important Rules:
-1. Return ONLY the SQL query statement, nothing else
-2. Do NOT include any explanations, descriptions, or comments
-3. Use MySQL syntax
-4. Field names and table names must exactly match the database structure
-5. Use appropriate JOINs to connect tables
-6. For time queries, use appropriate DATE functions
-7. For fuzzy queries, use LIKE operator
-8. For statistical queries, use COUNT, SUM, AVG and other aggregate functions
-9. For sorting queries, use ORDER BY
-10. For pagination queries, use LIMIT
-
-### Example:
-Question: How many users are there?
-Answer: SELECT COUNT(*) FROM users;
-
-### User Question:
-{user_question}
-
-### SQL Query (return only the SQL statement):
-"""
-        return prompt
+        # 只缓存通过验证的SQL，避免错误结果被重复返回
+        if self.validate_sql(sql_query)[0]:
+            self.sql_cache.set(cache_key, sql_query)
+        
+        return {
+            "success": True,
+            "sql": sql_query,
+            "user_question": user_question,
+            "cached": False,
+            "source": "llm"
+        }
     
     def generate_sql(self, user_question):
-        """生成SQL查询"""
+        """生成SQL查询（依次尝试模板快速通道、缓存、模型）
+
+        供命令行脚本和测试使用，只调用一次模型：推测执行（SPECULATIVE_CANDIDATES）和
+        相同问题的请求合并只在 agenerate_sql（API使用的路径）中生效
+        """
+        matched = self._lookup_fast_path(user_question)
+        if matched is not None:
+            return matched
+        
+        cache_key = self._cache_key(user_question)
+        cached = self._lookup_cache(user_question, cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            # 构建提示词
+            # 构建提示词并调用模型
             prompt = self._build_prompt(user_question)
+            return self._handle_completion(user_question, cache_key, self._complete(prompt))
             
-            # 调用Groq API
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                model="llama3-8b-8192",  # 使用Llama3-8B模型
-                temperature=0.1,  # 降低随机性，提高准确性
-                max_tokens=500,
-                top_p=0.9,
-            )
-            
-            # 提取生成的SQL
-            sql_query = chat_completion.choices[0].message.content.strip()
-            
-            # 清理SQL查询（移除代码块标记等）
-            sql_query = self._clean_sql(sql_query)
-            
+        except Exception as e:
             return {
-                "success": True,
-                "sql": sql_query,
+                "success": False,
+                "error": str(e),
                 "user_question": user_question
             }
+    
+    async def agenerate_sql(self, user_question):
+        """异步生成SQL查询，等待模型响应时不阻塞事件循环
+
+        相同问题的并发请求合并为一次模型调用
+        """
+        matched = self._lookup_fast_path(user_question)
+        if matched is not None:
+            return matched
+        
+        cache_key = self._cache_key(user_question)
+        cached = self._lookup_cache(user_question, cache_key)
+        if cached is not None:
+            return cached
+        
+        result = await self.inflight.do(cache_key, lambda: self._agenerate_uncached(user_question, cache_key))
+        if result["user_question"] != user_question:
+            result = dict(result, user_question=user_question, coalesced=True)
+        return result
+    
+    async def _agenerate_uncached(self, user_question, cache_key):
+        """调用模型生成SQL"""
+        if self.speculative_candidates > 1:
+            return await self._agenerate_speculative(user_question, cache_key)
+        try:
+            prompt = self._build_prompt(user_question)
+            content = await self._acomplete(prompt)
+            return self._handle_completion(user_question, cache_key, content)
             
         except Exception as e:
             return {
@@ -137,6 +264,62 @@ Answer: SELECT COUNT(*) FROM users;
                 "user_question": user_question
             }
     
+    async def _agenerate_speculative(self, user_question, cache_key):
+        """并发发出多个温度不同的生成请求，返回第一个通过验证的SQL，其余请求取消
+
+        没有候选通过验证时返回首选候选（温度最低）的结果，与单次生成的行为一致
+        """
+        try:
+            prompt = self._build_prompt(user_question)
+        except Exception as e:
+            return {"success": False, "error": str(e), "user_question": user_question}
+        
+        def candidate(temperature):
+            async def create():
+                return self._extract_sql(await self._acomplete(prompt, temperature))
+            return create
+        
+        temperatures = SPECULATIVE_TEMPERATURES or [0.1]
+        factories = [candidate(temperatures[index % len(temperatures)])
+                     for index in range(self.speculative_candidates)]
+        outcome = await first_accepted(factories, lambda sql: self.validate_sql(sql)[0])
+        self.speculation.record(outcome)
+        
+        if outcome.winner is not None:
+            self.sql_cache.set(cache_key, outcome.result)
+            return {
+                "success": True,
+                "sql": outcome.result,
+                "user_question": user_question,
+                "cached": False,
+                "source": "llm",
+                "candidate": outcome.winner
+            }
+        
+        # 全部完成但都未通过验证：优先返回首选候选生成的SQL，交给后续验证报错
+        finished = sorted(outcome.finished.items())
+        for index, (_, _, result) in finished:
+            if not isinstance(result, Exception):
+                return {
+                    "success": True,
+                    "sql": result,
+                    "user_question": user_question,
+                    "cached": False,
+                    "source": "llm",
+                    "candidate": index
+                }
+        return {
+            "success": False,
+            "error": str(finished[0][1][2]) if finished else "没有可用的生成结果",
+            "user_question": user_question
+        }
+    
+    def speculation_stats(self):
+        """获取推测执行统计"""
+        stats = self.speculation.stats()
+        stats["candidates"] = self.speculative_candidates
+        return stats
+    
     def _clean_sql(self, sql_query):
         """清理SQL查询"""
         # 移除代码块标记
@@ -177,36 +360,49 @@ Answer: SELECT COUNT(*) FROM users;
         return sql_query
     
     def validate_sql(self, sql_query):
-        """验证SQL查询的基本语法"""
-        # 基本的SQL关键字检查
-        sql_upper = sql_query.upper()
+        """验证SQL查询：单条SELECT，只引用已知的表和列
+
+        解析结果按SQL文本缓存，后续的缓存、分页等阶段直接复用
+        """
+        parsed = parse_sql(sql_query)
+        if parsed.error:
+            return False, f"SQL syntax error: {parsed.error}"
         
-        # 检查是否包含基本的SELECT语句
-        if not sql_upper.startswith('SELECT'):
+        # 检查是否为单条SELECT语句（允许WITH ... SELECT）
+        if parsed.statement_type != 'SELECT':
             return False, "Query must start with SELECT"
+        if parsed.statement_count > 1:
+            return False, "Only a single statement is allowed"
         
         # 检查是否包含危险操作
-        dangerous_keywords = ['DROP', 'DELETE', 'UPDATE', 'INSERT', 'ALTER', 'CREATE', 'TRUNCATE']
-        for keyword in dangerous_keywords:
-            if keyword in sql_upper:
+        for keyword in DANGEROUS_KEYWORDS:
+            if parsed.has_keyword(keyword):
                 return False, f"Operation {keyword} is not allowed"
         
         # 检查表名是否存在
-        table_names = list(self.table_schema.keys())
-        found_table = False
-        for table_name in table_names:
-            if table_name.upper() in sql_upper:
-                found_table = True
-                break
-        
-        if not found_table:
+        known_tables = {name.lower(): name for name in self.table_schema}
+        if not parsed.tables:
             return False, "No valid table name found in query"
+        for table in parsed.tables:
+            if table.lower() not in known_tables:
+                return False, f"Unknown table: {table}"
+        
+        # 检查 别名.列名 形式的列是否属于对应的表（未限定的列可能是输出别名，不检查）
+        for qualifier, column in parsed.columns:
+            if qualifier is None:
+                continue
+            table = parsed.aliases.get(qualifier.lower())
+            if table is None:
+                continue
+            columns = self.table_schema[known_tables[table.lower()]]['columns']
+            if column.lower() not in (c.lower() for c in columns):
+                return False, f"Unknown column: {qualifier}.{column}"
         
         return True, "SQL query validation passed"
 
-# 创建全局服务实例
-nl2sql_service = NL2SQLService()
+# 全局服务实例（第一次使用时创建模型客户端和提示词模板）
+_nl2sql_service = Lazy(NL2SQLService)
 
 def get_nl2sql_service():
     """获取自然语言转SQL服务实例"""
-    return nl2sql_service 
\ No newline at end of file
+    return _nl2sql_service()
@@ -0,0 +1,295 @@
+import re
+import hmac
+import json
+import base64
+import hashlib
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.utils.serializer import QueryResult
+from app.utils.sql_parser import parse_sql
+
+# 出现这些顶层子句时结果行数由查询本身决定（或每行不对应主表的一行），不能按主键续读
+_NOT_KEYSET = re.compile(
+    r"\b(GROUP\s+BY|HAVING|DISTINCT|UNION|LIMIT|OFFSET|INTO|FOR\s+UPDATE|WINDOW|OVER)\b"
+)
+_ORDER_BY = re.compile(r"\bORDER\s+BY\b")
+# ORDER BY 中的一项：可带表别名的列名和排序方向（表达式、函数、序号不能续读）
+_ORDER_ITEM = re.compile(r"\s*(?:`?(\w+)`?\s*\.\s*)?`?([A-Z_]\w*)`?(?:\s+(ASC|DESC))?\s*\Z")
+_AGGREGATE = re.compile(
+    r"\b(COUNT|SUM|AVG|MIN|MAX|GROUP_CONCAT|STD|STDDEV|STDDEV_POP|STDDEV_SAMP|VARIANCE|VAR_POP|VAR_SAMP|"
+    r"BIT_AND|BIT_OR|BIT_XOR|JSON_ARRAYAGG|JSON_OBJECTAGG)\s*\("
+)
+_IDENT = r"`?(\w+)`?"
+_MAIN_TABLE = re.compile(
+    rf"^\s*{_IDENT}(?:\s+(?:AS\s+)?(?!(?:INNER|LEFT|RIGHT|CROSS|NATURAL|FULL|JOIN|WHERE|STRAIGHT_JOIN)\b){_IDENT})?"
+)
+_JOIN = re.compile(
+    rf"\b(INNER\s+JOIN|LEFT\s+(?:OUTER\s+)?JOIN|JOIN)\s+{_IDENT}"
+    rf"(?:\s+(?:AS\s+)?(?!ON\b){_IDENT})?\s+ON\b"
+)
+_ANY_JOIN = re.compile(r"\bJOIN\b")
+_OTHER_JOIN = re.compile(r"\b(RIGHT|CROSS|NATURAL|FULL|STRAIGHT_JOIN|USING)\b")
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)(?:\s*,\s*(\d+)|\s+OFFSET\s+(\d+))?\s*$")
+
+
+class InvalidCursor(ValueError):
+    """分页游标无效（被篡改或由其他密钥签发）"""
+
+
+@dataclass(frozen=True)
+class PagePlan:
+    """一次分页查询的执行计划"""
+    source_sql: str             # 生成的原始SQL（游标中保存的就是它）
+    sql: str                    # 实际执行的SQL（多取一行用于判断是否还有下一页）
+    limit: int                  # 每页行数
+    key_column: Optional[str]   # 按主键续读时，结果中的主键列名
+    capped: bool                # 是否由服务端限制了行数
+    sort_columns: Tuple[str, ...] = ()  # 带ORDER BY时，主键之前的各排序列在结果中的列名
+
+
+def _strip_terminator(sql):
+    sql = sql.rstrip()
+    while sql.endswith(";"):
+        sql = sql[:-1].rstrip()
+    return sql
+
+def _sql_literal(value):
+    """把游标中的排序列/主键值写成SQL字面量（DECIMAL、日期时间在游标中保存为字符串）"""
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise InvalidCursor("不支持的主键值类型")
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+def _aliased_as(item, name):
+    """以 name 为别名的结果列的表达式，不是时返回None"""
+    suffix = f" as {name}"
+    return item[:-len(suffix)].strip() if item.endswith(suffix) else None
+
+def _selects(items, accepted, name):
+    """结果中是否包含该列（accepted 中的写法，或以原列名作为别名）"""
+    return any(item in accepted or _aliased_as(item, name) in accepted for item in items)
+
+def _keyset_key(sql, masked, table_schema):
+    """判断查询能否按主键续读，可以时返回 (续读键, ORDER BY 在SQL中的起始位置)
+
+    续读键为 [(列表达式, 结果中的列名, 是否降序)]，最后一项是主表主键。
+    要求：单个主表（或只通过父表主键JOIN，不会让主表的行重复），
+    没有聚合、分组、LIMIT，并且结果包含主表主键；带ORDER BY时每个排序项都是结果中未改名的列，
+    按 (排序列…, 主键) 续读
+    """
+    if _NOT_KEYSET.search(masked) or not masked.lstrip().startswith("SELECT"):
+        return None
+    order_matches = list(_ORDER_BY.finditer(masked))
+    if len(order_matches) > 1:
+        return None
+    head_end = order_matches[0].start() if order_matches else len(masked)
+    order_start = order_matches[0].end() if order_matches else None
+    order_sql, order_masked = sql[order_start:], masked[order_start:]
+    sql, masked = sql[:head_end], masked[:head_end]
+    from_match = re.search(r"\bFROM\b", masked)
+    if not from_match:
+        return None
+    select_list = masked[masked.index("SELECT") + len("SELECT"):from_match.start()]
+    if _AGGREGATE.search(select_list):
+        return None
+
+    where_match = re.search(r"\bWHERE\b", masked)
+    from_end = where_match.start() if where_match else len(masked)
+    from_clause = masked[from_match.end():from_end]
+    if "," in from_clause or "(" in from_clause or _OTHER_JOIN.search(from_clause):
+        return None
+
+    main = _MAIN_TABLE.match(from_clause)
+    if not main:
+        return None
+    main_table = main.group(1).lower()
+    if main_table not in table_schema:
+        return None
+    # 别名在MySQL中可能区分大小写，从原始SQL中取
+    original_from = sql[from_match.end():from_end]
+    alias_group = 2 if main.group(2) else 1
+    main_alias = original_from[main.start(alias_group):main.end(alias_group)]
+    primary_key = table_schema[main_table]['primary_key']
+    if not primary_key:
+        return None
+    # 小写别名 -> (表, 原始别名)
+    tables = {main_alias.lower(): (main_table, main_alias)}
+
+    # 只允许JOIN父表：被JOIN表的主键出现在ON条件中，主表的每一行最多匹配一行
+    joins = list(_JOIN.finditer(from_clause))
+    if len(joins) != len(_ANY_JOIN.findall(from_clause)):
+        return None
+    for index, join in enumerate(joins):
+        table = join.group(2).lower()
+        if table not in table_schema:
+            return None
+        alias_group = 3 if join.group(3) else 2
+        alias = join.group(alias_group).lower()
+        tables[alias] = (table, original_from[join.start(alias_group):join.end(alias_group)])
+        end = joins[index + 1].start() if index + 1 < len(joins) else len(from_clause)
+        condition = original_from[join.end():end]
+        parent_key = table_schema[table]['primary_key']
+        if not parent_key or not re.search(rf"\b{re.escape(alias)}\s*\.\s*`?{re.escape(parent_key)}\b", condition, re.IGNORECASE):
+            return None
+
+    # 结果中必须包含主表主键（SELECT *、主表.* 或未改名的主键列）
+    items = [item.strip().lower() for item in select_list.split(",")]
+    alias = main_alias.lower()
+    accepted = {"*", f"{alias}.*", f"{main_table}.*", primary_key,
+                f"{alias}.{primary_key}", f"{main_table}.{primary_key}"}
+    if not _selects(items, accepted, primary_key):
+        return None
+    key = (f"{main_alias}.{primary_key}", primary_key, False)
+    if order_start is None:
+        return [key], head_end
+
+    keys = []
+    offset = 0
+    for item in order_masked.split(","):
+        match = _ORDER_ITEM.match(item)
+        if match is None:
+            return None
+        column = match.group(2).lower()
+        qualifier = match.group(1) and order_sql[offset + match.start(1):offset + match.end(1)]
+        offset += len(item) + 1
+        owners = [table for table in tables.values() if column in table_schema[table[0]]['columns']]
+        resolved = tables.get(qualifier.lower()) if qualifier is not None else (owners[0] if len(owners) == 1 else None)
+        if resolved not in owners:
+            return None
+        table, table_alias = resolved
+        accepted = {f"{table_alias.lower()}.*", f"{table}.*", f"{table_alias.lower()}.{column}",
+                    f"{table}.{column}", "*"}
+        if len(owners) == 1:
+            # 列名只属于一个表时，结果中未限定表名的同名列就是该列
+            accepted.add(column)
+        # 结果中必须有该列；未限定表名的排序项可能指向同名的结果别名，这时不能续读
+        if not _selects(items, accepted, column) or (qualifier is None and any(
+                _aliased_as(item, column) not in accepted | {None} for item in items)):
+            return None
+        keys.append((f"{table_alias}.{column}", column, match.group(3) == "DESC"))
+        if table == main_table and column == primary_key:
+            # 主键唯一，之后的排序项不影响顺序
+            return keys, head_end
+    return keys + [key], head_end
+
+def _after_condition(keys, values):
+    """按 keys 的顺序排在 values 之后的行的条件（MySQL升序时NULL在最前，降序时在最后）"""
+    clauses = []
+    for index, ((expr, _, descending), value) in enumerate(zip(keys, values)):
+        if value is None:
+            if descending:
+                continue
+            after = f"{expr} IS NOT NULL"
+        elif descending:
+            after = f"({expr} < {_sql_literal(value)} OR {expr} IS NULL)"
+        else:
+            after = f"{expr} > {_sql_literal(value)}"
+        equal = [f"{prior} IS NULL" if prior_value is None else f"{prior} = {_sql_literal(prior_value)}"
+                 for (prior, _, _), prior_value in zip(keys[:index], values[:index])]
+        clauses.append(" AND ".join(equal + [after]))
+    if not clauses:
+        return "FALSE"
+    if len(clauses) == 1:
+        return clauses[0]
+    return "(" + " OR ".join(f"({clause})" for clause in clauses) + ")"
+
+def _apply_limit(sql, masked, limit, fetch_extra=False):
+    """保证SQL最多返回limit行（fetch_extra时多取一行），返回 (SQL, 是否由服务端限制了行数)"""
+    fetch = limit + 1 if fetch_extra else limit
+    match = _LIMIT.search(masked)
+    if match is None:
+        return f"{sql} LIMIT {fetch}", True
+    if match.group(2) is not None:
+        # LIMIT offset, count
+        count_start, count_end = match.span(2)
+    else:
+        count_start, count_end = match.span(1)
+    if int(sql[count_start:count_end]) <= limit:
+        return sql, False
+    return f"{sql[:count_start]}{fetch}{sql[count_end:]}", True
+
+def cap_sql(sql, limit):
+    """给任意SELECT加上行数上限（流式导出使用）"""
+    sql = _strip_terminator(sql)
+    capped, _ = _apply_limit(sql, parse_sql(sql).masked, limit)
+    return capped
+
+def plan_page(sql, table_schema, limit, after=None):
+    """重写生成的SQL：按主键（或排序列+主键）续读的查询使用keyset分页，其余查询只限制行数
+
+    after 为上一页最后一行的主键值，带ORDER BY时为 [排序列…, 主键] 的值列表（来自分页游标）
+    """
+    source_sql = _strip_terminator(sql)
+    masked = parse_sql(source_sql).masked
+    keyset = _keyset_key(source_sql, masked, table_schema)
+
+    if keyset is None:
+        if after is not None:
+            raise InvalidCursor("该查询不支持分页续读")
+        capped_sql, capped = _apply_limit(source_sql, masked, limit, fetch_extra=True)
+        return PagePlan(source_sql, capped_sql, limit, None, capped)
+
+    keys, head_end = keyset
+    page_sql = source_sql[:head_end].rstrip()
+    if after is not None:
+        values = [after] if len(keys) == 1 else after
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise InvalidCursor("分页游标与查询不匹配")
+        after_condition = _after_condition(keys, values)
+        where_match = re.search(r"\bWHERE\b", masked[:head_end])
+        if where_match:
+            condition = page_sql[where_match.end():].strip()
+            page_sql = f"{page_sql[:where_match.start()]}WHERE ({condition}) AND {after_condition}"
+        else:
+            page_sql = f"{page_sql} WHERE {after_condition}"
+    order_by = ", ".join(f"{expr} DESC" if descending else expr for expr, _, descending in keys)
+    page_sql = f"{page_sql} ORDER BY {order_by} LIMIT {limit + 1}"
+    return PagePlan(source_sql, page_sql, limit, keys[-1][1], True, tuple(key[1] for key in keys[:-1]))
+
+def apply_page(plan, result, secret):
+    """截取一页结果，返回 (QueryResult, 是否被截断, 下一页游标)"""
+    if not plan.capped or len(result.rows) <= plan.limit:
+        return result, False, None
+    page = QueryResult(result.description, result.rows[:plan.limit])
+    next_cursor = None
+    if plan.key_column is not None:
+        columns = [column.lower() for column in page.columns]
+        # 排序列在结果中同名出现多次（如 SELECT * 连接了有同名列的表）时无法确定取哪一列
+        if plan.key_column in columns and all(columns.count(name) == 1 for name in plan.sort_columns):
+            last_row = page.rows[-1]
+            last_key = last_row[columns.index(plan.key_column)]
+            if plan.sort_columns:
+                last_key = [last_row[columns.index(name)] for name in plan.sort_columns] + [last_key]
+            next_cursor = encode_cursor(plan.source_sql, last_key, secret)
+    return page, True, next_cursor
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _signature(payload, secret):
+    return hmac.new(secret.encode("utf-8"), payload, hashlib.sha256).digest()
+
+def encode_cursor(source_sql, after, secret):
+    """生成签名的分页游标（不透明字符串）"""
+    payload = json.dumps({"sql": source_sql, "after": after}, ensure_ascii=False,
+                         separators=(",", ":"), default=str).encode("utf-8")
+    return f"{_b64encode(payload)}.{_b64encode(_signature(payload, secret))}"
+
+def decode_cursor(cursor, secret):
+    """校验并解析分页游标，返回 (原始SQL, 上一页最后的主键值或 [排序列…, 主键] 的值)"""
+    try:
+        payload_part, signature_part = cursor.split(".", 1)
+        payload = _b64decode(payload_part)
+        signature = _b64decode(signature_part)
+    except (ValueError, TypeError):
+        raise InvalidCursor("分页游标格式错误")
+    if not hmac.compare_digest(signature, _signature(payload, secret)):
+        raise InvalidCursor("分页游标签名无效")
+    data = json.loads(payload.decode("utf-8"))
+    return data["sql"], data["after"]
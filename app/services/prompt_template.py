@@ -0,0 +1,156 @@
+import json
+import hashlib
+from dataclasses import dataclass
+
+# 提示词模板版本，修改下面的固定文本时递增
+PROMPT_TEMPLATE_REVISION = 2
+
+# 固定不变的说明、规则和示例放在最前面，
+# 保证不同请求的提示词前缀字节完全一致，便于模型服务端的前缀缓存命中
+_INSTRUCTIONS = """
+You are a professional SQL query generation expert. Please generate accurate MySQL queries based on user's natural language questions.
+
+### Important Rules:
+1. Return ONLY the SQL query statement, nothing else
+2. Do NOT include any explanations, descriptions, or comments
+3. Use MySQL syntax
+4. Field names and table names must exactly match the database structure
+5. Use appropriate JOINs to connect tables
+6. For time queries, use appropriate DATE functions
+7. For fuzzy queries, use LIKE operator
+8. For statistical queries, use COUNT, SUM, AVG and other aggregate functions
+9. For sorting queries, use ORDER BY
+10. For pagination queries, use LIMIT
+
+### Example:
+Question: How many users are there?
+Answer: SELECT COUNT(*) FROM users;
+"""
+
+_QUESTION_HEADER = """
+### User Question:
+"""
+
+_SUFFIX = """
+
+### SQL Query (return only the SQL statement):
+"""
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """编译好的提示词模板（不可变）
+
+    prefix 包含说明、规则、示例和数据库结构，只在元数据变化时重新生成；
+    version 是模板全文的哈希，可作为下游缓存的版本号
+    """
+    prefix: str
+    suffix: str
+    version: str
+    metadata_hash: str
+
+    def render(self, user_question):
+        """填入用户问题，生成完整提示词"""
+        return f"{self.prefix}{user_question}{self.suffix}"
+
+
+def extract_question(prompt):
+    """从完整提示词中取出用户问题（render 的逆操作）"""
+    start = prompt.rfind(_QUESTION_HEADER)
+    question = prompt[start + len(_QUESTION_HEADER):] if start >= 0 else prompt
+    if question.endswith(_SUFFIX):
+        question = question[:-len(_SUFFIX)]
+    return question
+
+
+def metadata_fingerprint(table_schema, field_mapping, table_relationships, enum_values):
+    """计算数据库元数据的内容哈希"""
+    payload = json.dumps(
+        [table_schema, field_mapping, table_relationships, enum_values],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_database_context(table_schema, field_mapping, table_relationships, enum_values, tables=None):
+    """构建数据库上下文信息
+
+    tables 不为空时只包含这些表，以及它们之间的关系和它们的枚举列
+    """
+    if tables is not None:
+        table_schema = {t: info for t, info in table_schema.items() if t in tables}
+        table_relationships = {
+            t: {r: cond for r, cond in relations.items() if r in tables}
+            for t, relations in table_relationships.items() if t in tables
+        }
+        columns = {c for info in table_schema.values() for c in info['columns']}
+        enum_values = {f: v for f, v in enum_values.items() if f in columns}
+        intro = "These are the tables of the e-commerce sales database relevant to the question:"
+    else:
+        intro = "This is the complete structure of the e-commerce sales database:"
+
+    lines = [
+        "",
+        "### Database Schema Information",
+        "",
+        intro,
+        "",
+        "**Table Structures:**",
+    ]
+
+    # 添加表结构信息（从数据库读取的结构还包含列类型和索引）
+    for table_name, table_info in table_schema.items():
+        column_types = table_info.get('column_types', {})
+        lines.append("")
+        lines.append(f"**{table_name} table** ({table_info['description']}):")
+        if table_info['primary_key']:
+            lines.append(f"- Primary key: {table_info['primary_key']}")
+        lines.append("- Columns:")
+        for column in table_info['columns']:
+            chinese_name = field_mapping.get(column, column)
+            if column_types.get(column):
+                lines.append(f"  - {column} ({chinese_name}, {column_types[column]})")
+            else:
+                lines.append(f"  - {column} ({chinese_name})")
+        if table_info.get('indexes'):
+            indexes = [
+                f"({', '.join(index['columns'])})" + (" unique" if index['unique'] else "")
+                for index in table_info['indexes']
+            ]
+            lines.append(f"- Indexes: {'; '.join(indexes)}")
+
+    # 添加表关系信息
+    lines.append("")
+    lines.append("**Table Relationships:**")
+    for table, relations in table_relationships.items():
+        for related_table, join_condition in relations.items():
+            lines.append(f"- {table} -> {related_table}: {join_condition}")
+
+    # 添加枚举值信息
+    if enum_values:
+        lines.append("")
+        lines.append("**Enum Values:**")
+        for field, values in enum_values.items():
+            lines.append(f"- {field}: {', '.join(values)}")
+
+    lines.append("")
+    return "\n".join(lines)
+
+
+def compile_prompt_template(table_schema, field_mapping, table_relationships, enum_values, tables=None):
+    """把数据库元数据编译成提示词模板，tables 不为空时只包含相关的表"""
+    database_context = build_database_context(
+        table_schema, field_mapping, table_relationships, enum_values, tables
+    )
+    prefix = f"{_INSTRUCTIONS}{database_context}{_QUESTION_HEADER}"
+    version = hashlib.sha256(
+        f"{PROMPT_TEMPLATE_REVISION}\0{prefix}\0{_SUFFIX}".encode("utf-8")
+    ).hexdigest()[:16]
+    return PromptTemplate(
+        prefix=prefix,
+        suffix=_SUFFIX,
+        version=version,
+        metadata_hash=metadata_fingerprint(
+            table_schema, field_mapping, table_relationships, enum_values
+        )
+    )
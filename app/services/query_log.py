@@ -0,0 +1,375 @@
+import re
+import json
+import time
+import queue
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from config import QUERY_LOG_ENABLED, QUERY_LOG_MAX_ENTRIES, QUERY_LOG_PATH
+from database.config import get_table_schema
+from app.utils.sql_parser import parse_sql
+
+# 子句关键字 -> 列引用所在的位置（ON 与 WHERE 一样按谓词处理）
+_CLAUSES = {
+    "SELECT": "select", "FROM": "from", "JOIN": "from", "STRAIGHT_JOIN": "from", "ON": "where",
+    "WHERE": "where", "GROUP": "group", "HAVING": "having", "ORDER": "order", "LIMIT": "limit"
+}
+
+# 这些关键字后面的左括号只是分组括号，不是函数调用
+_BOOLEAN_CONTEXT = frozenset("WHERE ON AND OR NOT XOR HAVING".split())
+
+_RANGE_OPS = frozenset(["<", ">", "<=", ">="])
+_FLIPPED = {"<": ">", ">": "<", "<=": ">=", ">=": "<=", "=": "=", "<=>": "<=>"}
+
+# IN 列表中连续的占位符折叠为一个
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+@dataclass(frozen=True)
+class QueryShape:
+    """一条SELECT用到的可走索引的列，均为 (表, 列)
+
+    equality: 等值条件（=、IN、IS NULL）；ranges: 范围条件（<、>、BETWEEN、前缀LIKE、IS NOT NULL）；
+    joins: 连接条件 ((表, 列), (表, 列))；group_by / order_by: 直接按列分组、排序（不含表达式）
+    """
+    tables: Tuple[str, ...]
+    equality: Tuple[Tuple[str, str], ...] = ()
+    ranges: Tuple[Tuple[str, str], ...] = ()
+    joins: Tuple[Tuple[Tuple[str, str], Tuple[str, str]], ...] = ()
+    group_by: Tuple[Tuple[str, str], ...] = ()
+    order_by: Tuple[Tuple[str, str], ...] = ()
+
+    def to_dict(self):
+        dotted = lambda refs: [f"{table}.{column}" for table, column in refs]
+        return {
+            "tables": list(self.tables),
+            "equality": dotted(self.equality),
+            "ranges": dotted(self.ranges),
+            "joins": [f"{a[0]}.{a[1]} = {b[0]}.{b[1]}" for a, b in self.joins],
+            "group_by": dotted(self.group_by),
+            "order_by": dotted(self.order_by)
+        }
+
+
+def sql_template(sql):
+    """字面量替换为 ? 后的SQL及其指纹，只有常量不同的查询归为同一条"""
+    parsed = parse_sql(sql)
+    if parsed.error is not None:
+        template = sql.strip()
+    else:
+        parts = []
+        pending_space = False
+        for token in parsed.tokens:
+            if token.kind in ("ws", "comment", "hint"):
+                pending_space = True
+                continue
+            if pending_space and parts:
+                parts.append(" ")
+            pending_space = False
+            parts.append("?" if token.kind in ("string", "number", "param") else token.text)
+        while parts and parts[-1] in (";", " "):
+            parts.pop()
+        template = _PLACEHOLDER_LIST.sub("?", "".join(parts))
+    return template, hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+class _ShapeReader:
+    """在词法单元上按子句收集列引用"""
+
+    def __init__(self, parsed, schema):
+        self.toks = [t for t in parsed.tokens if t.kind not in ("ws", "comment", "hint")]
+        self.schema = schema
+        self.tables = [t.lower() for t in parsed.tables if t.lower() in schema]
+        self.aliases = {alias: table.lower() for alias, table in parsed.aliases.items()}
+        self.equality, self.ranges, self.joins, self.group_by, self.order_by = [], [], [], [], []
+
+    def at(self, i):
+        return self.toks[i] if 0 <= i < len(self.toks) else None
+
+    def column_at(self, i):
+        """i 处为列引用时返回 (表, 列, 结束位置)，否则返回None"""
+        token = self.at(i)
+        if token is None or token.kind != "ident":
+            return None
+        previous, nxt = self.at(i - 1), self.at(i + 1)
+        if previous is not None and (previous.is_op(".") or previous.is_keyword("AS")):
+            return None
+        if nxt is not None and nxt.is_op("("):
+            return None
+        if nxt is not None and nxt.is_op("."):
+            target = self.at(i + 2)
+            table = self.aliases.get(token.value.lower())
+            if target is None or target.kind != "ident" or table not in self.schema or \
+                    target.value.lower() not in self.schema[table]["columns"]:
+                return None
+            return table, target.value.lower(), i + 3
+        column = token.value.lower()
+        owners = [table for table in self.tables if column in self.schema[table]["columns"]]
+        return (owners[0], column, i + 1) if len(owners) == 1 else None
+
+    def in_function(self, i):
+        """列是否作为函数参数出现（如 YEAR(order_date)），这样的条件用不上索引"""
+        previous, before = self.at(i - 1), self.at(i - 2)
+        if previous is None or not previous.is_op("(") or before is None:
+            return False
+        return before.kind == "ident" or (before.kind == "keyword" and before.value not in _BOOLEAN_CONTEXT)
+
+    @staticmethod
+    def is_value(token):
+        return token is not None and token.kind in ("string", "number", "param")
+
+    def bare_end(self, end):
+        """列引用之后没有紧跟算术运算"""
+        token = self.at(end)
+        return token is None or token.kind != "op" or token.value in (")", ",", ";")
+
+    def predicate(self, ref, i):
+        """WHERE/ON 中的列：按后面的运算符归入等值、范围或连接条件"""
+        table, column, end = ref
+        op = self.at(end)
+        if op is None or self.in_function(i):
+            return
+        if op.kind == "op" and op.value in ("=", "<=>"):
+            other = self.column_at(end + 1)
+            if other is None:
+                self.equality.append((table, column))
+            elif other[0] != table and self.bare_end(other[2]):
+                self.joins.append(tuple(sorted(((table, column), other[:2]))))
+        elif op.kind == "op" and op.value in _RANGE_OPS:
+            if self.column_at(end + 1) is None:
+                self.ranges.append((table, column))
+        elif op.is_keyword("IN"):
+            self.equality.append((table, column))
+        elif op.is_keyword("BETWEEN"):
+            self.ranges.append((table, column))
+        elif op.is_keyword("IS"):
+            nxt = self.at(end + 1)
+            (self.ranges if nxt is not None and nxt.is_keyword("NOT") else self.equality).append((table, column))
+        elif op.is_keyword("LIKE"):
+            pattern = self.at(end + 1)
+            if pattern is not None and pattern.kind == "string" and pattern.value[:1] not in ("%", "_", ""):
+                self.ranges.append((table, column))
+
+    def flipped_predicate(self, ref, i):
+        """字面量在左侧的比较：'2024-01-01' <= order_date"""
+        op, value = self.at(i - 1), self.at(i - 2)
+        if op is None or op.kind != "op" or op.value not in _FLIPPED or not self.is_value(value):
+            return
+        if not self.bare_end(ref[2]):
+            return
+        target = self.equality if _FLIPPED[op.value] in ("=", "<=>") else self.ranges
+        target.append(ref[:2])
+
+    def direct_item(self, i, end):
+        """GROUP BY / ORDER BY 中单独作为一项的列"""
+        previous, nxt = self.at(i - 1), self.at(end)
+        if previous is None or not (previous.is_keyword("BY") or previous.is_op(",")):
+            return False
+        return nxt is None or nxt.is_op(",") or nxt.is_op(")") or nxt.is_op(";") or \
+            nxt.is_keyword("ASC", "DESC", "HAVING", "ORDER", "LIMIT", "WITH", "UNION")
+
+    def read(self):
+        clauses = {}
+        i = 0
+        while i < len(self.toks):
+            token = self.toks[i]
+            if token.is_op("("):
+                clauses.pop(token.depth + 1, None)
+            if token.kind == "keyword" and token.value in _CLAUSES:
+                clauses[token.depth] = _CLAUSES[token.value]
+            ref = self.column_at(i)
+            if ref is None:
+                i += 1
+                continue
+            clause = next((clauses[d] for d in range(token.depth, -1, -1) if d in clauses), None)
+            if clause == "where":
+                previous = self.at(i - 1)
+                if previous is not None and previous.kind == "op" and previous.value in _FLIPPED:
+                    self.flipped_predicate(ref, i)
+                elif previous is None or previous.kind == "keyword" or previous.is_op("("):
+                    self.predicate(ref, i)
+            elif clause in ("group", "order") and self.direct_item(i, ref[2]):
+                (self.group_by if clause == "group" else self.order_by).append(ref[:2])
+            i = ref[2]
+        unique = lambda refs: tuple(dict.fromkeys(refs))
+        return QueryShape(
+            tables=unique(self.tables),
+            equality=unique(self.equality),
+            ranges=unique(ref for ref in self.ranges if ref not in self.equality),
+            joins=unique(self.joins),
+            group_by=unique(self.group_by),
+            order_by=unique(self.order_by)
+        )
+
+
+def analyze_sql(sql, schema=None):
+    """提取SELECT的谓词、连接、分组和排序列；不是SELECT或无法解析时返回None"""
+    parsed = parse_sql(sql)
+    if parsed.error or parsed.statement_type != "SELECT":
+        return None
+    return _ShapeReader(parsed, schema or get_table_schema()).read()
+
+
+@dataclass
+class LogEntry:
+    """同一SQL模板的执行记录"""
+    template: str
+    sql: str  # 最近一次执行的SQL（索引建议用它做EXPLAIN）
+    shape: Optional[QueryShape]
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    timeouts: int = 0
+    rows: int = 0
+    last_seen: float = field(default_factory=time.time)
+
+    def to_dict(self):
+        return {
+            "template": self.template,
+            "sql": self.sql,
+            "shape": self.shape.to_dict() if self.shape is not None else None,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "avg_ms": round(self.total_seconds * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "timeouts": self.timeouts,
+            "rows": self.rows,
+            "last_seen": self.last_seen
+        }
+
+
+class QueryLog:
+    """实际在数据库执行的SQL及其耗时，按SQL模板聚合（条目数有上限，淘汰最久未出现的）
+
+    path 不为空时每次执行同时追加一行JSON，索引建议命令可以离线读取。
+    写文件在后台线程中进行（record 在事件循环中调用，只把行放入队列），flush() 等待排队的行写完
+    """
+
+    def __init__(self, enabled=QUERY_LOG_ENABLED, max_entries=QUERY_LOG_MAX_ENTRIES, path=QUERY_LOG_PATH,
+                 schema=None):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.path = path
+        self.schema = schema or get_table_schema()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.evicted = 0
+        self.write_failures = 0
+        # 待写入文件的行（以及 flush() 放入的 threading.Event），由后台线程取出
+        self._pending = queue.SimpleQueue()
+        self._writer = None
+
+    def record(self, sql, seconds, rows=None, timed_out=False, at=None):
+        """记录一次执行（seconds 为数据库执行耗时）"""
+        if not self.enabled:
+            return
+        at = time.time() if at is None else at
+        template, key = sql_template(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = LogEntry(template, sql, analyze_sql(sql, self.schema))
+                self._entries[key] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._entries.move_to_end(key)
+                entry.sql = sql
+            entry.count += 1
+            entry.total_seconds += seconds
+            entry.max_seconds = max(entry.max_seconds, seconds)
+            entry.timeouts += 1 if timed_out else 0
+            entry.rows += rows or 0
+            entry.last_seen = at
+            self.recorded += 1
+            if self.path:
+                self._append(sql, seconds, rows, timed_out, at)
+
+    def _append(self, sql, seconds, rows, timed_out, at):
+        """把一行JSON放入写入队列（调用方持有 self._lock），第一次写入时启动后台线程"""
+        line = json.dumps({"ts": at, "sql": sql, "ms": round(seconds * 1000, 3), "rows": rows,
+                           "timed_out": timed_out}, ensure_ascii=False)
+        self._pending.put(line)
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_pending, name="query-log-writer", daemon=True)
+            self._writer.start()
+
+    def _write_pending(self):
+        """后台线程：取出队列中已有的行，每批打开一次文件追加"""
+        while True:
+            batch = [self._pending.get()]
+            try:
+                while True:
+                    batch.append(self._pending.get_nowait())
+            except queue.Empty:
+                pass
+            lines = [item for item in batch if isinstance(item, str)]
+            if lines:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write("".join(line + "\n" for line in lines))
+                except OSError as e:
+                    with self._lock:
+                        self.write_failures += len(lines)
+                    print(f"[ERROR] 写入查询日志失败: {e}")
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def flush(self, timeout=5):
+        """等待已记录的执行写入文件，超时前写完时返回True"""
+        if self._writer is None:
+            return True
+        done = threading.Event()
+        self._pending.put(done)
+        return done.wait(timeout)
+
+    @classmethod
+    def load(cls, path, max_entries=QUERY_LOG_MAX_ENTRIES, schema=None):
+        """从JSONL文件重建查询日志（不再写回文件）"""
+        log = cls(enabled=True, max_entries=max_entries, path="", schema=schema)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                log.record(item["sql"], item["ms"] / 1000, item.get("rows"), item.get("timed_out", False),
+                           item.get("ts"))
+        return log
+
+    def entries(self, limit=None):
+        """按总耗时从高到低排列的条目"""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry.total_seconds, reverse=True)
+        return entries if limit is None else entries[:limit]
+
+    def clear(self):
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+        return cleared
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "recorded": self.recorded,
+                "evicted": self.evicted,
+                "path": self.path or None,
+                "write_failures": self.write_failures
+            }
+
+
+# 创建全局查询日志实例
+query_log = QueryLog()
+
+def get_query_log():
+    """获取查询日志实例"""
+    return query_log
@@ -0,0 +1,376 @@
+import time
+import asyncio
+import threading
+import contextvars
+from datetime import datetime
+from functools import lru_cache
+
+from mysql.connector import Error, FieldType, FieldFlag
+
+from app.utils.database import get_db
+from app.utils.pool import PoolTimeoutError
+from app.utils.metrics import REPLICA_QUERIES
+from app.utils.lazy import Lazy
+from app.services.select_query import UnsupportedQuery, relationship_pairs
+from database.config import get_table_schema, get_table_relationships, get_enum_values
+from config import REPLICA_ENABLED, REPLICA_REFRESH_INTERVAL, REPLICA_FULL_REFRESH_INTERVAL, REPLICA_MAX_ROWS
+
+# numpy 是可选依赖，未安装时不启用列式副本
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+if NUMPY_AVAILABLE:
+    from app.services.replica_executor import compile_query, execute_plan
+
+# 编译结果缓存的条目数（按SQL文本）
+PLAN_CACHE_SIZE = 1024
+
+# MySQL列类型 -> 副本中的列类型
+_INTEGER_TYPES = (FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG,
+                  FieldType.LONGLONG, FieldType.YEAR)
+_STRING_TYPES = (FieldType.VAR_STRING, FieldType.STRING, FieldType.VARCHAR, FieldType.ENUM,
+                 FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB, FieldType.LONG_BLOB, FieldType.BLOB)
+
+# MySQL二进制字符集编号（BLOB/VARBINARY列）
+BINARY_CHARSET = 63
+
+
+def column_kind(description):
+    """cursor.description 中的一列 -> 副本列类型（int/decimal/float/string/date/datetime），不支持的类型返回None"""
+    type_code = description[1]
+    flags = description[7] if len(description) > 7 else 0
+    charset = description[8] if len(description) > 8 else None
+    if type_code in _INTEGER_TYPES:
+        return None if (flags or 0) & FieldFlag.UNSIGNED and type_code == FieldType.LONGLONG else "int"
+    if type_code in (FieldType.DECIMAL, FieldType.NEWDECIMAL):
+        return "decimal"
+    if type_code in (FieldType.FLOAT, FieldType.DOUBLE):
+        return "float"
+    if type_code in (FieldType.DATE, FieldType.NEWDATE):
+        return "date"
+    if type_code in (FieldType.DATETIME, FieldType.TIMESTAMP):
+        return "datetime"
+    if type_code in _STRING_TYPES and charset != BINARY_CHARSET:
+        return "string"
+    return None
+
+
+class Column:
+    """一列数据：values 为NumPy数组，valid 为非空标记（全部非空时为None）
+
+    decimal 按 10**scale 缩放为 int64 保证求和精确；string 字典编码为 int32（dictionary 为取值列表，
+    ENUM 列的字典按定义顺序预置，编码顺序即排序顺序）；date/datetime 为 datetime64[D]/datetime64[us]
+    """
+
+    __slots__ = ("kind", "type_code", "values", "valid", "scale", "dictionary", "enum")
+
+    def __init__(self, kind, type_code, values, valid=None, scale=0, dictionary=None, enum=False):
+        self.kind = kind
+        self.type_code = type_code
+        self.values = values
+        self.valid = valid
+        self.scale = scale
+        self.dictionary = dictionary
+        self.enum = enum
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def build(cls, kind, type_code, raw, base=None, enum_values=None):
+        """由一列Python值构建；base 为已有的列时沿用其字典和小数位数（追加新行使用）"""
+        valid = np.fromiter((value is not None for value in raw), dtype=bool, count=len(raw))
+        if valid.all():
+            valid = None
+        if kind == "int":
+            values = np.fromiter((0 if value is None else value for value in raw), dtype=np.int64, count=len(raw))
+            return cls(kind, type_code, values, valid)
+        if kind == "float":
+            values = np.fromiter((0.0 if value is None else value for value in raw), dtype=np.float64, count=len(raw))
+            return cls(kind, type_code, values, valid)
+        if kind == "decimal":
+            scales = [-value.as_tuple().exponent for value in raw if value is not None]
+            scale = max(scales + [base.scale if base is not None else 0, 0])
+            values = np.fromiter((0 if value is None else int(value.scaleb(scale)) for value in raw),
+                                 dtype=np.int64, count=len(raw))
+            return cls(kind, type_code, values, valid, scale=scale)
+        if kind in ("date", "datetime"):
+            unit = "datetime64[D]" if kind == "date" else "datetime64[us]"
+            return cls(kind, type_code, np.array(raw, dtype=unit), valid)
+        # 字符串：字典编码，空值编码为-1
+        if base is not None:
+            dictionary, enum = list(base.dictionary), base.enum
+        else:
+            dictionary, enum = list(enum_values or []), enum_values is not None
+        index = {value: code for code, value in enumerate(dictionary)}
+        codes = np.empty(len(raw), dtype=np.int32)
+        for i, value in enumerate(raw):
+            if value is None:
+                codes[i] = -1
+                continue
+            if isinstance(value, (bytes, bytearray)):
+                value = value.decode("utf-8", errors="replace")
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(dictionary)
+                dictionary.append(value)
+            codes[i] = code
+        return cls(kind, type_code, codes, valid, dictionary=dictionary, enum=enum)
+
+    def concat(self, other):
+        """追加 other（由 build(..., base=self) 构建）后的新列，原列不变"""
+        values = self.values
+        if self.kind == "decimal" and other.scale > self.scale:
+            values = values * 10 ** (other.scale - self.scale)
+        if self.valid is None and other.valid is None:
+            valid = None
+        else:
+            valid = np.concatenate([
+                np.ones(len(self), dtype=bool) if self.valid is None else self.valid,
+                np.ones(len(other), dtype=bool) if other.valid is None else other.valid
+            ])
+        return Column(self.kind, self.type_code, np.concatenate([values, other.values]), valid,
+                      scale=max(self.scale, other.scale),
+                      dictionary=other.dictionary if self.kind == "string" else None, enum=self.enum)
+
+
+class ColumnTable:
+    """一张表的只读快照：列名 -> Column，按主键升序"""
+
+    def __init__(self, name, primary_key, columns, row_count, watermark, loaded_at):
+        self.name = name
+        self.primary_key = primary_key
+        self.columns = columns
+        self.row_count = row_count
+        self.watermark = watermark
+        self.loaded_at = loaded_at
+        self._sorted = {}
+
+    def sorted_index(self, column):
+        """连接用的有序索引：(非空行按该列排序后的行号, 排序后的值)，按列缓存"""
+        cached = self._sorted.get(column)
+        if cached is None:
+            col = self.columns[column]
+            rows = np.arange(self.row_count) if col.valid is None else np.flatnonzero(col.valid)
+            order = rows[np.argsort(col.values[rows], kind="stable")]
+            cached = self._sorted[column] = (order, col.values[order])
+        return cached
+
+    def nbytes(self):
+        return sum(col.values.nbytes + (0 if col.valid is None else col.valid.nbytes)
+                   for col in self.columns.values())
+
+
+def _table_from_rows(name, primary_key, description, rows, watermark, base=None):
+    """由查询结果构建 ColumnTable；base 不为空时把 rows 追加到 base 之后"""
+    enum_values = get_enum_values()
+    columns = {}
+    for position, desc in enumerate(description):
+        column = desc[0].lower()
+        kind = column_kind(desc)
+        if kind is None:
+            continue
+        raw = [row[position] for row in rows]
+        enums = enum_values.get(column) if kind == "string" and (desc[7] or 0) & FieldFlag.ENUM else None
+        if base is None:
+            columns[column] = Column.build(kind, desc[1], raw, enum_values=enums)
+        else:
+            columns[column] = base.columns[column].concat(Column.build(kind, desc[1], raw, base=base.columns[column]))
+    row_count = len(rows) + (base.row_count if base is not None else 0)
+    return ColumnTable(name, primary_key, columns, row_count, watermark, datetime.now())
+
+
+class ColumnarReplica:
+    """进程内的列式只读副本：把业务表加载为NumPy列，在本地执行支持的聚合查询
+
+    增量刷新按主键水位线追加新行（行数与数据库不一致时全量重新加载），
+    已有行的更新和删除只在全量刷新（full_refresh_interval）时同步，结果最多滞后这么久。
+    不支持的查询返回None，由调用方回退到MySQL
+    """
+
+    def __init__(self, enabled=REPLICA_ENABLED, refresh_interval=REPLICA_REFRESH_INTERVAL,
+                 full_refresh_interval=REPLICA_FULL_REFRESH_INTERVAL, max_rows=REPLICA_MAX_ROWS,
+                 schema=None, relationships=None):
+        self.enabled = enabled and NUMPY_AVAILABLE
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self.max_rows = max_rows
+        self.schema = get_table_schema() if schema is None else schema
+        self.relationships = relationship_pairs(get_table_relationships() if relationships is None else relationships)
+        self.tables = {}
+        self.last_refresh = {}
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._compile = lru_cache(maxsize=PLAN_CACHE_SIZE)(self._compile_uncached)
+
+    def _compile_uncached(self, sql):
+        """编译SQL，不支持时返回None（同样缓存）"""
+        try:
+            return compile_query(sql, self.schema, self.relationships)
+        except UnsupportedQuery:
+            return None
+
+    def set_table(self, table):
+        """发布新的表快照（正在执行的查询继续使用旧快照）"""
+        with self.lock:
+            self.tables = {**self.tables, table.name: table}
+
+    def execute(self, sql):
+        """在副本上执行查询，返回 QueryResult；副本不能回答时返回None"""
+        tables = self.tables
+        if not self.enabled or not tables:
+            return None
+        plan = self._compile(sql)
+        try:
+            if plan is None or any(table not in tables for table in plan.tables):
+                raise UnsupportedQuery()
+            result = execute_plan(plan, tables)
+        except UnsupportedQuery:
+            REPLICA_QUERIES.inc(outcome="fallback")
+            return None
+        REPLICA_QUERIES.inc(outcome="hit")
+        return result
+
+    async def aexecute(self, sql):
+        """在线程池中执行，大表上的计算不阻塞事件循环"""
+        if not self.enabled or not self.tables:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, self.execute, sql)
+
+    def refresh(self, names=None, full=False):
+        """刷新副本中的表，返回 {表: {"success":..., ...}}"""
+        names = list(self.schema) if names is None else names
+        results = {}
+        with self.refresh_lock:
+            for name in names:
+                try:
+                    results[name] = self._refresh_one(name, full)
+                except (Error, PoolTimeoutError) as e:
+                    print(f"[ERROR] 列式副本 {name} 刷新失败: {e}")
+                    results[name] = {"success": False, "error": str(e)}
+                self.last_refresh[name] = results[name]
+        return results
+
+    def _refresh_one(self, name, full):
+        start = time.perf_counter()
+        primary_key = self.schema[name]["primary_key"]
+        columns = ", ".join(self.schema[name]["columns"])
+        current = self.tables.get(name)
+        if current is not None and not full and self.full_refresh_interval > 0 and \
+                (datetime.now() - current.loaded_at).total_seconds() >= self.full_refresh_interval:
+            full = True
+
+        with get_db().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT COUNT(*) FROM {name}")
+                count = cursor.fetchone()[0]
+                if count > self.max_rows:
+                    with self.lock:
+                        self.tables = {table: t for table, t in self.tables.items() if table != name}
+                    return {"success": False, "error": f"行数 {count} 超过上限 {self.max_rows}，不加载"}
+
+                key_position = self.schema[name]["columns"].index(primary_key)
+                mode = "full"
+                rows = []
+                if current is not None and not full and current.watermark is not None:
+                    cursor.execute(f"SELECT {columns} FROM {name} WHERE {primary_key} > %s ORDER BY {primary_key}",
+                                   (current.watermark,))
+                    rows = cursor.fetchall()
+                    # 行数对得上说明只有追加；否则有删除（或水位线之前的插入），全量重新加载
+                    if current.row_count + len(rows) == count:
+                        mode = "incremental"
+                if mode == "incremental":
+                    if rows:
+                        table = _table_from_rows(name, primary_key, cursor.description, rows,
+                                                 rows[-1][key_position], current)
+                        table.loaded_at = current.loaded_at
+                        self.set_table(table)
+                else:
+                    cursor.execute(f"SELECT {columns} FROM {name} ORDER BY {primary_key}")
+                    rows = cursor.fetchall()
+                    # 水位线取自实际读到的行，COUNT之后插入的行不会在下次增量刷新时重复读取
+                    watermark = rows[-1][key_position] if rows else None
+                    self.set_table(_table_from_rows(name, primary_key, cursor.description, rows, watermark))
+            finally:
+                cursor.close()
+
+        result = {
+            "success": True,
+            "mode": mode,
+            "rows": len(rows),
+            "row_count": self.tables[name].row_count,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        if mode == "full" or rows:
+            print(f"[INFO] 列式副本 {name} 已刷新（{mode}，{len(rows)}行，{result['duration_ms']}毫秒）")
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            if self._stop.wait(self.refresh_interval):
+                break
+
+    def start(self):
+        """在后台线程中加载各表并按间隔增量刷新；refresh_interval<=0 时只加载一次"""
+        if not self.enabled or self._thread is not None:
+            return
+        if self.refresh_interval <= 0:
+            self._thread = threading.Thread(target=self.refresh, name="replica-refresh", daemon=True)
+        else:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="replica-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台刷新"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def ages(self):
+        """各表距上次全量加载的秒数"""
+        now = datetime.now()
+        return {name: (now - table.loaded_at).total_seconds() for name, table in self.tables.items()}
+
+    def stats(self):
+        """获取副本状态和查询统计"""
+        tables = self.tables
+        return {
+            "enabled": self.enabled,
+            "numpy_available": NUMPY_AVAILABLE,
+            "refresh_interval": self.refresh_interval,
+            "full_refresh_interval": self.full_refresh_interval,
+            "queries": {
+                "hit": REPLICA_QUERIES.value(outcome="hit"),
+                "fallback": REPLICA_QUERIES.value(outcome="fallback")
+            },
+            "tables": {
+                name: {
+                    "ready": name in tables,
+                    "rows": tables[name].row_count if name in tables else None,
+                    "bytes": tables[name].nbytes() if name in tables else None,
+                    "watermark": tables[name].watermark if name in tables else None,
+                    "loaded_at": str(tables[name].loaded_at) if name in tables else None,
+                    "last_refresh": self.last_refresh.get(name)
+                }
+                for name in self.schema
+            }
+        }
+
+
+# 全局列式副本实例
+_replica = Lazy(ColumnarReplica)
+
+def get_replica():
+    """获取列式副本实例"""
+    return _replica()
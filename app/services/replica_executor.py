@@ -0,0 +1,1104 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal, Context, ROUND_HALF_UP
+from typing import Optional, Tuple
+
+import numpy as np
+from mysql.connector import FieldType
+
+from app.services.select_query import SelectQuery, UnsupportedQuery
+from app.utils.serializer import QueryResult
+
+AGGREGATES = frozenset(("COUNT", "SUM", "AVG", "MIN", "MAX"))
+
+# 函数 -> 参数个数
+SCALAR_FUNCTIONS = {
+    "YEAR": (1,), "MONTH": (1,), "DAY": (1,), "DAYOFMONTH": (1,), "QUARTER": (1,),
+    "DATE": (1,), "DATE_FORMAT": (2,), "ROUND": (1, 2)
+}
+
+_COMPARISONS = {"=": "=", "!=": "!=", "<>": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+# DATE_FORMAT 支持的格式符 -> 需要保留的时间精度
+_FORMAT_UNITS = {"Y": "Y", "y": "Y", "m": "M", "c": "M", "d": "D", "e": "D", "H": "h", "i": "m", "s": "s"}
+_UNIT_ORDER = "YMDhms"
+
+_DATE_LITERAL = re.compile(r"^\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?$")
+
+# MySQL DECIMAL最多65位；除法结果的小数位数为被除数的小数位数 + div_precision_increment(4)
+_DECIMAL = Context(prec=65, rounding=ROUND_HALF_UP)
+DIV_PRECISION_INCREMENT = 4
+
+# 结果列的字符集编号：utf8mb4_0900_ai_ci / binary
+_UTF8MB4_CHARSET = 255
+_BINARY_CHARSET = 63
+_STRING_TYPE_CODES = (FieldType.VAR_STRING, FieldType.STRING, FieldType.VARCHAR)
+
+
+def fold(text):
+    """近似 utf8mb4_0900_ai_ci 的比较键：忽略大小写和重音"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+def _sortable(text):
+    """只含字母、数字、空格和连字符的字符串，按比较键排序与MySQL的排序规则一致"""
+    return text.replace(" ", "").replace("-", "").isalnum()
+
+
+@dataclass(frozen=True)
+class ReplicaPlan:
+    """编译后的查询：表达式为嵌套元组，列引用为 ("col", 表, 列)"""
+    tables: Tuple[str, ...]                     # 按FROM/JOIN顺序
+    joins: Tuple[tuple, ...]                    # ((表, 列), (表, 列))
+    where: Optional[tuple]
+    select: Tuple[Tuple[tuple, str], ...]       # (表达式, 结果列名)
+    group: Tuple[tuple, ...]                    # 分组表达式（DISTINCT时为全部SELECT项）
+    having: Optional[tuple]
+    order: Tuple[Tuple[tuple, bool], ...]       # (表达式, 是否降序)
+    limit: Optional[int]
+    offset: int
+    aggregates: Tuple[tuple, ...]
+
+
+def _children(node):
+    """表达式的子表达式"""
+    kind = node[0]
+    if kind in ("col", "lit", "item"):
+        return ()
+    if kind == "agg":
+        return () if node[3] is None else (node[3],)
+    if kind == "func":
+        return node[2]
+    if kind in ("cmp", "arith"):
+        return node[2:]
+    if kind in ("in", "isnull", "like"):
+        return (node[1],)
+    return node[1:]
+
+def _walk(node):
+    yield node
+    for child in _children(node):
+        yield from _walk(child)
+
+def _contains(node, *kinds):
+    return any(sub[0] in kinds for sub in _walk(node))
+
+def _contains_aggregate(node):
+    return _contains(node, "agg")
+
+
+class _ExpressionParser:
+    """在 SelectQuery 的词法单元区间上解析表达式"""
+
+    def __init__(self, query, start, end, clause, aliases):
+        self.q = query
+        self.i = start
+        self.end = end
+        self.clause = clause
+        self.aliases = aliases
+
+    def peek(self, offset=0):
+        i = self.i + offset
+        return self.q.toks[i] if i < self.end else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise UnsupportedQuery()
+        self.i += 1
+        return token
+
+    def expect_op(self, value):
+        if not self.take().is_op(value):
+            raise UnsupportedQuery()
+
+    def parse(self):
+        node = self.expression()
+        if self.i != self.end:
+            raise UnsupportedQuery()
+        return node
+
+    def expression(self):
+        node = self.conjunction()
+        while self.peek() is not None and (self.peek().is_keyword("OR") or self.peek().is_op("||")):
+            self.take()
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.peek() is not None and (self.peek().is_keyword("AND") or self.peek().is_op("&&")):
+            self.take()
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.peek() is not None and self.peek().is_keyword("NOT"):
+            self.take()
+            return ("not", self.negation())
+        return self.predicate()
+
+    def predicate(self):
+        left = self.additive()
+        token = self.peek()
+        if token is None:
+            return left
+        if token.kind == "op" and token.value in _COMPARISONS:
+            self.take()
+            return ("cmp", _COMPARISONS[token.value], left, self.additive())
+        if token.is_keyword("IS"):
+            self.take()
+            negated = self.peek() is not None and self.peek().is_keyword("NOT")
+            if negated:
+                self.take()
+            if not self.take().is_keyword("NULL"):
+                raise UnsupportedQuery()
+            return ("isnull", left, negated)
+        negated = token.is_keyword("NOT")
+        if negated:
+            self.take()
+            token = self.peek()
+            if token is None or not token.is_keyword("IN", "BETWEEN", "LIKE"):
+                raise UnsupportedQuery()
+        if token.is_keyword("IN"):
+            self.take()
+            self.expect_op("(")
+            values = [self.literal()]
+            while self.peek() is not None and self.peek().is_op(","):
+                self.take()
+                values.append(self.literal())
+            self.expect_op(")")
+            node = ("in", left, tuple(values))
+        elif token.is_keyword("BETWEEN"):
+            self.take()
+            low = self.additive()
+            if not self.take().is_keyword("AND"):
+                raise UnsupportedQuery()
+            node = ("between", left, low, self.additive())
+        elif token.is_keyword("LIKE"):
+            self.take()
+            pattern = self.take()
+            if pattern.kind != "string" or (self.peek() is not None and self.peek().is_keyword("ESCAPE")):
+                raise UnsupportedQuery()
+            node = ("like", left, pattern.value)
+        else:
+            return left
+        return ("not", node) if negated else node
+
+    def literal(self):
+        node = self.additive()
+        if node[0] != "lit" or node[1] is None:
+            raise UnsupportedQuery()
+        return node[1]
+
+    def additive(self):
+        node = self.multiplicative()
+        while self.peek() is not None and (self.peek().is_op("+") or self.peek().is_op("-")):
+            op = self.take().value
+            node = ("arith", op, node, self.multiplicative())
+        return node
+
+    def multiplicative(self):
+        node = self.unary()
+        while self.peek() is not None and (self.peek().is_op("*") or self.peek().is_op("/")):
+            op = self.take().value
+            node = ("arith", op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek() is not None and self.peek().is_op("-"):
+            self.take()
+            node = self.unary()
+            if node[0] == "lit" and isinstance(node[1], (int, Decimal, float)):
+                return ("lit", -node[1])
+            return ("neg", node)
+        if self.peek() is not None and self.peek().is_op("+"):
+            self.take()
+            return self.unary()
+        return self.primary()
+
+    def primary(self):
+        token = self.take()
+        if token.kind == "number":
+            text = token.text
+            if "e" in text.lower():
+                return ("lit", float(text))
+            return ("lit", Decimal(text) if "." in text else int(text))
+        if token.kind == "string":
+            return ("lit", token.value)
+        if token.is_keyword("NULL"):
+            return ("lit", None)
+        if token.is_keyword("TRUE", "FALSE"):
+            return ("lit", 1 if token.value == "TRUE" else 0)
+        if token.is_op("("):
+            node = self.expression()
+            self.expect_op(")")
+            return node
+        following = self.peek()
+        if token.kind in ("ident", "keyword") and following is not None and following.is_op("("):
+            return self.function(token.value.upper())
+        if token.kind == "ident":
+            return self.reference(self.i - 1)
+        if token.kind == "keyword" and self.clause in ("GROUP", "HAVING", "ORDER") and token.value.lower() in self.aliases:
+            # 与关键字同名的别名（如 month）
+            return ("item", self.aliases[token.value.lower()])
+        raise UnsupportedQuery()
+
+    def function(self, name):
+        self.expect_op("(")
+        if name in AGGREGATES:
+            if self.clause in ("WHERE", "GROUP", "FROM"):
+                raise UnsupportedQuery()
+            distinct = self.peek() is not None and self.peek().is_keyword("DISTINCT")
+            if distinct:
+                self.take()
+                if name != "COUNT":
+                    raise UnsupportedQuery()
+            if name == "COUNT" and not distinct and self.peek() is not None and self.peek().is_op("*"):
+                self.take()
+                argument = None
+            else:
+                argument = self.expression()
+                if _contains_aggregate(argument):
+                    raise UnsupportedQuery()
+            self.expect_op(")")
+            return ("agg", name, distinct, argument)
+        if name not in SCALAR_FUNCTIONS:
+            raise UnsupportedQuery()
+        args = [self.expression()]
+        while self.peek() is not None and self.peek().is_op(","):
+            self.take()
+            args.append(self.expression())
+        self.expect_op(")")
+        if len(args) not in SCALAR_FUNCTIONS[name]:
+            raise UnsupportedQuery()
+        if name == "DATE_FORMAT" and (args[1][0] != "lit" or not isinstance(args[1][1], str)):
+            raise UnsupportedQuery()
+        if name == "ROUND" and len(args) == 2 and (args[1][0] != "lit" or not isinstance(args[1][1], int)):
+            raise UnsupportedQuery()
+        name = "DAY" if name == "DAYOFMONTH" else name
+        return ("func", name, tuple(args))
+
+    def reference(self, i):
+        """列引用或SELECT别名；GROUP BY/HAVING 中别名与列同名时MySQL优先取列，不在副本中处理"""
+        token = self.q.toks[i]
+        following = self.q.at(i + 1)
+        name = token.value.lower()
+        if (following is None or not following.is_op(".")) and self.clause in ("GROUP", "HAVING", "ORDER") \
+                and name in self.aliases:
+            if self.clause != "ORDER" and any(name in self.q.schema[t]["columns"] for t in self.q.tables):
+                raise UnsupportedQuery()
+            return ("item", self.aliases[name])
+        column = self.q.column_at(i, "WHERE")
+        if column is None:
+            raise UnsupportedQuery()
+        table, column, end = column
+        if end > self.end:
+            raise UnsupportedQuery()
+        self.i = end
+        return ("col", table, column)
+
+
+def _split(toks, start, end):
+    """按顶层逗号切分 [start, end)"""
+    parts = []
+    part_start = start
+    depth = toks[start].depth if start < end else 0
+    for i in range(start, end):
+        if toks[i].is_op(",") and toks[i].depth == depth:
+            parts.append((part_start, i))
+            part_start = i + 1
+    parts.append((part_start, end))
+    if any(s >= e for s, e in parts):
+        raise UnsupportedQuery()
+    return parts
+
+
+def _grouped(node, keys):
+    """不含聚合的部分必须由分组表达式决定（ONLY_FULL_GROUP_BY）"""
+    if node in keys or node[0] in ("lit", "agg", "item"):
+        return True
+    if node[0] == "col":
+        return False
+    return all(_grouped(child, keys) for child in _children(node))
+
+
+def _item_name(query, start, end, node):
+    """未起别名的SELECT项的结果列名：列引用为列名，其余为原文"""
+    if node[0] == "col":
+        return query.toks[end - 1].value
+    return query.sql[query.toks[start].start:query.toks[end - 1].end]
+
+
+def compile_query(sql, schema, relationships):
+    """把SQL编译为 ReplicaPlan；超出支持范围时抛出 UnsupportedQuery
+
+    relationships 为 relationship_pairs() 的结果
+    """
+    query = SelectQuery(sql, schema, relationships)
+    toks = query.toks
+    if query.has_star:
+        raise UnsupportedQuery()
+
+    aliases = {}
+    for index, (_, _, alias) in enumerate(query.select_items):
+        if alias is not None:
+            aliases.setdefault(str(alias).lower(), index)
+
+    def parse(start, end, clause):
+        return _ExpressionParser(query, start, end, clause, aliases).parse()
+
+    select = []
+    for start, end, alias in query.select_items:
+        node = parse(start, end, "SELECT")
+        select.append((node, str(alias) if alias is not None else _item_name(query, start, end, node)))
+
+    where = None
+    if "WHERE" in query.clauses:
+        _, start, end = query.clauses["WHERE"]
+        where = parse(start, end, "WHERE")
+
+    def position(start, end):
+        """GROUP BY/ORDER BY 中的列序号"""
+        if end - start == 1 and toks[start].kind == "number" and isinstance(toks[start].value, int):
+            if not 1 <= toks[start].value <= len(select):
+                raise UnsupportedQuery()
+            return toks[start].value - 1
+        return None
+
+    group = []
+    if "GROUP" in query.clauses:
+        _, start, end = query.clauses["GROUP"]
+        for part_start, part_end in _split(toks, start, end):
+            index = position(part_start, part_end)
+            node = select[index][0] if index is not None else parse(part_start, part_end, "GROUP")
+            if node[0] == "item":
+                node = select[node[1]][0]
+            if _contains_aggregate(node):
+                raise UnsupportedQuery()
+            group.append(node)
+
+    having = None
+    if "HAVING" in query.clauses:
+        _, start, end = query.clauses["HAVING"]
+        having = parse(start, end, "HAVING")
+
+    order = []
+    if "ORDER" in query.clauses:
+        _, start, end = query.clauses["ORDER"]
+        for part_start, part_end in _split(toks, start, end):
+            descending = False
+            if toks[part_end - 1].is_keyword("ASC", "DESC"):
+                descending = toks[part_end - 1].value == "DESC"
+                part_end -= 1
+                if part_start >= part_end:
+                    raise UnsupportedQuery()
+            index = position(part_start, part_end)
+            node = ("item", index) if index is not None else parse(part_start, part_end, "ORDER")
+            order.append((node, descending))
+
+    limit, offset = None, 0
+    if "LIMIT" in query.clauses:
+        _, start, end = query.clauses["LIMIT"]
+        parts = [t for t in toks[start:end]]
+        numbers = [t.value for t in parts if t.kind == "number"]
+        if any(not isinstance(n, int) for n in numbers):
+            raise UnsupportedQuery()
+        if len(parts) == 1 and len(numbers) == 1:
+            limit = numbers[0]
+        elif len(parts) == 3 and parts[1].is_op(",") and len(numbers) == 2:
+            offset, limit = numbers
+        elif len(parts) == 3 and parts[1].is_keyword("OFFSET") and len(numbers) == 2:
+            limit, offset = numbers
+        else:
+            raise UnsupportedQuery()
+
+    nodes = [node for node, _ in select] + ([having] if having else []) + [node for node, _ in order]
+    aggregated = bool(group) or any(_contains_aggregate(node) for node in nodes)
+    if query.distinct:
+        # 没有聚合的 SELECT DISTINCT 等同于按全部SELECT项分组
+        if aggregated:
+            raise UnsupportedQuery()
+        group = [node for node, _ in select]
+    elif not aggregated:
+        # 明细查询由MySQL执行（有keyset分页）
+        raise UnsupportedQuery()
+    if having is not None and not aggregated:
+        raise UnsupportedQuery()
+    keys = frozenset(group)
+    if not all(_grouped(node, keys) for node in nodes):
+        raise UnsupportedQuery()
+
+    aggregates = []
+    for node in nodes:
+        for sub in _walk(node):
+            if sub[0] == "agg" and sub not in aggregates:
+                aggregates.append(sub)
+
+    return ReplicaPlan(
+        tables=tuple(query.table_order),
+        joins=tuple(query.joins),
+        where=where,
+        select=tuple(select),
+        group=tuple(group),
+        having=having,
+        order=tuple(order),
+        limit=limit,
+        offset=offset,
+        aggregates=tuple(aggregates)
+    )
+
+
+class _Vector:
+    """行级表达式的值：kind 同副本列类型另加 bool；valid 为None表示全部非空"""
+
+    __slots__ = ("kind", "values", "valid", "scale", "dictionary", "enum", "type_code")
+
+    def __init__(self, kind, values, valid=None, scale=0, dictionary=None, enum=False, type_code=None):
+        self.kind = kind
+        self.values = values
+        self.valid = valid
+        self.scale = scale
+        self.dictionary = dictionary
+        self.enum = enum
+        self.type_code = type_code
+
+    def mask(self):
+        return np.ones(len(self.values), dtype=bool) if self.valid is None else self.valid
+
+    def take(self, rows):
+        return _Vector(self.kind, self.values[rows], None if self.valid is None else self.valid[rows],
+                       self.scale, self.dictionary, self.enum, self.type_code)
+
+    def truth(self):
+        """作为条件时为真的行（NULL视为不成立）"""
+        if self.kind == "bool":
+            values = self.values
+        elif self.kind in ("int", "decimal", "float"):
+            values = self.values != 0
+        else:
+            raise UnsupportedQuery()
+        return values if self.valid is None else values & self.valid
+
+
+def _both_valid(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a & b
+
+def _literal_vector(value):
+    """字面量 -> 广播用的标量向量"""
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return _Vector("int", np.int64(value), type_code=FieldType.LONGLONG)
+    if isinstance(value, Decimal):
+        scale = max(-value.as_tuple().exponent, 0)
+        return _Vector("decimal", np.int64(int(value.scaleb(scale))), scale=scale, type_code=FieldType.NEWDECIMAL)
+    if isinstance(value, float):
+        return _Vector("float", np.float64(value), type_code=FieldType.DOUBLE)
+    raise UnsupportedQuery()
+
+def _date_literal(text):
+    if not _DATE_LITERAL.match(text):
+        raise UnsupportedQuery()
+    try:
+        if len(text) == 10:
+            date.fromisoformat(text)
+            return np.datetime64(text, "D")
+        datetime.fromisoformat(text)
+        return np.datetime64(text.replace(" ", "T"), "us")
+    except ValueError:
+        raise UnsupportedQuery()
+
+def _aligned(a, b):
+    """把两个数值向量对齐为可直接比较/运算的数组，返回 (a值, b值, 类型, 小数位数)"""
+    if a.kind not in ("int", "decimal", "float") or b.kind not in ("int", "decimal", "float"):
+        raise UnsupportedQuery()
+    if a.kind == "float" or b.kind == "float":
+        return (a.values / 10 ** a.scale if a.kind == "decimal" else a.values.astype(np.float64),
+                b.values / 10 ** b.scale if b.kind == "decimal" else b.values.astype(np.float64), "float", 0)
+    scale = max(a.scale, b.scale)
+    kind = "decimal" if "decimal" in (a.kind, b.kind) else "int"
+    return a.values * 10 ** (scale - a.scale), b.values * 10 ** (scale - b.scale), kind, scale
+
+
+_FLIPPED = {"=": "=", "!=": "!=", "<": ">", "<=": ">=", ">": "<", ">=": "<="}
+
+_NUMPY_COMPARE = {
+    "=": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal
+}
+
+
+class _Relation:
+    """连接后的行集合：表 -> 行号数组（惰性取列）"""
+
+    def __init__(self, tables, rows, length):
+        self.tables = tables
+        self.rows = rows
+        self.length = length
+        self._columns = {}
+
+    @classmethod
+    def join(cls, plan, tables):
+        root = plan.tables[0]
+        relation = cls(tables, {root: np.arange(tables[root].row_count)}, tables[root].row_count)
+        for (left, right), table in zip(plan.joins, plan.tables[1:]):
+            new, existing = (left, right) if left[0] == table else (right, left)
+            if existing[0] not in relation.rows:
+                raise UnsupportedQuery()
+            relation = relation._join(existing, new)
+        return relation
+
+    def _join(self, existing, new):
+        """等值内连接：在新表的有序索引上二分查找，一对多时展开"""
+        keys = self.column(*existing)
+        target = self.tables[new[0]]
+        if keys.kind != "int" or target.columns[new[1]].kind != "int":
+            raise UnsupportedQuery()
+        order, sorted_values = target.sorted_index(new[1])
+        low = np.searchsorted(sorted_values, keys.values, side="left")
+        high = np.searchsorted(sorted_values, keys.values, side="right")
+        counts = high - low
+        if keys.valid is not None:
+            counts[~keys.valid] = 0
+        total = int(counts.sum())
+        outer = np.repeat(np.arange(self.length), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = {table: indexes[outer] for table, indexes in self.rows.items()}
+        rows[new[0]] = order[np.repeat(low, counts) + offsets]
+        return _Relation(self.tables, rows, total)
+
+    def subset(self, selected):
+        """按行号或布尔数组取子集"""
+        rows = {table: indexes[selected] for table, indexes in self.rows.items()}
+        length = int(selected.sum()) if selected.dtype == bool else len(selected)
+        return _Relation(self.tables, rows, length)
+
+    def column(self, table, name):
+        key = (table, name)
+        vector = self._columns.get(key)
+        if vector is None:
+            col = self.tables[table].columns.get(name)
+            if col is None:
+                raise UnsupportedQuery()
+            rows = self.rows[table]
+            vector = self._columns[key] = _Vector(
+                col.kind, col.values[rows], None if col.valid is None else col.valid[rows],
+                col.scale, col.dictionary, col.enum, col.type_code
+            )
+        return vector
+
+    def evaluate(self, node):
+        """行级表达式求值（向量化）"""
+        kind = node[0]
+        if kind == "col":
+            return self.column(node[1], node[2])
+        if kind == "lit":
+            scalar = _literal_vector(node[1])
+            scalar.values = np.full(self.length, scalar.values)
+            return scalar
+        if kind in ("and", "or"):
+            a, b = self.evaluate(node[1]), self.evaluate(node[2])
+            a_true, b_true = a.truth(), b.truth()
+            a_false, b_false = a.mask() & ~a_true, b.mask() & ~b_true
+            if kind == "and":
+                true, false = a_true & b_true, a_false | b_false
+            else:
+                true, false = a_true | b_true, a_false & b_false
+            return _Vector("bool", true, true | false, type_code=FieldType.LONGLONG)
+        if kind == "not":
+            a = self.evaluate(node[1])
+            true = a.truth()
+            return _Vector("bool", a.mask() & ~true, a.valid, type_code=FieldType.LONGLONG)
+        if kind == "cmp":
+            op, left, right = node[1:]
+            if left[0] == "lit" and right[0] != "lit":
+                op, left, right = _FLIPPED[op], right, left
+            return self._compare(op, self.evaluate(left), right)
+        if kind == "between":
+            return self.evaluate(("and", ("cmp", ">=", node[1], node[2]), ("cmp", "<=", node[1], node[3])))
+        if kind == "in":
+            if not node[2]:
+                raise UnsupportedQuery()
+            result = None
+            for value in node[2]:
+                condition = ("cmp", "=", node[1], ("lit", value))
+                result = condition if result is None else ("or", result, condition)
+            return self.evaluate(result)
+        if kind == "isnull":
+            a = self.evaluate(node[1])
+            values = a.mask() if node[2] else ~a.mask()
+            return _Vector("bool", values, type_code=FieldType.LONGLONG)
+        if kind == "like":
+            return self._like(self.evaluate(node[1]), node[2])
+        if kind == "arith":
+            return self._arithmetic(node[1], self.evaluate(node[2]), self.evaluate(node[3]))
+        if kind == "neg":
+            a = self.evaluate(node[1])
+            if a.kind not in ("int", "decimal", "float"):
+                raise UnsupportedQuery()
+            return _Vector(a.kind, -a.values, a.valid, a.scale, type_code=a.type_code)
+        if kind == "func":
+            return self._function(node[1], node[2])
+        raise UnsupportedQuery()
+
+    def _compare(self, op, a, right):
+        """比较；NULL参与比较的结果为NULL"""
+        if right[0] == "lit" and isinstance(right[1], str):
+            if a.kind == "string":
+                if op not in ("=", "!="):
+                    raise UnsupportedQuery()
+                target = fold(right[1])
+                lookup = np.array([fold(value) == target for value in a.dictionary] + [False], dtype=bool)
+                values = lookup[a.values]
+                return _Vector("bool", values if op == "=" else ~values, a.valid, type_code=FieldType.LONGLONG)
+            if a.kind in ("date", "datetime"):
+                return _Vector("bool", _NUMPY_COMPARE[op](a.values, _date_literal(right[1])), a.valid,
+                               type_code=FieldType.LONGLONG)
+            raise UnsupportedQuery()
+        if right[0] == "lit" and right[1] is None:
+            return _Vector("bool", np.zeros(self.length, dtype=bool), np.zeros(self.length, dtype=bool),
+                           type_code=FieldType.LONGLONG)
+        b = _literal_vector(right[1]) if right[0] == "lit" else self.evaluate(right)
+        valid = _both_valid(a.valid, b.valid)
+        if a.kind in ("date", "datetime") and b.kind in ("date", "datetime"):
+            return _Vector("bool", _NUMPY_COMPARE[op](a.values, b.values), valid, type_code=FieldType.LONGLONG)
+        x, y, _, _ = _aligned(a, b)
+        return _Vector("bool", _NUMPY_COMPARE[op](x, y), valid, type_code=FieldType.LONGLONG)
+
+    def _like(self, a, pattern):
+        if a.kind != "string":
+            raise UnsupportedQuery()
+        parts = []
+        escaped = False
+        for char in fold(pattern):
+            if escaped:
+                parts.append(re.escape(char))
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == "%":
+                parts.append(".*")
+            elif char == "_":
+                parts.append(".")
+            else:
+                parts.append(re.escape(char))
+        regex = re.compile("".join(parts), re.S)
+        lookup = np.array([regex.fullmatch(fold(value)) is not None for value in a.dictionary] + [False], dtype=bool)
+        return _Vector("bool", lookup[a.values], a.valid, type_code=FieldType.LONGLONG)
+
+    def _arithmetic(self, op, a, b):
+        if op == "/":
+            raise UnsupportedQuery()
+        x, y, kind, scale = _aligned(a, b)
+        if op == "+":
+            values = x + y
+        elif op == "-":
+            values = x - y
+        elif kind == "decimal":
+            # 乘法的小数位数为两边之和
+            values, scale = a.values * b.values, a.scale + b.scale
+        else:
+            values = x * y
+        type_code = {"int": FieldType.LONGLONG, "decimal": FieldType.NEWDECIMAL, "float": FieldType.DOUBLE}[kind]
+        return _Vector(kind, values, _both_valid(a.valid, b.valid), scale, type_code=type_code)
+
+    def _function(self, name, args):
+        if name == "ROUND":
+            raise UnsupportedQuery()
+        a = self.evaluate(args[0])
+        if a.kind not in ("date", "datetime"):
+            raise UnsupportedQuery()
+        values = a.values
+        if name == "YEAR":
+            result = values.astype("datetime64[Y]").astype(np.int64) + 1970
+        elif name == "MONTH":
+            result = values.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        elif name == "QUARTER":
+            result = (values.astype("datetime64[M]").astype(np.int64) % 12) // 3 + 1
+        elif name == "DAY":
+            result = (values.astype("datetime64[D]") - values.astype("datetime64[M]")).astype(np.int64) + 1
+        elif name == "DATE":
+            return _Vector("date", values.astype("datetime64[D]"), a.valid, type_code=FieldType.DATE)
+        else:
+            return self._date_format(a, args[1][1])
+        return _Vector("int", result, a.valid, type_code=FieldType.LONG)
+
+    def _date_format(self, a, fmt):
+        """DATE_FORMAT：按格式需要的精度截断后去重，只格式化不同的值"""
+        specs = re.findall(r"%(.)", fmt)
+        if any(spec != "%" and spec not in _FORMAT_UNITS for spec in specs):
+            raise UnsupportedQuery()
+        units = [_FORMAT_UNITS[spec] for spec in specs if spec != "%"] or ["Y"]
+        unit = max(units, key=_UNIT_ORDER.index)
+        valid = a.mask()
+        truncated = a.values[valid].astype(f"datetime64[{unit}]")
+        unique, inverse = np.unique(truncated, return_inverse=True)
+        codes = np.full(len(a.values), -1, dtype=np.int32)
+        codes[valid] = inverse.reshape(-1)
+        dictionary = [_format_datetime(value.astype("datetime64[s]").item(), fmt) for value in unique]
+        return _Vector("string", codes, a.valid, dictionary=dictionary, type_code=FieldType.VAR_STRING)
+
+
+def _format_datetime(value, fmt):
+    fields = {
+        "Y": f"{value.year:04d}", "y": f"{value.year % 100:02d}", "m": f"{value.month:02d}", "c": str(value.month),
+        "d": f"{value.day:02d}", "e": str(value.day), "H": f"{value.hour:02d}", "i": f"{value.minute:02d}",
+        "s": f"{value.second:02d}", "%": "%"
+    }
+    return re.sub(r"%(.)", lambda m: fields[m.group(1)], fmt)
+
+
+def _group_codes(vector):
+    """分组用的整数键；字符串按比较键合并（大小写、重音不同的值分在同一组）"""
+    if vector.kind == "string":
+        first = {}
+        lookup = np.array([first.setdefault(fold(value), code) for code, value in enumerate(vector.dictionary)] + [-1],
+                          dtype=np.int64)
+        codes = lookup[vector.values]
+    elif vector.kind == "float":
+        codes = (vector.values + 0.0).view(np.int64)
+    else:
+        codes = vector.values.view(np.int64) if vector.values.dtype.kind == "M" else vector.values.astype(np.int64)
+    if vector.valid is None:
+        return [codes]
+    return [np.where(vector.valid, codes, 0), vector.valid.astype(np.int64)]
+
+
+def _group(relation, keys):
+    """分组，返回 (每行的组号, 每组的代表行, 组数)"""
+    if not keys:
+        return np.zeros(relation.length, dtype=np.int64), np.zeros(1, dtype=np.int64), 1
+    columns = [codes for key in keys for codes in _group_codes(relation.evaluate(key))]
+    if relation.length == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0
+    if len(columns) == 1:
+        _, first, inverse = np.unique(columns[0], return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(np.stack(columns, axis=1), axis=0, return_index=True, return_inverse=True)
+    return inverse.reshape(-1), first, len(first)
+
+
+def _reduce(ufunc, values, groups, count):
+    """按组归约有值的行，返回 (每组结果, 每组是否有值)"""
+    order = np.argsort(groups, kind="stable")
+    groups, values = groups[order], values[order]
+    present = np.zeros(count, dtype=bool)
+    result = np.zeros(count, dtype=values.dtype)
+    if len(groups):
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+        present[groups[starts]] = True
+        result[groups[starts]] = ufunc.reduceat(values, starts)
+    return result, present
+
+
+def _decimal(value, scale):
+    return Decimal(int(value)).scaleb(-scale)
+
+def _python_values(vector):
+    """向量 -> Python值列表（与mysql.connector返回的类型一致）"""
+    values = vector.values
+    valid = vector.mask()
+    if vector.kind == "string":
+        out = [vector.dictionary[code] for code in values.tolist()]
+    elif vector.kind == "decimal":
+        out = [_decimal(value, vector.scale) for value in values.tolist()]
+    elif vector.kind == "date":
+        out = values.astype(object).tolist()
+    elif vector.kind == "datetime":
+        out = values.astype("datetime64[us]").astype(object).tolist()
+    elif vector.kind == "bool":
+        out = values.astype(np.int64).tolist()
+    else:
+        out = values.tolist()
+    return [value if ok else None for value, ok in zip(out, valid.tolist())]
+
+
+def _aggregate(node, relation, groups, count):
+    """计算一个聚合在每组上的值（Python值列表）"""
+    _, name, distinct, argument = node
+    if argument is None:
+        return np.bincount(groups, minlength=count).tolist()
+    vector = relation.evaluate(argument)
+    valid = vector.mask()
+    values = vector.values[valid]
+    member = groups[valid]
+    if name == "COUNT":
+        if distinct:
+            # 去掉组内重复的 (组号, 值) 后计数
+            codes = _group_codes(vector)[0][valid]
+            pairs = np.unique(np.stack([member, codes], axis=1), axis=0)
+            return np.bincount(pairs[:, 0], minlength=count).tolist()
+        return np.bincount(member, minlength=count).tolist()
+    if vector.kind not in ("int", "decimal", "float", "date", "datetime") or \
+            (name in ("SUM", "AVG") and vector.kind in ("date", "datetime")):
+        raise UnsupportedQuery()
+    if name in ("MIN", "MAX"):
+        ufunc = np.minimum if name == "MIN" else np.maximum
+        raw = values.view(np.int64) if vector.kind in ("date", "datetime") else values
+        result, present = _reduce(ufunc, raw, member, count)
+        if vector.kind in ("date", "datetime"):
+            result = result.view(vector.values.dtype)
+        return _python_values(_Vector(vector.kind, result, present, vector.scale))
+    sums, present = _reduce(np.add, values, member, count)
+    if vector.kind == "float":
+        if name == "SUM":
+            return [float(s) if ok else None for s, ok in zip(sums.tolist(), present.tolist())]
+        counts = np.bincount(member, minlength=count)
+        return [float(s) / n if ok else None for s, n, ok in zip(sums.tolist(), counts.tolist(), present.tolist())]
+    # 整数和DECIMAL的SUM/AVG结果为DECIMAL；AVG的小数位数加 div_precision_increment，四舍五入
+    totals = [_decimal(s, vector.scale) if ok else None for s, ok in zip(sums.tolist(), present.tolist())]
+    if name == "SUM":
+        return totals
+    counts = np.bincount(member, minlength=count).tolist()
+    quantum = Decimal(1).scaleb(-(vector.scale + DIV_PRECISION_INCREMENT))
+    return [None if total is None else _DECIMAL.divide(total, Decimal(n)).quantize(quantum, context=_DECIMAL)
+            for total, n in zip(totals, counts)]
+
+
+def _scale(value):
+    return max(-value.as_tuple().exponent, 0)
+
+def _numeric(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, Decimal, float)):
+        return value
+    raise UnsupportedQuery()
+
+def _scalar_arithmetic(op, a, b):
+    """分组后的标量运算，与MySQL的DECIMAL规则一致"""
+    if a is None or b is None:
+        return None
+    a, b = _numeric(a), _numeric(b)
+    if isinstance(a, float) or isinstance(b, float):
+        a, b = float(a), float(b)
+        if op == "/":
+            return None if b == 0 else a / b
+        return {"+": a + b, "-": a - b, "*": a * b}[op]
+    if op == "/":
+        if b == 0:
+            return None
+        dividend = Decimal(a)
+        quantum = Decimal(1).scaleb(-(_scale(dividend) + DIV_PRECISION_INCREMENT))
+        return _DECIMAL.divide(dividend, Decimal(b)).quantize(quantum, context=_DECIMAL)
+    if isinstance(a, int) and isinstance(b, int):
+        return {"+": a + b, "-": a - b, "*": a * b}[op]
+    a, b = Decimal(a), Decimal(b)
+    return {"+": _DECIMAL.add, "-": _DECIMAL.subtract, "*": _DECIMAL.multiply}[op](a, b)
+
+def _scalar_compare(op, a, b):
+    if a is None or b is None:
+        return None
+    if isinstance(a, str) or isinstance(b, str):
+        if not (isinstance(a, str) and isinstance(b, str)) or op not in ("=", "!="):
+            raise UnsupportedQuery()
+        a, b = fold(a), fold(b)
+    elif isinstance(a, (date, datetime)) or isinstance(b, (date, datetime)):
+        raise UnsupportedQuery()
+    else:
+        a, b = _numeric(a), _numeric(b)
+    return int({"=": a == b, "!=": a != b, "<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op])
+
+def _round(value, digits):
+    """ROUND：DECIMAL和整数四舍五入（远离零），浮点数按Python规则"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return round(value, digits)
+    if not isinstance(value, (int, Decimal)):
+        raise UnsupportedQuery()
+    if isinstance(value, int) and digits >= 0:
+        return value
+    rounded = Decimal(value).quantize(Decimal(1).scaleb(-digits), rounding=ROUND_HALF_UP, context=_DECIMAL)
+    if digits < 0:
+        return int(rounded) if isinstance(value, int) else Decimal(int(rounded))
+    return rounded
+
+def _truth(value):
+    return None if value is None else int(_numeric(value) != 0)
+
+
+class _Groups:
+    """分组之后的求值：聚合、分组表达式和SELECT项按组计算（Python标量）"""
+
+    def __init__(self, plan, relation, groups, first, count):
+        self.plan = plan
+        self.count = count
+        self.aggregates = {node: _aggregate(node, relation, groups, count) for node in plan.aggregates}
+        self.representatives = relation.subset(first) if len(plan.group) else None
+        self.rows = {}
+        self.items = {}
+
+    def row_values(self, node):
+        """不含聚合的子表达式在各组代表行上的值"""
+        values = self.rows.get(node)
+        if values is None:
+            if self.representatives is None:
+                raise UnsupportedQuery()
+            values = self.rows[node] = _python_values(self.representatives.evaluate(node))
+        return values
+
+    def item_values(self, index):
+        values = self.items.get(index)
+        if values is None:
+            node = self.plan.select[index][0]
+            values = self.items[index] = [self.value(node, g) for g in range(self.count)]
+        return values
+
+    def value(self, node, g):
+        kind = node[0]
+        if kind == "lit":
+            return node[1]
+        if kind == "agg":
+            return self.aggregates[node][g]
+        if kind == "item":
+            return self.item_values(node[1])[g]
+        if not _contains(node, "agg", "item"):
+            return self.row_values(node)[g]
+        if kind == "arith":
+            return _scalar_arithmetic(node[1], self.value(node[2], g), self.value(node[3], g))
+        if kind == "neg":
+            value = self.value(node[1], g)
+            return None if value is None else -_numeric(value)
+        if kind == "cmp":
+            return _scalar_compare(node[1], self.value(node[2], g), self.value(node[3], g))
+        if kind == "between":
+            value = self.value(node[1], g)
+            return self._and(_scalar_compare(">=", value, self.value(node[2], g)),
+                             _scalar_compare("<=", value, self.value(node[3], g)))
+        if kind == "in":
+            value = self.value(node[1], g)
+            result = 0
+            for candidate in node[2]:
+                result = self._or(result, _scalar_compare("=", value, candidate))
+            return result
+        if kind == "isnull":
+            value = self.value(node[1], g)
+            return int((value is None) != node[2])
+        if kind == "and":
+            return self._and(_truth(self.value(node[1], g)), _truth(self.value(node[2], g)))
+        if kind == "or":
+            return self._or(_truth(self.value(node[1], g)), _truth(self.value(node[2], g)))
+        if kind == "not":
+            value = _truth(self.value(node[1], g))
+            return None if value is None else 1 - value
+        if kind == "func" and node[1] == "ROUND":
+            digits = node[2][1][1] if len(node[2]) == 2 else 0
+            return _round(self.value(node[2][0], g), digits)
+        raise UnsupportedQuery()
+
+    @staticmethod
+    def _and(a, b):
+        if a == 0 or b == 0:
+            return 0
+        return None if a is None or b is None else 1
+
+    @staticmethod
+    def _or(a, b):
+        if a == 1 or b == 1:
+            return 1
+        return None if a is None or b is None else 0
+
+
+def _sort_key(values, enum_dictionary):
+    """ORDER BY 的排序键：NULL最小；ENUM按定义顺序；字符串按比较键"""
+    strings = [value for value in values if isinstance(value, str)]
+    if strings and enum_dictionary is None and not all(_sortable(value) for value in strings):
+        raise UnsupportedQuery()
+    if strings and any(not isinstance(value, str) for value in values if value is not None):
+        raise UnsupportedQuery()
+    def key(value):
+        if value is None:
+            return (0, 0)
+        if isinstance(value, str):
+            if enum_dictionary is not None:
+                return (1, enum_dictionary.index(value) if value in enum_dictionary else -1)
+            return (1, fold(value))
+        return (1, value)
+    return key
+
+
+def _enum_dictionary(plan, node, tables):
+    """排序表达式为ENUM列（或以ENUM列为内容的SELECT项）时返回枚举取值"""
+    if node[0] == "item":
+        node = plan.select[node[1]][0]
+    if node[0] == "col":
+        column = tables[node[1]].columns[node[2]]
+        if column.enum:
+            return column.dictionary
+    return None
+
+
+def _type_code(plan, node, tables):
+    """结果列的MySQL类型"""
+    kind = node[0]
+    if kind == "col":
+        return tables[node[1]].columns[node[2]].type_code
+    if kind == "item":
+        return _type_code(plan, plan.select[node[1]][0], tables)
+    if kind == "lit":
+        value = node[1]
+        if value is None:
+            return FieldType.NULL
+        return {int: FieldType.LONGLONG, Decimal: FieldType.NEWDECIMAL, float: FieldType.DOUBLE,
+                str: FieldType.VAR_STRING}[type(value)]
+    if kind == "agg":
+        if node[1] == "COUNT":
+            return FieldType.LONGLONG
+        inner = _type_code(plan, node[3], tables)
+        if node[1] in ("MIN", "MAX"):
+            return inner
+        return FieldType.DOUBLE if inner in (FieldType.FLOAT, FieldType.DOUBLE) else FieldType.NEWDECIMAL
+    if kind == "func":
+        if node[1] == "ROUND":
+            return _type_code(plan, node[2][0], tables)
+        return {"DATE": FieldType.DATE, "DATE_FORMAT": FieldType.VAR_STRING}.get(node[1], FieldType.LONG)
+    if kind == "arith":
+        inner = {_type_code(plan, node[2], tables), _type_code(plan, node[3], tables)}
+        if inner & {FieldType.FLOAT, FieldType.DOUBLE}:
+            return FieldType.DOUBLE
+        if node[1] == "/" or inner & {FieldType.DECIMAL, FieldType.NEWDECIMAL}:
+            return FieldType.NEWDECIMAL
+        return FieldType.LONGLONG
+    if kind == "neg":
+        return _type_code(plan, node[1], tables)
+    return FieldType.LONGLONG
+
+
+def execute_plan(plan, tables):
+    """在表快照上执行编译后的查询，返回 QueryResult；运行时遇到不支持的情况抛出 UnsupportedQuery"""
+    relation = _Relation.join(plan, tables)
+    if plan.where is not None:
+        relation = relation.subset(relation.evaluate(plan.where).truth())
+
+    groups, first, count = _group(relation, plan.group)
+    grouped = _Groups(plan, relation, groups, first, count)
+
+    selected = list(range(count))
+    if plan.having is not None:
+        selected = [g for g in selected if _truth(grouped.value(plan.having, g))]
+
+    # 多个排序键：从最后一个开始做稳定排序
+    for node, descending in reversed(plan.order):
+        values = [grouped.value(node, g) for g in range(count)]
+        key = _sort_key([values[g] for g in selected], _enum_dictionary(plan, node, tables))
+        selected.sort(key=lambda g: key(values[g]), reverse=descending)
+
+    selected = selected[plan.offset:]
+    if plan.limit is not None:
+        selected = selected[:plan.limit]
+
+    columns = [grouped.item_values(index) for index in range(len(plan.select))]
+    rows = [tuple(column[g] for column in columns) for g in selected]
+    description = []
+    for node, name in plan.select:
+        type_code = _type_code(plan, node, tables)
+        charset = _UTF8MB4_CHARSET if type_code in _STRING_TYPE_CODES else _BINARY_CHARSET
+        description.append((name, type_code, None, None, None, None, 1, 0, charset))
+    return QueryResult(description, rows)
@@ -0,0 +1,719 @@
+import re
+import time
+import threading
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from mysql.connector import Error
+
+from config import (ROLLUP_ENABLED, ROLLUP_REFRESH_INTERVAL, ROLLUP_RECENT_DAYS,
+                    ROLLUP_FULL_REFRESH_INTERVAL, ROLLUP_MAX_STALENESS)
+from database.config import get_table_schema, get_table_relationships, get_enum_values
+from app.utils.database import get_db
+from app.utils.pool import PoolTimeoutError
+from app.services.select_query import SelectQuery, UnsupportedQuery, CLAUSE_ORDER, relationship_pairs
+from app.utils.metrics import ROLLUP_REWRITES
+from app.utils.lazy import Lazy
+
+# 改写结果缓存的条目数（按SQL文本和可用的汇总表）
+REWRITE_CACHE_SIZE = 1024
+
+# 可以由汇总表重新聚合的聚合函数；其余聚合函数（GROUP_CONCAT、方差等）无法由汇总结果得到
+_AGGREGATES = frozenset("SUM COUNT AVG MIN MAX".split())
+_UNSUPPORTED_AGGREGATES = frozenset(
+    "GROUP_CONCAT STD STDDEV STDDEV_POP STDDEV_SAMP VARIANCE VAR_POP VAR_SAMP "
+    "BIT_AND BIT_OR BIT_XOR JSON_ARRAYAGG JSON_OBJECTAGG ANY_VALUE".split()
+)
+
+# 结果只取决于日期部分的函数：按天截断的时间列只能作为这些函数的参数使用
+_DAY_FUNCTIONS = frozenset(
+    "DATE YEAR MONTH DAY DAYOFMONTH QUARTER WEEK YEARWEEK DAYOFWEEK WEEKDAY DAYNAME MONTHNAME "
+    "DAYOFYEAR LAST_DAY TO_DAYS DATE_FORMAT".split()
+)
+# DATE_FORMAT 中不涉及时分秒的格式符
+_DAY_FORMAT = re.compile(r"(?:[^%]|%[abcDdejMmUuVvWwXxYy%])*\Z")
+
+# 与按天截断的时间列比较（>=、<）时，另一侧必须是零点的日期
+_DATE_LITERAL = re.compile(r"\d{4}-\d{1,2}-\d{1,2}\Z")
+_DATE_FUNCTIONS = frozenset("CURDATE CURRENT_DATE UTC_DATE DATE_SUB DATE_ADD SUBDATE ADDDATE LAST_DAY MAKEDATE".split())
+_DATE_UNITS = frozenset("DAY WEEK MONTH QUARTER YEAR".split())
+
+# 刷新状态表：每个汇总表的事实表主键水位线和最后刷新时间
+STATE_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    rollup_name VARCHAR(64) PRIMARY KEY,
+    watermark BIGINT,
+    refreshed_at DATETIME NOT NULL
+)"""
+_STATE_UPSERT = (
+    "INSERT INTO rollup_state (rollup_name, watermark, refreshed_at) VALUES (%s, %s, NOW()) "
+    "ON DUPLICATE KEY UPDATE watermark = VALUES(watermark), refreshed_at = VALUES(refreshed_at)"
+)
+# 多个进程（多个worker或多个实例）共用汇总表，同一时间只有一个进程刷新同一个汇总表
+_REFRESH_LOCK_PREFIX = "chat2bi_rollup_refresh:"
+
+
+@dataclass(frozen=True)
+class RollupDefinition:
+    """汇总表定义
+
+    columns: (汇总表列, 列类型, 来源表达式)，维度列在前、度量列在后
+    tables: 可以由该汇总表回答的查询所涉及的表（必须包含事实表 fact）
+    dimensions: (源表, 源列) -> 汇总表维度列
+    measures: (源表, 源列) -> (求和列, 非空计数列)
+    row_count: 事实表行数列（COUNT(*)）
+    day_source: 按天截断的时间列（源表, 源列, 来源表达式），为None时每次全量重建
+    required: 查询内连接该表时需要排除的空值列（汇总时该表为LEFT JOIN）
+    """
+    name: str
+    fact: str
+    fact_key: str
+    source: str
+    tables: frozenset
+    columns: Tuple[Tuple[str, str, str], ...]
+    dimensions: Mapping[Tuple[str, str], str]
+    measures: Mapping[Tuple[str, str], Tuple[str, str]]
+    row_count: str
+    indexes: Tuple[str, ...] = ()
+    day_source: Optional[Tuple[str, str, str]] = None
+    required: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+
+    @property
+    def day_column(self):
+        return None if self.day_source is None else self.dimensions[self.day_source[:2]]
+
+    @property
+    def ddl(self):
+        lines = [f"{name} {column_type}" for name, column_type, _ in self.columns] + list(self.indexes)
+        return f"CREATE TABLE IF NOT EXISTS {self.name} (\n    " + ",\n    ".join(lines) + "\n)"
+
+    @property
+    def watermark_sql(self):
+        return f"SELECT MAX({self.fact_key.split('.')[-1]}) FROM {self.fact}"
+
+    @property
+    def changed_since_sql(self):
+        """需要重新计算的最早日期：水位线之后的新行涉及的最早日期和最近若干天中较早的一个"""
+        day = self.day_source[2]
+        return (f"SELECT LEAST(COALESCE(MIN(DATE({day})), CURDATE()), DATE_SUB(CURDATE(), INTERVAL %s DAY)) "
+                f"FROM {self.source} WHERE {self.fact_key} > %s")
+
+    def insert_sql(self, since=False):
+        """重新聚合并写入汇总表的SQL；since为True时只聚合某个日期（参数）之后的数据"""
+        dimension_columns = set(self.dimensions.values())
+        names = ", ".join(name for name, _, _ in self.columns)
+        expressions = ", ".join(expr for _, _, expr in self.columns)
+        group_by = ", ".join(expr for name, _, expr in self.columns if name in dimension_columns)
+        where = f" WHERE {self.day_source[2]} >= %s" if since else ""
+        return f"INSERT INTO {self.name} ({names}) SELECT {expressions} FROM {self.source}{where} GROUP BY {group_by}"
+
+
+def _enum(name):
+    return "ENUM(" + ", ".join(f"'{value}'" for value in get_enum_values()[name]) + ")"
+
+# 内置的汇总表：按天的订单汇总、按天×分类×品牌的商品销售汇总、按等级×地区的用户汇总
+ROLLUPS = (
+    RollupDefinition(
+        name="rollup_orders_daily",
+        fact="orders",
+        fact_key="o.order_id",
+        source="orders o",
+        tables=frozenset({"orders"}),
+        columns=(
+            ("order_day", "DATE NOT NULL", "DATE(o.order_date)"),
+            ("payment_method", f"{_enum('payment_method')} NOT NULL", "o.payment_method"),
+            ("order_status", f"{_enum('order_status')} NOT NULL", "o.order_status"),
+            ("order_count", "INT NOT NULL", "COUNT(*)"),
+            ("total_amount", "DECIMAL(20, 2) NOT NULL", "SUM(o.total_amount)"),
+            ("discount_amount", "DECIMAL(20, 2)", "SUM(o.discount_amount)"),
+            ("discount_count", "INT NOT NULL", "COUNT(o.discount_amount)"),
+            ("shipping_fee", "DECIMAL(20, 2)", "SUM(o.shipping_fee)"),
+            ("shipping_fee_count", "INT NOT NULL", "COUNT(o.shipping_fee)"),
+            ("final_amount", "DECIMAL(20, 2) NOT NULL", "SUM(o.final_amount)"),
+        ),
+        indexes=("PRIMARY KEY (order_day, payment_method, order_status)",),
+        dimensions=MappingProxyType({
+            ("orders", "order_date"): "order_day",
+            ("orders", "payment_method"): "payment_method",
+            ("orders", "order_status"): "order_status",
+        }),
+        measures=MappingProxyType({
+            ("orders", "total_amount"): ("total_amount", "order_count"),
+            ("orders", "discount_amount"): ("discount_amount", "discount_count"),
+            ("orders", "shipping_fee"): ("shipping_fee", "shipping_fee_count"),
+            ("orders", "final_amount"): ("final_amount", "order_count"),
+        }),
+        row_count="order_count",
+        day_source=("orders", "order_date", "o.order_date"),
+    ),
+    RollupDefinition(
+        name="rollup_item_sales_daily",
+        fact="order_items",
+        fact_key="oi.order_item_id",
+        source="order_items oi JOIN orders o ON oi.order_id = o.order_id "
+               "JOIN products p ON oi.product_id = p.product_id "
+               "LEFT JOIN categories c ON p.category_id = c.category_id",
+        tables=frozenset({"order_items", "orders", "products", "categories"}),
+        columns=(
+            ("order_day", "DATE NOT NULL", "DATE(o.order_date)"),
+            ("payment_method", f"{_enum('payment_method')} NOT NULL", "o.payment_method"),
+            ("order_status", f"{_enum('order_status')} NOT NULL", "o.order_status"),
+            ("category_id", "INT", "p.category_id"),
+            ("category_name", "VARCHAR(50)", "c.category_name"),
+            ("brand", "VARCHAR(50)", "p.brand"),
+            ("line_count", "INT NOT NULL", "COUNT(*)"),
+            ("quantity", "BIGINT NOT NULL", "SUM(oi.quantity)"),
+            ("total_price", "DECIMAL(20, 2) NOT NULL", "SUM(oi.total_price)"),
+        ),
+        indexes=("KEY idx_rollup_item_sales_day (order_day)", "KEY idx_rollup_item_sales_category (category_id)"),
+        dimensions=MappingProxyType({
+            ("orders", "order_date"): "order_day",
+            ("orders", "payment_method"): "payment_method",
+            ("orders", "order_status"): "order_status",
+            ("products", "category_id"): "category_id",
+            ("categories", "category_id"): "category_id",
+            ("categories", "category_name"): "category_name",
+            ("products", "brand"): "brand",
+        }),
+        measures=MappingProxyType({
+            ("order_items", "quantity"): ("quantity", "line_count"),
+            ("order_items", "total_price"): ("total_price", "line_count"),
+        }),
+        row_count="line_count",
+        day_source=("orders", "order_date", "o.order_date"),
+        required=MappingProxyType({"categories": "category_id"}),
+    ),
+    RollupDefinition(
+        name="rollup_users",
+        fact="users",
+        fact_key="u.user_id",
+        source="users u",
+        tables=frozenset({"users"}),
+        columns=(
+            ("user_level", _enum("user_level"), "u.user_level"),
+            ("province", "VARCHAR(50)", "u.province"),
+            ("city", "VARCHAR(50)", "u.city"),
+            ("gender", _enum("gender"), "u.gender"),
+            ("user_count", "INT NOT NULL", "COUNT(*)"),
+            ("age", "BIGINT", "SUM(u.age)"),
+            ("age_count", "INT NOT NULL", "COUNT(u.age)"),
+        ),
+        indexes=("KEY idx_rollup_users_level (user_level)", "KEY idx_rollup_users_province (province)"),
+        dimensions=MappingProxyType({
+            ("users", "user_level"): "user_level",
+            ("users", "province"): "province",
+            ("users", "city"): "city",
+            ("users", "gender"): "gender",
+        }),
+        measures=MappingProxyType({
+            ("users", "age"): ("age", "age_count"),
+        }),
+        row_count="user_count",
+    ),
+)
+
+_ROLLUPS_BY_NAME = {rollup.name: rollup for rollup in ROLLUPS}
+
+
+@dataclass(frozen=True)
+class RollupRewrite:
+    """改写结果：读取汇总表的SQL、使用的汇总表和汇总表距上次刷新的秒数"""
+    sql: str
+    rollup: str
+    age: Optional[float] = None
+
+
+class _NoMatch(UnsupportedQuery):
+    """查询不能由该汇总表回答"""
+    pass
+
+
+class _Rewriter:
+    """把一个查询改写为读取指定汇总表的查询（以字符区间替换的方式保留原SQL的格式）"""
+
+    def __init__(self, query, rollup):
+        self.query = query
+        self.toks = query.toks
+        self.rollup = rollup
+        self.fact_key = (rollup.fact, query.schema[rollup.fact]["primary_key"])
+        self.edits = []
+        self.aggregated = False
+
+    def run(self):
+        query, toks = self.query, self.toks
+        for start, end, alias in query.select_items:
+            before = len(self.edits)
+            self._rewrite_range(start, end, "SELECT")
+            if alias is None and len(self.edits) > before:
+                # 保持结果列名不变：未命名的列引用以列名作为列名，其他表达式以原表达式文本作为列名
+                column = self._single_column(start, end, "SELECT")
+                if column is None:
+                    original = query.sql[toks[start].start:toks[end - 1].end]
+                elif self.rollup.dimensions[column] != column[1]:
+                    original = column[1]
+                else:
+                    continue
+                original = original.replace("`", "``")
+                self.edits.append((toks[end - 1].end, toks[end - 1].end, f" AS `{original}`"))
+
+        filters = [f"{column} IS NOT NULL" for table, column in self.rollup.required.items() if table in query.tables]
+        from_start, _, from_end = query.clauses["FROM"]
+        from_sql = f"FROM {self.rollup.name}"
+        if "WHERE" in query.clauses:
+            _, start, end = query.clauses["WHERE"]
+            self._rewrite_range(start, end, "WHERE")
+            if filters:
+                self.edits.append((toks[start].start, toks[start].start, "("))
+                self.edits.append((toks[end - 1].end, toks[end - 1].end, ") AND " + " AND ".join(filters)))
+        elif filters:
+            from_sql += " WHERE " + " AND ".join(filters)
+        self.edits.append((toks[from_start].start, toks[from_end - 1].end, from_sql))
+
+        for clause in ("GROUP", "HAVING", "ORDER"):
+            if clause in query.clauses:
+                _, start, end = query.clauses[clause]
+                self._rewrite_range(start, end, clause)
+
+        if not self.aggregated:
+            raise _NoMatch()
+        sql = query.sql
+        for start, end, text in sorted(self.edits, reverse=True):
+            sql = sql[:start] + text + sql[end:]
+        return sql
+
+    def _replace(self, start, end, text):
+        self.edits.append((self.toks[start].start, self.toks[end - 1].end, text))
+
+    def _rewrite_range(self, start, end, clause, in_aggregate=False):
+        i = start
+        while i < end:
+            token = self.toks[i]
+            nxt = self.query.at(i + 1)
+            if token.kind in ("ident", "keyword") and nxt is not None and nxt.is_op("("):
+                name = token.value.upper()
+                if name in _UNSUPPORTED_AGGREGATES:
+                    raise _NoMatch()
+                if name in _AGGREGATES:
+                    if in_aggregate:
+                        raise _NoMatch()
+                    close = self.query.close_paren(i + 1)
+                    self._aggregate(i, close, clause)
+                    i = close + 1
+                    continue
+                i += 1
+                continue
+            column = self.query.column_at(i, clause)
+            if column is None:
+                i += 1
+                continue
+            table, name, column_end = column
+            target = self.rollup.dimensions.get((table, name))
+            if target is None:
+                raise _NoMatch()
+            if self.rollup.day_source is not None and (table, name) == self.rollup.day_source[:2]:
+                self._check_day_context(i, column_end)
+            self._replace(i, column_end, target)
+            i = column_end
+
+    def _single_column(self, start, end, clause):
+        if start >= end:
+            return None
+        column = self.query.column_at(start, clause)
+        if column is None or column[2] != end:
+            return None
+        return column[:2]
+
+    def _aggregate(self, i, close, clause):
+        """聚合函数：行数和度量改为对汇总列求和，维度上的 MIN/MAX/COUNT(DISTINCT) 只改写参数
+
+        COUNT 改写为 COALESCE(SUM(...), 0)：没有匹配的行时 SUM 返回 NULL，而原查询的 COUNT 返回 0
+        """
+        self.aggregated = True
+        name = self.toks[i].value.upper()
+        start = i + 2
+        distinct = start < close and self.toks[start].is_keyword("DISTINCT")
+        if distinct:
+            start += 1
+        rollup = self.rollup
+
+        if name == "COUNT":
+            args = self.toks[start:close]
+            if not distinct and len(args) == 1 and (args[0].is_op("*") or args[0].kind == "number"):
+                self._replace(i, close + 1, f"COALESCE(SUM({rollup.row_count}), 0)")
+                return
+            column = self._single_column(start, close, clause)
+            if column == self.fact_key:
+                self._replace(i, close + 1, f"COALESCE(SUM({rollup.row_count}), 0)")
+                return
+            if not distinct and column in rollup.measures:
+                self._replace(i, close + 1, f"COALESCE(SUM({rollup.measures[column][1]}), 0)")
+                return
+            if not distinct:
+                raise _NoMatch()
+
+        if name in ("MIN", "MAX", "COUNT"):
+            # 维度值在汇总表中都存在，最值和去重计数不受汇总影响
+            self._rewrite_range(start, close, clause, in_aggregate=True)
+            return
+
+        column = self._single_column(start, close, clause)
+        if distinct or column not in rollup.measures:
+            raise _NoMatch()
+        sum_column, count_column = rollup.measures[column]
+        if name == "SUM":
+            self._replace(i, close + 1, f"SUM({sum_column})")
+        else:
+            self._replace(i, close + 1, f"(SUM({sum_column}) / SUM({count_column}))")
+
+    def _check_day_context(self, i, end):
+        """按天截断的时间列只能用于日期函数的参数，或与零点日期做 >= / < 比较"""
+        at = self.query.at
+        before, function, after = at(i - 1), at(i - 2), at(end)
+        if before is not None and before.is_op("(") and function is not None and \
+                function.kind in ("ident", "keyword") and function.value.upper() in _DAY_FUNCTIONS and \
+                after is not None and (after.is_op(")") or after.is_op(",")):
+            if function.value.upper() != "DATE_FORMAT":
+                return
+            fmt, close = at(end + 1), at(end + 2)
+            if fmt is not None and fmt.kind == "string" and _DAY_FORMAT.match(fmt.value) and \
+                    close is not None and close.is_op(")"):
+                return
+            raise _NoMatch()
+        if after is not None and after.kind == "op" and after.value in (">=", "<") and \
+                self._is_date_value(end + 1, after.depth):
+            return
+        raise _NoMatch()
+
+    def _is_date_value(self, start, depth):
+        """从start开始到本条件结束的表达式是否为日期（字符串日期、CURDATE()及按天以上单位的加减）"""
+        i = start
+        operand = []
+        while i < len(self.toks):
+            token = self.toks[i]
+            if token.depth < depth or (token.depth == depth and (
+                    token.is_keyword(*CLAUSE_ORDER, "AND", "OR", "XOR") or token.is_op(","))):
+                break
+            operand.append(token)
+            i += 1
+        if not operand:
+            return False
+        for index, token in enumerate(operand):
+            nxt = operand[index + 1] if index + 1 < len(operand) else None
+            if token.kind == "string":
+                if not _DATE_LITERAL.match(token.value):
+                    return False
+            elif token.kind == "ident":
+                if token.value.upper() not in _DATE_FUNCTIONS:
+                    return False
+            elif token.kind == "keyword":
+                if token.value != "INTERVAL" and token.value not in _DATE_UNITS:
+                    return False
+            elif token.kind == "op":
+                if token.value in ("+", "-"):
+                    if nxt is None or not nxt.is_keyword("INTERVAL"):
+                        return False
+                elif token.value not in ("(", ")", ","):
+                    return False
+            elif token.kind != "number":
+                return False
+        return True
+
+
+def rewrite_sql(sql, rollups, schema=None, relationships=None):
+    """尝试把查询改写为读取汇总表，不能改写时返回None
+
+    只改写结果与原查询完全一致的聚合查询：表和连接都在汇总表覆盖范围内，
+    过滤、分组、排序只用到汇总表的维度，聚合为行数或度量的 SUM/AVG/COUNT
+    """
+    schema = get_table_schema() if schema is None else schema
+    relationships = relationship_pairs(get_table_relationships() if relationships is None else relationships)
+    try:
+        query = SelectQuery(sql, schema, relationships)
+    except UnsupportedQuery:
+        return None
+    if query.has_star:
+        return None
+    for rollup in rollups:
+        if rollup.fact not in query.tables or not query.tables <= rollup.tables:
+            continue
+        try:
+            return RollupRewrite(_Rewriter(query, rollup).run(), rollup.name)
+        except UnsupportedQuery:
+            continue
+    return None
+
+@lru_cache(maxsize=REWRITE_CACHE_SIZE)
+def _cached_rewrite(sql, names):
+    return rewrite_sql(sql, [_ROLLUPS_BY_NAME[name] for name in names])
+
+
+class RollupManager:
+    """维护汇总表（建表、增量刷新、状态）并改写匹配的查询
+
+    按天的汇总表增量刷新：重新计算水位线之后新行涉及的日期和最近 recent_days 天（覆盖订单状态更新），
+    在一个事务中删除并重新写入这些日期的汇总行；没有日期维度的汇总表每次全量重建。
+    增量刷新看不到更早订单的更新和删除，因此每隔 full_refresh_interval 秒全量重建一次；
+    rollup_state 中没有记录（如重新生成数据后被清空）或事实表主键水位线回退时也全量重建。
+    只有刷新过、且距上次刷新不超过 max_staleness 秒的汇总表参与改写。
+    刷新前在数据库上获取命名锁（GET_LOCK），其他进程正在刷新时跳过，只从 rollup_state 同步刷新时间
+    """
+
+    def __init__(self, enabled=ROLLUP_ENABLED, refresh_interval=ROLLUP_REFRESH_INTERVAL,
+                 recent_days=ROLLUP_RECENT_DAYS, full_refresh_interval=ROLLUP_FULL_REFRESH_INTERVAL,
+                 max_staleness=ROLLUP_MAX_STALENESS, rollups=ROLLUPS):
+        self.enabled = enabled
+        self.refresh_interval = refresh_interval
+        self.recent_days = recent_days
+        self.full_refresh_interval = full_refresh_interval
+        self.max_staleness = max_staleness
+        self.rollups = {rollup.name: rollup for rollup in rollups}
+        self.states = {}
+        self.last_refresh = {}
+        # 各汇总表上次刷新和上次全量重建的时间（time.monotonic）
+        self.refreshed = {}
+        self.full_refreshed = {}
+        self.lock = threading.Lock()
+        # 进程内的刷新互斥；进程之间由数据库命名锁互斥
+        self.refresh_lock = threading.Lock()
+        self.tables_created = False
+        self._ready = ()
+        self._thread = None
+        self._stop = threading.Event()
+        # 汇总表的查询结果缓存按表版本失效
+        get_db().register_tables(list(self.rollups))
+
+    def rewrite(self, sql):
+        """改写为读取汇总表的查询，不能改写时返回None"""
+        ready = self._fresh()
+        if not self.enabled or not ready:
+            return None
+        result = _cached_rewrite(sql, ready)
+        if result is None:
+            return None
+        ROLLUP_REWRITES.inc(rollup=result.rollup)
+        return replace(result, age=self.age(result.rollup))
+
+    def _fresh(self):
+        """刷新过且未超过 max_staleness 的汇总表"""
+        ready = self._ready
+        if self.max_staleness <= 0 or not ready:
+            return ready
+        oldest = time.monotonic() - self.max_staleness
+        refreshed = self.refreshed
+        fresh = tuple(name for name in ready if refreshed[name] >= oldest)
+        return ready if len(fresh) == len(ready) else fresh
+
+    def _set_state(self, name, watermark, refreshed_at, age=0.0):
+        """age 为距上次刷新的秒数（从 rollup_state 加载时由数据库计算，避免时钟和时区差异）"""
+        with self.lock:
+            self.states[name] = {"watermark": watermark, "refreshed_at": refreshed_at}
+            self.refreshed[name] = time.monotonic() - age
+            self._ready = tuple(rollup for rollup in self.rollups if rollup in self.states)
+
+    def load_state(self):
+        """从 rollup_state 读取已刷新的汇总表（重启后不需要全量重建）"""
+        try:
+            with get_db().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT rollup_name, watermark, refreshed_at, "
+                                   "TIMESTAMPDIFF(SECOND, refreshed_at, NOW()) FROM rollup_state")
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+        except (Error, PoolTimeoutError) as e:
+            print(f"[INFO] 未读取到汇总表状态: {e}")
+            return False
+        for name, watermark, refreshed_at, age in rows:
+            if name in self.rollups:
+                self._set_state(name, watermark, refreshed_at, max(age or 0, 0))
+                # 上次全量重建的时间未持久化，从加载时开始计算全量重建间隔
+                self.full_refreshed.setdefault(name, time.monotonic())
+        return True
+
+    def refresh(self, names=None, full=False):
+        """刷新汇总表，返回 {汇总表: {"success":..., ...}}"""
+        names = list(self.rollups) if names is None else names
+        results = {}
+        with self.refresh_lock:
+            for name in names:
+                try:
+                    results[name] = self._refresh_one(self.rollups[name], full)
+                except (Error, PoolTimeoutError) as e:
+                    print(f"[ERROR] 汇总表 {name} 刷新失败: {e}")
+                    results[name] = {"success": False, "error": str(e)}
+                self.last_refresh[name] = results[name]
+        return results
+
+    def _refresh_one(self, rollup, full):
+        start = time.perf_counter()
+        db = get_db()
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if not self.tables_created:
+                    cursor.execute(STATE_TABLE_DDL)
+                    for definition in self.rollups.values():
+                        cursor.execute(definition.ddl)
+                    self.tables_created = True
+
+                cursor.execute("SELECT GET_LOCK(%s, 0)", (_REFRESH_LOCK_PREFIX + rollup.name,))
+                if cursor.fetchone()[0] != 1:
+                    return self._skip_locked(rollup, cursor, start)
+                try:
+                    watermark, reason, since, rows = self._refresh_locked(rollup, conn, cursor, full)
+                finally:
+                    cursor.execute("DO RELEASE_LOCK(%s)", (_REFRESH_LOCK_PREFIX + rollup.name,))
+            finally:
+                cursor.close()
+
+        self._set_state(rollup.name, watermark, datetime.now())
+        if since is None:
+            self.full_refreshed[rollup.name] = time.monotonic()
+        db.bump_tables([rollup.name])
+        result = {
+            "success": True,
+            "mode": "full" if since is None else "incremental",
+            "reason": reason,
+            "since": None if since is None else str(since),
+            "rows": rows,
+            "watermark": watermark,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+        print(f"[INFO] 汇总表 {rollup.name} 已刷新（{result['mode']}，{rows}行，{result['duration_ms']}毫秒）")
+        return result
+
+    def _skip_locked(self, rollup, cursor, start):
+        """其他进程正在刷新：不重复刷新，按 rollup_state 中的记录更新本进程的刷新时间"""
+        cursor.execute("SELECT watermark, refreshed_at, TIMESTAMPDIFF(SECOND, refreshed_at, NOW()) "
+                       "FROM rollup_state WHERE rollup_name = %s", (rollup.name,))
+        row = cursor.fetchone()
+        if row is not None:
+            self._set_state(rollup.name, row[0], row[1], max(row[2] or 0, 0))
+        print(f"[INFO] 汇总表 {rollup.name} 正在由其他进程刷新，跳过")
+        return {
+            "success": True,
+            "mode": "skipped",
+            "reason": "locked",
+            "watermark": None if row is None else row[0],
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def _refresh_locked(self, rollup, conn, cursor, full):
+        """持有命名锁时刷新一个汇总表，返回 (水位线, 全量重建原因, 增量起始日期, 写入行数)"""
+        # 先读取水位线：刷新期间新写入的行会在下次刷新时按其日期重新计算
+        cursor.execute(rollup.watermark_sql)
+        watermark = cursor.fetchone()[0]
+        # 以 rollup_state 中的记录为准（其他进程或重新生成数据时可能已清空）
+        cursor.execute("SELECT watermark FROM rollup_state WHERE rollup_name = %s", (rollup.name,))
+        row = cursor.fetchone()
+        reason = self._full_reason(rollup, row, watermark, full)
+        since = None
+        if reason is None:
+            cursor.execute(rollup.changed_since_sql, (self.recent_days, row[0]))
+            since = cursor.fetchone()[0]
+
+        # 删除和重新写入在同一个事务中，查询始终读到完整的汇总
+        conn.start_transaction()
+        try:
+            if since is None:
+                cursor.execute(f"DELETE FROM {rollup.name}")
+                cursor.execute(rollup.insert_sql())
+            else:
+                cursor.execute(f"DELETE FROM {rollup.name} WHERE {rollup.day_column} >= %s", (since,))
+                cursor.execute(rollup.insert_sql(since=True), (since,))
+            rows = cursor.rowcount
+            cursor.execute(_STATE_UPSERT, (rollup.name, watermark))
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        return watermark, reason, since, rows
+
+    def _full_reason(self, rollup, row, watermark, full):
+        """需要全量重建的原因，可以增量刷新时返回None；row 为 rollup_state 中的 (watermark,) 记录"""
+        if full:
+            return "requested"
+        if rollup.day_source is None:
+            return "no_day_column"
+        if row is None or row[0] is None:
+            return "no_state"
+        if watermark is None or watermark < row[0]:
+            # 事实表被清空或删除了最新的行，增量刷新会保留已不存在的数据
+            return "watermark_regressed"
+        last_full = self.full_refreshed.get(rollup.name)
+        if self.full_refresh_interval > 0 and (last_full is None
+                                               or time.monotonic() - last_full >= self.full_refresh_interval):
+            return "periodic"
+        return None
+
+    def _run(self):
+        self.load_state()
+        while not self._stop.is_set():
+            self.refresh()
+            if self._stop.wait(self.refresh_interval):
+                break
+
+    def start(self):
+        """在后台线程中加载状态并按间隔刷新；refresh_interval<=0 时只加载状态"""
+        if not self.enabled or self._thread is not None:
+            return
+        if self.refresh_interval <= 0:
+            self._thread = threading.Thread(target=self.load_state, name="rollup-refresh", daemon=True)
+        else:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rollup-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台刷新"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def age(self, name):
+        """汇总表距上次刷新的秒数（汇总表数据的滞后时间），没有刷新过时返回None"""
+        refreshed = self.refreshed.get(name)
+        return None if refreshed is None else round(time.monotonic() - refreshed, 3)
+
+    def ages(self):
+        """各汇总表距上次刷新的秒数"""
+        now = time.monotonic()
+        with self.lock:
+            return {name: now - refreshed for name, refreshed in self.refreshed.items()}
+
+    def stats(self):
+        """获取汇总表状态和改写统计"""
+        with self.lock:
+            states = dict(self.states)
+        fresh = self._fresh()
+        return {
+            "enabled": self.enabled,
+            "refresh_interval": self.refresh_interval,
+            "recent_days": self.recent_days,
+            "full_refresh_interval": self.full_refresh_interval,
+            "max_staleness": self.max_staleness,
+            "rollups": {
+                name: {
+                    "ready": name in states,
+                    "fresh": name in fresh,
+                    "watermark": states[name]["watermark"] if name in states else None,
+                    "refreshed_at": str(states[name]["refreshed_at"]) if name in states else None,
+                    "last_refresh": self.last_refresh.get(name),
+                    "rewrites": ROLLUP_REWRITES.value(rollup=name)
+                }
+                for name in self.rollups
+            }
+        }
+
+
+# 全局汇总表管理实例
+_rollup_manager = Lazy(RollupManager)
+
+def get_rollup_manager():
+    """获取汇总表管理实例"""
+    return _rollup_manager()
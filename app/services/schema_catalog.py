@@ -0,0 +1,449 @@
+import re
+import time
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from fnmatch import fnmatch
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from mysql.connector import Error
+
+from config import (
+    SCHEMA_CATALOG_ENABLED, SCHEMA_CATALOG_CHECK_INTERVAL, SCHEMA_CATALOG_REFRESH_INTERVAL, SCHEMA_CATALOG_EXCLUDE
+)
+from database.config import get_table_schema, get_field_mapping, get_table_relationships, get_enum_values
+from app.utils.database import get_db
+from app.utils.pool import PoolTimeoutError
+from app.services.prompt_template import metadata_fingerprint
+from app.utils.lazy import Lazy
+
+# 结构指纹：列、索引、外键定义的校验和，只要有DDL变化指纹就会改变（不读取具体定义，开销很小）
+_FINGERPRINT_SQL = """
+SELECT
+  (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION,
+          COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT))), 0))
+     FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+  (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX,
+          COLUMN_NAME, NON_UNIQUE))), 0))
+     FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE()),
+  (SELECT CONCAT(COUNT(*), ':', COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME,
+          REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0))
+     FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL)"""
+
+_TABLES_SQL = """
+SELECT TABLE_NAME, TABLE_ROWS, TABLE_COMMENT FROM information_schema.TABLES
+ WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'"""
+
+_COLUMNS_SQL = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT FROM information_schema.COLUMNS
+ WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION"""
+
+_INDEXES_SQL = """
+SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS
+ WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"""
+
+_FOREIGN_KEYS_SQL = """
+SELECT TABLE_NAME, CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+  FROM information_schema.KEY_COLUMN_USAGE
+ WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+ ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION"""
+
+# ENUM/SET 列类型中的取值：'a','b''c'
+_ENUM_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+
+
+def _text(value):
+    """information_schema 的部分列在某些版本的驱动中返回bytes"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8")
+    return value
+
+
+def parse_enum_literals(column_type):
+    """enum('Male','Female') -> ('Male', 'Female')，不是ENUM/SET时返回空元组"""
+    column_type = _text(column_type) or ""
+    if not column_type.lower().startswith(("enum(", "set(")):
+        return ()
+    return tuple(value.replace("''", "'") for value in _ENUM_LITERAL.findall(column_type))
+
+
+def display_type(column_type):
+    """提示词中展示的列类型：decimal(10,2) -> DECIMAL(10,2)，ENUM/SET的取值单独列出"""
+    column_type = _text(column_type) or ""
+    lowered = column_type.lower()
+    if lowered.startswith("enum("):
+        return "ENUM"
+    if lowered.startswith("set("):
+        return "SET"
+    return column_type.upper()
+
+
+@dataclass(frozen=True)
+class ColumnInfo:
+    """一列：column_type 为展示用的类型（静态配置中没有类型时为None）"""
+    name: str
+    label: Optional[str] = None
+    column_type: Optional[str] = None
+    nullable: bool = True
+    enum_values: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class IndexInfo:
+    name: str
+    columns: Tuple[str, ...]
+    unique: bool
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    columns: Tuple[str, ...]
+    referenced_table: str
+    referenced_columns: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class TableInfo:
+    """一张表的结构；row_count 为 information_schema 的估算行数（InnoDB不精确）"""
+    name: str
+    description: str
+    primary_key: Tuple[str, ...]
+    columns: Tuple[ColumnInfo, ...]
+    indexes: Tuple[IndexInfo, ...] = ()
+    foreign_keys: Tuple[ForeignKey, ...] = ()
+    row_count: Optional[int] = None
+
+    def to_dict(self):
+        return {
+            "description": self.description,
+            "primary_key": list(self.primary_key),
+            "columns": [
+                {"name": c.name, "label": c.label, "type": c.column_type, "nullable": c.nullable,
+                 "enum_values": list(c.enum_values)}
+                for c in self.columns
+            ],
+            "indexes": [{"name": i.name, "columns": list(i.columns), "unique": i.unique} for i in self.indexes],
+            "foreign_keys": [
+                {"columns": list(f.columns), "referenced_table": f.referenced_table,
+                 "referenced_columns": list(f.referenced_columns)}
+                for f in self.foreign_keys
+            ],
+            "row_count": self.row_count
+        }
+
+
+@dataclass(frozen=True)
+class SchemaSnapshot:
+    """某一时刻的数据库结构（不可变，整体替换）
+
+    tables 为结构化的表信息；table_schema、field_mapping、table_relationships、enum_values
+    是与 database/config.py 格式兼容的视图（只读，供提示词和SQL验证使用），读取时不再复制。
+    version 只取决于结构和中文名，估算行数变化不会改变版本号
+    """
+    tables: Mapping[str, TableInfo]
+    table_schema: dict
+    field_mapping: dict
+    table_relationships: dict
+    enum_values: dict
+    version: str
+    source: str  # information_schema / static
+    loaded_at: datetime
+    ddl_fingerprint: Optional[str] = None
+
+    def row_counts(self):
+        return {name: table.row_count for name, table in self.tables.items() if table.row_count is not None}
+
+    def database_info(self):
+        """/api/database-info 的内容"""
+        return {
+            "tables": self.table_schema,
+            "field_mapping": self.field_mapping,
+            "relationships": self.table_relationships,
+            "enum_values": self.enum_values,
+            "row_counts": self.row_counts(),
+            "schema_version": self.version,
+            "schema_source": self.source,
+            "schema_loaded_at": self.loaded_at.isoformat(timespec="seconds")
+        }
+
+
+def _make_snapshot(tables, table_schema, field_mapping, table_relationships, enum_values, source, ddl_fingerprint=None):
+    return SchemaSnapshot(
+        tables=MappingProxyType(tables),
+        table_schema=table_schema,
+        field_mapping=field_mapping,
+        table_relationships=table_relationships,
+        enum_values=enum_values,
+        version=metadata_fingerprint(table_schema, field_mapping, table_relationships, enum_values)[:16],
+        source=source,
+        loaded_at=datetime.now(),
+        ddl_fingerprint=ddl_fingerprint
+    )
+
+
+def static_snapshot():
+    """由 database/config.py 中手工维护的配置构建（数据库不可用时使用）"""
+    table_schema = get_table_schema()
+    field_mapping = get_field_mapping()
+    enum_values = get_enum_values()
+    tables = {
+        name: TableInfo(
+            name=name,
+            description=info['description'],
+            primary_key=(info['primary_key'],),
+            columns=tuple(ColumnInfo(column, field_mapping.get(column), enum_values=tuple(enum_values.get(column, ())))
+                          for column in info['columns'])
+        )
+        for name, info in table_schema.items()
+    }
+    return _make_snapshot(tables, table_schema, field_mapping, get_table_relationships(), enum_values, "static")
+
+
+def build_snapshot(table_rows, column_rows, index_rows, foreign_key_rows, exclude=(), ddl_fingerprint=None):
+    """由 information_schema 的查询结果构建快照
+
+    表描述和列的中文名优先使用 database/config.py 中的配置，没有配置时使用表/列注释；
+    已在配置中的表按配置顺序排列（提示词保持稳定），新增的表按名称排在后面
+    """
+    static_schema = get_table_schema()
+    static_mapping = get_field_mapping()
+
+    comments = {}
+    row_counts = {}
+    for table, rows, comment in table_rows:
+        table = _text(table)
+        if any(fnmatch(table, pattern) for pattern in exclude):
+            continue
+        comments[table] = _text(comment) or ""
+        row_counts[table] = None if rows is None else int(rows)
+    names = [t for t in static_schema if t in comments] + sorted(t for t in comments if t not in static_schema)
+
+    columns = {name: [] for name in names}
+    primary_keys = {name: [] for name in names}
+    for table, column, column_type, nullable, key, comment in column_rows:
+        table, column = _text(table), _text(column)
+        if table not in columns:
+            continue
+        label = static_mapping.get(column) or _text(comment) or None
+        columns[table].append(ColumnInfo(column, label, display_type(column_type), _text(nullable) == "YES",
+                                         parse_enum_literals(column_type)))
+
+    indexes = {name: {} for name in names}
+    for table, index, non_unique, column in index_rows:
+        table, index = _text(table), _text(index)
+        if table not in indexes:
+            continue
+        if index == "PRIMARY":
+            primary_keys[table].append(_text(column))
+            continue
+        index_columns, unique = indexes[table].get(index, ((), not int(non_unique)))
+        indexes[table][index] = (index_columns + (_text(column),), unique)
+
+    foreign_keys = {name: {} for name in names}
+    for table, constraint, column, referenced_table, referenced_column in foreign_key_rows:
+        table, referenced_table = _text(table), _text(referenced_table)
+        if table not in foreign_keys or referenced_table not in foreign_keys:
+            continue
+        own, referenced = foreign_keys[table].get(_text(constraint), ((), ()))
+        foreign_keys[table][_text(constraint)] = (own + (_text(column),), referenced_table,
+                                                 referenced + (_text(referenced_column),))
+
+    tables = {}
+    for name in names:
+        description = static_schema[name]['description'] if name in static_schema else comments[name]
+        tables[name] = TableInfo(
+            name=name,
+            description=description,
+            primary_key=tuple(primary_keys[name]),
+            columns=tuple(columns[name]),
+            indexes=tuple(IndexInfo(index, cols, unique) for index, (cols, unique) in indexes[name].items()),
+            foreign_keys=tuple(ForeignKey(own, referenced_table, referenced)
+                               for own, referenced_table, referenced in foreign_keys[name].values()),
+            row_count=row_counts[name]
+        )
+    return _make_snapshot(tables, *_compatible_views(tables), "information_schema", ddl_fingerprint)
+
+
+def _compatible_views(tables):
+    """结构化的表信息 -> database/config.py 格式的 table_schema、field_mapping、table_relationships、enum_values"""
+    table_schema = {}
+    field_mapping = {}
+    enum_values = {}
+    for name, table in tables.items():
+        table_schema[name] = {
+            'columns': [c.name for c in table.columns],
+            'description': table.description,
+            # 联合主键或没有主键时为None（不支持按主键翻页）
+            'primary_key': table.primary_key[0] if len(table.primary_key) == 1 else None,
+            'column_types': {c.name: c.column_type for c in table.columns},
+            'indexes': [{'name': i.name, 'columns': list(i.columns), 'unique': i.unique} for i in table.indexes]
+        }
+        for column in table.columns:
+            if column.label:
+                field_mapping.setdefault(column.name, column.label)
+            if column.enum_values:
+                enum_values.setdefault(column.name, list(column.enum_values))
+
+    # 外键两个方向都记录连接条件；自引用的外键使用被引用方向的写法（父.主键 = 子.外键）
+    table_relationships = {name: {} for name in tables}
+    for name, table in tables.items():
+        for fk in table.foreign_keys:
+            table_relationships[fk.referenced_table][name] = " AND ".join(
+                f"{fk.referenced_table}.{r} = {name}.{c}" for c, r in zip(fk.columns, fk.referenced_columns)
+            )
+    for name, table in tables.items():
+        for fk in table.foreign_keys:
+            table_relationships[name].setdefault(fk.referenced_table, " AND ".join(
+                f"{name}.{c} = {fk.referenced_table}.{r}" for c, r in zip(fk.columns, fk.referenced_columns)
+            ))
+    table_relationships = {name: relations for name, relations in table_relationships.items() if relations}
+    return table_schema, field_mapping, table_relationships, enum_values
+
+
+def read_fingerprint(cursor):
+    cursor.execute(_FINGERPRINT_SQL)
+    return "|".join(str(_text(value)) for value in cursor.fetchone())
+
+
+def load_snapshot(cursor, exclude=(), ddl_fingerprint=None):
+    """从 information_schema 读取当前数据库的结构"""
+    results = []
+    for sql in (_TABLES_SQL, _COLUMNS_SQL, _INDEXES_SQL, _FOREIGN_KEYS_SQL):
+        cursor.execute(sql)
+        results.append(cursor.fetchall())
+    return build_snapshot(*results, exclude=exclude, ddl_fingerprint=ddl_fingerprint)
+
+
+class SchemaCatalog:
+    """数据库结构目录：持有当前快照，在后台检查DDL变化并重新读取
+
+    启动前（或数据库不可用时）使用静态配置构建的快照；读取快照只是一次属性访问。
+    版本号变化时通知订阅者（如重新编译提示词模板），估算行数的变化不通知
+    """
+
+    def __init__(self, enabled=SCHEMA_CATALOG_ENABLED, check_interval=SCHEMA_CATALOG_CHECK_INTERVAL,
+                 refresh_interval=SCHEMA_CATALOG_REFRESH_INTERVAL, exclude=SCHEMA_CATALOG_EXCLUDE):
+        self.enabled = enabled
+        self.check_interval = check_interval
+        self.refresh_interval = refresh_interval
+        self.exclude = tuple(exclude)
+        self.snapshot = static_snapshot()
+        self.checks = 0
+        self.reloads = 0
+        self.last_error = None
+        self._loaded_at = None  # 上次从数据库读取的时间（time.monotonic）
+        self._listeners = []
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def subscribe(self, listener):
+        """注册版本变化的回调 listener(snapshot)"""
+        self._listeners.append(listener)
+
+    def publish(self, snapshot):
+        """替换当前快照，版本号变化时通知订阅者"""
+        previous, self.snapshot = self.snapshot, snapshot
+        if snapshot.version == previous.version:
+            return
+        print(f"[INFO] 数据库结构已更新（{snapshot.source}，版本 {snapshot.version}，{len(snapshot.tables)}张表）")
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"[ERROR] 数据库结构更新通知失败: {e}")
+
+    def refresh(self, full=False):
+        """检查结构指纹，有变化（或 full=True）时重新读取，返回 {"success":..., "reloaded":...}"""
+        start = time.perf_counter()
+        with self._refresh_lock:
+            try:
+                with get_db().connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        fingerprint = read_fingerprint(cursor)
+                        self.checks += 1
+                        if not full and fingerprint == self.snapshot.ddl_fingerprint:
+                            return {"success": True, "reloaded": False, "version": self.snapshot.version}
+                        snapshot = load_snapshot(cursor, self.exclude, fingerprint)
+                    finally:
+                        cursor.close()
+            except (Error, PoolTimeoutError) as e:
+                self.last_error = str(e)
+                print(f"[ERROR] 读取数据库结构失败，继续使用{self.snapshot.source}结构: {e}")
+                return {"success": False, "error": str(e)}
+            if not snapshot.tables:
+                self.last_error = "information_schema 中没有可用的表"
+                return {"success": False, "error": self.last_error}
+            self.reloads += 1
+            self.last_error = None
+            self._loaded_at = time.monotonic()
+            self.publish(snapshot)
+        return {
+            "success": True,
+            "reloaded": True,
+            "version": snapshot.version,
+            "tables": len(snapshot.tables),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3)
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            # 从未读取过，或距上次读取超过 refresh_interval 时完整重新读取，否则只比较指纹
+            full = self._loaded_at is None or (
+                self.refresh_interval > 0 and time.monotonic() - self._loaded_at >= self.refresh_interval
+            )
+            self.refresh(full=full)
+            if self._stop.wait(self.check_interval):
+                break
+
+    def start(self):
+        """在后台线程中读取结构，并按间隔检查DDL变化"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        if self.check_interval <= 0:
+            self._thread = threading.Thread(target=self.refresh, name="schema-catalog", daemon=True)
+        else:
+            self._thread = threading.Thread(target=self._run, name="schema-catalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台检查"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def age(self):
+        """当前快照读取至今的秒数"""
+        return (datetime.now() - self.snapshot.loaded_at).total_seconds()
+
+    def stats(self):
+        """获取结构目录状态"""
+        snapshot = self.snapshot
+        return {
+            "enabled": self.enabled,
+            "source": snapshot.source,
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at.isoformat(timespec="seconds"),
+            "age_seconds": round(self.age(), 3),
+            "ddl_fingerprint": snapshot.ddl_fingerprint,
+            "check_interval": self.check_interval,
+            "refresh_interval": self.refresh_interval,
+            "exclude": list(self.exclude),
+            "checks": self.checks,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "tables": {name: table.to_dict() for name, table in snapshot.tables.items()}
+        }
+
+
+# 全局结构目录实例
+_schema_catalog = Lazy(SchemaCatalog)
+
+def get_schema_catalog():
+    """获取数据库结构目录实例"""
+    return _schema_catalog()
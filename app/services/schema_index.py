@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from collections import defaultdict, deque
+
+# 各类词条的权重
+TABLE_NAME_WEIGHT = 3
+ALIAS_WEIGHT = 3
+COLUMN_WEIGHT = 2
+ENUM_WEIGHT = 2
+STEM_WEIGHT = 1
+
+# 表得分达到该值才会被选中
+MIN_TABLE_SCORE = 2
+
+def _normalize(text):
+    """统一全角/半角并忽略大小写"""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+def _is_ascii(term):
+    return all(ord(ch) < 128 for ch in term)
+
+
+class SchemaIndex:
+    """问题 -> 相关表的倒排索引
+
+    词条来自表名、列名、FIELD_MAPPING中文名、枚举值和表别名；
+    命中的表再沿 TABLE_RELATIONSHIPS 的连接路径补全，保证生成的SQL能够JOIN
+    """
+
+    def __init__(self, table_schema, field_mapping, table_relationships, enum_values, table_aliases=None):
+        self.tables = list(table_schema.keys())
+        self._index = defaultdict(lambda: defaultdict(int))
+        self._graph = defaultdict(set)
+
+        def add(term, tables, weight):
+            term = _normalize(term.strip())
+            if not term:
+                return
+            for table in tables:
+                self._index[term][table] = max(self._index[term][table], weight)
+
+        column_tables = defaultdict(set)
+        for table, info in table_schema.items():
+            add(table, [table], TABLE_NAME_WEIGHT)
+            for column in info['columns']:
+                column_tables[column].add(table)
+
+        for column, tables in column_tables.items():
+            # 所有表都有的列（如created_at）没有区分度
+            if len(tables) == len(self.tables):
+                continue
+            add(column, tables, COLUMN_WEIGHT)
+            label = field_mapping.get(column)
+            if label:
+                add(label, tables, COLUMN_WEIGHT)
+                if not _is_ascii(label) and len(label) > 2:
+                    # 中文名的前两个字作为弱匹配词干，如“库存数量” -> “库存”
+                    add(label[:2], tables, STEM_WEIGHT)
+            for value in enum_values.get(column, []):
+                add(value, tables, ENUM_WEIGHT)
+
+        for table, aliases in (table_aliases or {}).items():
+            if table in table_schema:
+                for alias in aliases:
+                    add(alias, [table], ALIAS_WEIGHT)
+
+        for table, relations in table_relationships.items():
+            for related_table in relations:
+                if related_table != table and related_table in table_schema:
+                    self._graph[table].add(related_table)
+                    self._graph[related_table].add(table)
+
+        # ASCII词条按单词边界匹配，中文词条按子串匹配；长词优先
+        terms = sorted(self._index.keys(), key=len, reverse=True)
+        self._ascii_terms = [
+            (term, re.compile(r"(?<![a-z0-9_])" + re.escape(term) + r"(?![a-z0-9_])"))
+            for term in terms if _is_ascii(term)
+        ]
+        self._cjk_terms = [term for term in terms if not _is_ascii(term)]
+
+    def score_tables(self, question):
+        """计算问题与每张表的相关度"""
+        text = _normalize(question)
+        scores = defaultdict(int)
+        matched = []
+        for term in self._cjk_terms:
+            if term in text:
+                matched.append(term)
+        for term, pattern in self._ascii_terms:
+            if pattern.search(text):
+                matched.append(term)
+        for term in matched:
+            for table, weight in self._index[term].items():
+                scores[table] += weight
+        return dict(scores)
+
+    def select_tables(self, question):
+        """选出回答问题所需的最小表集合
+
+        没有命中任何表时返回None，调用方应使用完整的schema
+        """
+        scores = self.score_tables(question)
+        selected = [t for t in self.tables if scores.get(t, 0) >= MIN_TABLE_SCORE]
+        if not selected:
+            return None
+        selected.sort(key=lambda t: -scores[t])
+        return self._join_closure(selected)
+
+    def _join_closure(self, tables):
+        """沿表关系把选中的表连通起来，加入路径上的中间表"""
+        result = [tables[0]]
+        for target in tables[1:]:
+            if target in result:
+                continue
+            path = self._shortest_path(result, target)
+            for table in path:
+                if table not in result:
+                    result.append(table)
+        # 保持与schema定义一致的顺序，相同的表集合生成相同的提示词
+        return tuple(t for t in self.tables if t in result)
+
+    def _shortest_path(self, sources, target):
+        """从已选表集合到目标表的最短连接路径（BFS）"""
+        previous = {source: None for source in sources}
+        queue = deque(sources)
+        while queue:
+            current = queue.popleft()
+            if current == target:
+                path = []
+                while current is not None:
+                    path.append(current)
+                    current = previous[current]
+                return path
+            for neighbor in self._graph[current]:
+                if neighbor not in previous:
+                    previous[neighbor] = current
+                    queue.append(neighbor)
+        # 不连通时只加入目标表本身
+        return [target]
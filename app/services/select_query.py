@@ -0,0 +1,194 @@
+from app.utils.sql_parser import parse_sql
+
+# 顶层子句及其必须出现的顺序
+CLAUSE_ORDER = ("FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT")
+
+# 出现这些关键字的查询不做结构分析（子查询、集合运算、窗口函数、锁定读等）
+UNSUPPORTED_KEYWORDS = frozenset("WITH UNION EXCEPT INTERSECT OVER WINDOW INTO FOR LOCK SELECT".split())
+
+# 不带括号使用的日期时间常量，不是列
+CONSTANTS = frozenset(
+    "CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP LOCALTIME LOCALTIMESTAMP UTC_DATE UTC_TIME UTC_TIMESTAMP".split()
+)
+
+
+class UnsupportedQuery(Exception):
+    """查询超出可以分析的SELECT子集"""
+    pass
+
+
+def relationship_pairs(relationships):
+    """表关系 -> {frozenset({(表, 列), (表, 列)})}"""
+    pairs = set()
+    for targets in relationships.values():
+        for condition in targets.values():
+            left, right = (side.strip().lower().split(".") for side in condition.split("="))
+            pairs.add(frozenset({tuple(left), tuple(right)}))
+    return pairs
+
+
+class SelectQuery:
+    """单条SELECT的结构：SELECT ... FROM 表 [INNER] JOIN 表 ON a.x = b.y ... [WHERE] [GROUP BY] [HAVING] [ORDER BY] [LIMIT]
+
+    汇总表改写和列式副本共用；超出该子集（子查询、外连接、与表关系不一致的连接条件等）时抛出 UnsupportedQuery。
+    toks 为去掉空白和注释的词法单元，clauses 为 子句 -> (关键字位置, 内容起始位置, 结束位置)，
+    joins 为按出现顺序的连接条件 ((表, 列), (表, 列))
+    """
+
+    def __init__(self, sql, schema, relationships):
+        parsed = parse_sql(sql)
+        if parsed.error or parsed.statement_type != "SELECT" or parsed.statement_count != 1:
+            raise UnsupportedQuery()
+        if any(t.kind == "hint" for t in parsed.tokens):
+            raise UnsupportedQuery()
+        toks = [t for t in parsed.tokens if t.kind not in ("ws", "comment")]
+        while toks and toks[-1].is_op(";"):
+            toks.pop()
+        if not toks or not toks[0].is_keyword("SELECT") or \
+                any(t.kind == "keyword" and t.value in UNSUPPORTED_KEYWORDS for t in toks[1:]):
+            raise UnsupportedQuery()
+        self.sql = sql
+        self.toks = toks
+        self.schema = schema
+
+        starts = [(t.value, i) for i, t in enumerate(toks) if t.depth == 0 and t.is_keyword(*CLAUSE_ORDER)]
+        names = [name for name, _ in starts]
+        if not names or names[0] != "FROM" or names != sorted(set(names), key=CLAUSE_ORDER.index):
+            raise UnsupportedQuery()
+        self.clauses = {}
+        for index, (name, i) in enumerate(starts):
+            end = starts[index + 1][1] if index + 1 < len(starts) else len(toks)
+            content = i + 1
+            if name in ("GROUP", "ORDER"):
+                if content >= end or not toks[content].is_keyword("BY"):
+                    raise UnsupportedQuery()
+                content += 1
+            self.clauses[name] = (i, content, end)
+
+        self.refs = {}
+        self.tables = set()
+        self.table_order = []
+        self.joins = []
+        self._read_from(relationships)
+        self.output_aliases = set()
+        self.distinct = toks[1].is_keyword("DISTINCT") if len(toks) > 1 else False
+        self.select_items = self._read_select()
+
+    def at(self, i):
+        return self.toks[i] if 0 <= i < len(self.toks) else None
+
+    def close_paren(self, i):
+        """i 指向 '('，返回匹配的 ')' 的位置"""
+        depth = self.toks[i].depth
+        i += 1
+        while not (self.toks[i].is_op(")") and self.toks[i].depth == depth):
+            i += 1
+        return i
+
+    def is_star(self, start, end):
+        """SELECT项是否为 * 或 表.*"""
+        item = self.toks[start:end]
+        return bool(item) and item[-1].is_op("*") and (len(item) == 1 or (len(item) == 3 and item[1].is_op(".")))
+
+    @property
+    def has_star(self):
+        return any(self.is_star(start, end) for start, end, _ in self.select_items)
+
+    def _read_table(self, i):
+        token = self.at(i)
+        if token is None or token.kind != "ident" or (self.at(i + 1) is not None and self.at(i + 1).is_op(".")):
+            raise UnsupportedQuery()
+        table = token.value.lower()
+        if table not in self.schema or table in self.tables:
+            raise UnsupportedQuery()
+        self.tables.add(table)
+        self.table_order.append(table)
+        self.refs[table] = table
+        i += 1
+        if self.at(i) is not None and self.at(i).is_keyword("AS"):
+            i += 1
+            if self.at(i) is None or self.at(i).kind != "ident":
+                raise UnsupportedQuery()
+        if self.at(i) is not None and self.at(i).kind == "ident":
+            self.refs[self.at(i).value.lower()] = table
+            i += 1
+        return table, i
+
+    def _read_from(self, relationships):
+        """只接受内连接，且连接条件与表关系定义一致"""
+        _, i, end = self.clauses["FROM"]
+        _, i = self._read_table(i)
+        while i < end:
+            if self.at(i).is_keyword("INNER"):
+                i += 1
+            if not self.at(i).is_keyword("JOIN"):
+                raise UnsupportedQuery()
+            table, i = self._read_table(i + 1)
+            condition = self.toks[i:i + 8]
+            if len(condition) < 8 or not condition[0].is_keyword("ON") or not condition[4].is_op("=") or \
+                    not (condition[2].is_op(".") and condition[6].is_op(".")) or \
+                    any(condition[k].kind != "ident" for k in (1, 3, 5, 7)):
+                raise UnsupportedQuery()
+            left = (self.refs.get(condition[1].value.lower()), condition[3].value.lower())
+            right = (self.refs.get(condition[5].value.lower()), condition[7].value.lower())
+            if table not in (left[0], right[0]) or frozenset({left, right}) not in relationships:
+                raise UnsupportedQuery()
+            self.joins.append((left, right))
+            i += 8
+            if i > end:
+                raise UnsupportedQuery()
+
+    def _read_select(self):
+        """SELECT列表：[(表达式起始, 表达式结束, 输出别名)]"""
+        start, end = 1, self.clauses["FROM"][0]
+        if self.at(start) is not None and self.at(start).is_keyword("DISTINCT", "ALL"):
+            start += 1
+        items = []
+        item_start = start
+        for i in range(start, end + 1):
+            if i < end and not (self.toks[i].is_op(",") and self.toks[i].depth == 0):
+                continue
+            item = self.toks[item_start:i]
+            if not item:
+                raise UnsupportedQuery()
+            alias = None
+            if len(item) >= 2 and item[-1].kind in ("ident", "string", "keyword") and item[-2].is_keyword("AS"):
+                alias = item[-1].text if item[-1].kind == "keyword" else item[-1].value
+                expr_end = i - 2
+            elif len(item) >= 2 and item[-1].kind in ("ident", "string") and not item[-2].is_op(".") and \
+                    not (item[-2].kind == "op" and item[-2].value != ")"):
+                alias, expr_end = item[-1].value, i - 1
+            else:
+                expr_end = i
+            if alias is not None:
+                self.output_aliases.add(str(alias).lower())
+            items.append((item_start, expr_end, alias))
+            item_start = i + 1
+        return items
+
+    def column_at(self, i, clause):
+        """i 处为列引用时返回 (表, 列, 结束位置)；函数名、常量、输出别名返回None；无法确定所属表时抛出 UnsupportedQuery"""
+        token = self.toks[i]
+        if token.kind != "ident":
+            return None
+        nxt = self.at(i + 1)
+        if nxt is not None and nxt.is_op("("):
+            return None
+        if nxt is not None and nxt.is_op("."):
+            target = self.at(i + 2)
+            table = self.refs.get(token.value.lower())
+            if target is None or target.kind != "ident" or table is None:
+                raise UnsupportedQuery()
+            column = target.value.lower()
+            if column not in self.schema[table]["columns"]:
+                raise UnsupportedQuery()
+            return table, column, i + 3
+        if token.value.upper() in CONSTANTS:
+            return None
+        column = token.value.lower()
+        if clause in ("GROUP", "HAVING", "ORDER") and column in self.output_aliases:
+            return None
+        owners = [table for table in self.tables if column in self.schema[table]["columns"]]
+        if len(owners) != 1:
+            raise UnsupportedQuery()
+        return owners[0], column, i + 1
@@ -0,0 +1,129 @@
+import time
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app.utils.metrics import SPECULATION_RACES, SPECULATION_SAVED_SECONDS
+
+
+@dataclass
+class RaceOutcome:
+    """一次推测执行的结果
+
+    winner 为第一个被接受的候选编号，没有候选被接受时为None；
+    finished 记录在结束前完成的候选：编号 -> (耗时秒, 是否被接受, 结果或异常)
+    """
+    winner: Optional[int] = None
+    result: Any = None
+    elapsed: float = 0.0
+    finished: Dict[int, tuple] = field(default_factory=dict)
+    cancelled: int = 0
+
+
+async def _timed(index, factory):
+    start = time.perf_counter()
+    try:
+        result = await factory()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        result = e
+    return index, result, time.perf_counter() - start
+
+async def first_accepted(factories, accept):
+    """并发运行各候选，按完成顺序检查，返回第一个被 accept 接受的结果，其余候选立即取消
+
+    factories 为无参数的异步函数列表；候选抛出的异常作为结果交给 accept 判断
+    """
+    tasks = [asyncio.ensure_future(_timed(index, factory)) for index, factory in enumerate(factories)]
+    outcome = RaceOutcome()
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, result, elapsed = await next_done
+            accepted = not isinstance(result, Exception) and accept(result)
+            outcome.finished[index] = (elapsed, accepted, result)
+            if accepted:
+                outcome.winner, outcome.result, outcome.elapsed = index, result, elapsed
+                break
+    finally:
+        # 已有结果或调用方被取消时，取消仍在等待的候选
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                outcome.cancelled += 1
+    return outcome
+
+
+class SpeculationStats:
+    """推测执行统计：各候选的胜出次数、首选候选失败次数和节省的延迟"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.races = 0
+            self.wins = {}
+            self.no_valid = 0
+            self.primary_failures = 0
+            self.cancelled = 0
+            self.latency_saved = 0.0
+            self.winner_latency = 0.0
+            self.primary_latency = 0.0
+            self.primary_samples = 0
+
+    def record(self, outcome):
+        """记录一次推测执行
+
+        节省的延迟为估算值：首选候选（编号0）无效时，节省了一次重新生成的往返（按首选候选的耗时计）；
+        其他候选先于首选候选返回时，节省的是首选候选的平均耗时与胜出耗时之差。
+        同时计入 /metrics：按胜出候选计数，有胜出候选时记录本次节省的延迟（首选候选胜出时为0）
+        """
+        saved = self._record(outcome)
+        SPECULATION_RACES.inc(winner="none" if outcome.winner is None else str(outcome.winner))
+        if saved is not None:
+            SPECULATION_SAVED_SECONDS.observe(saved)
+
+    def _record(self, outcome):
+        """更新统计，返回本次节省的延迟（秒），没有胜出候选时返回None"""
+        with self.lock:
+            self.races += 1
+            self.cancelled += outcome.cancelled
+            primary = outcome.finished.get(0)
+            if primary is not None:
+                self.primary_latency += primary[0]
+                self.primary_samples += 1
+                if not primary[1]:
+                    self.primary_failures += 1
+            if outcome.winner is None:
+                self.no_valid += 1
+                return None
+            self.wins[outcome.winner] = self.wins.get(outcome.winner, 0) + 1
+            self.winner_latency += outcome.elapsed
+            saved = 0.0
+            if outcome.winner == 0:
+                return saved
+            if primary is not None:
+                saved = primary[0]
+            elif self.primary_samples:
+                saved = max(self.primary_latency / self.primary_samples - outcome.elapsed, 0.0)
+            self.latency_saved += saved
+            return saved
+
+    def stats(self):
+        with self.lock:
+            won = self.races - self.no_valid
+            return {
+                "races": self.races,
+                "wins": {str(index): count for index, count in sorted(self.wins.items())},
+                "speculative_win_rate": (won - self.wins.get(0, 0)) / self.races if self.races else 0.0,
+                "no_valid": self.no_valid,
+                "primary_failures": self.primary_failures,
+                "cancelled": self.cancelled,
+                "avg_winner_latency_ms": round(self.winner_latency / won * 1000, 2) if won else 0.0,
+                "avg_primary_latency_ms": round(self.primary_latency / self.primary_samples * 1000, 2)
+                if self.primary_samples else 0.0,
+                "latency_saved_ms": round(self.latency_saved * 1000, 2)
+            }
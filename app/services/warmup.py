@@ -0,0 +1,136 @@
+import time
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+from config import WARMUP_RETRY_INTERVAL, WARMUP_QUERIES_ENABLED
+from app.utils.database import get_db
+from app.services.schema_catalog import get_schema_catalog
+from app.services.nl2sql_service import get_nl2sql_service
+
+
+@dataclass(frozen=True)
+class WarmupStep:
+    """预热步骤：fn 为同步函数（在线程池中执行）或协程函数，返回值作为步骤详情
+
+    required 的步骤失败后按间隔重试，全部成功后服务才就绪；after 中的步骤都成功后才开始执行
+    """
+    name: str
+    fn: Callable
+    required: bool = True
+    after: Tuple[str, ...] = ()
+
+
+class Warmup:
+    """启动预热：相互独立的步骤并行执行，不阻塞服务启动，通过 ready 判断是否可以接收流量"""
+
+    def __init__(self, steps, retry_interval=WARMUP_RETRY_INTERVAL):
+        self.steps = {step.name: step for step in steps}
+        self.retry_interval = retry_interval
+        self.results = {}
+        self.duration = None
+        self._done = {}
+        self._task = None
+
+    @property
+    def ready(self):
+        """所有必需步骤都已成功"""
+        return all(self.results.get(name, {}).get("success") for name, step in self.steps.items() if step.required)
+
+    async def run(self):
+        """执行全部步骤，必需步骤失败时重试直到成功（或被取消）"""
+        start = time.perf_counter()
+        self._done = {name: asyncio.Event() for name in self.steps}
+        await asyncio.gather(*[self._run_step(step) for step in self.steps.values()])
+        self.duration = time.perf_counter() - start
+        print(f"[SUCCESS] 预热完成（{round(self.duration * 1000, 1)}毫秒）")
+
+    async def _run_step(self, step):
+        try:
+            for name in step.after:
+                await self._done[name].wait()
+                if not self.results[name]["success"]:
+                    self.results[step.name] = {"success": False, "skipped": True, "error": f"步骤 {name} 未成功"}
+                    return
+            attempts = 0
+            while True:
+                attempts += 1
+                result = await self._attempt(step)
+                result["attempts"] = attempts
+                self.results[step.name] = result
+                if result["success"] or not step.required or self.retry_interval <= 0:
+                    return
+                await asyncio.sleep(self.retry_interval)
+        finally:
+            self._done[step.name].set()
+
+    async def _attempt(self, step):
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(step.fn):
+                detail = await step.fn()
+            else:
+                detail = await asyncio.get_running_loop().run_in_executor(None, step.fn)
+        except Exception as e:
+            print(f"[ERROR] 预热步骤 {step.name} 失败: {e}")
+            return {"success": False, "error": str(e), "duration_ms": round((time.perf_counter() - start) * 1000, 3)}
+        return {"success": True, "detail": detail, "duration_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    def start(self):
+        """在后台任务中执行预热（需要在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """取消尚未完成的预热"""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def status(self):
+        """/ready 的内容"""
+        return {
+            "ready": self.ready,
+            "finished": self.duration is not None,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "steps": {name: self.results.get(name, {"success": False, "pending": True}) for name in self.steps}
+        }
+
+
+def warm_database():
+    """建立连接池的最小连接数（数据库不可用时抛出异常）"""
+    return {"connections": get_db().pool.warm()}
+
+
+def warm_prompts(questions):
+    """读取数据库结构，创建模型客户端，编译完整模板和示例问题用到的裁剪后模板"""
+    def run():
+        catalog = get_schema_catalog()
+        schema = catalog.refresh() if catalog.enabled else None
+        nl2sql = get_nl2sql_service()
+        return {
+            "schema_source": catalog.snapshot.source,
+            "schema_error": schema["error"] if schema and not schema["success"] else None,
+            "prompt_version": nl2sql.prompt_version,
+            "templates": nl2sql.warm_templates(questions)
+        }
+    return run
+
+
+def create_warmup(questions, warm_queries=None):
+    """默认的预热步骤：连接池和提示词并行，都成功后执行示例查询预热各级缓存
+
+    warm_queries 为协程函数，WARMUP_QUERIES_ENABLED=false 或未提供时不执行示例查询
+    """
+    steps = [
+        WarmupStep("database", warm_database),
+        WarmupStep("prompts", warm_prompts(questions)),
+    ]
+    if warm_queries is not None and WARMUP_QUERIES_ENABLED:
+        async def warm_caches():
+            return await warm_queries(questions)
+        steps.append(WarmupStep("caches", warm_caches, required=False, after=("database", "prompts")))
+    return Warmup(steps)
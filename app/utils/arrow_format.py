@@ -0,0 +1,175 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+from mysql.connector import FieldType, FieldFlag
+
+# pyarrow 是可选依赖，未安装时不提供 arrow/parquet 格式
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    ARROW_AVAILABLE = False
+
+ARROW_FORMATS = ("arrow", "parquet")
+
+# Accept 头 -> 格式
+ARROW_MEDIA_TYPES = {
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+# 结果中没有非空值时DECIMAL列使用的小数位数
+DEFAULT_DECIMAL_SCALE = 6
+DECIMAL_PRECISION = 38
+
+# MySQL二进制字符集编号（BLOB/VARBINARY列）
+BINARY_CHARSET = 63
+
+_INTEGER_TYPES = (FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG,
+                  FieldType.LONGLONG, FieldType.YEAR, FieldType.BIT)
+_BLOB_TYPES = (FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB, FieldType.LONG_BLOB, FieldType.BLOB,
+               FieldType.VAR_STRING, FieldType.STRING, FieldType.VARCHAR)
+
+def negotiate_format(accept):
+    """根据 Accept 头选择二进制格式，未安装pyarrow或没有匹配时返回None"""
+    if not ARROW_AVAILABLE or not accept:
+        return None
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in ARROW_MEDIA_TYPES:
+            return ARROW_MEDIA_TYPES[media_type]
+    return None
+
+def _decimal_scale(values):
+    """从DECIMAL值推断小数位数（MySQL同一列的值小数位数相同）"""
+    scales = [-value.as_tuple().exponent for value in values if value is not None]
+    if not scales:
+        return DEFAULT_DECIMAL_SCALE
+    return min(max(max(scales), 0), DECIMAL_PRECISION)
+
+def _arrow_type(column, values):
+    """MySQL列类型 -> Arrow类型"""
+    type_code, flags, charset = column[1], column[7] or 0, column[8]
+    if type_code in _INTEGER_TYPES:
+        if type_code == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED:
+            return pa.uint64()
+        return pa.int64()
+    if type_code == FieldType.FLOAT:
+        return pa.float32()
+    if type_code == FieldType.DOUBLE:
+        return pa.float64()
+    if type_code in (FieldType.DECIMAL, FieldType.NEWDECIMAL):
+        return pa.decimal128(DECIMAL_PRECISION, _decimal_scale(values))
+    if type_code in (FieldType.DATETIME, FieldType.TIMESTAMP):
+        return pa.timestamp("us")
+    if type_code in (FieldType.DATE, FieldType.NEWDATE):
+        return pa.date32()
+    if type_code == FieldType.TIME:
+        return pa.duration("us")
+    if type_code == FieldType.NULL:
+        return pa.null()
+    if type_code in _BLOB_TYPES and charset == BINARY_CHARSET:
+        return pa.binary()
+    return pa.string()
+
+def _to_text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, (set, frozenset)):
+        return ",".join(sorted(value))
+    return value if isinstance(value, str) else str(value)
+
+def _column_array(values, arrow_type):
+    """把一列Python值转换为Arrow数组"""
+    if pa.types.is_string(arrow_type):
+        values = [None if value is None else _to_text(value) for value in values]
+    try:
+        return pa.array(values, type=arrow_type)
+    except pa.ArrowInvalid:
+        if not pa.types.is_decimal(arrow_type):
+            raise
+        # 小数位数超过推断值（如不同精度的计算列），按列的小数位数舍入
+        quantum = Decimal(1).scaleb(-arrow_type.scale)
+        values = [None if value is None else value.quantize(quantum, rounding=ROUND_HALF_EVEN) for value in values]
+        return pa.array(values, type=arrow_type)
+
+
+class _ChunkSink:
+    """收集写入的字节，每写完一批就取出发送"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+class ArrowEncoder:
+    """把数据库游标的分块结果编码为 Arrow IPC 流或 Parquet
+
+    每一块元组行转换为一个 RecordBatch（Parquet 中为一个 row group）后立即写出；
+    Arrow 类型由 cursor.description 决定，DECIMAL 的小数位数从第一块数据推断
+    """
+
+    def __init__(self, description, fmt="arrow"):
+        if not ARROW_AVAILABLE:
+            raise RuntimeError("未安装pyarrow，无法使用arrow/parquet格式")
+        if fmt not in ARROW_FORMATS:
+            raise ValueError(f"不支持的格式: {fmt}")
+        self.description = description
+        self.format = fmt
+        self.schema = None
+        self._sink = _ChunkSink()
+        self._writer = None
+
+    def _open(self, columns):
+        self.schema = pa.schema([
+            pa.field(column[0], _arrow_type(column, values))
+            for column, values in zip(self.description, columns)
+        ])
+        if self.format == "parquet":
+            self._writer = pq.ParquetWriter(self._sink, self.schema)
+        else:
+            self._writer = pa.ipc.new_stream(self._sink, self.schema)
+
+    def encode(self, rows):
+        """编码一块元组行，返回可以立即发送的字节"""
+        if not rows:
+            return b""
+        columns = list(zip(*rows))
+        if self._writer is None:
+            self._open(columns)
+        arrays = [
+            _column_array(list(values), field.type)
+            for values, field in zip(columns, self.schema)
+        ]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._sink.drain()
+
+    def finish(self):
+        """结束编码，返回剩余的字节（Arrow流结束标记或Parquet文件尾）"""
+        if self._writer is None:
+            self._open([[] for _ in self.description])
+        self._writer.close()
+        return self._sink.drain()
@@ -0,0 +1,25 @@
+import asyncio
+
+
+class ClientDisconnected(Exception):
+    """客户端在请求处理完成前断开了连接"""
+
+
+async def run_until_disconnected(request, coro, poll_interval=0.2):
+    """执行协程，同时检测客户端是否断开；断开时取消协程并抛出 ClientDisconnected"""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
@@ -1,24 +1,87 @@
 import mysql.connector
 from mysql.connector import Error
-import sys
-import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
-# 添加database目录到Python路径
-sys.path.append(os.path.join(os.path.dirname(__file__), '../../database'))
+from contextlib import contextmanager
+from database.config import get_database_config, get_pool_config, get_result_cache_config, get_table_schema
+from app.utils.pool import ConnectionPool, PoolTimeoutError
+from app.utils.result_cache import ResultCache, normalize_sql, extract_tables, is_cacheable, UNSETTLED
+from app.utils.singleflight import SingleFlight
+from app.utils.serializer import QueryResult
+from app.utils.sql_parser import parse_sql
+from app.utils.timing import stage, record_stage
+from app.utils.metrics import DB_POOL_WAIT_SECONDS
+from app.utils.lazy import Lazy
 
-from config import get_database_config
+# 流式读取结束标记
+_STREAM_END = object()
+
+# MySQL的 MAX_EXECUTION_TIME 超时错误码（ER_QUERY_TIMEOUT）
+ER_QUERY_TIMEOUT = 3024
+
+class QueryTimeoutError(Exception):
+    """查询超过执行时间上限被中止"""
+    pass
+
+# 写操作语句类型，执行后需要使相关表的缓存失效
+WRITE_STATEMENTS = frozenset(['INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'TRUNCATE', 'ALTER', 'DROP', 'CREATE', 'LOAD'])
 
 class DatabaseManager:
     def __init__(self):
         self.config = get_database_config()
-        self.connection = None
-        self.cursor = None
+        
+        # 连接池：每个请求借出独立的连接和游标，用完归还
+        pool_config = get_pool_config()
+        self.pool = ConnectionPool(
+            self._new_connection,
+            min_size=pool_config['min_size'],
+            max_size=pool_config['max_size'],
+            max_lifetime=pool_config['max_lifetime'],
+            idle_check_interval=pool_config['idle_check_interval'],
+            checkout_timeout=pool_config['checkout_timeout']
+        )
+        
+        # 有界线程池：阻塞的mysql.connector调用在这里执行，不占用事件循环
+        self.executor = ThreadPoolExecutor(
+            max_workers=pool_config['executor_workers'],
+            thread_name_prefix="db"
+        )
+        
+        # 合并相同SQL的并发查询
+        self.inflight = SingleFlight()
+        
+        # 查询结果缓存
+        cache_config = get_result_cache_config()
+        self.known_tables = list(get_table_schema().keys())
+        self.result_cache = None
+        if cache_config['enabled']:
+            self.result_cache = ResultCache(
+                max_bytes=cache_config['max_bytes'],
+                max_entry_bytes=cache_config['max_entry_bytes'],
+                ttl=cache_config['ttl'],
+                check_interval=cache_config['check_interval']
+            )
+    
+    def _new_connection(self):
+        """建立新连接；关闭information_schema统计缓存，使表版本水位线中的UPDATE_TIME是实时的（MySQL 8.0+）"""
+        conn = mysql.connector.connect(**self.config)
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Error:
+            pass
+        finally:
+            cursor.close()
+        return conn
     
     def connect(self):
-        """连接到数据库"""
+        """预先建立连接池中的最小连接数"""
         try:
-            self.connection = mysql.connector.connect(**self.config)
-            self.cursor = self.connection.cursor(dictionary=True)
+            self.pool.warm()
             print("[SUCCESS] 数据库连接成功")
             return True
         except Error as e:
@@ -26,30 +89,292 @@ class DatabaseManager:
             return False
     
     def disconnect(self):
-        """断开数据库连接"""
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+        """关闭连接池中的所有空闲连接"""
+        self.pool.close_all()
         print("[INFO] 数据库连接已断开")
     
-    def execute_query(self, query, params=None):
-        """执行查询语句"""
-        if not self.connection or not self.connection.is_connected():
-            if not self.connect():
+    @contextmanager
+    def connection(self, timeout=None):
+        """从连接池借出连接，退出时自动归还
+
+        借出失败时抛出 mysql.connector.Error 或 PoolTimeoutError
+        """
+        start = time.perf_counter()
+        with self.pool.connection(timeout) as conn:
+            waited = time.perf_counter() - start
+            DB_POOL_WAIT_SECONDS.observe(waited)
+            record_stage("db_pool_wait", waited)
+            yield conn
+    
+    def pool_stats(self):
+        """获取连接池统计信息"""
+        return self.pool.stats()
+    
+    def execute_query(self, query, params=None, use_cache=True, connection=None):
+        """执行查询语句，SELECT返回字典行列表，其余语句返回影响的行数
+
+        传入 connection 时使用调用方借出的连接，否则临时从连接池借出
+        """
+        statement_type = parse_sql(query).statement_type
+        if statement_type == 'SELECT':
+            result = self.fetch_result(query, params, use_cache, connection)
+            return None if result is None else result.as_dicts()
+        
+        if connection is None:
+            try:
+                with self.connection() as conn:
+                    return self.execute_query(query, params, use_cache, conn)
+            except (Error, PoolTimeoutError) as e:
+                print(f"[ERROR] 数据库连接失败: {e}")
                 return None
         
         try:
-            self.cursor.execute(query, params)
-            if query.strip().upper().startswith('SELECT'):
-                result = self.cursor.fetchall()
-                return result
-            else:
-                self.connection.commit()
-                return self.cursor.rowcount
+            cursor = connection.cursor()
+            try:
+                cursor.execute(query, params)
+                connection.commit()
+                if self.result_cache is not None and statement_type in WRITE_STATEMENTS:
+                    self.result_cache.bump(extract_tables(query, self.known_tables))
+                return cursor.rowcount
+            finally:
+                cursor.close()
+        except Error as e:
+            print(f"[ERROR] 查询执行失败: {e}")
+            return None
+    
+    def fetch_result(self, query, params=None, use_cache=True, connection=None):
+        """执行SELECT，返回 QueryResult（列信息 + 元组行），失败时返回None
+
+        不使用字典游标，由序列化层按列类型统一转换
+        """
+        if connection is None:
+            try:
+                with self.connection() as conn:
+                    return self.fetch_result(query, params, use_cache, conn)
+            except (Error, PoolTimeoutError) as e:
+                print(f"[ERROR] 数据库连接失败: {e}")
+                return None
+        
+        cache = self.result_cache if use_cache else None
+        fetch_watermarks = lambda tables: self._fetch_watermarks(connection, tables)
+        tables = extract_tables(query, self.known_tables) if cache is not None else ()
+        if cache is not None and not is_cacheable(query, tables):
+            cache = None
+        
+        if cache is not None:
+            with stage("result_cache"):
+                cache_key = self._cache_key(query, params)
+                cached = cache.get(cache_key, fetch_watermarks)
+                if cached is not None:
+                    return cached
+                # 在执行前读取表版本，执行期间发生的写入会让该条目在下次读取时失效
+                versions = cache.current_versions(tables, fetch_watermarks)
+        
+        try:
+            cursor = connection.cursor()
+            try:
+                with stage("db_query"):
+                    cursor.execute(query, params)
+                    result = QueryResult(cursor.description, cursor.fetchall())
+            finally:
+                cursor.close()
         except Error as e:
+            if e.errno == ER_QUERY_TIMEOUT:
+                raise QueryTimeoutError(str(e))
             print(f"[ERROR] 查询执行失败: {e}")
             return None
+        
+        if cache is not None:
+            cache.set(cache_key, result, tables, versions)
+        return result
+    
+    @staticmethod
+    def _cache_key(query, params):
+        return normalize_sql(query) if params is None else f"{normalize_sql(query)}|{params!r}"
+    
+    async def fetch_result_async(self, query, params=None, use_cache=True):
+        """在数据库线程池中执行SELECT，返回 QueryResult
+
+        相同SQL的并发查询合并为一次执行，所有调用方共享同一个结果
+        """
+        if use_cache:
+            key = self._cache_key(query, params)
+            return await self.inflight.do(
+                key, lambda: self._run_cancellable(self.fetch_result, query, params, use_cache)
+            )
+        return await self._run_cancellable(self.fetch_result, query, params, use_cache)
+    
+    async def execute_query_async(self, query, params=None, use_cache=True):
+        """execute_query 的异步版本"""
+        if parse_sql(query).statement_type == 'SELECT':
+            result = await self.fetch_result_async(query, params, use_cache)
+            return None if result is None else result.as_dicts()
+        return await self._run_cancellable(self.execute_query, query, params, use_cache)
+    
+    async def _run_cancellable(self, method, query, params=None, use_cache=True):
+        """在数据库线程池中执行 method(query, params, use_cache, connection)
+
+        调用方被取消（例如客户端断开）时，对正在执行的语句发送 KILL QUERY，
+        避免已经没人等待的查询继续占用数据库和连接。
+        连接池借出失败时抛出 mysql.connector.Error 或 PoolTimeoutError
+        """
+        state = {}
+        submitted = time.perf_counter()
+        
+        def run():
+            # 等待数据库线程的时间（线程池饱和时变长）
+            record_stage("db_queue", time.perf_counter() - submitted)
+            with self.connection() as conn:
+                state['connection_id'] = getattr(conn, 'connection_id', None)
+                try:
+                    return method(query, params, use_cache, conn)
+                finally:
+                    state.pop('connection_id', None)
+        
+        loop = asyncio.get_running_loop()
+        try:
+            # 带上当前上下文，数据库线程中的各阶段耗时计入发起请求的计时器
+            return await loop.run_in_executor(self.executor, contextvars.copy_context().run, run)
+        except asyncio.CancelledError:
+            connection_id = state.get('connection_id')
+            if connection_id is not None:
+                # 不能占用已满的数据库线程池，单独起线程发送KILL
+                threading.Thread(target=self.kill_query, args=(connection_id,), daemon=True).start()
+            raise
+    
+    def explain(self, query):
+        """获取查询的执行计划（EXPLAIN 的字典行），失败时返回None"""
+        result = self.fetch_result(f"EXPLAIN {query}", use_cache=False)
+        return None if result is None else result.as_dicts()
+    
+    async def explain_async(self, query):
+        """在数据库线程池中执行 EXPLAIN"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.explain, query)
+    
+    def stream_query(self, query, params=None, chunk_size=1000, state=None):
+        """流式执行查询
+
+        使用非缓冲游标逐块读取结果，内存占用与结果集大小无关。
+        第一次yield返回 cursor.description，之后每次yield一批元组行。
+        生成器被提前关闭时，未读完结果的连接直接关闭而不放回连接池。
+        state 为字典时记录所用连接的 connection_id（用于终止语句）；
+        超过 MAX_EXECUTION_TIME 时抛出 QueryTimeoutError
+        """
+        start = time.perf_counter()
+        conn = self.pool.checkout()
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+        if state is not None:
+            state['connection_id'] = getattr(conn, 'connection_id', None)
+        discard = True
+        try:
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(query, params)
+                yield cursor.description
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            except Error as e:
+                if e.errno == ER_QUERY_TIMEOUT:
+                    raise QueryTimeoutError(str(e))
+                raise
+            cursor.close()
+            discard = False
+        finally:
+            self.pool.release(conn, discard=discard)
+    
+    async def astream_query(self, query, params=None, chunk_size=1000):
+        """stream_query 的异步版本，每一块都在数据库线程池中读取
+
+        读取过程中被取消（客户端断开、等待超时）时对语句发送 KILL QUERY
+        """
+        loop = asyncio.get_running_loop()
+        state = {}
+        gen = self.stream_query(query, params, chunk_size, state)
+        try:
+            while True:
+                item = await loop.run_in_executor(self.executor, next, gen, _STREAM_END)
+                if item is _STREAM_END:
+                    return
+                yield item
+        finally:
+            try:
+                await loop.run_in_executor(self.executor, gen.close)
+            except ValueError:
+                # 读取仍在线程中进行：终止语句，读取结束后生成器被回收时关闭并释放连接
+                connection_id = state.get('connection_id')
+                if connection_id is not None:
+                    threading.Thread(target=self.kill_query, args=(connection_id,), daemon=True).start()
+    
+    def kill_query(self, connection_id):
+        """终止指定连接上正在执行的语句（连接本身保留）"""
+        try:
+            conn = mysql.connector.connect(**self.config)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"KILL QUERY {int(connection_id)}")
+                cursor.close()
+            finally:
+                conn.close()
+            print(f"[INFO] 已终止连接 {connection_id} 上的查询")
+        except Error as e:
+            print(f"[ERROR] 终止查询失败: {e}")
+    
+    def register_tables(self, tables):
+        """登记业务表之外、也需要按表版本使缓存失效的表（如汇总表）"""
+        for table in tables:
+            if table not in self.known_tables:
+                self.known_tables.append(table)
+    
+    def _fetch_watermarks(self, connection, tables):
+        """读取表的版本水位线：最大主键值 + information_schema中的最后更新时间
+
+        没有单列主键的表（汇总表）只使用最后更新时间；最近一秒内有写入的表返回 UNSETTLED
+        （UPDATE_TIME只精确到秒，同一秒内的后续写入不会改变水位线）
+        """
+        if not tables:
+            return {}
+        
+        schema = get_table_schema()
+        try:
+            cursor = connection.cursor()
+            try:
+                watermarks = {}
+                keyed = [t for t in tables if t in schema]
+                if keyed:
+                    max_keys = " UNION ALL ".join(
+                        f"SELECT '{t}', MAX({schema[t]['primary_key']}) FROM {t}" for t in keyed
+                    )
+                    cursor.execute(max_keys)
+                    watermarks = {table: [max_key] for table, max_key in cursor.fetchall()}
+                
+                placeholders = ", ".join(["%s"] * len(tables))
+                cursor.execute(
+                    "SELECT TABLE_NAME, UPDATE_TIME, UPDATE_TIME >= NOW() - INTERVAL 1 SECOND "
+                    "FROM information_schema.TABLES "
+                    f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})",
+                    tuple(tables)
+                )
+                unsettled = set()
+                for table, update_time, recent in cursor.fetchall():
+                    watermarks.setdefault(table, []).append(update_time)
+                    if recent:
+                        unsettled.add(table)
+                return {table: UNSETTLED if table in unsettled else tuple(values)
+                        for table, values in watermarks.items()}
+            finally:
+                cursor.close()
+        except Error as e:
+            print(f"[ERROR] 读取表版本失败: {e}")
+            return None
+    
+    def bump_tables(self, tables):
+        """外部写入数据后显式使相关表的缓存失效"""
+        if self.result_cache is not None:
+            self.result_cache.bump(tables)
     
     def test_connection(self):
         """测试数据库连接和基本查询"""
@@ -80,9 +405,9 @@ class DatabaseManager:
         finally:
             self.disconnect()
 
-# 创建全局数据库实例
-db_manager = DatabaseManager()
+# 全局数据库实例（第一次使用时创建连接池，连接在预热或借出时建立）
+_db_manager = Lazy(DatabaseManager)
 
 def get_db():
     """获取数据库连接实例"""
-    return db_manager 
\ No newline at end of file
+    return _db_manager()
@@ -0,0 +1,27 @@
+import threading
+
+
+class Lazy:
+    """线程安全的惰性单例：第一次调用时才创建实例，之后总是返回同一个实例
+
+    导入模块时不建立连接、不创建模型客户端，实例在应用启动（或第一次使用）时创建
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self.factory()
+                instance = self._instance
+        return instance
+
+    @property
+    def created(self):
+        """实例是否已创建"""
+        return self._instance is not None
@@ -0,0 +1,232 @@
+import math
+import threading
+from bisect import bisect_left
+
+# Prometheus 文本格式的响应类型
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 延迟类直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """累积分桶直方图（观测值只做一次二分查找和计数）"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # 各桶计数（最后一个为+Inf）、总和、次数
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels):
+        """返回 (总和, 次数)"""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (0.0, 0) if series is None else (series[1], series[2])
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """抓取时通过回调读取当前值（缓存命中率、连接池状态等已有统计）
+
+    回调返回 {标签值元组: 数值}，没有标签时可以直接返回数值
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values.items() if value is not None
+        ]
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已注册: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, callback, labelnames=(), kind="gauge"):
+        return self.register(CallbackMetric(name, documentation, callback, labelnames, kind))
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """生成 /metrics 的响应内容"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # 单个回调失败不影响其他指标
+                print(f"[ERROR] 指标 {metric.name} 读取失败: {e}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+def get_registry():
+    """获取指标注册表"""
+    return registry
+
+
+# 查询流水线指标
+STAGE_SECONDS = registry.histogram(
+    "chat2bi_stage_duration_seconds", "Duration of each query pipeline stage", ["stage"]
+)
+QUERY_SECONDS = registry.histogram(
+    "chat2bi_query_duration_seconds", "End-to-end duration of /api/query requests", ["outcome"]
+)
+QUERIES_TOTAL = registry.counter(
+    "chat2bi_queries_total", "Queries by SQL source and outcome", ["source", "outcome"]
+)
+LLM_SECONDS = registry.histogram(
+    "chat2bi_llm_latency_seconds", "Latency of LLM completion calls", ["backend"]
+)
+LLM_ERRORS = registry.counter(
+    "chat2bi_llm_errors_total", "Failed LLM completion calls", ["backend"]
+)
+SPECULATION_RACES = registry.counter(
+    "chat2bi_llm_speculation_races_total", "Speculative SQL generations by winning candidate (none: no valid SQL)",
+    ["winner"]
+)
+SPECULATION_SAVED_SECONDS = registry.histogram(
+    "chat2bi_llm_speculation_saved_seconds", "Estimated latency saved per speculative generation"
+)
+LLM_PROMPT_TOKENS = registry.histogram(
+    "chat2bi_llm_prompt_tokens", "Prompt tokens per LLM call", ["backend"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192)
+)
+DB_POOL_WAIT_SECONDS = registry.histogram(
+    "chat2bi_db_pool_wait_seconds", "Time spent waiting to check out a database connection"
+)
+ROWS_RETURNED = registry.histogram(
+    "chat2bi_rows_returned", "Rows returned per query",
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+)
+RESPONSE_BYTES = registry.histogram(
+    "chat2bi_response_bytes", "Serialized JSON response size in bytes",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+)
+ROLLUP_REWRITES = registry.counter(
+    "chat2bi_rollup_rewrites_total", "Queries rewritten to read from a rollup table", ["rollup"]
+)
+REPLICA_QUERIES = registry.counter(
+    "chat2bi_replica_queries_total", "Queries offered to the in-process columnar replica", ["outcome"]
+)
@@ -0,0 +1,211 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeoutError(Exception):
+    """在超时时间内没有可用的数据库连接"""
+
+
+class _PoolEntry:
+    """连接池中的连接及其元数据"""
+
+    __slots__ = ("connection", "created_at", "last_used")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """线程安全的数据库连接池
+
+    - min_size/max_size: 最少保持/最多创建的连接数
+    - max_lifetime: 连接最长存活秒数，超过后归还时关闭并重建
+    - idle_check_interval: 空闲超过该秒数的连接在借出前做健康检查
+    - checkout_timeout: 借出连接的最长等待秒数
+    """
+
+    def __init__(self, connect_fn, min_size=2, max_size=10, max_lifetime=1800,
+                 idle_check_interval=30, checkout_timeout=10):
+        self.connect_fn = connect_fn
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.idle_check_interval = idle_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiters = 0
+        self._cond = threading.Condition()
+
+        # 统计计数
+        self.created = 0
+        self.closed_count = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def warm(self):
+        """预先创建 min_size 个连接"""
+        created = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size:
+                        break
+                    self._size += 1
+                try:
+                    entry = _PoolEntry(self.connect_fn())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created.append(entry)
+                with self._cond:
+                    self.created += 1
+        finally:
+            with self._cond:
+                self._idle.extend(created)
+                self._cond.notify_all()
+        return len(created)
+
+    def checkout(self, timeout=None):
+        """借出一个连接，没有可用连接时等待"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeoutError(f"等待数据库连接超时（{timeout}秒）")
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+                if self._idle:
+                    entry = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+
+            if create:
+                try:
+                    entry = _PoolEntry(self.connect_fn())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(entry):
+                self._discard(entry)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                if create:
+                    self.created += 1
+                self._in_use[id(entry.connection)] = entry
+                self.checkouts += 1
+                self.total_wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+            return entry.connection
+
+    def release(self, connection, discard=False):
+        """归还连接；出错的连接或超过最长存活时间的连接直接关闭"""
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            return
+
+        now = time.monotonic()
+        if discard or now - entry.created_at >= self.max_lifetime:
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """借出连接的上下文管理器，退出时自动归还"""
+        conn = self.checkout(timeout)
+        discard = False
+        try:
+            yield conn
+        except BaseException:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self):
+        """关闭所有空闲连接；借出中的连接不受影响，之后的借出会重新建立连接"""
+        with self._cond:
+            entries = list(self._idle)
+            self._idle.clear()
+        for entry in entries:
+            self._discard(entry)
+
+    def _is_healthy(self, entry):
+        """检查空闲连接是否可用"""
+        now = time.monotonic()
+        if now - entry.created_at >= self.max_lifetime:
+            return False
+        if now - entry.last_used < self.idle_check_interval:
+            return True
+        try:
+            healthy = entry.connection.is_connected()
+        except Exception:
+            healthy = False
+        if not healthy:
+            with self._cond:
+                self.health_check_failures += 1
+        return healthy
+
+    def _discard(self, entry):
+        """关闭连接并释放名额"""
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.closed_count += 1
+            self._cond.notify()
+
+    def stats(self):
+        """获取连接池统计信息"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiters": self._waiters,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "created": self.created,
+                "closed": self.closed_count,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "health_check_failures": self.health_check_failures,
+                "avg_wait_time": round(self.total_wait_time / self.checkouts, 6) if self.checkouts else 0.0,
+                "max_wait_time": round(self.max_wait_time, 6),
+                "total_wait_time": round(self.total_wait_time, 6)
+            }
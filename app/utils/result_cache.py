@@ -0,0 +1,222 @@
+import sys
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+from app.utils.sql_parser import parse_sql
+
+# 结果随时间、会话或随机数变化的函数，使用它们的查询不缓存
+NONDETERMINISTIC_FUNCTIONS = frozenset(
+    "now sysdate curdate curtime current_date current_time current_timestamp localtime localtimestamp "
+    "utc_date utc_time utc_timestamp unix_timestamp rand uuid uuid_short connection_id current_user user "
+    "session_user system_user database schema last_insert_id found_rows row_count sleep".split()
+)
+
+# 水位线中表示“最近一秒内有写入”的标记：UPDATE_TIME只精确到秒，同一秒内的后续写入不会改变它
+UNSETTLED = "unsettled"
+
+def normalize_sql(sql):
+    """归一化SQL文本，用作结果缓存键
+
+    折叠字符串字面量之外的空白，去掉注释和末尾分号，字面量内容保持原样
+    """
+    return parse_sql(sql).normalized
+
+def extract_tables(sql, known_tables):
+    """提取SQL中引用到的已知表名（保守估计，宁多勿少）
+
+    字符串之外出现过的标识符只要与已知表名相同就算引用
+    """
+    known = {t.lower(): t for t in known_tables}
+    return [known[name] for name in parse_sql(sql).identifiers if name in known]
+
+def is_cacheable(sql, tables):
+    """查询结果是否可以缓存：必须引用已知表（按表版本失效），且不使用时间、随机数等不确定的函数
+
+    不引用表的查询（如 SELECT NOW()）没有任何失效依据，只能等TTL过期
+    """
+    if not tables:
+        return False
+    return NONDETERMINISTIC_FUNCTIONS.isdisjoint(parse_sql(sql).identifiers)
+
+def estimate_size(rows):
+    """估算查询结果占用的内存字节数（字典行列表或 QueryResult）"""
+    rows = getattr(rows, 'rows', rows)
+    size = sys.getsizeof(rows)
+    if not isinstance(rows, list):
+        return size
+    for row in rows:
+        size += sys.getsizeof(row)
+        values = row.values() if isinstance(row, dict) else row
+        for value in values:
+            size += sys.getsizeof(value)
+    return size
+
+
+class TableVersionTracker:
+    """维护每张表的版本：显式bump计数 + 数据库水位线
+
+    check_interval: 0 表示每次读取都检查水位线，>0 表示水位线的有效秒数，
+    <0 表示不查询水位线，只依赖显式bump。本服务的写入都会显式bump，水位线只用于发现外部写入，
+    外部写入最多在 check_interval 秒后生效。
+    水位线为 UNSETTLED 的表（刚刚有写入）不记录检查时间，版本为None，期间的结果不缓存
+    """
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self._bumps = defaultdict(int)
+        self._watermarks = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+    def bump(self, tables):
+        """显式递增表版本（写入后调用）"""
+        with self._lock:
+            for table in tables:
+                self._bumps[table] += 1
+
+    def versions(self, tables, fetch_watermarks):
+        """获取表的当前版本，必要时调用 fetch_watermarks(tables) 刷新水位线"""
+        if self.check_interval >= 0:
+            now = time.monotonic()
+            with self._lock:
+                stale = [
+                    t for t in tables
+                    if self.check_interval == 0
+                    or now - self._checked_at.get(t, float("-inf")) >= self.check_interval
+                ]
+            if stale:
+                watermarks = fetch_watermarks(stale)
+                if watermarks is None:
+                    return None
+                unsettled = False
+                with self._lock:
+                    for table in stale:
+                        watermark = watermarks.get(table)
+                        self._watermarks[table] = watermark
+                        if watermark == UNSETTLED:
+                            self._checked_at.pop(table, None)
+                            unsettled = True
+                        else:
+                            self._checked_at[table] = now
+                if unsettled:
+                    return None
+
+        with self._lock:
+            return {t: (self._bumps[t], self._watermarks.get(t)) for t in tables}
+
+    def snapshot(self):
+        """导出当前版本信息"""
+        with self._lock:
+            tables = set(self._bumps) | set(self._watermarks)
+            return {
+                t: {"bumps": self._bumps[t], "watermark": str(self._watermarks.get(t))}
+                for t in sorted(tables)
+            }
+
+
+class ResultCache:
+    """查询结果缓存，按表版本失效，按总字节数限容"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024,
+                 ttl=600, check_interval=5):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.tracker = TableVersionTracker(check_interval)
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def current_versions(self, tables, fetch_watermarks):
+        """在执行查询前读取表版本，写入时与结果一起保存"""
+        return self.tracker.versions(tables, fetch_watermarks)
+
+    def get(self, key, fetch_watermarks):
+        """读取缓存；表版本变化或过期的条目视为未命中并删除"""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        rows, tables, versions, size, expires_at = entry
+        current = None
+        if expires_at > time.monotonic():
+            current = self.tracker.versions(tables, fetch_watermarks)
+
+        with self._lock:
+            if current is None or current != versions:
+                if self._data.get(key) is entry:
+                    del self._data[key]
+                    self._bytes -= size
+                self.stale += 1
+                self.misses += 1
+                return None
+            if key in self._data:
+                self._data.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def set(self, key, rows, tables, versions):
+        """写入缓存；versions 必须是执行查询之前读取的表版本"""
+        if versions is None:
+            return False
+        size = estimate_size(rows)
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self.rejected += 1
+                return False
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[3]
+            self._data[key] = (rows, tables, versions, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= evicted[3]
+                self.evictions += 1
+        return True
+
+    def bump(self, tables):
+        """显式使相关表的缓存结果失效"""
+        self.tracker.bump(tables)
+        with self._lock:
+            for key in [k for k, e in self._data.items() if set(e[1]) & set(tables)]:
+                self._bytes -= self._data.pop(key)[3]
+
+    def clear(self):
+        """清空缓存并返回清除的条目数"""
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+            self._bytes = 0
+            return count
+
+    def stats(self):
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "ttl": self.ttl,
+                "check_interval": self.tracker.check_interval,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+                "table_versions": self.tracker.snapshot()
+            }
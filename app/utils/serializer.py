@@ -0,0 +1,141 @@
+import io
+import csv
+import json
+from decimal import Decimal
+from operator import methodcaller
+from mysql.connector import FieldType
+
+# 查询结果的JSON形状：records 为对象数组，columns 为 {columns, rows} 的列名+数组形式
+RESULT_SHAPES = ("records", "columns")
+
+# CSV流中途出错时最后一行的第一个单元格
+CSV_ERROR_MARKER = "#error"
+
+def json_default(value):
+    """JSON编码时处理Decimal和日期时间类型"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+def dumps(obj):
+    """编码为紧凑的UTF-8 JSON字节"""
+    return json.dumps(obj, ensure_ascii=False, default=json_default, separators=(',', ':')).encode('utf-8')
+
+
+class QueryResult:
+    """查询结果：cursor.description + 元组行"""
+
+    __slots__ = ("description", "rows")
+
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = rows
+
+    @property
+    def columns(self):
+        return [column[0] for column in self.description]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def as_dicts(self):
+        """转换为字典行（与 dictionary=True 游标的结果一致）"""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+
+_isoformat = methodcaller('isoformat')
+
+def _text(value):
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', errors='replace')
+    return value
+
+# 按MySQL列类型选择转换函数，None表示JSON可以直接编码（整数、浮点、字符串）
+_CONVERTERS = {
+    FieldType.DECIMAL: float,
+    FieldType.NEWDECIMAL: float,
+    FieldType.DATE: _isoformat,
+    FieldType.NEWDATE: _isoformat,
+    FieldType.DATETIME: _isoformat,
+    FieldType.TIMESTAMP: _isoformat,
+    FieldType.TIME: str,
+    FieldType.SET: sorted,
+    FieldType.JSON: _text,
+    FieldType.TINY_BLOB: _text,
+    FieldType.MEDIUM_BLOB: _text,
+    FieldType.LONG_BLOB: _text,
+    FieldType.BLOB: _text,
+}
+
+def column_converters(description):
+    """根据 cursor.description 为每一列选出转换函数（只需计算一次）"""
+    return [_CONVERTERS.get(column[1]) for column in description]
+
+def convert_rows(rows, converters):
+    """按列转换一批元组行
+
+    只有需要转换的列（DECIMAL、日期时间等）才逐个单元格处理，
+    其余列原样保留；没有需要转换的列时直接返回原始行
+    """
+    if not rows or not any(converters):
+        return rows
+    columns = list(zip(*rows))
+    for index, convert in enumerate(converters):
+        if convert is None:
+            continue
+        column = columns[index]
+        if None in column:
+            columns[index] = [None if value is None else convert(value) for value in column]
+        else:
+            columns[index] = list(map(convert, column))
+    return list(zip(*columns))
+
+def result_data(result, shape="records"):
+    """把查询结果转换为可直接JSON编码的数据
+
+    records: [{"列名": 值, ...}, ...]
+    columns: {"columns": [列名, ...], "rows": [[值, ...], ...]}
+    """
+    columns = result.columns
+    rows = convert_rows(result.rows, column_converters(result.description))
+    if shape == "columns":
+        return {"columns": columns, "rows": rows}
+    return [dict(zip(columns, row)) for row in rows]
+
+def encode_ndjson_chunk(columns, rows, converters=None):
+    """把一批元组行编码为NDJSON（每行一个JSON对象）"""
+    if converters is not None:
+        rows = convert_rows(rows, converters)
+    lines = [
+        json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=json_default, separators=(',', ':'))
+        for row in rows
+    ]
+    lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+def encode_ndjson_error(message, detail):
+    """NDJSON流中途出错时写出的最后一行：{"error": ..., "error_detail": ...}"""
+    return (json.dumps({"error": message, "error_detail": detail}, ensure_ascii=False, default=json_default,
+                       separators=(',', ':')) + '\n').encode('utf-8')
+
+def encode_csv_error(message):
+    """CSV流中途出错时写出的最后一行：第一个单元格为 CSV_ERROR_MARKER，第二个为错误信息"""
+    return encode_csv_chunk([(CSV_ERROR_MARKER, message)])
+
+def encode_csv_chunk(rows, header=None, converters=None):
+    """把一批元组行编码为CSV，header不为空时先写表头（None写为空单元格）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    if converters is not None:
+        rows = convert_rows(rows, converters)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
@@ -0,0 +1,58 @@
+import asyncio
+
+
+class _Call:
+    """一个正在执行的调用及其等待者数量"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，其余调用等待同一个结果
+
+    调用在独立的任务中执行，某个等待者被取消不会影响其他等待者；
+    所有等待者都取消后才取消该任务，并立即移除该键（任务可能还要一段时间才结束，
+    之后相同键的调用重新执行，而不是等待一个已取消的任务）
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """执行 fn()（返回协程）；相同 key 的调用正在进行时直接等待其结果"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            self.executed += 1
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        """移除键；该键已对应新的调用时保持不变"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self):
+        """获取合并统计"""
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced
+        }
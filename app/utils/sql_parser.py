@@ -0,0 +1,441 @@
+import re
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+# 解析结果缓存的条目数（按SQL文本）
+PARSE_CACHE_SIZE = 2048
+
+_TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<hint>/\*\+.*?\*/)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<qident>`(?:[^`]|``)+`)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<param>%s|%\(\w+\)s)
+  | (?P<word>[^\W\d][\w$]*)
+  | (?P<op><=>|<=|>=|<>|!=|\|\||&&|:=|->>|->|[(),.;*+\-/%=<>!~&|^@?:])
+  | (?P<error>.)
+""", re.S | re.X)
+
+# 不能作为表别名或列名的关键字
+KEYWORDS = frozenset("""
+    SELECT FROM WHERE AND OR NOT IN IS NULL LIKE REGEXP RLIKE BETWEEN EXISTS AS ON USING
+    JOIN INNER LEFT RIGHT OUTER CROSS NATURAL FULL STRAIGHT_JOIN
+    GROUP BY ORDER HAVING LIMIT OFFSET ASC DESC DISTINCT DISTINCTROW ALL ANY SOME UNION EXCEPT INTERSECT
+    CASE WHEN THEN ELSE END WITH RECURSIVE OVER PARTITION WINDOW ROWS RANGE PRECEDING FOLLOWING
+    UNBOUNDED CURRENT ROW INTERVAL TRUE FALSE UNKNOWN DIV MOD XOR COLLATE BINARY ESCAPE
+    SECOND MINUTE HOUR DAY WEEK MONTH QUARTER YEAR
+    INSERT INTO VALUES VALUE UPDATE SET DELETE REPLACE CREATE ALTER DROP TRUNCATE TABLE
+    RENAME GRANT REVOKE LOAD DATA OUTFILE DUMPFILE INFILE CALL LOCK UNLOCK HANDLER DO
+    FOR SHARE NOWAIT SKIP LOCKED FORCE IGNORE USE INDEX KEY IF TEMPORARY
+    EXPLAIN DESCRIBE SHOW
+""".split())
+
+# 语句类型关键字
+STATEMENT_TYPES = frozenset(
+    "SELECT INSERT UPDATE DELETE REPLACE CREATE ALTER DROP TRUNCATE RENAME GRANT REVOKE LOAD CALL "
+    "LOCK UNLOCK HANDLER DO SET SHOW EXPLAIN DESCRIBE USE".split()
+)
+
+# 这些关键字出现在同一层时，FROM后逗号分隔的表列表结束
+_FROM_LIST_END = frozenset(
+    "SELECT WHERE GROUP ORDER HAVING LIMIT UNION WINDOW FOR INTO ON USING SET VALUES".split()
+)
+
+
+class SQLToken:
+    """词法单元：kind, value（关键字为大写）, 在原文中的起止位置, 括号深度"""
+
+    __slots__ = ("kind", "value", "text", "start", "end", "depth")
+
+    def __init__(self, kind, value, text, start, end, depth):
+        self.kind = kind
+        self.value = value
+        self.text = text
+        self.start = start
+        self.end = end
+        self.depth = depth
+
+    def is_keyword(self, *values):
+        return self.kind == "keyword" and (not values or self.value in values)
+
+    def is_op(self, value):
+        return self.kind == "op" and self.value == value
+
+    def __repr__(self):
+        return f"SQLToken({self.kind}, {self.value!r}, depth={self.depth})"
+
+
+@dataclass(frozen=True)
+class ParsedSQL:
+    """一次解析的结果（不可变，可在各阶段之间共享）
+
+    tables: FROM/JOIN/INTO/UPDATE 等位置引用的表（不含CTE和派生表）
+    aliases: 别名 -> 表名（表名本身也映射到自己）
+    columns: (限定符或None, 列名) 形式的列引用
+    identifiers: 字符串之外出现过的所有标识符（小写，按出现顺序），用于保守地判断涉及哪些表
+    masked: 与原文等长，只保留顶层结构的大写文本（字符串内容、注释、括号内的内容替换为空格）
+    """
+    sql: str
+    tokens: Tuple[SQLToken, ...]
+    statement_type: Optional[str]
+    statement_count: int
+    tables: Tuple[str, ...]
+    aliases: Mapping[str, str]
+    cte_names: frozenset
+    columns: Tuple[Tuple[Optional[str], str], ...]
+    literals: Tuple[object, ...]
+    keywords: frozenset
+    identifiers: Tuple[str, ...]
+    masked: str
+    normalized: str
+    fingerprint: str
+    error: Optional[str] = None
+
+    def has_keyword(self, *values):
+        """是否出现过这些关键字（不含函数调用，如 REPLACE(...)）"""
+        return any(value in self.keywords for value in values)
+
+
+def tokenize(sql):
+    """单遍扫描把SQL切分为词法单元，返回 (tokens, 错误信息)"""
+    tokens = []
+    depth = 0
+    error = None
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "error":
+            if text in "'\"`":
+                error = "未闭合的字符串或标识符"
+            elif text == "/" and sql.startswith("/*", match.start()):
+                error = "未闭合的注释"
+            else:
+                error = f"无法识别的字符: {text}"
+            break
+        if kind == "word":
+            upper = text.upper()
+            kind, value = ("keyword", upper) if upper in KEYWORDS else ("ident", text)
+        elif kind == "qident":
+            kind, value = "ident", text[1:-1].replace("``", "`")
+        elif kind == "string":
+            value = _unquote(text)
+        elif kind == "number":
+            value = float(text) if any(c in text for c in ".eE") else int(text)
+        else:
+            value = text
+        if kind == "op" and text == ")":
+            depth -= 1
+            if depth < 0:
+                error = "括号不匹配"
+                break
+        tokens.append(SQLToken(kind, value, text, match.start(), match.end(), depth))
+        if kind == "op" and text == "(":
+            depth += 1
+    if error is None and depth != 0:
+        error = "括号不匹配"
+    return tokens, error
+
+def split_statements(sql):
+    """按顶层分号切分SQL脚本（字符串、注释、带引号的标识符中的分号不切分）
+
+    返回去掉首尾空白的语句列表，只有注释的片段不计入；无法完整切分时抛出 ValueError
+    """
+    tokens, error = tokenize(sql)
+    if error is not None:
+        raise ValueError(error)
+    statements = []
+    start = 0
+    has_content = False
+    for token in tokens:
+        if token.is_op(";") and token.depth == 0:
+            if has_content:
+                statements.append(sql[start:token.start].strip())
+            start = token.end
+            has_content = False
+        elif token.kind not in ("ws", "comment"):
+            has_content = True
+    if has_content:
+        statements.append(sql[start:].strip())
+    return statements
+
+def _unquote(text):
+    quote = text[0]
+    body = text[1:-1].replace(quote * 2, quote)
+    return re.sub(r"\\(.)", lambda m: {"n": "\n", "t": "\t", "0": "\0"}.get(m.group(1), m.group(1)), body)
+
+def _mask(sql, tokens):
+    """只保留顶层结构：括号内、字符串内容、注释替换为空格"""
+    out = [" "] * len(sql)
+    for token in tokens:
+        if token.kind in ("comment", "hint"):
+            continue
+        if token.depth > 0:
+            continue
+        if token.kind == "string":
+            out[token.start] = token.text[0]
+            out[token.end - 1] = token.text[-1]
+        elif token.kind != "ws":
+            out[token.start:token.end] = token.text
+    return "".join(out).upper()
+
+def _normalize(tokens):
+    """折叠空白、去掉普通注释和末尾分号；字面量内容保持原样"""
+    parts = []
+    pending_space = False
+    for token in tokens:
+        if token.kind in ("ws", "comment"):
+            pending_space = True
+            continue
+        if pending_space and parts:
+            parts.append(" ")
+        pending_space = False
+        parts.append(token.text)
+    while parts and parts[-1] in (";", " "):
+        parts.pop()
+    return "".join(parts)
+
+
+class _Parser:
+    """在词法单元上做一遍轻量的结构分析"""
+
+    def __init__(self, tokens):
+        self.toks = [t for t in tokens if t.kind not in ("ws", "comment", "hint")]
+        self.tables = []
+        self.aliases = {}
+        self.cte_names = set()
+        self.consumed = set()
+
+    def _at(self, i):
+        return self.toks[i] if 0 <= i < len(self.toks) else None
+
+    def _skip_parens(self, i):
+        """i 指向 '('，返回匹配的 ')' 之后的位置"""
+        depth = self.toks[i].depth
+        i += 1
+        while i < len(self.toks) and not (self.toks[i].is_op(")") and self.toks[i].depth == depth):
+            i += 1
+        return i + 1
+
+    def _read_name(self, i):
+        """读取 name 或 db.name，返回 (名称, 下一个位置)"""
+        token = self._at(i)
+        if token is None or token.kind != "ident":
+            return None, i
+        name = token.value
+        self.consumed.add(i)
+        if self._at(i + 1) is not None and self._at(i + 1).is_op(".") and \
+                self._at(i + 2) is not None and self._at(i + 2).kind == "ident":
+            self.consumed.update((i + 1, i + 2))
+            name = f"{name}.{self._at(i + 2).value}"
+            i += 2
+        return name, i + 1
+
+    def _read_alias(self, i):
+        token = self._at(i)
+        if token is not None and token.is_keyword("AS"):
+            i += 1
+            token = self._at(i)
+        if token is not None and token.kind in ("ident", "string"):
+            self.consumed.add(i)
+            return token.value, i + 1
+        return None, i
+
+    def _read_table_ref(self, i):
+        """读取一个表引用（表名或派生表）及其别名"""
+        token = self._at(i)
+        if token is None:
+            return i
+        if token.is_op("("):
+            # 派生表：记录别名后回到括号内继续分析子查询
+            alias, _ = self._read_alias(self._skip_parens(i))
+            if alias:
+                self.aliases[alias.lower()] = None
+            return i + 1
+        name, i = self._read_name(i)
+        if name is None:
+            return i
+        # CTE不是真实的表，别名不指向任何表
+        target = None if name.lower() in self.cte_names else name
+        if target is not None:
+            self.tables.append(name)
+        self.aliases[name.lower()] = target
+        alias, i = self._read_alias(i)
+        if alias:
+            self.aliases[alias.lower()] = target
+        return i
+
+    def parse(self):
+        toks = self.toks
+        # 正处于FROM表列表中的括号深度
+        from_depths = set()
+        i = 0
+        while i < len(toks):
+            token = toks[i]
+            if token.is_keyword("WITH"):
+                self._read_ctes(i + 1)
+                i += 1
+                continue
+            if token.is_keyword("FROM"):
+                from_depths.add(token.depth)
+                i = self._read_table_ref(i + 1)
+                continue
+            if token.is_op(",") and token.depth in from_depths:
+                i = self._read_table_ref(i + 1)
+                continue
+            if token.is_op(")"):
+                from_depths.discard(token.depth + 1)
+            elif token.kind == "keyword" and token.value in _FROM_LIST_END:
+                from_depths.discard(token.depth)
+            if token.is_keyword("JOIN", "STRAIGHT_JOIN", "UPDATE", "INTO"):
+                nxt = self._at(i + 1)
+                if nxt is not None and nxt.is_keyword("TABLE"):
+                    i += 1
+                i = self._read_table_ref(i + 1)
+                continue
+            if token.is_keyword("TABLE") and i > 0 and toks[i - 1].is_keyword(
+                    "CREATE", "ALTER", "DROP", "TRUNCATE", "LOCK", "RENAME", "TEMPORARY"):
+                i += 1
+                while self._at(i) is not None and self._at(i).is_keyword("IF", "NOT", "EXISTS"):
+                    i += 1
+                i = self._read_table_ref(i)
+                continue
+            if token.is_keyword("TRUNCATE") and self._at(i + 1) is not None and self._at(i + 1).kind == "ident":
+                i = self._read_table_ref(i + 1)
+                continue
+            i += 1
+        return self
+
+    def _read_ctes(self, i):
+        """预先读取 WITH [RECURSIVE] name [(列)] AS (...), ... 中的CTE名称
+
+        CTE定义内部的FROM/JOIN仍由主循环分析
+        """
+        if self._at(i) is not None and self._at(i).is_keyword("RECURSIVE"):
+            i += 1
+        while True:
+            token = self._at(i)
+            if token is None or token.kind != "ident":
+                return
+            self.cte_names.add(token.value.lower())
+            self.consumed.add(i)
+            i += 1
+            if self._at(i) is not None and self._at(i).is_op("("):
+                i = self._skip_parens(i)
+            if self._at(i) is None or not self._at(i).is_keyword("AS"):
+                return
+            i += 1
+            if self._at(i) is None or not self._at(i).is_op("("):
+                return
+            i = self._skip_parens(i)
+            if self._at(i) is None or not self._at(i).is_op(","):
+                return
+            i += 1
+
+    def columns(self):
+        """列引用：qualifier.column 或未限定的列名（函数调用、表名、别名除外）"""
+        toks = self.toks
+        columns = []
+        i = 0
+        while i < len(toks):
+            token = toks[i]
+            if token.kind != "ident" or i in self.consumed:
+                i += 1
+                continue
+            nxt = self._at(i + 1)
+            if nxt is not None and nxt.is_op("("):
+                i += 1
+                continue
+            if nxt is not None and nxt.is_op(".") and self._at(i + 2) is not None:
+                target = self._at(i + 2)
+                if target.kind == "ident":
+                    columns.append((token.value, target.value))
+                i += 3
+                continue
+            previous = self._at(i - 1)
+            if previous is not None and previous.is_keyword("AS"):
+                # SELECT列表中的输出别名
+                i += 1
+                continue
+            columns.append((None, token.value))
+            i += 1
+        return columns
+
+
+def _statement_info(tokens):
+    """语句数量和第一条语句的类型（WITH语句取其主语句的类型）"""
+    count = 0
+    statement_type = None
+    has_content = False
+    for token in tokens:
+        if token.kind in ("ws", "comment", "hint"):
+            continue
+        if token.is_op(";") and token.depth == 0:
+            if has_content:
+                count += 1
+            has_content = False
+            continue
+        if not has_content:
+            has_content = True
+            if count == 0 and token.kind == "keyword":
+                statement_type = token.value
+        if count == 0 and statement_type == "WITH" and token.depth == 0 and \
+                token.kind == "keyword" and token.value in STATEMENT_TYPES:
+            statement_type = token.value
+    if has_content:
+        count += 1
+    if statement_type == "WITH":
+        statement_type = None
+    return count, statement_type
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_sql(sql):
+    """解析SQL，结果按SQL文本缓存，各阶段共享同一个 ParsedSQL"""
+    tokens, error = tokenize(sql)
+    # 无法完整切分时不做归一化，避免不同的SQL得到相同的缓存键
+    normalized = _normalize(tokens) if error is None else sql.strip()
+    fingerprint = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:16]
+    statement_count, statement_type = _statement_info(tokens)
+
+    parser = _Parser(tokens).parse()
+    significant = parser.toks
+
+    # 紧跟左括号的关键字是函数调用（如字符串函数 REPLACE(...)、INSERT(...)），不计入
+    keywords = set()
+    for index, token in enumerate(significant):
+        if token.kind == "keyword":
+            nxt = significant[index + 1] if index + 1 < len(significant) else None
+            if nxt is None or not nxt.is_op("("):
+                keywords.add(token.value)
+
+    identifiers = []
+    seen = set()
+    for token in significant:
+        if token.kind == "ident":
+            for name in token.value.lower().split("."):
+                if name not in seen:
+                    seen.add(name)
+                    identifiers.append(name)
+
+    return ParsedSQL(
+        sql=sql,
+        tokens=tuple(tokens),
+        statement_type=statement_type,
+        statement_count=statement_count,
+        tables=tuple(dict.fromkeys(parser.tables)),
+        aliases=MappingProxyType({k: v for k, v in parser.aliases.items() if v is not None}),
+        cte_names=frozenset(parser.cte_names),
+        columns=tuple(parser.columns()),
+        literals=tuple(t.value for t in tokens if t.kind in ("string", "number")),
+        keywords=frozenset(keywords),
+        identifiers=tuple(identifiers),
+        masked=_mask(sql, tokens),
+        normalized=normalized,
+        fingerprint=fingerprint,
+        error=error
+    )
@@ -0,0 +1,28 @@
+import unicodedata
+
+# 数字中有意义的符号：小数点、正负号、日期/时间/分数分隔符
+_NUMERIC_MARKS = frozenset(".-+:/")
+# 出现在数字之前即有意义的符号（如 -5、.5），其余符号需要两侧都是数字（如 2023-01-05、12:30、1/2）
+_LEADING_MARKS = frozenset(".-+")
+
+def normalize_question(question):
+    """归一化用户问题，用作缓存键和模板匹配
+
+    统一全角/半角字符（NFKC），忽略大小写，去掉空白和标点符号；
+    数字中的 . - + : / 保留，避免 10.5 与 105、2023-01-05 与 20230105 归一化为同一个问题
+    """
+    text = unicodedata.normalize("NFKC", question).casefold()
+    kept = []
+    for i, ch in enumerate(text):
+        if ch.isspace():
+            continue
+        if ch in _NUMERIC_MARKS:
+            before = i > 0 and text[i - 1].isdigit()
+            after = i + 1 < len(text) and text[i + 1].isdigit()
+            if after and (before or ch in _LEADING_MARKS):
+                kept.append(ch)
+                continue
+        if unicodedata.category(ch).startswith("P"):
+            continue
+        kept.append(ch)
+    return "".join(kept)
@@ -0,0 +1,71 @@
+import time
+import contextvars
+from contextlib import contextmanager
+
+# 当前请求的阶段计时器；run_in_executor 时通过 copy_context 带到数据库线程中
+_current_timer = contextvars.ContextVar("stage_timer", default=None)
+
+
+class StageTimer:
+    """记录一次请求中各流水线阶段的耗时（单调时钟，纳秒精度）
+
+    同名阶段多次出现时耗时累加
+    """
+
+    __slots__ = ("started", "stages")
+
+    def __init__(self):
+        self.started = time.perf_counter_ns()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def add(self, name, elapsed_ns):
+        self.stages[name] = self.stages.get(name, 0) + elapsed_ns
+
+    def elapsed(self):
+        """从开始到现在的秒数"""
+        return (time.perf_counter_ns() - self.started) / 1e9
+
+    def seconds(self):
+        """各阶段耗时（秒）"""
+        return {name: elapsed / 1e9 for name, elapsed in self.stages.items()}
+
+    def breakdown(self):
+        """各阶段耗时（毫秒），total 为到目前为止的总耗时"""
+        result = {name: round(elapsed / 1e6, 3) for name, elapsed in self.stages.items()}
+        result["total"] = round(self.elapsed() * 1000, 3)
+        return result
+
+
+def start_timer():
+    """为当前请求创建计时器"""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+def current_timer():
+    """当前请求的计时器，不在请求中时为None"""
+    return _current_timer.get()
+
+@contextmanager
+def stage(name):
+    """在当前请求的计时器中记录一个阶段；没有计时器时什么也不做"""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+def record_stage(name, seconds):
+    """把已测得的耗时（秒）计入当前请求的阶段"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, int(seconds * 1e9))
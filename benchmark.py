@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+端到端压测工具
+在进程内启动API，使用本地桩模型后端和模拟数据库，测量服务自身的吞吐量和各阶段延迟
+
+用法：
+    python benchmark.py --requests 2000 --concurrency 32 --output result.json
+    python benchmark.py --requests 2000 --concurrency 32 --baseline result.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import resource
+import tracemalloc
+from datetime import datetime, date
+from decimal import Decimal
+
+# 必须在导入应用之前设置，避免创建Groq客户端
+os.environ.setdefault("LLM_BACKEND", "stub")
+
+import httpx
+from mysql.connector import FieldType
+
+from main import app
+from app.services.nl2sql_service import get_nl2sql_service
+from app.services.cost_guard import get_cost_guard
+from app.services.llm_backend import StubBackend
+from app.utils.database import get_db
+from app.utils.cache import TTLCache
+
+# 服务端返回的流水线阶段（timing=true，按执行顺序），other 为客户端测得的总耗时减去各阶段之和（路由、编码等）
+STAGES = ("generate", "validate", "rewrite", "plan", "replica", "cost_guard", "execute", "serialize")
+# execute 阶段的组成部分：等待数据库线程、借出连接、结果缓存、执行SQL
+DB_STAGES = ("db_queue", "db_pool_wait", "result_cache", "db_query")
+PERCENTILES = (50, 95, 99)
+
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(?:\d+\s*,\s*)?(\d+)\s*;?\s*$", re.IGNORECASE)
+
+
+class StandInCursor:
+    """模拟 mysql.connector 游标：按SQL返回固定结构的合成结果"""
+
+    DESCRIPTION = [
+        ("id", FieldType.LONGLONG, None, None, None, None, 0, 0, 63),
+        ("name", FieldType.VAR_STRING, None, None, None, None, 1, 0, 45),
+        ("amount", FieldType.NEWDECIMAL, None, None, None, None, 1, 0, 63),
+        ("created_at", FieldType.DATETIME, None, None, None, None, 1, 0, 63),
+        ("order_date", FieldType.DATE, None, None, None, None, 1, 0, 63),
+    ]
+
+    def __init__(self, database):
+        self.database = database
+        self.description = None
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, query, params=None):
+        database = self.database
+        if database.latency:
+            time.sleep(database.latency)
+        upper = query.lstrip().upper()
+        if upper.startswith("SET") or upper.startswith("KILL"):
+            self.description, self._rows = None, []
+        elif upper.startswith("EXPLAIN"):
+            self.description = [("id",), ("table",), ("type",), ("rows",), ("filtered",)]
+            self._rows = [(1, "orders", "ref", database.rows, 100.0)]
+        elif "INFORMATION_SCHEMA" in upper:
+            self.description, self._rows = [("TABLE_NAME",), ("UPDATE_TIME",)], []
+        elif " MAX(" in upper:
+            # 结果缓存的表版本水位线
+            self.description = [("table",), ("max_key",)]
+            self._rows = [(table, 1) for table in re.findall(r"SELECT '(\w+)'", query)]
+        else:
+            match = _LIMIT_RE.search(query)
+            count = database.rows if match is None else min(int(match.group(1)), database.rows)
+            self.description = self.DESCRIPTION
+            self._rows = database.row_pool[:count]
+        self.rowcount = len(self._rows)
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class StandInDatabase:
+    """模拟数据库：每条语句等待 latency_ms 后返回最多 rows 行"""
+
+    def __init__(self, rows=100, latency_ms=0.0):
+        self.rows = rows
+        self.latency = latency_ms / 1000
+        self.row_pool = [
+            (i, f"user_{i}", Decimal(i) / 4, datetime(2024, 1, 1 + i % 28, i % 24), date(2024, 1 + i % 12, 1))
+            for i in range(rows)
+        ]
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+        return StandInConnection(self, self.connections)
+
+
+class StandInConnection:
+    def __init__(self, database, connection_id):
+        self.database = database
+        self.connection_id = connection_id
+
+    def cursor(self, dictionary=False, buffered=None):
+        return StandInCursor(self.database)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def install(args):
+    """把应用的模型后端和数据库替换为本地桩
+
+    返回恢复函数，调用后还原被替换的属性并清空压测期间写入的缓存
+    """
+    nl2sql = get_nl2sql_service()
+    db = get_db()
+    guard = get_cost_guard()
+    saved = [
+        (nl2sql, {name: nl2sql.__dict__.get(name) for name in ("llm", "fast_path", "sql_cache")}),
+        (guard, {"explain_cache": guard.explain_cache}),
+        (db, {"result_cache": db.result_cache}),
+        (db.pool, {"connect_fn": db.pool.connect_fn}),
+    ]
+
+    # 示例问题的SQL取自模板快速通道，保证桩后端返回的SQL能通过验证
+    fixtures = {}
+    if nl2sql.fast_path is not None:
+        for question in sample_questions():
+            matched = nl2sql.fast_path.match(question)
+            if matched is not None:
+                fixtures[question] = matched["sql"]
+    nl2sql.llm = StubBackend(fixtures, latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                             error_rate=args.llm_error_rate, seed=args.seed)
+    if args.no_fast_path:
+        nl2sql.fast_path = None
+    if args.no_cache:
+        nl2sql.sql_cache = TTLCache(max_size=0)
+        guard.explain_cache = TTLCache(max_size=0)
+        db.result_cache = None
+
+    database = StandInDatabase(rows=args.rows, latency_ms=args.db_latency_ms)
+    db.pool.close_all()
+    db.pool.connect_fn = database.connect
+
+    def restore():
+        db.pool.close_all()
+        for target, attributes in saved:
+            target.__dict__.update(attributes)
+        nl2sql.clear_cache()
+        guard.explain_cache.clear()
+        if db.result_cache is not None:
+            db.result_cache.clear()
+    return restore
+
+def sample_questions():
+    """API示例查询中的问题"""
+    from app.api.query import get_sample_queries
+    return [item["question"] for item in asyncio.run(get_sample_queries())["sample_queries"]]
+
+def load_mix(path):
+    """问题组合：JSON文件 {"问题": 权重} 或 ["问题", ...]，未指定时使用示例查询（等权重）"""
+    if not path:
+        return {question: 1 for question in sample_questions()}
+    with open(path, encoding="utf-8") as f:
+        mix = json.load(f)
+    return {question: 1 for question in mix} if isinstance(mix, list) else mix
+
+
+def percentile(sorted_values, p):
+    """线性插值百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def summarize(values):
+    """延迟分布（毫秒）"""
+    values = sorted(values)
+    summary = {"count": len(values), "mean": sum(values) / len(values) * 1000 if values else 0.0}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = percentile(values, p) * 1000
+    summary["max"] = values[-1] * 1000 if values else 0.0
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+async def run_load(args, mix):
+    """按并发数发送请求，返回每个请求的 (状态, 各阶段耗时)"""
+    rng = random.Random(args.seed)
+    questions = list(mix)
+    weights = [mix[question] for question in questions]
+    plan = rng.choices(questions, weights=weights, k=args.requests)
+    params = {"timing": "true"}
+    if args.shape != "records":
+        params["shape"] = args.shape
+    samples = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        async def one(question):
+            start = time.perf_counter()
+            times = {}
+            try:
+                response = await client.post("/api/query", json={"question": question}, params=params)
+                body = response.json() if response.status_code == 200 else {}
+                ok = body.get("success", False)
+                size = len(response.content)
+                # 服务端各阶段耗时（毫秒）-> 秒
+                times = {name: value / 1000 for name, value in (body.get("timings") or {}).items()}
+            except Exception as e:
+                print(f"[ERROR] 请求失败: {e}")
+                ok, size = False, 0
+            times["total"] = time.perf_counter() - start
+            samples.append((ok, size, times))
+
+        async def worker(queue):
+            while queue:
+                await one(queue.pop())
+
+        queue = list(reversed(plan))
+        for question in questions[:args.warmup]:
+            await one(question)
+        samples.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker(queue) for _ in range(max(args.concurrency, 1))])
+        duration = time.perf_counter() - started
+    return samples, duration
+
+def build_report(args, samples, duration, tracemalloc_peak):
+    """汇总压测结果"""
+    stages = {}
+    for stage in STAGES + DB_STAGES + ("other", "total"):
+        values = []
+        for _, _, times in samples:
+            if stage == "other":
+                values.append(max(times["total"] - sum(times.get(s, 0.0) for s in STAGES), 0.0))
+            elif stage in times:
+                values.append(times[stage])
+        stages[stage] = summarize(values)
+
+    errors = sum(1 for ok, _, _ in samples if not ok)
+    nl2sql = get_nl2sql_service()
+    db = get_db()
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "tolerance", "min_delta_ms")},
+        "requests": len(samples),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "qps": round(len(samples) / duration, 2) if duration else 0.0,
+        "response_bytes_mean": round(sum(size for _, size, _ in samples) / len(samples), 1) if samples else 0,
+        "stages_ms": stages,
+        "memory": {
+            # Linux下 ru_maxrss 单位为KB
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "tracemalloc_peak_kb": round(tracemalloc_peak / 1024, 1) if tracemalloc_peak is not None else None
+        },
+        "caches": {
+            "sql": nl2sql.sql_cache.stats(),
+            "result": db.result_cache.stats() if db.result_cache is not None else None
+        },
+        "llm": nl2sql.llm.stats()
+    }
+
+def compare(report, baseline, tolerance, min_delta_ms=0.5):
+    """与基线比较，返回退化的指标列表
+
+    QPS 下降或各阶段 p50/p95/p99 上升超过 tolerance（比例）视为退化；
+    延迟变化小于 min_delta_ms 时忽略（亚毫秒级阶段的相对波动没有意义）
+    """
+    regressions = []
+
+    def check(name, current, previous, higher_is_better, min_delta=0.0):
+        if not previous:
+            return
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        regressed = worse > tolerance and abs(current - previous) >= min_delta
+        print(f"  {name:<24} {previous:>10.2f} -> {current:>10.2f}  ({change:+.1%}) {'退化' if regressed else '正常'}")
+        if regressed:
+            regressions.append(name)
+
+    print("[INFO] 与基线比较:")
+    changed = [key for key, value in report["config"].items() if baseline.get("config", {}).get(key, value) != value]
+    if changed:
+        print(f"[INFO] 注意：与基线的压测参数不同: {', '.join(changed)}")
+    check("qps", report["qps"], baseline.get("qps"), True)
+    for stage, summary in report["stages_ms"].items():
+        previous = baseline.get("stages_ms", {}).get(stage, {})
+        for p in PERCENTILES:
+            key = f"p{p}"
+            check(f"{stage}.{key}", summary[key], previous.get(key), False, min_delta_ms)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chat2BI 端到端压测工具（本地桩模型 + 模拟数据库）")
+    parser.add_argument("--requests", type=int, default=1000, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发数")
+    parser.add_argument("--warmup", type=int, default=6, help="正式计时前预热的问题数")
+    parser.add_argument("--mix", help='问题组合JSON文件：{"问题": 权重} 或 ["问题", ...]，默认使用示例查询')
+    parser.add_argument("--shape", default="records", choices=["records", "columns"], help="结果形状")
+    parser.add_argument("--rows", type=int, default=100, help="模拟数据库每个查询最多返回的行数")
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="模拟数据库每条语句的延迟")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="桩模型后端的延迟")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0, help="桩模型后端延迟的随机波动")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="桩模型后端的失败率")
+    parser.add_argument("--no-fast-path", action="store_true", help="关闭模板快速通道，所有问题都调用模型")
+    parser.add_argument("--no-cache", action="store_true", help="关闭SQL缓存、EXPLAIN缓存和结果缓存")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计Python内存分配峰值（有额外开销）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--output", help="结果JSON文件")
+    parser.add_argument("--baseline", help="基线结果JSON文件，用于比较")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的退化比例")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="延迟变化小于该值时不算退化")
+    return parser.parse_args(argv)
+
+def run_benchmark(args):
+    """执行压测并返回结果"""
+    restore = install(args)
+    try:
+        mix = load_mix(args.mix)
+        if args.tracemalloc:
+            tracemalloc.start()
+        samples, duration = asyncio.run(run_load(args, mix))
+        peak = None
+        if args.tracemalloc:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return build_report(args, samples, duration, peak)
+    finally:
+        restore()
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"[INFO] 压测开始: {args.requests} 个请求，并发 {args.concurrency}")
+    report = run_benchmark(args)
+
+    print(f"[INFO] QPS: {report['qps']}  错误: {report['errors']}/{report['requests']}")
+    print(f"[INFO] {'阶段':<12}{'p50':>10}{'p95':>10}{'p99':>10}  (毫秒)")
+    for stage, summary in report["stages_ms"].items():
+        print(f"       {stage:<12}{summary['p50']:>10.2f}{summary['p95']:>10.2f}{summary['p99']:>10.2f}")
+    print(f"[INFO] 内存峰值: {report['memory']['max_rss_kb']} KB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[SUCCESS] 结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"[ERROR] 性能退化: {', '.join(regressions)}")
+            return 1
+        print("[SUCCESS] 没有超过容差的性能退化")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
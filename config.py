@@ -1,20 +1,118 @@
 import os
+import secrets
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+# 模型后端：groq（Groq API）或 stub（本地桩，不访问网络，用于离线压测）
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq").lower()
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 500))
+LLM_TOP_P = float(os.getenv("LLM_TOP_P", 0.9))
+
 # Groq API配置
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_MODEL = "llama3-8b-8192"
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+
+# 本地桩后端：问题 -> SQL 的JSON文件（为空时使用内置示例）、注入的延迟（毫秒）和失败率
+LLM_STUB_FIXTURES = os.getenv("LLM_STUB_FIXTURES", "")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", 0))
+LLM_STUB_LATENCY_JITTER_MS = float(os.getenv("LLM_STUB_LATENCY_JITTER_MS", 0))
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", 0))
+LLM_STUB_SEED = int(os.getenv("LLM_STUB_SEED")) if os.getenv("LLM_STUB_SEED") else None
 
 # 数据库配置（从database/config.py导入）
-import sys
-sys.path.append('database')
 from database.config import get_database_config
 
 DATABASE_CONFIG = get_database_config()
 
+# 自然语言转SQL缓存配置
+NL2SQL_CACHE_MAX_SIZE = int(os.getenv("NL2SQL_CACHE_MAX_SIZE", 2048))
+NL2SQL_CACHE_TTL = int(os.getenv("NL2SQL_CACHE_TTL", 3600))  # 秒，0表示不过期
+
+# 常见问题的模板快速通道（不调用模型）
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+
+# 按问题裁剪提示词中的schema，只保留相关的表
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+
+# 推测执行：同时发出多个SQL生成请求（温度不同），使用第一个通过验证的结果，1表示关闭；
+# 只用于异步生成（API），同步的 generate_sql 始终只调用一次模型
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", 1))
+# 各候选的温度，候选数多于温度个数时循环使用
+SPECULATIVE_TEMPERATURES = [float(t) for t in os.getenv("SPECULATIVE_TEMPERATURES", "0.1,0.4,0.7").split(",") if t.strip()]
+
+# 流式结果每次从数据库读取的行数
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 1000))
+# 流式导出的执行超时（毫秒）：非缓冲游标的执行时间包含向客户端发送结果的时间，远大于交互查询的 QUERY_TIMEOUT_MS
+STREAM_EXECUTION_TIMEOUT_MS = int(os.getenv("STREAM_EXECUTION_TIMEOUT_MS", 600000))
+
+# 批量查询：单次最多问题数、SQL生成的最大并发数
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 50))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+
+# 单次查询最多返回的行数，超出部分通过分页游标继续读取
+QUERY_ROW_LIMIT = int(os.getenv("QUERY_ROW_LIMIT", 1000))
+# 流式导出的行数上限
+STREAM_ROW_LIMIT = int(os.getenv("STREAM_ROW_LIMIT", 1000000))
+# 分页游标的签名密钥，未配置时每次启动随机生成（重启后旧游标失效）
+PAGINATION_SECRET = os.getenv("PAGINATION_SECRET") or secrets.token_hex(32)
+
+# 执行前代价检查（EXPLAIN）：估算扫描行数超过上限的查询被拒绝，超过降级阈值的查询使用更短的超时
+COST_GUARD_ENABLED = os.getenv("COST_GUARD_ENABLED", "true").lower() == "true"
+COST_MAX_ESTIMATED_ROWS = int(os.getenv("COST_MAX_ESTIMATED_ROWS", 10000000))
+COST_DOWNGRADE_ROWS = int(os.getenv("COST_DOWNGRADE_ROWS", 1000000))
+# 允许的全表扫描JOIN数量（只统计行数不少于 COST_FULL_SCAN_MIN_ROWS 的表）
+COST_MAX_FULL_SCAN_JOINS = int(os.getenv("COST_MAX_FULL_SCAN_JOINS", 1))
+COST_FULL_SCAN_MIN_ROWS = int(os.getenv("COST_FULL_SCAN_MIN_ROWS", 10000))
+EXPLAIN_CACHE_MAX_SIZE = int(os.getenv("EXPLAIN_CACHE_MAX_SIZE", 1024))
+EXPLAIN_CACHE_TTL = int(os.getenv("EXPLAIN_CACHE_TTL", 600))  # 秒
+# 查询执行超时（毫秒）：MAX_EXECUTION_TIME提示 + 客户端超时
+QUERY_TIMEOUT_MS = int(os.getenv("QUERY_TIMEOUT_MS", 15000))
+DOWNGRADED_QUERY_TIMEOUT_MS = int(os.getenv("DOWNGRADED_QUERY_TIMEOUT_MS", 3000))
+
+# 预聚合汇总表（默认关闭，需要建表权限）：匹配的聚合查询改为读取汇总表，结果最多滞后一个刷新间隔；
+# 后台刷新间隔（秒），<=0 表示只手动刷新
+ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "false").lower() == "true"
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", 300))
+# 增量刷新时重新计算最近若干天的汇总（覆盖已有订单的状态更新）
+ROLLUP_RECENT_DAYS = int(os.getenv("ROLLUP_RECENT_DAYS", 7))
+# 全量重建间隔（秒），同步更早订单的更新和删除（增量刷新只覆盖新行和最近几天），<=0 表示只在需要时全量重建
+ROLLUP_FULL_REFRESH_INTERVAL = float(os.getenv("ROLLUP_FULL_REFRESH_INTERVAL", 3600))
+# 汇总表距上次刷新超过该秒数时不再改写（刷新持续失败时回退到明细表），<=0 表示不限制
+ROLLUP_MAX_STALENESS = float(os.getenv("ROLLUP_MAX_STALENESS", 900))
+
+# 进程内列式副本（需要numpy）：支持的聚合查询在本地执行，不访问数据库
+REPLICA_ENABLED = os.getenv("REPLICA_ENABLED", "false").lower() == "true"
+# 增量刷新间隔（秒，按主键追加新行），<=0 表示启动时只加载一次
+REPLICA_REFRESH_INTERVAL = float(os.getenv("REPLICA_REFRESH_INTERVAL", 30))
+# 全量重新加载间隔（秒），同步已有行的更新和删除，<=0 表示只在行数不一致时重新加载
+REPLICA_FULL_REFRESH_INTERVAL = float(os.getenv("REPLICA_FULL_REFRESH_INTERVAL", 900))
+# 行数超过上限的表不加载，涉及这些表的查询回退到MySQL
+REPLICA_MAX_ROWS = int(os.getenv("REPLICA_MAX_ROWS", 5000000))
+
+# 查询日志：按SQL模板记录实际执行的SQL、用到的谓词/连接/分组列和执行耗时，供索引建议使用
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_MAX_ENTRIES = int(os.getenv("QUERY_LOG_MAX_ENTRIES", 2000))
+# 同时追加写入的JSONL文件（索引建议命令可以离线读取），为空时只保存在内存中
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "")
+# 索引建议：用EXPLAIN验证候选索引时使用的数据库副本（同一实例上的另一个库），为空时只给出估算
+INDEX_ADVISOR_DATABASE = os.getenv("INDEX_ADVISOR_DATABASE", "")
+
+# 数据库结构目录：从 information_schema 读取表结构（列类型、主外键、索引、枚举值、估算行数），数据库不可用时使用静态配置
+SCHEMA_CATALOG_ENABLED = os.getenv("SCHEMA_CATALOG_ENABLED", "true").lower() == "true"
+# DDL变更检查间隔（秒，只比较结构指纹，指纹变化时重新读取），<=0 表示启动时只读取一次
+SCHEMA_CATALOG_CHECK_INTERVAL = float(os.getenv("SCHEMA_CATALOG_CHECK_INTERVAL", 60))
+# 定期完整重新读取的间隔（秒，更新估算行数），<=0 表示只在DDL变化时重新读取
+SCHEMA_CATALOG_REFRESH_INTERVAL = float(os.getenv("SCHEMA_CATALOG_REFRESH_INTERVAL", 3600))
+# 不对外暴露的表（逗号分隔的通配符，如汇总表）
+SCHEMA_CATALOG_EXCLUDE = [p.strip() for p in os.getenv("SCHEMA_CATALOG_EXCLUDE", "rollup_*").split(",") if p.strip()]
+
+# 启动预热：必需步骤（连接池、提示词）失败后的重试间隔（秒），<=0 表示不重试
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", 5))
+# 预热时执行模板快速通道能回答的示例查询，填充汇总表改写、EXPLAIN和查询结果缓存（不调用模型）
+WARMUP_QUERIES_ENABLED = os.getenv("WARMUP_QUERIES_ENABLED", "true").lower() == "true"
+
 # API配置
 API_HOST = "0.0.0.0"
 API_PORT = 8000
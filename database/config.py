@@ -13,6 +13,28 @@ DATABASE_CONFIG = {
     'autocommit': True
 }
 
+# 数据库连接池配置
+POOL_CONFIG = {
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+    'max_lifetime': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),  # 秒
+    'idle_check_interval': int(os.getenv('DB_POOL_IDLE_CHECK_INTERVAL', 30)),  # 秒
+    'checkout_timeout': float(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 10)),  # 秒
+    # 执行阻塞数据库调用的线程数，默认与最大连接数一致
+    'executor_workers': int(os.getenv('DB_EXECUTOR_WORKERS', os.getenv('DB_POOL_MAX_SIZE', 10)))
+}
+
+# 查询结果缓存配置
+RESULT_CACHE_CONFIG = {
+    'enabled': os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true',
+    'max_bytes': int(os.getenv('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    'max_entry_bytes': int(os.getenv('RESULT_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024)),
+    'ttl': int(os.getenv('RESULT_CACHE_TTL', 600)),
+    # 表水位线检查间隔（秒）：本服务的写入会显式bump，水位线只用于发现外部写入，外部写入最多在该秒数后生效；
+    # 0每次命中都检查（每次命中多两条查询），<0只依赖显式bump
+    'check_interval': float(os.getenv('RESULT_CACHE_CHECK_INTERVAL', 5))
+}
+
 # 数据库表信息（用于自然语言转SQL）
 TABLE_SCHEMA = {
     'users': {
@@ -132,6 +154,15 @@ TABLE_RELATIONSHIPS = {
     }
 }
 
+# 表的中文别名和业务关键词（用于根据问题筛选相关的表）
+TABLE_ALIASES = {
+    'users': ['用户', '会员', '客户', '顾客', '注册'],
+    'categories': ['分类', '类别', '品类', '类目'],
+    'products': ['商品', '产品', '货品', '库存', '品牌', '价格', '利润'],
+    'orders': ['订单', '销售', '销售额', '销售金额', '营收', '收入', '支付', '下单', '实付', '运费', '优惠'],
+    'order_items': ['订单详情', '订单项', '明细', '销量', '卖得', '受欢迎', '畅销', '购买数量']
+}
+
 # 枚举值定义
 ENUM_VALUES = {
     'gender': ['Male', 'Female', 'Other'],
@@ -144,6 +175,14 @@ def get_database_config() -> Dict[str, Any]:
     """获取数据库配置"""
     return DATABASE_CONFIG.copy()
 
+def get_pool_config() -> Dict[str, Any]:
+    """获取连接池配置"""
+    return POOL_CONFIG.copy()
+
+def get_result_cache_config() -> Dict[str, Any]:
+    """获取查询结果缓存配置"""
+    return RESULT_CACHE_CONFIG.copy()
+
 def get_table_schema() -> Dict[str, Dict[str, Any]]:
     """获取表结构信息"""
     return TABLE_SCHEMA.copy()
@@ -156,6 +195,10 @@ def get_table_relationships() -> Dict[str, Dict[str, str]]:
     """获取表关系定义"""
     return TABLE_RELATIONSHIPS.copy()
 
+def get_table_aliases() -> Dict[str, list]:
+    """获取表的中文别名和业务关键词"""
+    return TABLE_ALIASES.copy()
+
 def get_enum_values() -> Dict[str, list]:
     """获取枚举值定义"""
     return ENUM_VALUES.copy() 
\ No newline at end of file
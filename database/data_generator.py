@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+大规模模拟数据生成与批量导入
+按订单数推算各表规模，生成参照一致、分布有偏的模拟数据，流式写入CSV后用 LOAD DATA LOCAL INFILE 导入
+（服务端不允许时改用分批 executemany），导入期间删除二级索引，导入完成后重建
+"""
+
+import os
+import csv
+import time
+import random
+import tempfile
+import itertools
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import mysql.connector
+
+# 各表导入的列（显式给出主键，保证表之间的引用一致）
+TABLE_COLUMNS = {
+    'categories': ['category_id', 'category_name', 'parent_category_id', 'created_at'],
+    'users': ['user_id', 'username', 'email', 'phone', 'gender', 'age', 'city', 'province',
+              'registration_date', 'last_login_date', 'user_level', 'created_at'],
+    'products': ['product_id', 'product_name', 'category_id', 'brand', 'price', 'cost', 'stock_quantity',
+                 'description', 'is_active', 'created_at'],
+    'orders': ['order_id', 'user_id', 'order_date', 'total_amount', 'discount_amount', 'shipping_fee',
+               'final_amount', 'payment_method', 'order_status', 'shipping_address', 'created_at'],
+    'order_items': ['order_item_id', 'order_id', 'product_id', 'quantity', 'unit_price', 'total_price', 'created_at'],
+}
+
+# 按外键依赖排列的导入顺序
+LOAD_ORDER = ['categories', 'users', 'products', 'orders', 'order_items']
+
+# (一级分类, 商品数权重, [(二级分类, 品牌（按热度排列）, 价格区间（元）)])
+CATEGORY_TREE = [
+    ('Electronics', 3, [
+        ('Smartphones', ['Apple', 'Xiaomi', 'Huawei', 'Samsung', 'OPPO', 'vivo'], (999, 9999)),
+        ('Laptops', ['Lenovo', 'Apple', 'Huawei', 'Dell', 'HP', 'ASUS'], (2999, 19999)),
+        ('Audio', ['Apple', 'Sony', 'Xiaomi', 'Bose', 'JBL'], (99, 3999)),
+    ]),
+    ('Clothing', 3, [
+        ('Men Clothing', ['Uniqlo', 'Nike', 'Adidas', 'Li-Ning', 'Jack Jones'], (49, 1299)),
+        ('Women Clothing', ['Uniqlo', 'Zara', 'H&M', 'ONLY', 'Ur'], (49, 1599)),
+        ('Shoes', ['Nike', 'Adidas', 'Anta', 'Li-Ning', 'New Balance'], (199, 1999)),
+    ]),
+    ('Books', 1, [
+        ('Fiction Books', ['Penguin', 'Bloomsbury', 'CITIC Press', 'People Literature'], (19, 199)),
+        ('Technical Books', ['O Reilly', 'Posts & Telecom Press', 'China Machine Press'], (39, 299)),
+    ]),
+    ('Home & Garden', 2, [
+        ('Kitchen', ['Midea', 'Supor', 'Philips', 'Joyoung'], (49, 2999)),
+        ('Furniture', ['IKEA', 'Kuka', 'Quanu'], (199, 9999)),
+        ('Cleaning', ['Dyson', 'Ecovacs', 'Roborock', 'Xiaomi'], (99, 4999)),
+    ]),
+    ('Sports', 1, [
+        ('Fitness', ['Decathlon', 'Keep', 'Lululemon'], (49, 2999)),
+        ('Outdoor', ['Decathlon', 'The North Face', 'Columbia', 'Kailas'], (99, 3999)),
+    ]),
+    ('Beauty', 2, [
+        ('Skincare', ['Pechoin', 'Lancome', 'Estee Lauder', 'SK-II'], (59, 2999)),
+        ('Makeup', ['Perfect Diary', 'MAC', 'Dior', 'Florasis'], (39, 999)),
+    ]),
+]
+
+# (城市, 省份, 权重)，权重大致与城市规模和网购活跃度成比例
+CITIES = [
+    ('Shanghai', 'Shanghai', 25), ('Beijing', 'Beijing', 23), ('Shenzhen', 'Guangdong', 18),
+    ('Guangzhou', 'Guangdong', 18), ('Chengdu', 'Sichuan', 15), ('Chongqing', 'Chongqing', 14),
+    ('Hangzhou', 'Zhejiang', 13), ('Wuhan', 'Hubei', 11), ('Suzhou', 'Jiangsu', 10), ('Xian', 'Shaanxi', 10),
+    ('Nanjing', 'Jiangsu', 9), ('Tianjin', 'Tianjin', 9), ('Changsha', 'Hunan', 8), ('Zhengzhou', 'Henan', 8),
+    ('Dongguan', 'Guangdong', 7), ('Qingdao', 'Shandong', 7), ('Shenyang', 'Liaoning', 6), ('Ningbo', 'Zhejiang', 6),
+    ('Kunming', 'Yunnan', 5), ('Hefei', 'Anhui', 5), ('Fuzhou', 'Fujian', 4), ('Xiamen', 'Fujian', 4),
+    ('Dalian', 'Liaoning', 4), ('Jinan', 'Shandong', 4), ('Harbin', 'Heilongjiang', 3), ('Nanning', 'Guangxi', 3),
+    ('Guiyang', 'Guizhou', 3), ('Lanzhou', 'Gansu', 2), ('Urumqi', 'Xinjiang', 2), ('Haikou', 'Hainan', 2),
+]
+
+FIRST_NAMES = ['wei', 'fang', 'na', 'min', 'jing', 'li', 'qiang', 'lei', 'jun', 'yang', 'yong', 'yan', 'jie', 'tao',
+               'ming', 'chao', 'xiu', 'xia', 'ping', 'gang', 'john', 'jane', 'mike', 'lisa', 'david', 'emma']
+LAST_NAMES = ['wang', 'li', 'zhang', 'liu', 'chen', 'yang', 'huang', 'zhao', 'wu', 'zhou', 'xu', 'sun', 'ma', 'zhu',
+              'hu', 'guo', 'he', 'gao', 'lin', 'luo']
+STREETS = ['Renmin Road', 'Zhongshan Road', 'Jiefang Avenue', 'Century Avenue', 'Binjiang Road', 'Xinhua Street',
+           'Jianshe Road', 'Heping Road', 'Changjiang Road', 'Huaihai Road']
+
+GENDERS = (('Male', 48), ('Female', 49), ('Other', 3))
+USER_LEVELS = (('Bronze', 50), ('Silver', 30), ('Gold', 15), ('Platinum', 5))
+PAYMENT_METHODS = (('Alipay', 38), ('WeChat Pay', 34), ('Credit Card', 12), ('Debit Card', 10), ('PayPal', 6))
+# 订单商品数、每件商品购买数量的分布
+ITEM_COUNTS = ((1, 45), (2, 28), (3, 15), (4, 8), (5, 4))
+QUANTITIES = ((1, 80), (2, 15), (3, 5))
+# 各小时的下单权重（晚间高峰）
+HOUR_WEIGHTS = (2, 1, 1, 1, 1, 1, 2, 3, 5, 6, 7, 7, 8, 7, 6, 6, 6, 7, 8, 10, 12, 12, 9, 5)
+# 大促日期 (月, 日) -> 订单量倍数
+PROMOTION_DAYS = {(11, 11): 4.0, (12, 12): 2.0, (6, 18): 2.5, (11, 10): 1.5, (6, 17): 1.3}
+
+# 老用户下单更频繁：用户序号按 random() ** USER_SKEW 选取（越大越集中在早注册的用户）
+USER_SKEW = 1.8
+# 商品热度服从 Zipf 分布的指数
+PRODUCT_SKEW = 0.9
+# 满99元包邮，否则运费10元（单位：分）
+FREE_SHIPPING_CENTS = 9900
+SHIPPING_FEE_CENTS = 1000
+
+# LOAD DATA LOCAL INFILE 被拒绝的错误码（服务端或客户端未开启 local_infile）
+LOCAL_INFILE_ERRORS = (1148, 2068, 3948, 3950)
+
+_SUFFIXES = {'k': 10 ** 3, 'm': 10 ** 6, 'b': 10 ** 9}
+
+
+def parse_count(text):
+    """解析数量参数：10M、500k、1.5m、20000"""
+    text = str(text).strip().lower().replace('_', '').replace(',', '')
+    multiplier = _SUFFIXES.get(text[-1:], 1)
+    number = text[:-1] if text[-1:] in _SUFFIXES else text
+    try:
+        value = int(float(number) * multiplier)
+    except ValueError:
+        raise ValueError(f"无法识别的数量: {text}")
+    if value <= 0:
+        raise ValueError(f"数量必须大于0: {text}")
+    return value
+
+
+@dataclass(frozen=True)
+class GenerationPlan:
+    """各表规模和时间范围；用户和商品数量默认按订单数推算"""
+    orders: int
+    users: int
+    products: int
+    start_date: date
+    end_date: date
+    seed: int = 42
+
+    @classmethod
+    def for_orders(cls, orders, users=None, products=None, start_date=None, end_date=None, seed=42):
+        end_date = end_date or date.today() - timedelta(days=1)
+        start_date = start_date or end_date - timedelta(days=2 * 365 - 1)
+        if start_date > end_date:
+            raise ValueError("开始日期不能晚于结束日期")
+        return cls(
+            orders=orders,
+            users=users or max(100, orders // 8),
+            products=products or max(50, min(200000, orders // 500)),
+            start_date=start_date,
+            end_date=end_date,
+            seed=seed
+        )
+
+    @property
+    def registration_start(self):
+        """用户注册从订单开始前一年开始"""
+        return self.start_date - timedelta(days=365)
+
+
+def _money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+def _cumulative(pairs):
+    values = [value for value, _ in pairs]
+    return values, list(itertools.accumulate(weight for _, weight in pairs))
+
+
+class DataGenerator:
+    """确定性（按随机种子）的模拟数据生成器，各方法按块产出元组行（NULL为None，其余为字符串或整数）"""
+
+    def __init__(self, plan, chunk_size=100000):
+        self.plan = plan
+        self.chunk_size = chunk_size
+        self.rng = random.Random(plan.seed)
+        self.leaf_categories = []  # (分类ID, 名称, 品牌, 价格区间, 商品数权重)
+        self.product_prices = []  # 商品价格（分），下标为 product_id - 1
+        self.user_cities = bytearray()  # 用户所在城市在 CITIES 中的下标
+        self.registration_span = (plan.end_date - plan.registration_start).days + 1
+
+    def _chunks(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def categories(self):
+        """一级分类在前，二级分类在后"""
+        created = f"{self.plan.registration_start.isoformat()} 00:00:00"
+        rows = [(index, name, None, created) for index, (name, _, _) in enumerate(CATEGORY_TREE, 1)]
+        self.leaf_categories = []
+        category_id = len(CATEGORY_TREE)
+        for parent_id, (_, weight, children) in enumerate(CATEGORY_TREE, 1):
+            for name, brands, price_range in children:
+                category_id += 1
+                rows.append((category_id, name, parent_id, created))
+                self.leaf_categories.append((category_id, name, brands, price_range, weight))
+        yield rows
+
+    def registration_offset(self, user_id):
+        """用户注册日期（距 registration_start 的天数），按 user_id 递增均匀分布"""
+        return (user_id - 1) * self.registration_span // self.plan.users
+
+    def registered_users(self, day):
+        """到这一天为止已注册的用户数（即可以下单的用户 ID 上限）"""
+        offset = (day - self.plan.registration_start).days
+        return min(self.plan.users, -(-(offset + 1) * self.plan.users // self.registration_span))
+
+    def users(self):
+        rng = self.rng
+        cities, city_cum = _cumulative([(index, weight) for index, (_, _, weight) in enumerate(CITIES)])
+        genders, gender_cum = _cumulative(GENDERS)
+        levels, level_cum = _cumulative(USER_LEVELS)
+        start = self.plan.registration_start
+        end_offset = (self.plan.end_date - start).days
+
+        def rows():
+            for user_id in range(1, self.plan.users + 1):
+                city = rng.choices(cities, cum_weights=city_cum)[0]
+                self.user_cities.append(city)
+                username = f"{rng.choice(FIRST_NAMES)}_{rng.choice(LAST_NAMES)}{user_id}"
+                registered = self.registration_offset(user_id)
+                # 最近登录时间偏向近期
+                login = registered + int((end_offset - registered) * (1 - rng.random() ** 3))
+                login_time = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}"
+                registration_date = (start + timedelta(days=registered)).isoformat()
+                yield (
+                    user_id, username, f"{username}@example.com", f"1{rng.choice('3578')}{rng.randrange(10 ** 9):09d}",
+                    rng.choices(genders, cum_weights=gender_cum)[0], min(70, max(18, int(rng.gauss(32, 9)))),
+                    CITIES[city][0], CITIES[city][1], registration_date,
+                    f"{(start + timedelta(days=login)).isoformat()} {login_time}",
+                    rng.choices(levels, cum_weights=level_cum)[0], f"{registration_date} 00:00:00"
+                )
+
+        return self._chunks(rows())
+
+    def products(self):
+        """价格在分类的价格区间内按对数均匀分布；少量商品缺货或下架"""
+        rng = self.rng
+        if not self.leaf_categories:
+            list(self.categories())
+        weights = [leaf[-1] for leaf in self.leaf_categories]
+        created = f"{self.plan.registration_start.isoformat()} 00:00:00"
+
+        def rows():
+            for product_id in range(1, self.plan.products + 1):
+                category_id, name, brands, (low, high), _ = rng.choices(self.leaf_categories, weights=weights)[0]
+                brand = brands[min(int(len(brands) * rng.random() ** 2), len(brands) - 1)]
+                price = int(low * (high / low) ** rng.random()) * 100 - 10  # 以 .90 结尾
+                cost = price * rng.randint(45, 80) // 100
+                self.product_prices.append(price)
+                roll = rng.random()
+                stock = 0 if roll < 0.03 else rng.randint(1, 49) if roll < 0.18 else int(rng.paretovariate(1.2) * 50)
+                yield (
+                    product_id, f"{brand} {name} {product_id}", category_id, brand, _money(price), _money(cost),
+                    min(stock, 100000), f"{brand} {name}", 1 if rng.random() < 0.95 else 0, created
+                )
+
+        return self._chunks(rows())
+
+    def daily_orders(self):
+        """每天的订单数：随时间线性增长，周末和大促日更多；总数恰好为 plan.orders"""
+        days = (self.plan.end_date - self.plan.start_date).days + 1
+        weights = []
+        for offset in range(days):
+            day = self.plan.start_date + timedelta(days=offset)
+            weight = (1 + offset / max(days - 1, 1)) * (1.15 if day.weekday() >= 5 else 1.0)
+            weights.append(weight * PROMOTION_DAYS.get((day.month, day.day), 1.0))
+        total = sum(weights)
+        exact = [self.plan.orders * weight / total for weight in weights]
+        counts = [int(value) for value in exact]
+        remainder = self.plan.orders - sum(counts)
+        for offset in sorted(range(days), key=lambda i: counts[i] - exact[i])[:remainder]:
+            counts[offset] += 1
+        return [(self.plan.start_date + timedelta(days=offset), count) for offset, count in enumerate(counts)]
+
+    def orders(self):
+        """按时间顺序生成订单及其明细，每块产出 (订单行, 订单详情行)
+
+        金额一致：明细金额 = 单价 × 数量，订单总额 = 明细之和，实付 = 总额 - 优惠 + 运费；
+        下单用户在下单日之前已注册；商品热度服从 Zipf 分布；订单状态取决于距今天数
+        """
+        rng = self.rng
+        if not self.product_prices:
+            for _ in self.products():
+                pass
+        if not self.user_cities:
+            for _ in self.users():
+                pass
+        popular = list(range(1, self.plan.products + 1))
+        rng.shuffle(popular)
+        product_cum = list(itertools.accumulate(1 / rank ** PRODUCT_SKEW for rank in range(1, len(popular) + 1)))
+        hours, hour_cum = _cumulative(list(enumerate(HOUR_WEIGHTS)))
+        item_counts, item_count_cum = _cumulative(ITEM_COUNTS)
+        quantities, quantity_cum = _cumulative(QUANTITIES)
+        payments, payment_cum = _cumulative(PAYMENT_METHODS)
+        prices = self.product_prices
+
+        order_id = item_id = 0
+        orders, items = [], []
+        for day, count in self.daily_orders():
+            if not count:
+                continue
+            day_text = day.isoformat()
+            seconds = sorted(hour * 3600 + rng.randrange(3600)
+                             for hour in rng.choices(hours, cum_weights=hour_cum, k=count))
+            counts = rng.choices(item_counts, cum_weights=item_count_cum, k=count)
+            picks = rng.choices(popular, cum_weights=product_cum, k=sum(counts))
+            amounts = rng.choices(quantities, cum_weights=quantity_cum, k=len(picks))
+            statuses = self._statuses((self.plan.end_date - day).days, count)
+            methods = rng.choices(payments, cum_weights=payment_cum, k=count)
+            eligible = self.registered_users(day)
+            position = 0
+            for index in range(count):
+                order_id += 1
+                second = seconds[index]
+                timestamp = f"{day_text} {second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+                total = 0
+                for _ in range(counts[index]):
+                    product_id, quantity = picks[position], amounts[position]
+                    position += 1
+                    item_id += 1
+                    line = prices[product_id - 1] * quantity
+                    total += line
+                    items.append((item_id, order_id, product_id, quantity, _money(prices[product_id - 1]),
+                                  _money(line), timestamp))
+                discount = total * rng.choice((5, 10, 15, 20)) // 100 if rng.random() < 0.3 else 0
+                shipping = 0 if total >= FREE_SHIPPING_CENTS else SHIPPING_FEE_CENTS
+                user_id = 1 + int(eligible * rng.random() ** USER_SKEW)
+                city, province, _ = CITIES[self.user_cities[user_id - 1]]
+                orders.append((
+                    order_id, user_id, timestamp, _money(total), _money(discount), _money(shipping),
+                    _money(total - discount + shipping), methods[index], statuses[index],
+                    f"{city}, {province}, {rng.choice(STREETS)} {rng.randint(1, 999)}", timestamp
+                ))
+                if len(orders) >= self.chunk_size:
+                    yield orders, items
+                    orders, items = [], []
+        if orders:
+            yield orders, items
+
+    def _statuses(self, age_days, count):
+        """近期订单多为待处理、已发货，较早的订单多为已送达，少量取消"""
+        if age_days < 1:
+            choices = (('Pending', 60), ('Processing', 40))
+        elif age_days < 3:
+            choices = (('Pending', 10), ('Processing', 45), ('Shipped', 45))
+        elif age_days < 7:
+            choices = (('Shipped', 60), ('Delivered', 35), ('Cancelled', 5))
+        else:
+            choices = (('Delivered', 92), ('Cancelled', 6), ('Shipped', 2))
+        values, cum = _cumulative(choices)
+        return self.rng.choices(values, cum_weights=cum, k=count)
+
+
+class BulkLoader:
+    """批量导入：infile 时每块写入临时CSV后 LOAD DATA LOCAL INFILE，executemany 时分批多行INSERT
+
+    LOAD DATA LOCAL INFILE 被服务端拒绝时自动改用 executemany
+    """
+
+    def __init__(self, conn, method='infile', batch_size=5000):
+        self.conn = conn
+        self.method = method
+        self.batch_size = batch_size
+        self.loaded = {}
+
+    def load(self, table, rows):
+        if not rows:
+            return
+        if self.method == 'infile':
+            try:
+                self._load_infile(table, rows)
+            except mysql.connector.Error as e:
+                if e.errno not in LOCAL_INFILE_ERRORS:
+                    raise
+                print(f"[INFO] LOAD DATA LOCAL INFILE 不可用（{e}），改用 executemany 批量插入")
+                self.method = 'executemany'
+                self._load_executemany(table, rows)
+        else:
+            self._load_executemany(table, rows)
+        self.loaded[table] = self.loaded.get(table, 0) + len(rows)
+
+    def _load_infile(self, table, rows):
+        handle, path = tempfile.mkstemp(prefix=f"chat2bi_{table}_", suffix='.csv')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerows(tuple('\\N' if value is None else value for value in row) for row in rows)
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE '{path.replace(os.sep, '/')}' INTO TABLE {table} "
+                    f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                    f"LINES TERMINATED BY '\\n' ({', '.join(TABLE_COLUMNS[table])})"
+                )
+                self.conn.commit()
+            finally:
+                cursor.close()
+        finally:
+            os.remove(path)
+
+    def _load_executemany(self, table, rows):
+        columns = TABLE_COLUMNS[table]
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        cursor = self.conn.cursor()
+        try:
+            for start in range(0, len(rows), self.batch_size):
+                # mysql.connector 把 INSERT ... VALUES 的 executemany 合并为一条多行INSERT
+                cursor.executemany(sql, rows[start:start + self.batch_size])
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+
+def secondary_indexes(cursor, tables):
+    """导入前可以删除的二级索引：表 -> [(索引名, 列定义)]
+
+    主键、唯一索引（保证email唯一）和外键依赖的索引（首列为外键列）保留
+    """
+    cursor.execute(
+        "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL"
+    )
+    foreign_keys = {(table.lower(), column.lower()) for table, column in cursor.fetchall()}
+    cursor.execute(
+        "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, SUB_PART FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND NON_UNIQUE = 1 ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+    )
+    indexes = {}
+    for table, name, column, sub_part in cursor.fetchall():
+        if table.lower() in tables:
+            indexes.setdefault((table.lower(), name), []).append((column.lower(), sub_part))
+    result = {}
+    for (table, name), columns in indexes.items():
+        if (table, columns[0][0]) in foreign_keys:
+            continue
+        definition = ', '.join(f"{column}({sub_part})" if sub_part else column for column, sub_part in columns)
+        result.setdefault(table, []).append((name, definition))
+    return result
+
+def _alter_indexes(cursor, indexes, action):
+    for table, items in indexes.items():
+        if action == 'drop':
+            clauses = ', '.join(f"DROP INDEX {name}" for name, _ in items)
+        else:
+            clauses = ', '.join(f"ADD INDEX {name} ({definition})" for name, definition in items)
+        started = time.time()
+        cursor.execute(f"ALTER TABLE {table} {clauses}")
+        names = ', '.join(name for name, _ in items)
+        print(f"[INFO] {table}: {'删除' if action == 'drop' else '重建'}索引 {names}（{time.time() - started:.1f}秒）")
+
+
+class _Progress:
+    def __init__(self, total_orders):
+        self.total_orders = total_orders
+        self.started = time.time()
+        self.last = 0.0
+
+    def report(self, loader, force=False):
+        now = time.time()
+        if not force and now - self.last < 5:
+            return
+        self.last = now
+        elapsed = now - self.started
+        rows = sum(loader.loaded.values())
+        orders = loader.loaded.get('orders', 0)
+        print(f"[INFO] 订单 {orders:,}/{self.total_orders:,}（{orders / self.total_orders:.1%}），"
+              f"订单详情 {loader.loaded.get('order_items', 0):,}，共 {rows:,} 行，"
+              f"{rows / max(elapsed, 1e-9):,.0f} 行/秒，已用 {elapsed:.0f} 秒")
+
+
+def reset_rollup_state(cursor):
+    """清空汇总表的刷新状态，服务下次刷新时全量重建汇总表（否则旧的水位线会让增量刷新保留已删除的数据）"""
+    cursor.execute("SHOW TABLES LIKE 'rollup_state'")
+    if cursor.fetchall():
+        cursor.execute("DELETE FROM rollup_state")
+        print("[INFO] 已清空汇总表刷新状态，服务将在下次刷新时全量重建（可调用 POST /api/admin/rollups/refresh 立即刷新）")
+
+
+def generate_and_load(conn, plan, method='infile', chunk_size=100000, batch_size=5000, replace=False):
+    """生成模拟数据并导入当前库；表中已有数据时需要 replace=True（先清空五张业务表）
+
+    导入期间关闭外键和唯一性检查、删除二级索引，结束后（包括失败时）重建索引；返回各表导入的行数
+    """
+    cursor = conn.cursor()
+    try:
+        non_empty = []
+        for table in LOAD_ORDER:
+            cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            if cursor.fetchall():
+                non_empty.append(table)
+        if non_empty and not replace:
+            raise ValueError(f"表中已有数据: {', '.join(non_empty)}，使用 --replace 清空后重新生成")
+
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        if replace:
+            for table in reversed(LOAD_ORDER):
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            reset_rollup_state(cursor)
+        indexes = secondary_indexes(cursor, LOAD_ORDER)
+        _alter_indexes(cursor, indexes, 'drop')
+        try:
+            generator = DataGenerator(plan, chunk_size)
+            loader = BulkLoader(conn, method, batch_size)
+            progress = _Progress(plan.orders)
+            print(f"[INFO] 生成 {plan.users:,} 个用户、{plan.products:,} 个商品、{plan.orders:,} 个订单"
+                  f"（{plan.start_date} ~ {plan.end_date}），导入方式: {method}")
+            for table, chunks in (('categories', generator.categories()), ('users', generator.users()),
+                                  ('products', generator.products())):
+                for rows in chunks:
+                    loader.load(table, rows)
+                    progress.report(loader)
+            for orders, items in generator.orders():
+                loader.load('orders', orders)
+                loader.load('order_items', items)
+                progress.report(loader)
+            progress.report(loader, force=True)
+        finally:
+            _alter_indexes(cursor, indexes, 'add')
+            cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+        return dict(loader.loaded)
+    finally:
+        cursor.close()
@@ -6,20 +6,30 @@
 
 import mysql.connector
 import os
+import sys
+import time
+from datetime import date
 from config import get_database_config
+from data_generator import GenerationPlan, generate_and_load, parse_count
+
+# 项目根目录加入路径，复用SQL词法解析切分语句
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app.utils.sql_parser import split_statements
+
+# SQL文件所在目录（与本脚本相同，不依赖当前工作目录）
+SQL_DIR = os.path.dirname(os.path.abspath(__file__))
 
 def read_sql_file(file_path):
     """读取SQL文件内容"""
-    with open(file_path, 'r', encoding='utf-8') as file:
+    with open(os.path.join(SQL_DIR, file_path), 'r', encoding='utf-8') as file:
         return file.read()
 
 def execute_sql_file(cursor, sql_content):
     """执行SQL文件内容"""
-    # 按分号分割SQL语句
-    statements = sql_content.split(';')
+    # 按顶层分号分割SQL语句（字符串和注释中的分号不分割）
+    statements = split_statements(sql_content)
     
     for statement in statements:
-        statement = statement.strip()
         if statement:
             try:
                 cursor.execute(statement)
@@ -28,8 +38,8 @@ def execute_sql_file(cursor, sql_content):
                 print(f"[ERROR] 执行失败: {err}")
                 print(f"  语句: {statement[:100]}...")
 
-def init_database():
-    """初始化数据库"""
+def init_database(sample_data=True):
+    """初始化数据库（sample_data 为False时只创建表结构）"""
     config = get_database_config()
     
     try:
@@ -52,9 +62,10 @@ def init_database():
         execute_sql_file(cursor, schema_sql)
         
         # 2. 插入示例数据
-        print("\n[DATA] 插入示例数据...")
-        data_sql = read_sql_file('sample_data.sql')
-        execute_sql_file(cursor, data_sql)
+        if sample_data:
+            print("\n[DATA] 插入示例数据...")
+            data_sql = read_sql_file('sample_data.sql')
+            execute_sql_file(cursor, data_sql)
         
         # 3. 验证数据
         print("\n[VERIFY] 验证数据...")
@@ -86,6 +97,43 @@ def init_database():
     
     return True
 
+def generate_data(args):
+    """生成大规模模拟数据并批量导入（表结构需已存在）"""
+    config = get_database_config()
+    try:
+        plan = GenerationPlan.for_orders(
+            args.orders, users=args.users, products=args.products,
+            start_date=date.fromisoformat(args.start_date) if args.start_date else None,
+            end_date=date.fromisoformat(args.end_date) if args.end_date else None,
+            seed=args.seed
+        )
+    except ValueError as err:
+        print(f"[ERROR] 参数错误: {err}")
+        return False
+    
+    started = time.time()
+    try:
+        conn = mysql.connector.connect(**config, allow_local_infile=args.loader == 'infile')
+    except mysql.connector.Error as err:
+        print(f"[ERROR] 数据库连接错误: {err}")
+        return False
+    try:
+        loaded = generate_and_load(conn, plan, method=args.loader, chunk_size=args.chunk_size,
+                                   batch_size=args.batch_size, replace=args.replace)
+    except ValueError as err:
+        print(f"[ERROR] {err}")
+        return False
+    except mysql.connector.Error as err:
+        print(f"[ERROR] 导入失败: {err}")
+        return False
+    finally:
+        conn.close()
+    
+    for table, count in loaded.items():
+        print(f"[OK] {table}: {count:,} 条记录")
+    print(f"\n[COMPLETE] 模拟数据导入完成，用时 {time.time() - started:.0f} 秒")
+    return True
+
 def test_connection():
     """测试数据库连接"""
     config = get_database_config()
@@ -123,13 +171,30 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='数据库初始化工具')
     parser.add_argument('--init', action='store_true', help='初始化数据库')
     parser.add_argument('--test', action='store_true', help='测试数据库连接')
+    parser.add_argument('--generate', action='store_true',
+                        help='生成大规模模拟数据并批量导入（与 --init 同时使用时不导入示例数据）')
+    parser.add_argument('--orders', type=parse_count, default=parse_count('1M'), help='订单数，如 10M、500k（默认1M）')
+    parser.add_argument('--users', type=parse_count, help='用户数（默认为订单数的1/8）')
+    parser.add_argument('--products', type=parse_count, help='商品数（默认为订单数的1/500，最多20万）')
+    parser.add_argument('--start-date', help='订单开始日期 YYYY-MM-DD（默认结束日期前两年）')
+    parser.add_argument('--end-date', help='订单结束日期 YYYY-MM-DD（默认昨天）')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子（相同参数生成相同数据）')
+    parser.add_argument('--loader', choices=['infile', 'executemany'], default='infile',
+                        help='导入方式：LOAD DATA LOCAL INFILE（默认，服务端不允许时自动改用executemany）或分批INSERT')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='每次生成并导入的行数（订单按订单数计）')
+    parser.add_argument('--batch-size', type=int, default=5000, help='executemany 每批插入的行数')
+    parser.add_argument('--replace', action='store_true', help='表中已有数据时先清空再导入')
     
     args = parser.parse_args()
     
-    if args.init:
-        init_database()
+    if args.init or args.generate:
+        if args.init and not init_database(sample_data=not args.generate):
+            sys.exit(1)
+        if args.generate and not generate_data(args):
+            sys.exit(1)
     elif args.test:
         test_connection()
     else:
-        print("请使用 --init 初始化数据库或 --test 测试连接")
-        print("例如: python init_db.py --init") 
\ No newline at end of file
+        print("请使用 --init 初始化数据库、--generate 生成模拟数据或 --test 测试连接")
+        print("例如: python init_db.py --init")
+        print("      python init_db.py --init --generate --orders 10M") 
\ No newline at end of file
@@ -15,6 +15,7 @@ const api = axios.create({
 // 查询请求类型
 export interface QueryRequest {
   question: string;
+  cursor?: string;
 }
 
 // 查询响应类型
@@ -26,6 +27,12 @@ export interface QueryResponse {
   count?: number;
   error?: string;
   execution_time?: number;
+  source?: 'template' | 'cache' | 'llm' | 'cursor';
+  truncated?: boolean;
+  next_cursor?: string | null;
+  timings?: Record<string, number> | null;
+  rollup?: string | null;
+  replica?: boolean | null;
 }
 
 // 示例查询类型
@@ -1,13 +1,48 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.query import router as query_router
+from fastapi.responses import JSONResponse
+from app.api.query import router as query_router, get_sample_queries, warm_queries
+from app.api.admin import router as admin_router
+from app.api.metrics import router as metrics_router
+from app.services.schema_catalog import get_schema_catalog
+from app.services.rollup import get_rollup_manager
+from app.services.replica import get_replica
+from app.services.warmup import create_warmup
+from app.services.query_log import get_query_log
+from app.utils.database import get_db
 import os
+from config import LLM_BACKEND
+
+@asynccontextmanager
+async def lifespan(app):
+    """启动时创建服务、开始后台刷新并在后台并行预热；预热完成前 /ready 返回503
+
+    导入模块时不建立连接、不创建模型客户端，服务实例在这里（或第一次使用时）创建
+    """
+    # 数据库结构目录、汇总表和列式副本在各自的后台线程中加载并定期刷新
+    services = [get_schema_catalog(), get_rollup_manager(), get_replica()]
+    for service in services:
+        service.start()
+    
+    questions = [item["question"] for item in (await get_sample_queries())["sample_queries"]]
+    app.state.warmup = create_warmup(questions, warm_queries)
+    app.state.warmup.start()
+    try:
+        yield
+    finally:
+        await app.state.warmup.stop()
+        for service in services:
+            service.stop()
+        get_query_log().flush()
+        get_db().disconnect()
 
 # 创建FastAPI应用实例
 app = FastAPI(
     title="Chat2BI API",
     description="将自然语言转换为SQL查询的API服务",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # 配置CORS中间件（允许前端访问）
@@ -21,12 +56,28 @@ app.add_middleware(
 
 # 包含API路由
 app.include_router(query_router, prefix="/api", tags=["query"])
+app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
+app.include_router(metrics_router, tags=["metrics"])
 
 # 基础健康检查接口
 @app.get("/")
 async def root():
     return {"message": "Chat2BI API is running", "status": "healthy"}
 
+# 存活检查：进程能响应即可，不检查数据库等依赖
+@app.get("/health")
+async def health():
+    return {"status": "alive"}
+
+# 就绪检查：连接池和提示词预热完成后才返回200，负载均衡据此决定是否转发流量
+@app.get("/ready")
+async def ready():
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is None:
+        return JSONResponse(status_code=503, content={"ready": False, "error": "预热尚未开始"})
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
 # 获取API信息
 @app.get("/api/info")
 async def get_api_info():
@@ -40,25 +91,13 @@ def check_environment():
     """检查环境配置"""
     print("[INFO] 检查环境配置...")
     
-    # 检查GROQ_API_KEY
-    if not os.environ.get("GROQ_API_KEY"):
+    # 使用Groq后端时检查GROQ_API_KEY（本地桩后端不需要）
+    if LLM_BACKEND == "groq" and not os.environ.get("GROQ_API_KEY"):
         print("[ERROR] 请设置GROQ_API_KEY环境变量")
         print("   获取API密钥：https://console.groq.com/")
         return False
     
-    # 检查数据库连接
-    try:
-        from app.utils.database import get_db
-        db = get_db()
-        if db.connect():
-            print("[SUCCESS] 数据库连接正常")
-            db.disconnect()
-        else:
-            print("[ERROR] 数据库连接失败")
-            return False
-    except Exception as e:
-        print(f"[ERROR] 数据库检查失败: {e}")
-        return False
+    # 数据库连接在服务启动后并行预热，连接状态见 /ready，这里不再串行检查
     
     print("[SUCCESS] 环境检查通过")
     return True
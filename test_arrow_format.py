@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+测试Arrow IPC / Parquet结果编码
+"""
+
+import io
+import datetime
+from decimal import Decimal
+import pytest
+from mysql.connector import FieldType
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+from app.utils.arrow_format import ArrowEncoder, negotiate_format
+
+def _column(name, type_code, charset=63):
+    return (name, type_code, None, None, None, None, 1, 0, charset)
+
+DESCRIPTION = [
+    _column('order_id', FieldType.LONG),
+    _column('final_amount', FieldType.NEWDECIMAL),
+    _column('order_date', FieldType.DATETIME),
+    _column('order_status', FieldType.VAR_STRING, charset=255),
+]
+
+CHUNKS = [
+    [(1, Decimal('99.90'), datetime.datetime(2024, 1, 1, 10, 0), 'Delivered'),
+     (2, None, None, None)],
+    [(3, Decimal('5.00'), datetime.datetime(2024, 2, 1, 8, 30), 'Pending')],
+]
+
+def _encode(fmt):
+    encoder = ArrowEncoder(DESCRIPTION, fmt)
+    parts = [encoder.encode(rows) for rows in CHUNKS]
+    parts.append(encoder.finish())
+    return b"".join(parts)
+
+def test_arrow_stream_types():
+    """测试Arrow流的列类型和数据"""
+    table = pa.ipc.open_stream(_encode("arrow")).read_all()
+    assert table.schema.field('order_id').type == pa.int64()
+    assert table.schema.field('final_amount').type == pa.decimal128(38, 2)
+    assert table.schema.field('order_date').type == pa.timestamp('us')
+    assert table.schema.field('order_status').type == pa.string()
+    assert table.column('order_id').to_pylist() == [1, 2, 3]
+    assert table.column('final_amount').to_pylist() == [Decimal('99.90'), None, Decimal('5.00')]
+    assert table.to_batches()[0].num_rows == 2
+
+def test_parquet_file():
+    """测试Parquet输出可以完整读回"""
+    table = pq.read_table(io.BytesIO(_encode("parquet")))
+    assert table.num_rows == 3
+    assert table.column('order_status').to_pylist() == ['Delivered', None, 'Pending']
+
+def test_empty_result():
+    """测试空结果仍然输出带schema的流"""
+    encoder = ArrowEncoder(DESCRIPTION, "arrow")
+    table = pa.ipc.open_stream(encoder.finish()).read_all()
+    assert table.num_rows == 0
+    assert table.schema.names == ['order_id', 'final_amount', 'order_date', 'order_status']
+
+def test_negotiate_format():
+    """测试根据Accept头选择格式"""
+    assert negotiate_format("application/vnd.apache.arrow.stream") == "arrow"
+    assert negotiate_format("application/json, application/vnd.apache.parquet;q=0.9") == "parquet"
+    assert negotiate_format("application/json") is None
+    assert negotiate_format(None) is None
+
+if __name__ == "__main__":
+    test_arrow_stream_types()
+    test_parquet_file()
+    test_empty_result()
+    test_negotiate_format()
+    print("[SUCCESS] 所有测试通过")
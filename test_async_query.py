@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+测试异步查询：慢查询在数据库线程池中执行不阻塞事件循环，客户端断开后终止数据库上的语句
+（使用阻塞的假连接，不依赖MySQL）
+"""
+
+import time
+import asyncio
+import threading
+from mysql.connector import Error
+from app.utils.database import DatabaseManager
+from app.utils.pool import ConnectionPool
+from app.utils.async_utils import run_until_disconnected, ClientDisconnected
+
+# 语句被 KILL QUERY 中止时MySQL返回的错误码（ER_QUERY_INTERRUPTED）
+ER_QUERY_INTERRUPTED = 1317
+
+class BlockingConnection:
+    """模拟mysql连接：每条语句一直执行到 finish() 或被 kill()"""
+
+    def __init__(self, connection_id):
+        self.connection_id = connection_id
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.killed = False
+        self.closed = False
+
+    def is_connected(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self, **kwargs):
+        return BlockingCursor(self)
+
+    def finish(self):
+        self.done.set()
+
+    def kill(self):
+        self.killed = True
+        self.done.set()
+
+
+class BlockingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+
+    def execute(self, query, params=None):
+        self.conn.started.set()
+        self.conn.done.wait(5)
+        if self.conn.killed:
+            raise Error(msg="Query execution was interrupted", errno=ER_QUERY_INTERRUPTED)
+        self.description = [("n", 8, None, None, None, None, 0, 1, 63)]
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+def _database():
+    """连接池使用阻塞的假连接，KILL QUERY 直接中止对应的假连接"""
+    db = DatabaseManager()
+    db.result_cache = None
+    connections = {}
+
+    def connect():
+        conn = BlockingConnection(len(connections) + 1)
+        connections[conn.connection_id] = conn
+        return conn
+
+    db.pool = ConnectionPool(connect, min_size=0, max_size=2)
+    db.killed = []
+
+    def kill_query(connection_id):
+        db.killed.append(connection_id)
+        connections[connection_id].kill()
+    db.kill_query = kill_query
+    return db, connections
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+def test_slow_query_does_not_block_event_loop():
+    """测试慢查询执行期间事件循环仍然可以处理其他任务"""
+    db, connections = _database()
+
+    async def scenario():
+        query = asyncio.ensure_future(db.fetch_result_async("SELECT SLEEP(10) AS n"))
+        ticks = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < 0.2:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not query.done()
+        connections[1].finish()
+        return ticks, await query
+
+    ticks, result = asyncio.run(scenario())
+    assert ticks >= 10
+    assert result.as_dicts() == [{"n": 1}]
+    assert db.pool.stats()["in_use"] == 0 and not db.killed
+
+def test_client_disconnect_kills_query():
+    """测试客户端断开后对正在执行的语句发送 KILL QUERY，连接归还连接池"""
+    db, connections = _database()
+
+    class Client:
+        disconnected = False
+        async def is_disconnected(self):
+            return self.disconnected
+
+    def wait_started(connection_id):
+        assert _wait_for(lambda: connection_id in connections and connections[connection_id].started.is_set())
+
+    async def scenario():
+        client = Client()
+        request = asyncio.ensure_future(run_until_disconnected(
+            client, db.fetch_result_async("SELECT SLEEP(10) AS n"), poll_interval=0.01
+        ))
+        await asyncio.get_running_loop().run_in_executor(None, wait_started, 1)
+        client.disconnected = True
+        try:
+            await request
+            assert False, "应该抛出 ClientDisconnected"
+        except ClientDisconnected:
+            pass
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+    assert time.perf_counter() - start < 2
+    assert _wait_for(lambda: db.killed == [1])
+    assert connections[1].killed
+    assert _wait_for(lambda: db.pool.stats()["in_use"] == 0)
+
+if __name__ == "__main__":
+    test_slow_query_does_not_block_event_loop()
+    test_client_disconnect_kills_query()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+测试批量查询接口：去重后分发、单个问题的错误隔离、批量大小限制（不依赖Groq和数据库）
+"""
+
+import json
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.api import query as query_api
+from app.api.query import batch_query, BatchQueryRequest, QueryResponse
+from config import BATCH_MAX_QUESTIONS, BATCH_MAX_CONCURRENCY
+
+class ConnectedRequest:
+    """始终保持连接的客户端"""
+    async def is_disconnected(self):
+        return False
+
+def _fake_pipeline(calls, state):
+    """代替 _process_query：记录被处理的问题，“失败”的问题返回错误，“异常”的问题抛出异常"""
+    async def process(request, start_time, stream=None, generation_limiter=None, shape="records"):
+        calls.append(request.question)
+        async with generation_limiter:
+            state["running"] = state.get("running", 0) + 1
+            state["peak"] = max(state.get("peak", 0), state["running"])
+            await asyncio.sleep(0.01)
+            state["running"] -= 1
+        if "失败" in request.question:
+            return QueryResponse(success=False, question=request.question, error="SQL生成失败: 无法理解")
+        if "异常" in request.question:
+            raise RuntimeError("boom")
+        return {"success": True, "question": request.question, "sql": "SELECT 1", "data": [{"n": 1}],
+                "count": 1, "error": None, "source": "template"}
+    return process
+
+def _run(questions, max_concurrency=None):
+    calls, state = [], {}
+    original = query_api._process_query
+    query_api._process_query = _fake_pipeline(calls, state)
+    try:
+        request = BatchQueryRequest(questions=questions, max_concurrency=max_concurrency)
+        response = asyncio.run(batch_query(request, ConnectedRequest()))
+    finally:
+        query_api._process_query = original
+    return json.loads(response.body), calls, state
+
+def test_duplicates_fan_out():
+    """测试归一化后相同的问题只处理一次，结果按原顺序分发并保留各自的原始问题"""
+    questions = ["总销售额是多少？", "总销售额是多少?", " 总销售额 是多少 ", "月度销售趋势"]
+    body, calls, _ = _run(questions)
+    assert calls == ["总销售额是多少？", "月度销售趋势"]
+    assert body["count"] == 4 and body["unique_count"] == 2 and body["success"]
+    assert [r["question"] for r in body["results"]] == questions
+    assert all(r["sql"] == "SELECT 1" for r in body["results"])
+
+def test_numbers_are_not_merged():
+    """测试只差小数点或日期分隔符的问题不会被合并"""
+    questions = ["库存低于10.5的商品", "库存低于105的商品", "2023-01-05的订单", "20230105的订单"]
+    body, calls, _ = _run(questions)
+    assert calls == questions
+    assert body["unique_count"] == 4
+
+def test_errors_are_isolated():
+    """测试单个问题失败不影响其他问题，整体 success 为False"""
+    body, calls, _ = _run(["月度销售趋势", "这个会失败", "这个会异常", "库存不足的商品"])
+    assert not body["success"]
+    assert [r["success"] for r in body["results"]] == [True, False, False, True]
+    assert body["results"][1]["error"].startswith("SQL生成失败")
+    assert body["results"][2]["error"] == "系统错误: boom"
+    assert body["results"][3]["data"] == [{"n": 1}]
+
+def test_batch_limits():
+    """测试空批量和超过上限的批量被拒绝，并发数不超过上限"""
+    for questions in ([], ["问题"] * (BATCH_MAX_QUESTIONS + 1)):
+        with pytest.raises(HTTPException) as error:
+            _run(questions)
+        assert error.value.status_code == 400
+
+    questions = [f"问题{i}" for i in range(BATCH_MAX_QUESTIONS)]
+    body, calls, state = _run(questions, max_concurrency=2)
+    assert body["count"] == BATCH_MAX_QUESTIONS and len(calls) == BATCH_MAX_QUESTIONS
+    assert state["peak"] == 2
+
+    # 请求的并发数不能超过服务端上限
+    _, _, state = _run(questions, max_concurrency=BATCH_MAX_CONCURRENCY * 10)
+    assert state["peak"] <= BATCH_MAX_CONCURRENCY
+
+if __name__ == "__main__":
+    test_duplicates_fan_out()
+    test_numbers_are_not_merged()
+    test_errors_are_isolated()
+    test_batch_limits()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+测试压测工具（进程内运行，使用本地桩模型和模拟数据库）
+"""
+
+from benchmark import parse_args, run_benchmark, compare, percentile
+
+def test_percentile_and_compare():
+    """测试百分位数插值和基线比较"""
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([5.0], 99) == 5.0
+
+    baseline = {"qps": 100.0, "stages_ms": {"total": {"p50": 10.0, "p95": 20.0, "p99": 30.0}}}
+    report = {"config": {}, "qps": 95.0, "stages_ms": {"total": {"p50": 10.2, "p95": 30.0, "p99": 30.1}}}
+    assert compare(report, baseline, tolerance=0.1) == ["total.p95"]
+
+def test_small_run():
+    """测试一次小规模压测能跑通并输出各阶段统计"""
+    args = parse_args(["--requests", "40", "--concurrency", "4", "--llm-latency-ms", "1",
+                       "--db-latency-ms", "0", "--no-fast-path"])
+    report = run_benchmark(args)
+    assert report["requests"] == 40 and report["errors"] == 0
+    assert report["qps"] > 0
+    assert {"generate", "validate", "cost_guard", "execute", "serialize", "other", "total"} <= set(report["stages_ms"])
+    assert report["stages_ms"]["generate"]["count"] == 40
+    assert report["stages_ms"]["total"]["p99"] >= report["stages_ms"]["total"]["p50"]
+    assert report["memory"]["max_rss_kb"] > 0
+
+if __name__ == "__main__":
+    test_percentile_and_compare()
+    test_small_run()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+测试缓存相关功能（不依赖Groq和数据库）
+"""
+
+import time
+from app.utils.cache import TTLCache
+from app.services.nl2sql_service import normalize_question
+from app.utils.result_cache import ResultCache, normalize_sql, extract_tables, is_cacheable, UNSETTLED
+
+def test_normalize_question():
+    """测试问题归一化"""
+    assert normalize_question("总销售额是多少？") == normalize_question("总销售额是多少?")
+    assert normalize_question(" 总销售额 是多少 ") == normalize_question("总销售额是多少")
+    assert normalize_question("ＴＯＰ１０商品") == normalize_question("top10商品")
+    assert normalize_question("总销售额") != normalize_question("总订单数")
+
+def test_normalize_question_keeps_numeric_marks():
+    """测试数字中的小数点、正负号和日期分隔符保留，句末标点仍去掉"""
+    assert normalize_question("库存低于10.5的商品") != normalize_question("库存低于105的商品")
+    assert normalize_question("2023-01-05的订单") != normalize_question("20230105的订单")
+    assert normalize_question("库存低于-5") != normalize_question("库存低于5")
+    assert normalize_question("12:30之后") != normalize_question("1230之后")
+    assert normalize_question("库存低于１０．５") == normalize_question("库存低于10.5") == "库存低于10.5"
+    assert normalize_question("2023-01-05的订单？") == "2023-01-05的订单"
+    assert normalize_question("销量前10。") == normalize_question("销量前10") == "销量前10"
+    assert normalize_question("销售额-按月") == "销售额按月"
+
+def test_ttl_cache_lru_eviction():
+    """测试LRU淘汰"""
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_ttl_cache_expiration():
+    """测试过期"""
+    cache = TTLCache(max_size=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["misses"] == 1
+
+def test_ttl_cache_stats():
+    """测试命中统计"""
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert cache.clear() == 1
+
+def test_normalize_sql():
+    """测试SQL归一化保留字面量内容"""
+    assert normalize_sql("SELECT  *\n FROM users ;") == "SELECT * FROM users"
+    assert normalize_sql("SELECT * FROM users WHERE city = 'a  b'") == "SELECT * FROM users WHERE city = 'a  b'"
+
+def test_extract_tables():
+    """测试提取引用的表"""
+    tables = ["users", "orders", "order_items"]
+    sql = "SELECT u.username FROM users u JOIN orders o ON u.user_id = o.user_id WHERE o.order_status = 'order_items'"
+    assert extract_tables(sql, tables) == ["users", "orders"]
+
+def test_result_cache_table_versions():
+    """测试结果缓存按表版本失效"""
+    watermarks = {"orders": (10, None), "users": (5, None)}
+    fetch = lambda tables: {t: watermarks[t] for t in tables}
+    cache = ResultCache(max_bytes=1024 * 1024, check_interval=0)
+
+    rows = [{"total": 1}]
+    versions = cache.current_versions(["orders"], fetch)
+    cache.set("q1", rows, ["orders"], versions)
+    assert cache.get("q1", fetch) == rows
+
+    # 其他表的变化不影响
+    watermarks["users"] = (6, None)
+    assert cache.get("q1", fetch) == rows
+
+    # 相关表的水位线变化后失效
+    watermarks["orders"] = (11, None)
+    assert cache.get("q1", fetch) is None
+
+    # 显式bump后失效
+    versions = cache.current_versions(["orders"], fetch)
+    cache.set("q1", rows, ["orders"], versions)
+    cache.bump(["orders"])
+    assert cache.get("q1", fetch) is None
+
+def test_result_cache_byte_limit():
+    """测试结果缓存按总字节数淘汰"""
+    fetch = lambda tables: {t: 1 for t in tables}
+    rows = [{"value": i} for i in range(100)]
+    cache = ResultCache(max_bytes=50000, max_entry_bytes=25000, check_interval=-1)
+    for key in ("a", "b", "c"):
+        cache.set(key, rows, ["orders"], cache.current_versions(["orders"], fetch))
+    stats = cache.stats()
+    assert stats["bytes"] <= 50000
+    assert stats["evictions"] >= 1
+    assert cache.get("c", fetch) == rows
+
+def test_result_cache_check_interval_and_unsettled():
+    """测试水位线按间隔检查，最近一秒内有写入的表不缓存且每次重新检查"""
+    calls = []
+    watermarks = {"orders": (10, None)}
+    def fetch(tables):
+        calls.append(tables)
+        return {t: watermarks[t] for t in tables}
+
+    cache = ResultCache(max_bytes=1024 * 1024, check_interval=60)
+    rows = [{"total": 1}]
+    cache.set("q1", rows, ["orders"], cache.current_versions(["orders"], fetch))
+    for _ in range(5):
+        assert cache.get("q1", fetch) == rows
+    assert len(calls) == 1
+
+    watermarks["orders"] = UNSETTLED
+    cache = ResultCache(max_bytes=1024 * 1024, check_interval=60)
+    assert cache.current_versions(["orders"], fetch) is None
+    assert not cache.set("q1", rows, ["orders"], None)
+    assert cache.current_versions(["orders"], fetch) is None
+    assert len(calls) == 3
+
+def test_is_cacheable():
+    """测试不引用表和使用不确定函数的查询不缓存"""
+    assert is_cacheable("SELECT COUNT(*) FROM orders", ["orders"])
+    assert is_cacheable("SELECT * FROM orders WHERE order_status = 'now()'", ["orders"])
+    assert not is_cacheable("SELECT NOW()", [])
+    assert not is_cacheable("SELECT 1 + 1", [])
+    assert not is_cacheable("SELECT COUNT(*) FROM orders WHERE order_date >= CURDATE()", ["orders"])
+    assert not is_cacheable("SELECT * FROM products ORDER BY RAND() LIMIT 5", ["products"])
+    assert not is_cacheable("SELECT * FROM orders WHERE order_date > CURRENT_DATE - INTERVAL 7 DAY", ["orders"])
+
+if __name__ == "__main__":
+    test_normalize_question()
+    test_normalize_question_keeps_numeric_marks()
+    test_ttl_cache_lru_eviction()
+    test_ttl_cache_expiration()
+    test_ttl_cache_stats()
+    test_normalize_sql()
+    test_extract_tables()
+    test_result_cache_table_versions()
+    test_result_cache_byte_limit()
+    test_result_cache_check_interval_and_unsettled()
+    test_is_cacheable()
+    print("[SUCCESS] 缓存测试通过")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+测试执行前代价检查
+"""
+
+import asyncio
+from app.api import query as query_api
+from app.api.query import QueryRequest
+from app.services.cost_guard import CostGuard, estimate_cost, with_max_execution_time
+from app.services.rollup import RollupManager
+
+def _plan(*tables):
+    return [{'id': 1, 'table': name, 'type': access, 'rows': rows, 'filtered': 100.0}
+            for name, access, rows in tables]
+
+def _guard():
+    return CostGuard(enabled=True, max_rows=10000000, downgrade_rows=100000, max_full_scan_joins=1,
+                     full_scan_min_rows=1000, timeout_ms=10000, downgraded_timeout_ms=2000)
+
+def test_estimate_nested_loop():
+    """测试嵌套循环JOIN的扫描行数估算"""
+    rows, full_scans = estimate_cost(_plan(('o', 'ALL', 1000), ('u', 'eq_ref', 1)))
+    assert rows == 2000 and full_scans == ()
+
+    rows, full_scans = estimate_cost(_plan(('o', 'ALL', 5000), ('oi', 'ALL', 20000), ('p', 'ALL', 1000)),
+                                     full_scan_min_rows=1000)
+    assert rows == 5000 + 5000 * 20000 + 5000 * 20000 * 1000
+    assert full_scans == ('oi', 'p')
+
+def test_cartesian_join_rejected():
+    """测试笛卡尔积JOIN被拒绝，并带有结构化原因"""
+    verdict = _guard().judge(_plan(('o', 'ALL', 5000), ('oi', 'ALL', 20000), ('p', 'ALL', 1000)))
+    assert not verdict.allowed
+    assert verdict.reason['code'] == 'estimated_rows_exceeded'
+    assert verdict.reason['full_scan_tables'] == ['oi', 'p']
+
+    verdict = _guard().judge(_plan(('o', 'const', 1), ('oi', 'ALL', 2000), ('p', 'ALL', 2000)))
+    assert not verdict.allowed
+    assert verdict.reason['code'] == 'full_scan_joins_exceeded'
+
+def test_downgrade_uses_shorter_timeout():
+    """测试代价较高的查询降级为更短的超时"""
+    verdict = _guard().judge(_plan(('orders', 'ALL', 500000)))
+    assert verdict.allowed and verdict.downgraded and verdict.timeout_ms == 2000
+    verdict = _guard().judge(_plan(('orders', 'ALL', 5000)))
+    assert verdict.allowed and not verdict.downgraded and verdict.timeout_ms == 10000
+
+def test_explain_cached_per_normalized_sql():
+    """测试相同SQL只EXPLAIN一次，EXPLAIN失败时放行"""
+    guard = _guard()
+    calls = []
+
+    async def explain(sql):
+        calls.append(sql)
+        return _plan(('users', 'ALL', 100))
+
+    async def failing_explain(sql):
+        return None
+
+    async def main():
+        await guard.check("SELECT * FROM users", explain)
+        await guard.check("SELECT *   FROM users;", explain)
+        return await guard.check("SELECT * FROM orders", failing_explain)
+
+    verdict = asyncio.run(main())
+    assert len(calls) == 1
+    assert verdict.allowed and guard.explain_failures == 1
+
+def test_max_execution_time_hint():
+    """测试MAX_EXECUTION_TIME提示插入到SELECT之后"""
+    assert with_max_execution_time("select * from users", 1500) == \
+        "SELECT /*+ MAX_EXECUTION_TIME(1500) */ * from users"
+    # CTE：提示加在主查询上，CTE内部的SELECT不变
+    assert with_max_execution_time(
+        "WITH m AS (SELECT user_id FROM orders) SELECT COUNT(*) FROM m", 1500
+    ) == "WITH m AS (SELECT user_id FROM orders) SELECT /*+ MAX_EXECUTION_TIME(1500) */ COUNT(*) FROM m"
+    assert with_max_execution_time("/* SELECT */ SELECT 'SELECT'", 10) == \
+        "/* SELECT */ SELECT /*+ MAX_EXECUTION_TIME(10) */ 'SELECT'"
+    assert with_max_execution_time("(SELECT 1) UNION (SELECT 2)", 10) == "(SELECT 1) UNION (SELECT 2)"
+
+class _FakeNL2SQL:
+    """代替NL2SQL服务：总是生成同一条SQL"""
+    table_schema = {}
+
+    def __init__(self, sql):
+        self.sql = sql
+
+    async def agenerate_sql(self, question):
+        return {"success": True, "sql": self.sql, "source": "template"}
+
+    def validate_sql(self, sql):
+        return True, ""
+
+class _FakeDatabase:
+    """EXPLAIN汇总表很便宜，EXPLAIN原始事实表超过预算"""
+    def __init__(self):
+        self.explained = []
+
+    async def explain_async(self, sql):
+        self.explained.append(sql)
+        if "rollup_orders_daily" in sql:
+            return _plan(('rollup_orders_daily', 'ALL', 500))
+        return _plan(('o', 'ALL', 5000), ('oi', 'ALL', 20000), ('p', 'ALL', 1000))
+
+def test_explain_cache_not_shared_with_rollup_rewrite():
+    """测试流式导出改写为读取汇总表后，关闭汇总表再执行同一SQL不会复用汇总表的EXPLAIN结果"""
+    sql = "SELECT COUNT(*) AS order_count FROM orders"
+    guard, db, manager = _guard(), _FakeDatabase(), RollupManager(enabled=True, refresh_interval=0)
+    manager._set_state("rollup_orders_daily", 100, None)
+    streamed = []
+
+    async def fake_stream(request, sql_query, stream_sql, *args):
+        streamed.append(stream_sql)
+        return "streamed"
+
+    async def scenario():
+        request = QueryRequest(question="订单数")
+        first = await query_api._process_query(request, 0, stream="ndjson")
+        manager.enabled = False
+        second = await query_api._process_query(request, 0)
+        return first, second
+
+    originals = (query_api.get_nl2sql_service, query_api.get_db, query_api.get_rollup_manager,
+                 query_api.get_cost_guard, query_api._stream_query_result)
+    query_api.get_nl2sql_service = lambda: _FakeNL2SQL(sql)
+    query_api.get_db = lambda: db
+    query_api.get_rollup_manager = lambda: manager
+    query_api.get_cost_guard = lambda: guard
+    query_api._stream_query_result = fake_stream
+    try:
+        first, second = asyncio.run(scenario())
+    finally:
+        (query_api.get_nl2sql_service, query_api.get_db, query_api.get_rollup_manager,
+         query_api.get_cost_guard, query_api._stream_query_result) = originals
+
+    assert first == "streamed" and "rollup_orders_daily" in streamed[0]
+    assert len(db.explained) == 2 and "rollup_orders_daily" not in db.explained[1]
+    assert not second.success and second.error_detail["code"] == "estimated_rows_exceeded"
+
+if __name__ == "__main__":
+    test_estimate_nested_loop()
+    test_cartesian_join_rejected()
+    test_downgrade_uses_shorter_timeout()
+    test_explain_cached_per_normalized_sql()
+    test_max_execution_time_hint()
+    test_explain_cache_not_shared_with_rollup_rewrite()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试模拟数据生成器
+"""
+
+import pytest
+from collections import Counter
+from datetime import date
+from decimal import Decimal
+from database.data_generator import DataGenerator, GenerationPlan, TABLE_COLUMNS, parse_count
+
+def _generate(orders=3000, seed=7):
+    plan = GenerationPlan.for_orders(orders, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31), seed=seed)
+    generator = DataGenerator(plan, chunk_size=1000)
+    tables = {
+        'categories': [row for chunk in generator.categories() for row in chunk],
+        'users': [row for chunk in generator.users() for row in chunk],
+        'products': [row for chunk in generator.products() for row in chunk],
+        'orders': [], 'order_items': []
+    }
+    for orders_chunk, items_chunk in generator.orders():
+        assert len(orders_chunk) <= 1000
+        tables['orders'].extend(orders_chunk)
+        tables['order_items'].extend(items_chunk)
+    return plan, tables
+
+def test_parse_count():
+    """测试数量参数的解析"""
+    assert parse_count('10M') == 10000000
+    assert parse_count('500k') == 500000
+    assert parse_count('1.5m') == 1500000
+    assert parse_count('20,000') == 20000
+    for text in ['', 'abc', '0', '-5']:
+        with pytest.raises(ValueError):
+            parse_count(text)
+
+def test_referential_consistency():
+    """测试各表行数、列数和引用关系一致，下单用户在下单前已注册"""
+    plan, tables = _generate()
+    assert len(tables['orders']) == plan.orders
+    assert len(tables['users']) == plan.users and len(tables['products']) == plan.products
+    for table, rows in tables.items():
+        assert all(len(row) == len(TABLE_COLUMNS[table]) for row in rows), table
+        assert [row[0] for row in rows] == list(range(1, len(rows) + 1)), table
+
+    category_ids = {row[0] for row in tables['categories']}
+    leaf_ids = {row[0] for row in tables['categories'] if row[2] is not None}
+    assert all(row[2] in category_ids for row in tables['categories'] if row[2] is not None)
+    assert all(row[2] in leaf_ids for row in tables['products'])
+    assert len({row[2] for row in tables['users']}) == plan.users  # email唯一
+
+    registered = {row[0]: row[8] for row in tables['users']}
+    order_dates = [row[2] for row in tables['orders']]
+    assert order_dates == sorted(order_dates)
+    assert all(registered[row[1]] <= row[2][:10] for row in tables['orders'])
+    assert all(1 <= row[2] <= plan.products and row[1] <= plan.orders for row in tables['order_items'])
+
+def test_amounts_are_consistent():
+    """测试明细金额 = 单价 × 数量，订单总额 = 明细之和，实付 = 总额 - 优惠 + 运费"""
+    _, tables = _generate()
+    prices = {row[0]: Decimal(row[4]) for row in tables['products']}
+    totals = Counter()
+    for _, order_id, product_id, quantity, unit_price, total_price, _ in tables['order_items']:
+        assert Decimal(unit_price) == prices[product_id]
+        assert Decimal(total_price) == Decimal(unit_price) * quantity
+        totals[order_id] += Decimal(total_price)
+    for row in tables['orders']:
+        total, discount, shipping, final = (Decimal(value) for value in row[3:7])
+        assert total == totals[row[0]]
+        assert 0 <= discount < total
+        assert shipping == (0 if total >= 99 else 10)
+        assert final == total - discount + shipping
+
+def test_distributions_are_skewed_and_deterministic():
+    """测试商品和用户的购买集中度、近期订单状态，以及相同种子生成相同数据"""
+    plan, tables = _generate(orders=5000)
+    product_sales = Counter(row[2] for row in tables['order_items'])
+    top = sum(count for _, count in product_sales.most_common(max(1, plan.products // 10)))
+    assert top > 0.3 * len(tables['order_items'])
+    user_orders = Counter(row[1] for row in tables['orders'])
+    assert user_orders.most_common(1)[0][1] >= 5
+
+    statuses = Counter(row[8] for row in tables['orders'] if row[2] < '2024-12-01')
+    assert statuses['Delivered'] > 0.8 * sum(statuses.values()) and statuses['Pending'] == 0
+    assert {row[8] for row in tables['orders'] if row[2] >= '2024-12-31'} <= {'Pending', 'Processing'}
+
+    assert _generate(orders=500, seed=3)[1]['orders'] == _generate(orders=500, seed=3)[1]['orders']
+
+if __name__ == "__main__":
+    test_parse_count()
+    test_referential_consistency()
+    test_amounts_are_consistent()
+    test_distributions_are_skewed_and_deterministic()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+测试常见问题的模板快速通道（不依赖Groq和数据库）
+"""
+
+from app.services.fast_path import FastPathMatcher, parse_number
+from app.services.nl2sql_service import get_nl2sql_service
+
+def test_sample_queries_match_templates():
+    """测试示例查询都能命中模板"""
+    matcher = FastPathMatcher()
+    expected = {
+        "总销售额是多少？": "total_sales",
+        "查询所有用户的信息": "all_users",
+        "哪个商品最受欢迎？": "most_popular_products",
+        "各个用户等级的人数分布": "group_by",
+        "月度销售趋势": "monthly_sales_trend",
+        "库存不足的商品": "low_stock_products",
+    }
+    for question, template in expected.items():
+        result = matcher.match(question)
+        assert result is not None, question
+        assert result["template"] == template, question
+
+def test_low_stock_threshold_parameter():
+    """测试库存阈值参数"""
+    matcher = FastPathMatcher()
+    assert "stock_quantity < 50" in matcher.match("库存不足的商品")["sql"]
+    assert "stock_quantity < 20" in matcher.match("库存低于20的商品")["sql"]
+    assert "stock_quantity < 120" in matcher.match("库存少于一百二十件的产品")["sql"]
+    assert parse_number("五十") == 50
+    assert parse_number("十五") == 15
+
+def test_unrepresentable_numbers_are_not_matched():
+    """测试模板不能准确表达的小数和负数阈值不命中（归一化后不会变成25、5）"""
+    matcher = FastPathMatcher()
+    for question in ["库存低于2.5的商品", "库存低于２．５的商品", "库存低于-5的商品", "库存少于+5件的商品",
+                     "库存低于二点五的商品"]:
+        assert matcher.match(question) is None, question
+    assert "stock_quantity < 25" in matcher.match("库存低于25的商品")["sql"]
+
+def test_group_by_template():
+    """测试按X统计Y"""
+    matcher = FastPathMatcher()
+    sql = matcher.match("按省份统计用户数")["sql"]
+    assert "GROUP BY province" in sql and "FROM users u" in sql
+    sql = matcher.match("按品牌统计销售额")["sql"]
+    assert "JOIN products p" in sql and "SUM(oi.total_price)" in sql
+    # 维度和指标组合不明确时不命中
+    assert matcher.match("按品牌统计用户数") is None
+
+def test_unmatched_questions_go_to_llm():
+    """测试不能确定意图的问题不命中"""
+    matcher = FastPathMatcher()
+    assert matcher.match("上海用户有多少个？") is None
+    assert matcher.match("苹果品牌的商品有哪些？") is None
+
+def test_template_sql_passes_validation():
+    """测试模板生成的SQL都能通过验证"""
+    nl2sql = get_nl2sql_service()
+    for question in ["总销售额是多少？", "查询所有用户的信息", "哪个商品最受欢迎？",
+                     "月度销售趋势", "库存不足的商品", "各分类的销量", "按月统计订单数"]:
+        result = nl2sql.generate_sql(question)
+        assert result["source"] == "template", question
+        assert nl2sql.validate_sql(result["sql"])[0], question
+
+if __name__ == "__main__":
+    test_sample_queries_match_templates()
+    test_low_stock_threshold_parameter()
+    test_unrepresentable_numbers_are_not_matched()
+    test_group_by_template()
+    test_unmatched_questions_go_to_llm()
+    test_template_sql_passes_validation()
+    print("[SUCCESS] 模板快速通道测试通过")
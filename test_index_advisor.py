@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+测试查询日志和索引建议
+"""
+
+import re
+from app.services.query_log import QueryLog, analyze_sql, sql_template
+from app.services.index_advisor import IndexAdvisor, IndexCandidate, coverage
+
+# schema.sql 中已有的索引（主键和外键列）
+EXISTING = {
+    'orders': [('order_id',), ('user_id',), ('order_date',)],
+    'order_items': [('order_item_id',), ('order_id',), ('product_id',)],
+    'products': [('product_id',), ('category_id',)],
+    'users': [('user_id',), ('email',)],
+}
+
+STATUS_SQL = ("SELECT payment_method, SUM(final_amount) FROM orders WHERE order_status = 'Delivered' "
+              "AND order_date >= '2024-01-01' GROUP BY payment_method")
+LEVEL_SQL = ("SELECT u.user_level, COUNT(*) FROM orders o JOIN users u ON o.user_id = u.user_id "
+             "WHERE u.province = '广东' AND YEAR(o.order_date) = 2024 GROUP BY u.user_level")
+
+def test_analyze_sql():
+    """测试提取等值、范围、连接、分组列（函数包裹的列不计入）"""
+    shape = analyze_sql(LEVEL_SQL)
+    assert shape.tables == ('orders', 'users')
+    assert shape.equality == (('users', 'province'),)
+    assert shape.ranges == ()
+    assert shape.joins == ((('orders', 'user_id'), ('users', 'user_id')),)
+    assert shape.group_by == (('users', 'user_level'),)
+
+    shape = analyze_sql("SELECT brand FROM products WHERE stock_quantity < 50 AND 'Apple' = brand "
+                        "AND product_name LIKE '%phone' AND price * 2 > 100 ORDER BY brand, price DESC")
+    assert shape.equality == (('products', 'brand'),)
+    assert shape.ranges == (('products', 'stock_quantity'),)
+    assert shape.order_by == (('products', 'brand'), ('products', 'price'))
+    assert analyze_sql("UPDATE orders SET order_status = 'Shipped'") is None
+
+def test_log_aggregates_by_template(tmp_path):
+    """测试只有常量不同的SQL归为同一条，JSONL文件可以重新加载"""
+    path = tmp_path / "query_log.jsonl"
+    log = QueryLog(enabled=True, max_entries=2, path=str(path))
+    log.record(STATUS_SQL, 0.2, rows=5)
+    log.record(STATUS_SQL.replace('Delivered', 'Pending'), 0.4, rows=5)
+    log.record("SELECT * FROM users WHERE user_id IN (1, 2, 3)", 0.01, rows=3)
+    log.record("SELECT * FROM users WHERE user_id IN (4)", 0.01, rows=1)
+
+    entries = log.entries()
+    assert [entry.count for entry in entries] == [2, 2]
+    assert abs(entries[0].total_seconds - 0.6) < 1e-9 and entries[0].max_seconds == 0.4
+    assert 'Pending' in entries[0].sql and "order_status = ?" in entries[0].template
+    assert sql_template("SELECT 1 FROM users WHERE user_id IN (1, 2)")[0] == \
+        sql_template("SELECT 1 FROM  users WHERE user_id IN (7);")[0]
+
+    # 超过条目上限时淘汰最久未出现的模板
+    log.record(LEVEL_SQL, 1.0)
+    assert log.stats()['evicted'] == 1 and len(log.entries()) == 2
+
+    # 文件由后台线程写入
+    assert log.flush()
+    reloaded = QueryLog.load(str(path), max_entries=10)
+    assert reloaded.stats()['recorded'] == 5 and len(reloaded.entries()) == 3
+    assert reloaded.entries()[0].template == log.entries()[0].template
+
+def test_log_file_written_in_background(tmp_path):
+    """测试记录时只把行放入队列，由后台线程写文件；写入失败只计数"""
+    log = QueryLog(enabled=True, path=str(tmp_path / "missing" / "query_log.jsonl"))
+    log.record(STATUS_SQL, 0.2, rows=5)
+    assert log.stats()['recorded'] == 1
+    assert log.flush() and log.stats()['write_failures'] == 1
+    assert log._writer.name == "query-log-writer"
+
+def test_advice_ranked_by_benefit():
+    """测试候选索引按估算收益排序，已有索引覆盖的和被更长索引包含的不再建议"""
+    log = QueryLog(enabled=True, path="")
+    for _ in range(10):
+        log.record(STATUS_SQL, 0.5)
+    log.record(LEVEL_SQL, 2.0)
+    log.record("SELECT * FROM orders WHERE user_id = 3", 0.01)
+
+    suggestions = IndexAdvisor().advise(log.entries(), EXISTING, limit=5)
+    top = suggestions[0]
+    assert top.candidate == IndexCandidate('orders', ('order_status', 'order_date'))
+    assert top.candidate.ddl == "CREATE INDEX idx_orders_order_status_order_date ON orders(order_status, order_date);"
+    assert abs(top.estimated_benefit - 5.0 * 2 / 3) < 1e-9
+    assert IndexCandidate('users', ('province', 'user_level')) in [s.candidate for s in suggestions]
+    # (order_status) 是 (order_status, order_date) 的前缀；orders.user_id 已有索引
+    tables_columns = [(s.candidate.table, s.candidate.columns) for s in suggestions]
+    assert ('orders', ('order_status',)) not in tables_columns
+    assert all(columns[0] != 'user_id' or table != 'orders' for table, columns in tables_columns)
+
+    shape = analyze_sql(STATUS_SQL)
+    assert coverage(IndexCandidate('orders', ('order_status', 'payment_method')), shape) == 2 / 3
+    assert coverage(IndexCandidate('orders', ('order_date', 'order_status')), shape) == 1 / 3
+
+class _CopyCursor:
+    """数据库副本的游标：索引 (order_status, ...) 存在时EXPLAIN估算的扫描行数减少"""
+
+    def __init__(self):
+        self.indexes = {}
+        self.statements = []
+        self.rows = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+        match = re.match(r"CREATE INDEX (\w+) ON (\w+)\((.*)\)", sql)
+        if match:
+            self.indexes[match.group(1)] = (match.group(2), match.group(3).split(", "))
+        elif sql.startswith("DROP INDEX"):
+            self.indexes.pop(sql.split()[2])
+        elif sql.startswith("EXPLAIN"):
+            useful = [name for name, (table, columns) in self.indexes.items() if columns[0] == 'order_status']
+            if useful and 'order_status' in sql:
+                self.rows = [{'id': 1, 'table': 'orders', 'type': 'range', 'rows': 100, 'filtered': 100.0,
+                              'key': useful[0]}]
+            else:
+                self.rows = [{'id': 1, 'table': 'orders', 'type': 'ALL', 'rows': 10000, 'filtered': 10.0,
+                              'key': None}]
+
+    def fetchall(self):
+        return self.rows
+
+def test_validate_with_explain():
+    """测试在副本上临时建索引验证：优化器不使用的索引收益为0，临时索引都被删除"""
+    log = QueryLog(enabled=True, path="")
+    log.record(STATUS_SQL, 1.0)
+    log.record("SELECT COUNT(*) FROM orders WHERE payment_method = 'Alipay'", 3.0)
+    advisor = IndexAdvisor()
+    suggestions = advisor.advise(log.entries(), EXISTING, limit=3)
+    assert suggestions[0].candidate.columns == ('payment_method',)
+
+    cursor = _CopyCursor()
+    validated = advisor.validate(suggestions, cursor)
+    assert validated[0].candidate.columns == ('order_status', 'order_date')
+    assert validated[0].used and validated[0].rows_before == 10000 and validated[0].rows_after == 100
+    assert abs(validated[0].validated_benefit - 0.99) < 1e-9
+    payment = [s for s in validated if s.candidate.columns == ('payment_method',)][0]
+    assert payment.used is False and payment.validated_benefit == 0.0
+    assert cursor.indexes == {}
+    assert not any(sql.startswith(("CREATE", "DROP")) and "idx_" in sql for sql in cursor.statements)
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    test_analyze_sql()
+    with tempfile.TemporaryDirectory() as directory:
+        test_log_aggregates_by_template(pathlib.Path(directory))
+        test_log_file_written_in_background(pathlib.Path(directory))
+    test_advice_ranked_by_benefit()
+    test_validate_with_explain()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+测试本地桩模型后端（不访问网络）
+"""
+
+import time
+import asyncio
+import pytest
+from app.services.llm_backend import LLMBackend, StubBackend, LLMBackendError, create_backend
+from app.services.nl2sql_service import NL2SQLService
+
+def test_stub_returns_fixture_sql_by_question():
+    """测试按提示词中的用户问题返回SQL，未匹配时返回默认SQL"""
+    service = NL2SQLService()
+    service.fast_path = None
+    service.llm = StubBackend({"各城市的用户数量": "SELECT city, COUNT(*) FROM users GROUP BY city"},
+                              default_sql="SELECT 1 FROM users")
+
+    result = service.generate_sql(" 各城市的用户数量？")
+    assert result["success"] and result["sql"] == "SELECT city, COUNT(*) FROM users GROUP BY city;"
+    assert asyncio.run(service.agenerate_sql("别的问题"))["sql"] == "SELECT 1 FROM users;"
+    assert service.llm.stats()["calls"] == 2 and service.llm.stats()["misses"] == 1
+
+def test_stub_injects_latency_and_errors():
+    """测试注入的延迟和失败率"""
+    backend = StubBackend(latency_ms=30)
+    start = time.perf_counter()
+    backend.complete("有多少用户？")
+    assert time.perf_counter() - start >= 0.03
+
+    backend = StubBackend(error_rate=1.0)
+    with pytest.raises(LLMBackendError):
+        asyncio.run(backend.acomplete("有多少用户？"))
+
+    async def collect():
+        return "".join([chunk async for chunk in StubBackend(seed=1).astream("有多少用户？")])
+    assert asyncio.run(collect()) == "SELECT COUNT(*) AS user_count FROM users;"
+
+    assert create_backend("stub").name == "stub"
+    with pytest.raises(ValueError):
+        create_backend("unknown")
+
+def test_backend_must_implement_both_calls():
+    """测试只实现异步调用的后端不能实例化"""
+    class AsyncOnly(LLMBackend):
+        async def acomplete(self, prompt, temperature=0.1):
+            return "SELECT 1"
+
+    with pytest.raises(TypeError):
+        AsyncOnly()
+    with pytest.raises(TypeError):
+        LLMBackend()
+
+if __name__ == "__main__":
+    test_stub_returns_fixture_sql_by_question()
+    test_stub_injects_latency_and_errors()
+    test_backend_must_implement_both_calls()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+测试阶段计时和Prometheus指标输出
+"""
+
+import asyncio
+import contextvars
+from app.utils.metrics import MetricsRegistry
+from app.utils.timing import start_timer, current_timer, stage, record_stage
+
+def test_prometheus_text_format():
+    """测试计数器、直方图和回调指标的文本格式"""
+    registry = MetricsRegistry()
+    counter = registry.counter("test_queries_total", "Queries", ["outcome"])
+    histogram = registry.histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    registry.callback("test_hit_ratio", "Hit ratio", lambda: {("sql",): 0.5}, ["cache"])
+
+    counter.inc(outcome="success")
+    counter.inc(2, outcome='bad "quote"')
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_queries_total counter" in lines
+    assert 'test_queries_total{outcome="success"} 1' in lines
+    assert 'test_queries_total{outcome="bad \\"quote\\""} 2' in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_latency_seconds_count 3" in lines
+    assert 'test_hit_ratio{cache="sql"} 0.5' in lines
+
+def test_stage_timer_follows_context():
+    """测试阶段耗时累加，并跟随上下文进入数据库线程"""
+    async def main():
+        timer = start_timer()
+        with stage("validate"):
+            pass
+        with stage("validate"):
+            pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, contextvars.copy_context().run, record_stage, "db_query", 0.25)
+        return timer
+
+    timer = asyncio.run(main())
+    breakdown = timer.breakdown()
+    assert set(breakdown) == {"validate", "db_query", "total"}
+    assert breakdown["db_query"] == 250.0
+    # 不在请求中时不记录
+    assert current_timer() is None
+    record_stage("ignored", 1.0)
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_stage_timer_follows_context()
+    print("[SUCCESS] 所有测试通过")
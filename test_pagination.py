@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试LIMIT注入和keyset分页
+"""
+
+import pytest
+from decimal import Decimal
+from database.config import get_table_schema
+from app.services.pagination import plan_page, apply_page, cap_sql, encode_cursor, decode_cursor, InvalidCursor
+from app.utils.serializer import QueryResult
+
+SCHEMA = get_table_schema()
+SECRET = "test-secret"
+
+def test_keyset_plan_for_simple_select():
+    """测试单表查询按主键分页"""
+    plan = plan_page("SELECT * FROM users;", SCHEMA, 100)
+    assert plan.key_column == 'user_id'
+    assert plan.sql == "SELECT * FROM users ORDER BY users.user_id LIMIT 101"
+
+    plan = plan_page("SELECT * FROM users WHERE city = '北京' OR age > 30", SCHEMA, 100, after=42)
+    assert plan.sql == ("SELECT * FROM users WHERE (city = '北京' OR age > 30) AND users.user_id > 42 "
+                        "ORDER BY users.user_id LIMIT 101")
+
+def test_keyset_allows_parent_join_only():
+    """测试只有JOIN父表时才按主表主键分页"""
+    plan = plan_page("SELECT o.order_id, u.username FROM orders o JOIN users u ON o.user_id = u.user_id",
+                     SCHEMA, 100)
+    assert plan.key_column == 'order_id'
+    assert plan.sql.endswith("ORDER BY o.order_id LIMIT 101")
+
+    plan = plan_page("SELECT * FROM orders o JOIN order_items oi ON o.order_id = oi.order_id", SCHEMA, 100)
+    assert plan.key_column is None
+    assert plan.sql.endswith("LIMIT 101")
+
+def test_keyset_plan_for_order_by():
+    """测试按列排序的查询按 (排序列…, 主键) 续读，NULL按MySQL的排序位置处理"""
+    sql = ("SELECT order_id, order_date, final_amount FROM orders o WHERE order_status = 'Delivered' "
+           "ORDER BY o.order_date DESC, final_amount")
+    plan = plan_page(sql, SCHEMA, 100)
+    assert plan.key_column == 'order_id' and plan.sort_columns == ('order_date', 'final_amount')
+    assert plan.sql == ("SELECT order_id, order_date, final_amount FROM orders o WHERE order_status = 'Delivered' "
+                        "ORDER BY o.order_date DESC, o.final_amount, o.order_id LIMIT 101")
+
+    plan = plan_page(sql, SCHEMA, 100, after=["2024-01-01 10:00:00", None, 5])
+    assert plan.sql == (
+        "SELECT order_id, order_date, final_amount FROM orders o WHERE (order_status = 'Delivered') AND "
+        "(((o.order_date < '2024-01-01 10:00:00' OR o.order_date IS NULL)) "
+        "OR (o.order_date = '2024-01-01 10:00:00' AND o.final_amount IS NOT NULL) "
+        "OR (o.order_date = '2024-01-01 10:00:00' AND o.final_amount IS NULL AND o.order_id > 5)) "
+        "ORDER BY o.order_date DESC, o.final_amount, o.order_id LIMIT 101"
+    )
+    # 游标与查询的续读键不匹配
+    with pytest.raises(InvalidCursor):
+        plan_page(sql, SCHEMA, 100, after=5)
+
+    # 主键出现在排序项中时不再追加主键，父表的列也可以排序
+    plan = plan_page("SELECT * FROM products ORDER BY price DESC, product_id DESC, product_name", SCHEMA, 100)
+    assert plan.sql == "SELECT * FROM products ORDER BY products.price DESC, products.product_id DESC LIMIT 101"
+    plan = plan_page("SELECT o.order_id, u.username FROM orders o JOIN users u ON o.user_id = u.user_id "
+                     "ORDER BY u.username", SCHEMA, 100)
+    assert plan.sql.endswith("ORDER BY u.username, o.order_id LIMIT 101")
+
+def test_order_by_without_keyset():
+    """测试按表达式、序号、同名结果别名或不明确的列排序时只截断不续读"""
+    for sql in [
+        "SELECT * FROM products ORDER BY FIELD(brand, 'a', 'b')",
+        "SELECT * FROM products ORDER BY 2",
+        "SELECT product_id, price * 2 AS price FROM products ORDER BY price",
+        "SELECT product_id, product_name FROM products ORDER BY price",
+        "SELECT o.order_id, o.created_at FROM orders o JOIN users u ON o.user_id = u.user_id ORDER BY created_at",
+    ]:
+        plan = plan_page(sql, SCHEMA, 100)
+        assert plan.key_column is None and plan.sql == f"{sql} LIMIT 101", sql
+
+def test_limit_injection():
+    """测试不能续读的查询只限制行数"""
+    assert plan_page("SELECT COUNT(*) FROM users", SCHEMA, 100).sql == "SELECT COUNT(*) FROM users LIMIT 101"
+    plan = plan_page("SELECT * FROM products ORDER BY price DESC LIMIT 10", SCHEMA, 100)
+    assert plan.sql == "SELECT * FROM products ORDER BY price DESC LIMIT 10" and not plan.capped
+    plan = plan_page("SELECT * FROM products ORDER BY price DESC LIMIT 20, 5000", SCHEMA, 100)
+    assert plan.sql == "SELECT * FROM products ORDER BY price DESC LIMIT 20, 101"
+    assert cap_sql("SELECT * FROM users WHERE username = 'a LIMIT 5';", 1000) == \
+        "SELECT * FROM users WHERE username = 'a LIMIT 5' LIMIT 1000"
+
+def test_apply_page_returns_cursor():
+    """测试超出上限时截断结果并生成下一页游标"""
+    plan = plan_page("SELECT user_id, username FROM users", SCHEMA, 2)
+    description = [('user_id', 3), ('username', 253)]
+    result = QueryResult(description, [(1, 'a'), (2, 'b'), (3, 'c')])
+    page, truncated, next_cursor = apply_page(plan, result, SECRET)
+    assert page.rows == [(1, 'a'), (2, 'b')] and truncated
+    assert decode_cursor(next_cursor, SECRET) == ("SELECT user_id, username FROM users", 2)
+
+    page, truncated, next_cursor = apply_page(plan, QueryResult(description, [(3, 'c')]), SECRET)
+    assert not truncated and next_cursor is None
+
+def test_apply_page_cursor_for_order_by():
+    """测试带ORDER BY的查询的游标保存最后一行的排序列和主键，DECIMAL保存为字符串"""
+    sql = "SELECT product_id, price FROM products ORDER BY price DESC"
+    plan = plan_page(sql, SCHEMA, 2)
+    description = [('product_id', 3), ('price', 246)]
+    result = QueryResult(description, [(7, Decimal('99.00')), (3, Decimal('9.90')), (5, Decimal('9.90'))])
+    page, truncated, next_cursor = apply_page(plan, result, SECRET)
+    assert truncated and decode_cursor(next_cursor, SECRET) == (sql, ["9.90", 3])
+    plan = plan_page(sql, SCHEMA, 2, after=["9.90", 3])
+    assert "(products.price < '9.90' OR products.price IS NULL)" in plan.sql
+    assert "(products.price = '9.90' AND products.product_id > 3)" in plan.sql
+
+def test_cursor_signature():
+    """测试被篡改的游标会被拒绝"""
+    cursor = encode_cursor("SELECT * FROM users", 10, SECRET)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, "other-secret")
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor", SECRET)
+
+if __name__ == "__main__":
+    test_keyset_plan_for_simple_select()
+    test_keyset_allows_parent_join_only()
+    test_keyset_plan_for_order_by()
+    test_order_by_without_keyset()
+    test_limit_injection()
+    test_apply_page_returns_cursor()
+    test_apply_page_cursor_for_order_by()
+    test_cursor_signature()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+测试数据库连接池（使用假连接，不依赖MySQL）
+"""
+
+import threading
+import time
+from app.utils.pool import ConnectionPool, PoolTimeoutError
+
+class FakeConnection:
+    """模拟mysql连接"""
+
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+
+    def is_connected(self):
+        return self.healthy and not self.closed
+
+    def close(self):
+        self.closed = True
+
+def test_pool_reuses_connections():
+    """测试连接复用"""
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=2)
+    assert pool.warm() == 1
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    stats = pool.stats()
+    assert stats["created"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["in_use"] == 0
+
+def test_pool_max_size_and_timeout():
+    """测试最大连接数和借出超时"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, checkout_timeout=0.05)
+    conn = pool.checkout()
+    try:
+        pool.checkout()
+        assert False, "应该超时"
+    except PoolTimeoutError:
+        pass
+    pool.release(conn)
+    assert pool.stats()["timeouts"] == 1
+
+def test_pool_waiter_gets_released_connection():
+    """测试等待者获得归还的连接"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, checkout_timeout=2)
+    conn = pool.checkout()
+    result = {}
+
+    def worker():
+        with pool.connection() as c:
+            result["conn"] = c
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    assert pool.stats()["waiters"] == 1
+    pool.release(conn)
+    thread.join()
+    assert result["conn"] is conn
+    assert pool.stats()["max_wait_time"] > 0
+
+def test_pool_discards_unhealthy_and_expired():
+    """测试健康检查和最长存活时间"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=2, idle_check_interval=0)
+    conn = pool.checkout()
+    pool.release(conn)
+    conn.healthy = False
+    new_conn = pool.checkout()
+    assert new_conn is not conn
+    assert conn.closed
+    pool.release(new_conn)
+    assert pool.stats()["health_check_failures"] == 1
+
+    pool.max_lifetime = 0
+    expired = pool.checkout()
+    pool.release(expired)
+    assert expired.closed
+    assert pool.stats()["size"] == 0
+
+def test_pool_discards_connection_on_error():
+    """测试出错的连接不再放回连接池"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1)
+    try:
+        with pool.connection() as conn:
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+
+if __name__ == "__main__":
+    test_pool_reuses_connections()
+    test_pool_max_size_and_timeout()
+    test_pool_waiter_gets_released_connection()
+    test_pool_discards_unhealthy_and_expired()
+    test_pool_discards_connection_on_error()
+    print("[SUCCESS] 连接池测试通过")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+测试提示词模板编译（不依赖Groq和数据库）
+"""
+
+from database.config import get_table_schema, get_field_mapping, get_table_relationships, get_enum_values
+from database.config import get_table_aliases
+from app.services.prompt_template import compile_prompt_template
+from app.services.schema_index import SchemaIndex
+
+def _metadata():
+    return get_table_schema(), get_field_mapping(), get_table_relationships(), get_enum_values()
+
+def test_prompt_prefix_is_stable():
+    """测试不同问题共享完全相同的前缀"""
+    template = compile_prompt_template(*_metadata())
+    first = template.render("总销售额是多少？")
+    second = template.render("各个用户等级的人数分布")
+    assert first.startswith(template.prefix)
+    assert second.startswith(template.prefix)
+    assert first.endswith(template.suffix)
+    assert "总销售额是多少？" in first
+
+def test_prompt_version_tracks_metadata():
+    """测试元数据变化时版本号变化，不变时版本号一致"""
+    table_schema, field_mapping, relationships, enum_values = _metadata()
+    template = compile_prompt_template(table_schema, field_mapping, relationships, enum_values)
+    same = compile_prompt_template(*_metadata())
+    assert template.version == same.version
+    assert template.metadata_hash == same.metadata_hash
+
+    enum_values = dict(enum_values, user_level=["Bronze", "Silver"])
+    changed = compile_prompt_template(table_schema, field_mapping, relationships, enum_values)
+    assert changed.version != template.version
+    assert changed.metadata_hash != template.metadata_hash
+
+def test_schema_index_selects_relevant_tables():
+    """测试按问题筛选相关表"""
+    index = SchemaIndex(*_metadata(), get_table_aliases())
+    assert index.select_tables("库存不足的商品") == ("products",)
+    assert index.select_tables("各个用户等级的人数分布") == ("users",)
+    assert index.select_tables("月度销售趋势") == ("orders",)
+    assert index.select_tables("随便说点什么") is None
+
+def test_schema_index_closes_over_join_paths():
+    """测试沿表关系补全中间表"""
+    index = SchemaIndex(*_metadata(), get_table_aliases())
+    tables = index.select_tables("各分类的销售额")
+    assert set(tables) == {"categories", "products", "order_items", "orders"}
+    assert set(index._join_closure(["users", "products"])) == {"users", "orders", "order_items", "products"}
+
+def test_pruned_prompt_only_contains_selected_tables():
+    """测试裁剪后的提示词只包含选中的表，且共享固定的说明前缀"""
+    full = compile_prompt_template(*_metadata())
+    pruned = compile_prompt_template(*_metadata(), tables=("products",))
+    assert "**products table**" in pruned.prefix
+    assert "**orders table**" not in pruned.prefix
+    assert "order_status" not in pruned.prefix
+    assert len(pruned.prefix) < len(full.prefix)
+    shared = full.prefix.index("### Database Schema Information")
+    assert pruned.prefix[:shared] == full.prefix[:shared]
+
+if __name__ == "__main__":
+    test_prompt_prefix_is_stable()
+    test_prompt_version_tracks_metadata()
+    test_schema_index_selects_relevant_tables()
+    test_schema_index_closes_over_join_paths()
+    test_pruned_prompt_only_contains_selected_tables()
+    print("[SUCCESS] 提示词模板测试通过")
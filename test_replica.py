@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试进程内列式副本
+"""
+
+import datetime
+from decimal import Decimal
+import pytest
+from mysql.connector import FieldType, FieldFlag
+
+np = pytest.importorskip("numpy")
+from app.services.replica import ColumnarReplica, _table_from_rows
+
+def _column(name, type_code, flags=0, charset=63):
+    return (name, type_code, None, None, None, None, 1, flags, charset)
+
+USERS = ([_column('user_id', FieldType.LONG), _column('city', FieldType.VAR_STRING, charset=255),
+          _column('user_level', FieldType.STRING, FieldFlag.ENUM, 255)],
+         [(1, '北京', 'Gold'), (2, 'Shanghai', 'Bronze'), (3, 'shanghai', None)])
+ORDERS = ([_column('order_id', FieldType.LONG), _column('user_id', FieldType.LONG),
+           _column('order_date', FieldType.DATETIME), _column('final_amount', FieldType.NEWDECIMAL),
+           _column('order_status', FieldType.STRING, FieldFlag.ENUM, 255)],
+          [(1, 1, datetime.datetime(2024, 1, 5, 10, 0), Decimal('100.00'), 'Delivered'),
+           (2, 1, datetime.datetime(2024, 1, 20, 8, 0), Decimal('50.50'), 'Pending'),
+           (3, 2, datetime.datetime(2024, 2, 1, 9, 0), Decimal('20.25'), 'Delivered'),
+           (4, 3, datetime.datetime(2024, 2, 3, 0, 0), None, 'Cancelled'),
+           (5, 9, datetime.datetime(2024, 3, 1, 0, 0), Decimal('1.00'), 'Delivered')])
+SCHEMA = {
+    'users': {'columns': ['user_id', 'city', 'user_level'], 'primary_key': 'user_id'},
+    'orders': {'columns': ['order_id', 'user_id', 'order_date', 'final_amount', 'order_status'],
+               'primary_key': 'order_id'},
+}
+RELATIONSHIPS = {'users': {'orders': 'users.user_id = orders.user_id'}}
+
+def _replica():
+    replica = ColumnarReplica(enabled=True, schema=SCHEMA, relationships=RELATIONSHIPS)
+    for name, (description, rows) in (('users', USERS), ('orders', ORDERS)):
+        replica.set_table(_table_from_rows(name, SCHEMA[name]['primary_key'], description, rows, rows[-1][0]))
+    return replica
+
+def test_aggregates_match_mysql_semantics():
+    """测试分组聚合的结果和类型与MySQL一致（DECIMAL求和、AVG四舍五入、NULL不计入）"""
+    replica = _replica()
+    result = replica.execute(
+        "SELECT DATE_FORMAT(order_date, '%Y-%m') AS month, COUNT(*) AS n, SUM(final_amount) AS total, "
+        "AVG(final_amount) FROM orders GROUP BY month ORDER BY month"
+    )
+    assert result.columns == ['month', 'n', 'total', 'AVG(final_amount)']
+    assert [column[1] for column in result.description] == [
+        FieldType.VAR_STRING, FieldType.LONGLONG, FieldType.NEWDECIMAL, FieldType.NEWDECIMAL]
+    assert result.rows == [
+        ('2024-01', 2, Decimal('150.50'), Decimal('75.250000')),
+        ('2024-02', 2, Decimal('20.25'), Decimal('20.250000')),
+        ('2024-03', 1, Decimal('1.00'), Decimal('1.000000')),
+    ]
+
+    # 没有分组且没有匹配行时返回一行
+    assert replica.execute("SELECT COUNT(*), SUM(final_amount) FROM orders WHERE order_id > 100").rows == [(0, None)]
+
+def test_joins_filters_and_ordering():
+    """测试内连接、不区分大小写的字符串比较、HAVING和ENUM排序"""
+    replica = _replica()
+    # 订单5的用户不存在，内连接后不计入
+    result = replica.execute(
+        "SELECT u.city, COUNT(*) AS n, SUM(o.final_amount) FROM orders o JOIN users u ON o.user_id = u.user_id "
+        "WHERE o.order_date >= '2024-01-10' AND u.city IN ('SHANGHAI', '北京') GROUP BY u.city ORDER BY n DESC"
+    )
+    assert result.rows == [('Shanghai', 2, Decimal('20.25')), ('北京', 1, Decimal('50.50'))]
+
+    result = replica.execute(
+        "SELECT order_status, COUNT(*) FROM orders GROUP BY order_status HAVING COUNT(*) >= 1 ORDER BY order_status LIMIT 2"
+    )
+    assert result.rows == [('Pending', 1), ('Delivered', 3)]
+
+def test_unsupported_queries_fall_back():
+    """测试副本不能回答的查询返回None（由MySQL执行）"""
+    replica = _replica()
+    for sql in [
+        "SELECT * FROM orders",
+        "SELECT order_id, final_amount FROM orders",
+        "SELECT COUNT(*) FROM orders WHERE order_date >= NOW() - INTERVAL 7 DAY",
+        "SELECT COUNT(*) FROM orders o LEFT JOIN users u ON o.user_id = u.user_id",
+        "SELECT user_id, COUNT(*) FROM orders WHERE user_id IN (SELECT user_id FROM users) GROUP BY user_id",
+        "SELECT order_status, final_amount FROM orders GROUP BY order_status",
+        "SELECT COUNT(*) FROM products",
+    ]:
+        assert replica.execute(sql) is None, sql
+    assert ColumnarReplica(enabled=False, schema=SCHEMA, relationships=RELATIONSHIPS).execute(
+        "SELECT COUNT(*) FROM orders") is None
+
+def test_append_rows():
+    """测试按主键追加新行（沿用已有的字典编码）"""
+    description, rows = USERS
+    table = _table_from_rows('users', 'user_id', description, rows, 3)
+    appended = _table_from_rows('users', 'user_id', description, [(4, '北京', 'Platinum')], 4, base=table)
+    assert appended.row_count == 4 and appended.watermark == 4
+    assert appended.columns['city'].values.tolist() == [0, 1, 2, 0]
+    assert table.row_count == 3 and len(table.columns['city']) == 3
+
+if __name__ == "__main__":
+    test_aggregates_match_mysql_semantics()
+    test_joins_filters_and_ordering()
+    test_unsupported_queries_fall_back()
+    test_append_rows()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+测试汇总表查询改写
+"""
+
+import time
+from datetime import datetime
+from app.services import rollup as rollup_module
+from app.services.rollup import rewrite_sql, ROLLUPS, RollupManager
+from app.utils.database import DatabaseManager
+from app.utils.pool import ConnectionPool
+
+_ORDERS_DAILY = ROLLUPS[0]
+
+def rewrite(sql):
+    result = rewrite_sql(sql, ROLLUPS)
+    return None if result is None else (result.rollup, result.sql)
+
+def test_rewrite_trend_and_category_queries():
+    """测试按月销售额、按分类销售额、按等级用户数改写为读取汇总表"""
+    assert rewrite(
+        "SELECT DATE_FORMAT(o.order_date, '%Y-%m') AS month, SUM(o.final_amount) AS total_sales "
+        "FROM orders o WHERE o.order_status = 'Delivered' GROUP BY month ORDER BY month;"
+    ) == ("rollup_orders_daily",
+          "SELECT DATE_FORMAT(order_day, '%Y-%m') AS month, SUM(final_amount) AS total_sales "
+          "FROM rollup_orders_daily WHERE order_status = 'Delivered' GROUP BY month ORDER BY month;")
+
+    # 内连接分类表时排除没有分类的商品
+    assert rewrite(
+        "SELECT c.category_name, SUM(oi.total_price) AS sales FROM order_items oi "
+        "JOIN products p ON oi.product_id = p.product_id JOIN categories c ON p.category_id = c.category_id "
+        "JOIN orders o ON oi.order_id = o.order_id WHERE o.order_status = 'Delivered' "
+        "GROUP BY c.category_name ORDER BY sales DESC LIMIT 10"
+    ) == ("rollup_item_sales_daily",
+          "SELECT category_name, SUM(total_price) AS sales FROM rollup_item_sales_daily "
+          "WHERE (order_status = 'Delivered') AND category_id IS NOT NULL "
+          "GROUP BY category_name ORDER BY sales DESC LIMIT 10")
+
+    assert rewrite("SELECT u.province, COUNT(DISTINCT u.user_id) AS n, AVG(u.age) FROM users u "
+                   "GROUP BY u.province HAVING COUNT(*) > 10") == (
+        "rollup_users",
+        "SELECT province, COALESCE(SUM(user_count), 0) AS n, (SUM(age) / SUM(age_count)) AS `AVG(u.age)` "
+        "FROM rollup_users GROUP BY province HAVING COALESCE(SUM(user_count), 0) > 10")
+
+def test_rewrite_day_granularity():
+    """测试只有按天即可确定结果的时间条件才改写"""
+    assert rewrite("SELECT SUM(final_amount) AS s FROM orders WHERE order_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)")
+    assert rewrite("SELECT COUNT(*) AS n FROM orders WHERE YEAR(order_date) = 2024 AND order_date < '2024-07-01'")
+    assert rewrite("SELECT order_date, SUM(final_amount) FROM orders GROUP BY order_date") is None
+    assert rewrite("SELECT SUM(final_amount) FROM orders WHERE order_date BETWEEN '2024-01-01' AND '2024-01-31'") is None
+    assert rewrite("SELECT SUM(final_amount) FROM orders WHERE order_date >= NOW() - INTERVAL 1 DAY") is None
+    assert rewrite("SELECT DATE_FORMAT(order_date, '%Y-%m-%d %H'), COUNT(*) FROM orders GROUP BY 1") is None
+
+def test_count_on_empty_match_is_zero():
+    """测试没有匹配的行时改写后的 COUNT 仍返回0（SUM 返回 NULL）"""
+    import sqlite3
+    sql = "SELECT COUNT(*) AS n, COUNT(discount_amount) AS d FROM orders WHERE order_status = 'Cancelled'"
+    rollup, rewritten = rewrite(sql)
+    assert rollup == "rollup_orders_daily"
+    assert rewritten == ("SELECT COALESCE(SUM(order_count), 0) AS n, COALESCE(SUM(discount_count), 0) AS d "
+                         "FROM rollup_orders_daily WHERE order_status = 'Cancelled'")
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE orders (order_id INT, order_status TEXT, discount_amount REAL)")
+    conn.execute("CREATE TABLE rollup_orders_daily (order_status TEXT, order_count INT, discount_count INT)")
+    conn.execute("INSERT INTO orders VALUES (1, 'Delivered', NULL)")
+    conn.execute("INSERT INTO rollup_orders_daily VALUES ('Delivered', 1, 0)")
+    assert conn.execute(sql).fetchone() == conn.execute(rewritten).fetchone() == (0, 0)
+
+def test_queries_that_are_not_rewritten():
+    """测试汇总表无法得到相同结果的查询保持原样"""
+    for sql in [
+        "SELECT SUM(oi.quantity * oi.unit_price) FROM order_items oi",
+        "SELECT user_id, SUM(final_amount) FROM orders GROUP BY user_id",
+        "SELECT p.product_name, SUM(oi.quantity) FROM order_items oi JOIN products p "
+        "ON oi.product_id = p.product_id GROUP BY p.product_name",
+        "SELECT u.city, SUM(o.final_amount) FROM orders o JOIN users u ON o.user_id = u.user_id GROUP BY u.city",
+        "SELECT payment_method, SUM(final_amount) FROM orders o LEFT JOIN users u ON o.user_id = u.user_id "
+        "GROUP BY payment_method",
+        "SELECT SUM(final_amount) FROM orders WHERE order_id IN (SELECT order_id FROM order_items)",
+        "SELECT COUNT(DISTINCT o.order_id) FROM order_items oi JOIN orders o ON oi.order_id = o.order_id",
+        "SELECT MAX(final_amount) FROM orders",
+        "SELECT * FROM orders",
+    ]:
+        assert rewrite(sql) is None, sql
+
+def test_manager_rewrites_only_refreshed_rollups():
+    """测试只有刷新过的汇总表参与改写"""
+    manager = RollupManager(enabled=True, refresh_interval=0)
+    sql = "SELECT user_level, COUNT(*) AS user_count FROM users GROUP BY user_level"
+    assert manager.rewrite(sql) is None
+    manager._set_state("rollup_users", 100, None)
+    assert manager.rewrite(sql).rollup == "rollup_users"
+    assert manager.rewrite("SELECT COUNT(*) FROM orders") is None
+
+def test_manager_skips_stale_rollups():
+    """测试距上次刷新超过 max_staleness 的汇总表不参与改写"""
+    manager = RollupManager(enabled=True, refresh_interval=0, max_staleness=60)
+    sql = "SELECT user_level, COUNT(*) AS user_count FROM users GROUP BY user_level"
+    manager._set_state("rollup_users", 100, None, age=120)
+    manager._set_state("rollup_orders_daily", 100, None)
+    assert manager.rewrite(sql) is None
+    assert manager.rewrite("SELECT COUNT(*) FROM orders").rollup == "rollup_orders_daily"
+    assert not manager.stats()["rollups"]["rollup_users"]["fresh"]
+    assert manager.ages()["rollup_users"] >= 120
+
+    manager._set_state("rollup_users", 100, None)
+    assert manager.rewrite(sql).rollup == "rollup_users"
+    assert RollupManager(enabled=True, max_staleness=0)._fresh() == ()
+
+def test_rewrite_reports_rollup_age():
+    """测试改写结果带有汇总表距上次刷新的秒数"""
+    manager = RollupManager(enabled=True, refresh_interval=0, max_staleness=600)
+    manager._set_state("rollup_orders_daily", 100, None, age=42)
+    result = manager.rewrite("SELECT COUNT(*) FROM orders")
+    assert result.rollup == "rollup_orders_daily" and 42 <= result.age < 43
+    assert manager.age("rollup_users") is None
+
+def test_full_refresh_reasons():
+    """测试状态缺失、水位线回退和超过全量重建间隔时全量重建，其余情况增量刷新"""
+    manager = RollupManager(enabled=True, refresh_interval=0, full_refresh_interval=3600)
+    reason = manager._full_reason
+    manager.full_refreshed[_ORDERS_DAILY.name] = 0
+    assert reason(_ORDERS_DAILY, (100,), 120, False) == "periodic"
+
+    manager.full_refreshed[_ORDERS_DAILY.name] = time.monotonic()
+    assert reason(_ORDERS_DAILY, (100,), 120, False) is None
+    assert reason(_ORDERS_DAILY, (100,), 120, True) == "requested"
+    # 重新生成数据后 rollup_state 被清空，或表被清空/重新导入了更少的行
+    assert reason(_ORDERS_DAILY, None, 120, False) == "no_state"
+    assert reason(_ORDERS_DAILY, (100,), 50, False) == "watermark_regressed"
+    assert reason(_ORDERS_DAILY, (100,), None, False) == "watermark_regressed"
+    assert reason(ROLLUPS[2], (100,), 120, False) == "no_day_column"
+
+    manager.full_refresh_interval = 0
+    manager.full_refreshed.clear()
+    assert reason(_ORDERS_DAILY, (100,), 120, False) is None
+
+class LockedConnection:
+    """模拟mysql连接：命名锁被其他进程持有，rollup_state 中有其他进程写入的刷新记录"""
+
+    def __init__(self):
+        self.queries = []
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+    def cursor(self, **kwargs):
+        return LockedCursor(self)
+
+
+class LockedCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+
+    def execute(self, query, params=None):
+        self.conn.queries.append(query)
+        if "GET_LOCK" in query:
+            self.result = (0,)
+        elif "FROM rollup_state" in query:
+            self.result = (100, datetime(2024, 1, 1), 30)
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+def test_refresh_skipped_when_locked_by_another_process():
+    """测试其他进程持有刷新锁时跳过刷新，只从 rollup_state 同步刷新时间"""
+    conn = LockedConnection()
+    db = DatabaseManager()
+    db.result_cache = None
+    db.pool = ConnectionPool(lambda: conn, min_size=0, max_size=1)
+    original = rollup_module.get_db
+    rollup_module.get_db = lambda: db
+    try:
+        manager = RollupManager(enabled=True, refresh_interval=0)
+        result = manager.refresh(["rollup_orders_daily"])["rollup_orders_daily"]
+    finally:
+        rollup_module.get_db = original
+    assert result["success"] and result["mode"] == "skipped" and result["watermark"] == 100
+    assert not any(query.startswith(("DELETE", "INSERT")) for query in conn.queries)
+    assert "RELEASE_LOCK" not in " ".join(conn.queries)
+    assert manager.stats()["rollups"]["rollup_orders_daily"]["ready"]
+    assert 30 <= manager.age("rollup_orders_daily") < 31
+
+if __name__ == "__main__":
+    test_rewrite_trend_and_category_queries()
+    test_rewrite_day_granularity()
+    test_count_on_empty_match_is_zero()
+    test_queries_that_are_not_rewritten()
+    test_manager_rewrites_only_refreshed_rollups()
+    test_manager_skips_stale_rollups()
+    test_rewrite_reports_rollup_age()
+    test_full_refresh_reasons()
+    test_refresh_skipped_when_locked_by_another_process()
+    print("[SUCCESS] 所有测试通过")
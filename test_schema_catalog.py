@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试数据库结构目录（information_schema 查询结果用固定数据代替，不依赖数据库）
+"""
+
+from database.config import get_table_relationships, get_enum_values, get_table_schema
+from app.services.schema_catalog import (
+    SchemaCatalog, build_snapshot, static_snapshot, parse_enum_literals, display_type
+)
+from app.services.prompt_template import compile_prompt_template
+
+# schema.sql 对应的 information_schema 内容（节选 users、categories、orders 三张表，外加一张汇总表）
+TABLE_ROWS = [
+    ('users', 1200, ''), ('categories', 10, ''), ('orders', 9600, ''),
+    ('coupons', 30, '优惠券表'), ('rollup_daily_sales', 700, '')
+]
+COLUMN_ROWS = [
+    ('categories', 'category_id', 'int', 'NO', 'PRI', ''),
+    ('categories', 'category_name', 'varchar(50)', 'NO', '', ''),
+    ('categories', 'parent_category_id', 'int', 'YES', 'MUL', ''),
+    ('coupons', 'coupon_code', 'varchar(20)', 'NO', '', '券码'),
+    ('coupons', 'user_id', 'int', 'NO', 'PRI', ''),
+    ('orders', 'order_id', 'int', 'NO', 'PRI', ''),
+    ('orders', 'user_id', 'int', 'NO', 'MUL', ''),
+    ('orders', 'final_amount', 'decimal(10,2)', 'NO', '', ''),
+    ('orders', 'order_status', "enum('Pending','Processing','Shipped','Delivered','Cancelled')", 'NO', '', ''),
+    ('rollup_daily_sales', 'sales_day', 'date', 'NO', 'PRI', ''),
+    ('users', 'user_id', 'int', 'NO', 'PRI', ''),
+    ('users', 'email', b'varchar(100)', 'NO', 'UNI', ''),
+    ('users', 'user_level', "enum('Bronze','Silver','Gold','Platinum')", 'YES', '', ''),
+]
+INDEX_ROWS = [
+    ('categories', 'PRIMARY', 0, 'category_id'),
+    ('categories', 'parent_category_id', 1, 'parent_category_id'),
+    ('coupons', 'PRIMARY', 0, 'user_id'),
+    ('coupons', 'PRIMARY', 0, 'coupon_code'),
+    ('orders', 'PRIMARY', 0, 'order_id'),
+    ('orders', 'idx_orders_user_id', 1, 'user_id'),
+    ('orders', 'idx_orders_status_amount', 1, 'order_status'),
+    ('orders', 'idx_orders_status_amount', 1, 'final_amount'),
+    ('users', 'PRIMARY', 0, 'user_id'),
+    ('users', 'email', 0, 'email'),
+]
+FOREIGN_KEY_ROWS = [
+    ('categories', 'categories_ibfk_1', 'parent_category_id', 'categories', 'category_id'),
+    ('coupons', 'coupons_ibfk_1', 'user_id', 'users', 'user_id'),
+    ('orders', 'orders_ibfk_1', 'user_id', 'users', 'user_id'),
+]
+
+def _snapshot(table_rows=TABLE_ROWS, column_rows=COLUMN_ROWS):
+    return build_snapshot(table_rows, column_rows, INDEX_ROWS, FOREIGN_KEY_ROWS, exclude=('rollup_*',),
+                          ddl_fingerprint='fp')
+
+def test_column_types():
+    """测试ENUM取值和列类型的解析"""
+    assert parse_enum_literals("enum('Credit Card','It''s')") == ('Credit Card', "It's")
+    assert parse_enum_literals("varchar(20)") == ()
+    assert display_type("decimal(10,2)") == "DECIMAL(10,2)"
+    assert display_type("enum('a','b')") == "ENUM"
+    assert display_type(b"int unsigned") == "INT UNSIGNED"
+
+def test_build_snapshot():
+    """测试表顺序、主键、索引、枚举值、中文名和与配置一致的表关系"""
+    snapshot = _snapshot()
+    assert snapshot.source == 'information_schema'
+    # 配置中的表按配置顺序，新表按名称排在后面，汇总表被排除
+    assert list(snapshot.tables) == ['users', 'categories', 'orders', 'coupons']
+    assert snapshot.tables['coupons'].primary_key == ('user_id', 'coupon_code')
+    assert snapshot.table_schema['coupons']['primary_key'] is None
+    assert snapshot.table_schema['coupons']['description'] == '优惠券表'
+    assert snapshot.table_schema['users']['description'] == get_table_schema()['users']['description']
+
+    orders = snapshot.table_schema['orders']
+    assert orders['primary_key'] == 'order_id'
+    assert orders['column_types'] == {'order_id': 'INT', 'user_id': 'INT', 'final_amount': 'DECIMAL(10,2)',
+                                      'order_status': 'ENUM'}
+    assert {'name': 'idx_orders_status_amount', 'columns': ['order_status', 'final_amount'],
+            'unique': False} in orders['indexes']
+    assert snapshot.table_schema['users']['indexes'] == [{'name': 'email', 'columns': ['email'], 'unique': True}]
+
+    assert snapshot.enum_values == {k: get_enum_values()[k] for k in ('user_level', 'order_status')}
+    assert snapshot.field_mapping['final_amount'] == '实付金额' and snapshot.field_mapping['coupon_code'] == '券码'
+    assert 'product_name' not in snapshot.field_mapping
+
+    static = get_table_relationships()
+    assert snapshot.table_relationships['users']['orders'] == static['users']['orders']
+    assert snapshot.table_relationships['orders']['users'] == static['orders']['users']
+    assert snapshot.table_relationships['categories']['categories'] == static['categories']['categories']
+    assert snapshot.table_relationships['coupons'] == {'users': 'coupons.user_id = users.user_id'}
+    assert snapshot.row_counts() == {'users': 1200, 'categories': 10, 'orders': 9600, 'coupons': 30}
+
+def test_version_ignores_row_counts():
+    """测试估算行数变化时版本不变，列定义变化时版本变化"""
+    snapshot = _snapshot()
+    grown = _snapshot(table_rows=[(t, (rows or 0) * 2, c) for t, rows, c in TABLE_ROWS])
+    assert grown.version == snapshot.version and grown.row_counts() != snapshot.row_counts()
+    altered = _snapshot(column_rows=COLUMN_ROWS + [('users', 'vip_until', 'date', 'YES', '', '会员到期日')])
+    assert altered.version != snapshot.version
+    assert static_snapshot().version != snapshot.version
+
+def test_prompt_includes_types_and_indexes():
+    """测试从数据库读取的结构在提示词中包含列类型和索引，静态配置的提示词不变"""
+    snapshot = _snapshot()
+    prefix = compile_prompt_template(snapshot.table_schema, snapshot.field_mapping,
+                                     snapshot.table_relationships, snapshot.enum_values).prefix
+    assert "  - final_amount (实付金额, DECIMAL(10,2))" in prefix
+    assert "- Indexes: (user_id); (order_status, final_amount)" in prefix
+    assert "- Indexes: (email) unique" in prefix
+    assert "**rollup_daily_sales table**" not in prefix
+
+    static = static_snapshot()
+    prefix = compile_prompt_template(static.table_schema, static.field_mapping,
+                                     static.table_relationships, static.enum_values).prefix
+    assert "  - final_amount (实付金额)" in prefix and "Indexes" not in prefix
+
+def test_publish_notifies_on_version_change():
+    """测试只有版本变化时通知订阅者，通知失败不影响快照替换"""
+    catalog = SchemaCatalog(enabled=False)
+    assert catalog.snapshot.source == 'static'
+    received = []
+    catalog.subscribe(received.append)
+    catalog.subscribe(lambda snapshot: 1 / 0)
+
+    snapshot = _snapshot()
+    catalog.publish(snapshot)
+    assert catalog.snapshot is snapshot and received == [snapshot]
+    grown = _snapshot(table_rows=[(t, (rows or 0) + 1, c) for t, rows, c in TABLE_ROWS])
+    catalog.publish(grown)
+    assert catalog.snapshot is grown and received == [snapshot]
+    assert catalog.stats()['tables']['orders']['row_count'] == 9601
+
+if __name__ == "__main__":
+    test_column_types()
+    test_build_snapshot()
+    test_version_ignores_row_counts()
+    test_prompt_includes_types_and_indexes()
+    test_publish_notifies_on_version_change()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+测试按列类型的结果序列化
+"""
+
+import json
+import datetime
+from decimal import Decimal
+from mysql.connector import FieldType
+from app.utils.serializer import QueryResult, result_data, dumps, encode_csv_chunk, column_converters
+
+def _column(name, type_code):
+    return (name, type_code, None, None, None, None, 1, 0, 63)
+
+DESCRIPTION = [
+    _column('user_id', FieldType.LONG),
+    _column('is_active', FieldType.TINY),
+    _column('amount', FieldType.NEWDECIMAL),
+    _column('created_at', FieldType.DATETIME),
+    _column('birth_date', FieldType.DATE),
+    _column('name', FieldType.VAR_STRING),
+]
+
+ROWS = [
+    (1, 1, Decimal('12.50'), datetime.datetime(2024, 1, 2, 3, 4, 5), datetime.date(1990, 5, 6), '张三'),
+    (2, 0, None, None, None, None),
+]
+
+def test_records_shape_keeps_integer_types():
+    """测试整数列保持整数，DECIMAL转为浮点数，日期转为ISO格式"""
+    data = json.loads(dumps(result_data(QueryResult(DESCRIPTION, ROWS))))
+    assert data[0] == {
+        'user_id': 1, 'is_active': 1, 'amount': 12.5,
+        'created_at': '2024-01-02T03:04:05', 'birth_date': '1990-05-06', 'name': '张三'
+    }
+    assert isinstance(data[0]['user_id'], int)
+    assert data[1]['amount'] is None and data[1]['created_at'] is None
+
+def test_columns_shape():
+    """测试 {columns, rows} 形状"""
+    data = json.loads(dumps(result_data(QueryResult(DESCRIPTION, ROWS), "columns")))
+    assert data['columns'] == ['user_id', 'is_active', 'amount', 'created_at', 'birth_date', 'name']
+    assert data['rows'][0] == [1, 1, 12.5, '2024-01-02T03:04:05', '1990-05-06', '张三']
+    assert data['rows'][1] == [2, 0, None, None, None, None]
+
+def test_rows_without_conversion_are_unchanged():
+    """测试不需要转换的结果直接返回原始行"""
+    description = [_column('user_id', FieldType.LONG), _column('name', FieldType.VARCHAR)]
+    rows = [(1, 'a'), (2, 'b')]
+    assert result_data(QueryResult(description, rows), "columns")['rows'] is rows
+
+def test_csv_chunk():
+    """测试CSV编码使用相同的列转换"""
+    chunk = encode_csv_chunk(ROWS, header=['a', 'b', 'c', 'd', 'e', 'f'], converters=column_converters(DESCRIPTION))
+    lines = chunk.decode('utf-8').splitlines()
+    assert lines[1] == '1,1,12.5,2024-01-02T03:04:05,1990-05-06,张三'
+    assert lines[2] == '2,0,,,,'
+
+if __name__ == "__main__":
+    test_records_shape_keeps_integer_types()
+    test_columns_shape()
+    test_rows_without_conversion_are_unchanged()
+    test_csv_chunk()
+    print("[SUCCESS] 所有测试通过")
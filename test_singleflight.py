@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+测试并发请求合并
+"""
+
+import asyncio
+from app.utils.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """测试相同键的并发调用只执行一次"""
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", work) for _ in range(10)])
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert results == ["result"] * 10
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 9}
+
+def test_cancelled_waiter_does_not_cancel_others():
+    """测试某个等待者取消后，其他等待者仍然得到结果"""
+    async def work():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == (42, True)
+
+def test_all_waiters_cancelled_cancels_call():
+    """测试所有等待者都取消后，调用本身也被取消"""
+    state = {}
+
+    async def work():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def main():
+        flight = SingleFlight()
+        waiter = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+        return flight.stats()["in_flight"]
+
+    assert asyncio.run(main()) == 0
+    assert state.get("cancelled")
+
+def test_new_caller_after_cancel_starts_new_call():
+    """测试最后一个等待者取消后，任务结束前到来的相同键调用重新执行而不是得到取消"""
+    calls = []
+
+    async def work():
+        calls.append(1)
+        try:
+            await asyncio.sleep(0.05)
+            return len(calls)
+        except asyncio.CancelledError:
+            # 模拟取消后还需要一段时间清理（如等待线程池中的查询结束）
+            await asyncio.sleep(0.05)
+            raise
+
+    async def main():
+        flight = SingleFlight()
+        waiter = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        result = await flight.do("key", work)
+        # 旧任务结束时不会移除新调用的键
+        await asyncio.sleep(0.06)
+        return result, waiter.cancelled(), flight.stats()
+
+    result, cancelled, stats = asyncio.run(main())
+    assert result == 2 and cancelled
+    assert stats == {"in_flight": 0, "executed": 2, "coalesced": 0}
+
+def test_errors_are_shared_and_not_cached():
+    """测试异常传给所有等待者，之后的调用重新执行"""
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("key", failing) for _ in range(3)], return_exceptions=True)
+        try:
+            await flight.do("key", failing)
+        except ValueError:
+            pass
+        return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(calls) == 2
+
+if __name__ == "__main__":
+    test_concurrent_calls_share_one_execution()
+    test_cancelled_waiter_does_not_cancel_others()
+    test_all_waiters_cancelled_cancels_call()
+    test_new_caller_after_cancel_starts_new_call()
+    test_errors_are_shared_and_not_cached()
+    print("[SUCCESS] 并发请求合并测试通过")
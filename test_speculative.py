@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+测试推测执行（多候选SQL生成，取第一个通过验证的结果）
+"""
+
+import asyncio
+from app.services.speculative import first_accepted, SpeculationStats
+from app.services.nl2sql_service import NL2SQLService
+from app.services.llm_backend import LLMBackend
+from app.utils.metrics import SPECULATION_RACES, SPECULATION_SAVED_SECONDS
+
+def test_first_accepted_cancels_slower_candidates():
+    """测试返回第一个被接受的结果，跳过无效结果并取消其余候选"""
+    cancelled = []
+
+    def candidate(delay, value):
+        async def run():
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(value)
+                raise
+            return value
+        return run
+
+    async def main():
+        outcome = await first_accepted(
+            [candidate(0.2, "slow"), candidate(0.01, "bad"), candidate(0.03, "good")],
+            lambda value: value != "bad"
+        )
+        await asyncio.sleep(0)
+        return outcome
+
+    outcome = asyncio.run(main())
+    assert (outcome.winner, outcome.result) == (2, "good")
+    assert outcome.finished[1][1] is False
+    assert outcome.cancelled == 1 and cancelled == ["slow"]
+
+    wins_before = SPECULATION_RACES.value(winner="2")
+    saved_before = SPECULATION_SAVED_SECONDS.snapshot()
+    stats = SpeculationStats()
+    stats.record(outcome)
+    assert stats.stats()["wins"] == {"2": 1}
+    # 胜出候选和节省的延迟同时计入 /metrics
+    assert SPECULATION_RACES.value(winner="2") == wins_before + 1
+    assert SPECULATION_SAVED_SECONDS.snapshot()[1] == saved_before[1] + 1
+    assert stats.stats()["speculative_win_rate"] == 1.0
+
+class FakeBackend(LLMBackend):
+    """按温度返回不同SQL和延迟的假模型后端"""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+        self.sync_calls = []
+
+    def complete(self, prompt, temperature=0.1):
+        self.sync_calls.append(temperature)
+        return self.answers[temperature][1]
+
+    async def acomplete(self, prompt, temperature=0.1):
+        self.calls.append(temperature)
+        delay, content = self.answers[temperature]
+        await asyncio.sleep(delay)
+        return content
+
+def test_speculative_generation_returns_first_valid_sql():
+    """测试首选候选生成无效SQL时，使用其他候选的有效SQL并写入缓存"""
+    service = NL2SQLService()
+    service.fast_path = None
+    service.speculative_candidates = 2
+    backend = FakeBackend({
+        0.1: (0.01, "SELECT * FROM customers"),
+        0.4: (0.03, "SELECT COUNT(*) FROM users"),
+    })
+    service.llm = backend
+
+    result = asyncio.run(service.agenerate_sql("用户总数"))
+    assert result["success"] and result["sql"] == "SELECT COUNT(*) FROM users;"
+    assert result["candidate"] == 1
+    assert sorted(backend.calls) == [0.1, 0.4]
+    assert service.speculation_stats()["primary_failures"] == 1
+    assert service.speculation_stats()["latency_saved_ms"] > 0
+    assert asyncio.run(service.agenerate_sql("用户总数"))["cached"]
+
+def test_sync_generation_does_not_speculate():
+    """测试同步的 generate_sql 只调用一次模型（推测执行和请求合并只用于异步接口）"""
+    service = NL2SQLService()
+    service.fast_path = None
+    service.speculative_candidates = 2
+    backend = FakeBackend({
+        0.1: (0.01, "SELECT COUNT(*) FROM users"),
+        0.4: (0.03, "SELECT COUNT(*) FROM users"),
+    })
+    service.llm = backend
+
+    result = service.generate_sql("用户总数是多少")
+    assert result["success"] and "candidate" not in result
+    assert len(backend.sync_calls) == 1 and backend.calls == []
+    assert service.speculation_stats()["races"] == 0
+
+if __name__ == "__main__":
+    test_first_accepted_cancels_slower_candidates()
+    test_speculative_generation_returns_first_valid_sql()
+    test_sync_generation_does_not_speculate()
+    print("[SUCCESS] 所有测试通过")
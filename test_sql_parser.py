@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试SQL词法解析和基于解析结果的SQL验证
+"""
+
+from app.utils.sql_parser import parse_sql, split_statements
+from app.services.nl2sql_service import get_nl2sql_service
+
+def test_parse_extracts_structure():
+    """测试解析语句类型、表、别名、列和字面量"""
+    parsed = parse_sql("SELECT u.username, o.total_amount FROM users u "
+                       "JOIN orders o ON u.user_id = o.user_id WHERE u.city = '北京' LIMIT 10")
+    assert parsed.statement_type == 'SELECT'
+    assert parsed.statement_count == 1
+    assert parsed.tables == ('users', 'orders')
+    assert parsed.aliases['u'] == 'users' and parsed.aliases['o'] == 'orders'
+    assert ('u', 'username') in parsed.columns and ('o', 'total_amount') in parsed.columns
+    assert parsed.literals == ("北京", 10)
+
+def test_parse_subqueries_and_ctes():
+    """测试派生表、逗号分隔的表列表和CTE"""
+    parsed = parse_sql("SELECT t.name FROM (SELECT p.name FROM products p, orders) t")
+    assert set(parsed.tables) == {'products', 'orders'}
+
+    parsed = parse_sql("WITH recent AS (SELECT * FROM orders) SELECT COUNT(*) FROM recent")
+    assert parsed.statement_type == 'SELECT'
+    assert parsed.tables == ('orders',)
+
+def test_parse_is_cached_and_normalized():
+    """测试相同SQL复用同一个解析结果，归一化保留字面量"""
+    sql = "SELECT  *\n FROM users  WHERE city = 'a  b' ;"
+    assert parse_sql(sql) is parse_sql(sql)
+    assert parse_sql(sql).normalized == "SELECT * FROM users WHERE city = 'a  b'"
+
+def test_split_statements():
+    """测试脚本按顶层分号切分，字符串和注释中的分号不切分"""
+    script = """-- 样本数据; 注释
+USE ecommerce_bi;
+INSERT INTO products (product_name, description) VALUES ('A; B', 'it''s \\'; fine'), ("x;y", NULL);
+/* 块注释; */ ;
+SELECT `a;b` FROM t # 末尾注释;
+"""
+    statements = split_statements(script)
+    assert len(statements) == 3
+    assert statements[0].endswith("USE ecommerce_bi")
+    assert statements[1].startswith("INSERT") and statements[1].endswith('("x;y", NULL)')
+    assert statements[2].startswith("SELECT") and "`a;b`" in statements[2]
+
+def test_validate_sql():
+    """测试SQL验证不误伤列名和字符串，拒绝未知的表和列"""
+    nl2sql = get_nl2sql_service()
+    accepted = [
+        "SELECT user_id, created_at FROM users",
+        "SELECT * FROM orders WHERE status = 'UPDATE pending'",
+        "SELECT REPLACE(username, 'a', 'b') FROM users",
+        "WITH t AS (SELECT user_id FROM orders) SELECT COUNT(*) FROM t",
+    ]
+    for sql in accepted:
+        assert nl2sql.validate_sql(sql)[0], sql
+
+    rejected = {
+        "DELETE FROM users": "Query must start with SELECT",
+        "SELECT * FROM users; DROP TABLE users": "Only a single statement is allowed",
+        "SELECT * FROM users INTO OUTFILE '/tmp/x'": "Operation INTO is not allowed",
+        "SELECT * FROM customers": "Unknown table: customers",
+        "SELECT u.salary FROM users u": "Unknown column: u.salary",
+        "SELECT * FROM users WHERE city = 'x": "SQL syntax error",
+    }
+    for sql, message in rejected.items():
+        is_valid, validation_message = nl2sql.validate_sql(sql)
+        assert not is_valid and validation_message.startswith(message), (sql, validation_message)
+
+if __name__ == "__main__":
+    test_parse_extracts_structure()
+    test_parse_subqueries_and_ctes()
+    test_parse_is_cached_and_normalized()
+    test_split_statements()
+    test_validate_sql()
+    print("[SUCCESS] 所有测试通过")
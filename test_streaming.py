@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+测试NDJSON/CSV流式导出：格式、响应头、CSV转义、超时和提前断开时连接的释放（使用假连接，不依赖MySQL）
+"""
+
+import csv
+import io
+import json
+import time
+import asyncio
+from decimal import Decimal
+from mysql.connector import Error, FieldType
+from app.api import query as query_api
+from app.api.query import QueryRequest, QueryResponse
+from app.services.cost_guard import CostVerdict
+from app.utils.database import DatabaseManager, ER_QUERY_TIMEOUT
+from app.utils.pool import ConnectionPool
+from app.utils.serializer import CSV_ERROR_MARKER
+from config import STREAM_EXECUTION_TIMEOUT_MS
+
+DESCRIPTION = [
+    ("product_id", FieldType.LONG, None, None, None, None, 0, 1, 63),
+    ("product_name", FieldType.VAR_STRING, None, None, None, None, 1, 0, 45),
+    ("price", FieldType.NEWDECIMAL, None, None, None, None, 1, 0, 63),
+]
+ROWS = [
+    (1, '普通商品', Decimal('9.90')),
+    (2, 'a,b "c"', Decimal('10.00')),
+    (3, '第一行\n第二行', None),
+    (4, None, Decimal('0.50')),
+]
+
+class StreamingConnection:
+    """模拟mysql连接：非缓冲游标按 fetchmany 分块返回 ROWS；表名为 slow_table 的语句按执行超时报错，
+    表名为 long_table 的语句读完第一块后超时"""
+
+    def __init__(self):
+        self.closed = False
+        self.queries = []
+
+    def is_connected(self):
+        return not self.closed
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self, buffered=True):
+        return StreamingCursor(self)
+
+
+class StreamingCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.position = 0
+
+    def execute(self, query, params=None):
+        self.conn.queries.append(query)
+        if "slow_table" in query:
+            raise Error(msg="Query execution was interrupted, maximum statement execution time exceeded",
+                        errno=ER_QUERY_TIMEOUT)
+        self.description = DESCRIPTION
+        self.query = query
+
+    def fetchmany(self, size):
+        if self.position and "long_table" in self.query:
+            raise Error(msg="Query execution was interrupted, maximum statement execution time exceeded",
+                        errno=ER_QUERY_TIMEOUT)
+        rows = ROWS[self.position:self.position + size]
+        self.position += len(rows)
+        return rows
+
+    def close(self):
+        pass
+
+
+def _database():
+    db = DatabaseManager()
+    db.result_cache = None
+    db.connections = []
+
+    def connect():
+        db.connections.append(StreamingConnection())
+        return db.connections[-1]
+
+    db.pool = ConnectionPool(connect, min_size=0, max_size=2)
+    return db
+
+def _stream(db, stream, sql="SELECT product_id, product_name, price FROM products", read_chunks=None):
+    """调用流式响应并读取响应体；read_chunks 为整数时只读取这么多块后断开"""
+    verdict = CostVerdict(True, 1500)
+
+    async def scenario():
+        original_chunk_size = query_api.STREAM_CHUNK_SIZE
+        query_api.STREAM_CHUNK_SIZE = 2
+        try:
+            response = await query_api._stream_query_result(
+                QueryRequest(question="导出商品"), sql, sql, "template", stream, time.time(), verdict
+            )
+        finally:
+            query_api.STREAM_CHUNK_SIZE = original_chunk_size
+        if isinstance(response, QueryResponse):
+            return response, None
+        body = []
+        iterator = response.body_iterator
+        async for chunk in iterator:
+            body.append(chunk)
+            if read_chunks is not None and len(body) >= read_chunks:
+                # 客户端提前断开：Starlette关闭响应体生成器
+                await iterator.aclose()
+                break
+        return response, b"".join(body)
+
+    original = query_api.get_db
+    query_api.get_db = lambda: db
+    try:
+        return asyncio.run(scenario())
+    finally:
+        query_api.get_db = original
+
+def test_ndjson_format_and_headers():
+    """测试NDJSON每行一个对象，DECIMAL按数值输出，响应头包含来源和耗时"""
+    db = _database()
+    response, body = _stream(db, "ndjson")
+    assert response.media_type == "application/x-ndjson"
+    assert response.headers["x-query-source"] == "template"
+    assert float(response.headers["x-execution-time"]) >= 0
+    assert "content-disposition" not in response.headers
+    lines = body.decode("utf-8").split("\n")
+    assert lines[-1] == ""
+    records = [json.loads(line) for line in lines[:-1]]
+    assert records == [
+        {"product_id": 1, "product_name": "普通商品", "price": 9.9},
+        {"product_id": 2, "product_name": 'a,b "c"', "price": 10.0},
+        {"product_id": 3, "product_name": "第一行\n第二行", "price": None},
+        {"product_id": 4, "product_name": None, "price": 0.5},
+    ]
+    # 执行的SQL带有流式导出的执行超时提示（而不是交互查询的超时），读完后连接归还连接池继续复用
+    assert f"MAX_EXECUTION_TIME({STREAM_EXECUTION_TIMEOUT_MS})" in db.connections[0].queries[0]
+    assert db.pool.stats()["in_use"] == 0 and not db.connections[0].closed
+
+def test_csv_escaping_and_headers():
+    """测试CSV表头、逗号/引号/换行的转义，None写为空单元格，以附件形式下载"""
+    db = _database()
+    response, body = _stream(db, "csv")
+    assert response.media_type == "text/csv"
+    assert response.headers["content-disposition"] == 'attachment; filename="query_result.csv"'
+    text = body.decode("utf-8")
+    assert '"a,b ""c"""' in text and '"第一行\n第二行"' in text
+    assert list(csv.reader(io.StringIO(text))) == [
+        ["product_id", "product_name", "price"],
+        ["1", "普通商品", "9.9"],
+        ["2", 'a,b "c"', "10.0"],
+        ["3", "第一行\n第二行", ""],
+        ["4", "", "0.5"],
+    ]
+
+def test_early_close_releases_connection():
+    """测试客户端读取部分结果后断开，未读完结果的连接被关闭并移出连接池"""
+    db = _database()
+    _response, body = _stream(db, "ndjson", read_chunks=1)
+    assert body.count(b"\n") == 2
+    stats = db.pool.stats()
+    assert stats["in_use"] == 0
+    assert db.connections[0].closed
+
+def test_timeout_before_first_chunk_returns_json_error():
+    """测试超过执行超时的流式查询在发送响应头之前返回JSON错误，连接归还连接池"""
+    db = _database()
+    response, body = _stream(db, "csv", sql="SELECT * FROM slow_table")
+    assert body is None and isinstance(response, QueryResponse)
+    assert not response.success and response.error_detail["code"] == "timeout"
+    assert response.error_detail["timeout_ms"] == STREAM_EXECUTION_TIMEOUT_MS
+    assert db.pool.stats()["in_use"] == 0
+
+def test_timeout_mid_stream_writes_error_trailer():
+    """测试已经开始的流式响应中途超时，NDJSON和CSV以一行错误信息结束"""
+    sql = "SELECT product_id, product_name, price FROM long_table"
+    _response, body = _stream(_database(), "ndjson", sql=sql)
+    records = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+    assert [record.get("product_id") for record in records[:2]] == [1, 2]
+    assert len(records) == 3 and records[-1]["error_detail"]["code"] == "timeout"
+    assert records[-1]["error_detail"]["timeout_ms"] == STREAM_EXECUTION_TIMEOUT_MS
+
+    db = _database()
+    _response, body = _stream(db, "csv", sql=sql)
+    rows = list(csv.reader(io.StringIO(body.decode("utf-8"))))
+    assert len(rows) == 4 and rows[-1][0] == CSV_ERROR_MARKER and "中止" in rows[-1][1]
+    assert db.pool.stats()["in_use"] == 0
+
+if __name__ == "__main__":
+    test_ndjson_format_and_headers()
+    test_csv_escaping_and_headers()
+    test_early_close_releases_connection()
+    test_timeout_before_first_chunk_returns_json_error()
+    test_timeout_mid_stream_writes_error_trailer()
+    print("[SUCCESS] 所有测试通过")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+测试惰性单例和启动预热（不依赖数据库）
+"""
+
+import time
+import asyncio
+import threading
+from app.utils.lazy import Lazy
+from app.services.warmup import Warmup, WarmupStep
+
+def test_lazy_creates_once():
+    """测试并发第一次调用只创建一个实例"""
+    created = []
+    def factory():
+        time.sleep(0.01)
+        created.append(object())
+        return created[-1]
+    lazy = Lazy(factory)
+    assert not lazy.created
+
+    instances = []
+    threads = [threading.Thread(target=lambda: instances.append(lazy())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and lazy.created
+    assert all(instance is created[0] for instance in instances)
+
+def test_steps_run_in_parallel_with_dependencies():
+    """测试独立步骤并行执行，依赖的步骤成功后才执行，依赖失败时跳过"""
+    order = []
+
+    def slow(name):
+        def run():
+            time.sleep(0.2)
+            order.append(name)
+            return name
+        return run
+
+    async def after():
+        order.append("caches")
+        return {"queries": 2}
+
+    def broken():
+        raise RuntimeError("boom")
+
+    warmup = Warmup([
+        WarmupStep("database", slow("database")),
+        WarmupStep("prompts", slow("prompts")),
+        WarmupStep("caches", after, required=False, after=("database", "prompts")),
+        WarmupStep("extra", broken, required=False),
+        WarmupStep("skipped", after, required=False, after=("extra",)),
+    ])
+    start = time.perf_counter()
+    asyncio.run(warmup.run())
+    assert time.perf_counter() - start < 0.35
+    assert order[-1] == "caches" and order.count("caches") == 1
+    status = warmup.status()
+    assert status["ready"] and status["finished"]
+    assert status["steps"]["caches"]["detail"] == {"queries": 2}
+    assert status["steps"]["extra"]["error"] == "boom"
+    assert status["steps"]["skipped"]["skipped"]
+
+def test_required_step_retries_until_ready():
+    """测试必需步骤失败时不就绪并按间隔重试，成功后就绪"""
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("数据库不可用")
+        return "ok"
+
+    async def scenario():
+        warmup = Warmup([WarmupStep("database", flaky)], retry_interval=0.05)
+        assert not warmup.ready and warmup.status()["steps"]["database"]["pending"]
+        warmup.start()
+        await asyncio.sleep(0.01)
+        assert not warmup.ready
+        await warmup._task
+        assert warmup.ready and warmup.results["database"]["attempts"] == 3
+
+        # 停止时取消仍在重试的预热
+        stuck = Warmup([WarmupStep("database", lambda: 1 / 0)], retry_interval=10)
+        stuck.start()
+        await asyncio.sleep(0.05)
+        await stuck.stop()
+        assert not stuck.ready and stuck.results["database"]["attempts"] == 1
+
+    asyncio.run(scenario())
+
+if __name__ == "__main__":
+    test_lazy_creates_once()
+    test_steps_run_in_parallel_with_dependencies()
+    test_required_step_retries_until_ready()
+    print("[SUCCESS] 所有测试通过")